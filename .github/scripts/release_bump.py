@@ -26,10 +26,27 @@ Manifest releaseNotes accumulation (see bump_manifest):
     browsers; the manifest stays scoped so HPM update prompts aren't a
     65 KB wall of text.
 
+PR metadata cache (see fetch_prs_cached):
+  - Each fetched PR's title, URL, author, body, parsed release-notes bullets
+    and updatedAt are kept in .github/.cache/release-prs.json (gitignored;
+    release.yml carries it across reruns with actions/cache).
+  - On the next run one light GraphQL query per 50 cached PRs asks only for
+    updatedAt; a PR whose updatedAt is unchanged is served from the cache,
+    the rest are fetched in full. Rerunning a release after a flaky API step
+    therefore re-downloads nothing that hasn't changed.
+
 Reads env:
   LABEL               - release:patch | release:minor | release:major
   TRIGGER_PR_NUMBER   - number of the PR that triggered this workflow (fallback)
 
+Run:  python .github/scripts/release_bump.py [--dry-run] [--label LABEL] [--no-cache]
+
+  --dry-run       print the new version, CHANGELOG entry and HPM block; write
+                  no release file and no GITHUB_OUTPUT (the cache is still
+                  refreshed, so a preview warms it for the real run)
+  --label LABEL   release label, overriding $LABEL
+  --no-cache      neither read nor write the PR metadata cache
+
 Outputs (GITHUB_OUTPUT):
   new_version=X.Y.Z
 
@@ -38,6 +55,7 @@ Files modified:
   hubitat-mcp-server.groovy, hubitat-mcp-rule.groovy
 """
 
+import argparse
 import json
 import os
 import re
@@ -53,6 +71,8 @@ README = ROOT / "README.md"
 SERVER = ROOT / "hubitat-mcp-server.groovy"
 RULE = ROOT / "hubitat-mcp-rule.groovy"
 
+PR_CACHE = ROOT / ".github" / ".cache" / "release-prs.json"
+
 SEMVER_RE = re.compile(r"^\d+\.\d+\.\d+$")
 
 
@@ -188,7 +208,8 @@ def merged_pr_numbers_since(tag: str | None) -> list[int]:
 
 
 def fetch_pr(number: int) -> dict | None:
-    """Fetch PR metadata via gh CLI. Returns None on failure.
+    """Fetch PR metadata via gh CLI. Returns None on failure. This is
+    fetch_prs' per-PR fallback when a batched GraphQL call fails as a whole.
 
     On failure, emits a `::warning::` so the run page surfaces the issue.
     Without this, the placeholder bullet `- PR #NN` looks identical to a
@@ -202,7 +223,7 @@ def fetch_pr(number: int) -> dict | None:
     try:
         result = run(
             "gh", "pr", "view", str(number),
-            "--json", "number,title,url,author,body",
+            "--json", "number,title,url,author,body,updatedAt",
         )
     except subprocess.CalledProcessError as e:
         # Pull the last non-blank line of stderr for the warning. Defensive
@@ -227,6 +248,161 @@ def fetch_pr(number: int) -> dict | None:
         return None
 
 
+# Pull requests resolved per `gh api graphql` call. Each is one aliased
+# `pullRequest` field, well under GitHub's per-query node limits.
+GRAPHQL_BATCH = 50
+
+_PR_FIELDS = "number title url body updatedAt author { login }"
+
+
+def _pr_query(numbers: list[int], fields: str = _PR_FIELDS) -> str:
+    """One GraphQL query aliasing `pr<N>: pullRequest(number: N)` per PR."""
+    aliases = "\n".join(
+        f"    pr{n}: pullRequest(number: {n}) {{ {fields} }}" for n in numbers
+    )
+    return (
+        "query($owner: String!, $name: String!) {\n"
+        "  repository(owner: $owner, name: $name) {\n"
+        f"{aliases}\n"
+        "  }\n"
+        "}"
+    )
+
+
+def fetch_prs(numbers: list[int], fields: str = _PR_FIELDS) -> dict[int, dict | None]:
+    """Fetch metadata for every PR in `numbers`, GRAPHQL_BATCH at a time, via
+    aliased `gh api graphql` queries. Returns {number: pr-or-None}, each pr in
+    fetch_pr's shape (or just `fields`, when fetch_prs_cached asks for less).
+
+    Same anti-silent-failure contract as fetch_pr: a PR the query could not
+    resolve (deleted number, an issue number rather than a PR) gets its own
+    `::warning::` and None, so its bullet falls back to `- PR #N` visibly.
+    When a whole batch fails -- gh missing, auth, an API outage, a response
+    that is not JSON -- its PRs are retried one by one through fetch_pr,
+    which warns per PR on failure exactly as before.
+
+    `{owner}`/`{repo}` are gh's placeholders for the current checkout's
+    repository (or GH_REPO).
+    """
+    prs: dict[int, dict | None] = {}
+    unique = list(dict.fromkeys(numbers))
+    for start in range(0, len(unique), GRAPHQL_BATCH):
+        batch = unique[start:start + GRAPHQL_BATCH]
+        # check=False: gh exits non-zero when any alias errors, but the
+        # response still carries every PR it did resolve.
+        try:
+            result = run(
+                "gh", "api", "graphql",
+                "-f", f"query={_pr_query(batch, fields)}",
+                "-F", "owner={owner}", "-F", "name={repo}",
+                check=False,
+            )
+            response = json.loads(result.stdout)
+            failure = "no repository in the response"
+        except (OSError, subprocess.CalledProcessError, json.JSONDecodeError) as e:
+            response, failure = None, str(e)
+        repository = (
+            (response.get("data") or {}).get("repository")
+            if isinstance(response, dict) else None
+        )
+        if repository is None:
+            print(
+                f"::warning::fetch_prs: gh api graphql failed for {len(batch)} "
+                f"PR(s) ({failure}); fetching them one by one.",
+                file=sys.stderr,
+            )
+            for n in batch:
+                prs[n] = fetch_pr(n)
+            continue
+        # GraphQL reports an unresolvable alias as null data plus an error
+        # whose path names the alias.
+        errors = {
+            tuple(err.get("path") or ())[-1:]: err.get("message", "")
+            for err in response.get("errors") or []
+            if isinstance(err, dict)
+        }
+        for n in batch:
+            pr = repository.get(f"pr{n}")
+            if pr is None:
+                reason = errors.get((f"pr{n}",)) or "no pull request with that number"
+                print(
+                    f"::warning::fetch_prs: GraphQL could not resolve PR #{n}: {reason}. "
+                    "Bullet will fall back to '- PR #N' placeholder.",
+                    file=sys.stderr,
+                )
+            prs[n] = pr
+    return prs
+
+
+# Bump when parse_release_notes or the cached PR shape changes, so entries
+# written by an older script are refetched rather than trusted.
+_PR_CACHE_FORMAT = 1
+
+
+def load_pr_cache(path: Path) -> dict[int, dict]:
+    """Return {number: cached pr} from `path`; empty when the file is missing,
+    unreadable or from another cache format. A cache is only ever a shortcut,
+    so a bad one is warned about and ignored, never fatal."""
+    try:
+        record = json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"::warning::load_pr_cache: ignoring unreadable {path.name}: {e}", file=sys.stderr)
+        return {}
+    if not isinstance(record, dict) or record.get("format") != _PR_CACHE_FORMAT:
+        return {}
+    return {
+        int(n): pr
+        for n, pr in (record.get("prs") or {}).items()
+        if n.isdigit() and isinstance(pr, dict) and pr.get("updatedAt")
+    }
+
+
+def save_pr_cache(path: Path, prs: dict[int, dict]) -> None:
+    """Write `prs` to `path` through a temp file, so an interrupted run never
+    leaves a truncated cache behind."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {"format": _PR_CACHE_FORMAT, "prs": {str(n): prs[n] for n in sorted(prs)}}
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(record, indent=2, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+def fetch_prs_cached(numbers: list[int], path: Path) -> dict[int, dict | None]:
+    """fetch_prs through the on-disk cache at `path`.
+
+    Cached PRs are validated first with a light query for updatedAt alone;
+    those unchanged since they were cached are served from it, and only new
+    or changed PRs are fetched in full. A PR the validation query cannot
+    resolve is None with fetch_prs' warning -- an unvalidated copy is not
+    trusted. Every resolved PR is written back with its parsed release-notes
+    bullets under "notes", replacing the cache's previous contents.
+    """
+    cache = load_pr_cache(path)
+    unique = list(dict.fromkeys(numbers))
+    prs: dict[int, dict | None] = {}
+    cached = [n for n in unique if n in cache]
+    if cached:
+        current = fetch_prs(cached, fields="number updatedAt")
+        for n in cached:
+            if current[n] is None:
+                prs[n] = None
+            elif current[n].get("updatedAt") == cache[n]["updatedAt"]:
+                prs[n] = cache[n]
+    prs.update(fetch_prs([n for n in unique if n not in prs]))
+    for pr in prs.values():
+        if pr is not None and "notes" not in pr:
+            pr["notes"] = parse_release_notes(pr.get("body"))
+    try:
+        save_pr_cache(path, {
+            n: pr for n, pr in prs.items() if pr is not None and pr.get("updatedAt")
+        })
+    except OSError as e:
+        print(f"::warning::fetch_prs_cached: cannot write {path.name}: {e}", file=sys.stderr)
+    return prs
+
+
 _RELEASE_NOTES_HEADING_RE = re.compile(r"^#+\s*release\s+notes\s*:?\s*$", re.IGNORECASE)
 _NEXT_HEADING_RE = re.compile(r"^#+\s+\S")
 _TOP_BULLET_RE = re.compile(r"^[-*]\s+\S")
@@ -316,7 +492,7 @@ def _has_release_notes_section(body: str | None) -> bool:
     )
 
 
-def build_bullets(pr_numbers: list[int]) -> list[str]:
+def build_bullets(pr_numbers: list[int], cache: Path | None = None) -> list[str]:
     """Return one bullet per PR.
 
     Each bullet is the PR title with full PR reference (number, URL,
@@ -335,10 +511,15 @@ def build_bullets(pr_numbers: list[int]) -> list[str]:
     intent to write release notes, but parse_release_notes silently dropped
     the content because it isn't bulleted. The bullet falls back to title-
     only either way, but the warning makes the degradation visible.
+
+    PR metadata comes from fetch_prs: a few batched GraphQL calls rather
+    than one `gh pr view` process per PR -- or from fetch_prs_cached when a
+    `cache` path is given.
     """
+    prs = fetch_prs(pr_numbers) if cache is None else fetch_prs_cached(pr_numbers, cache)
     bullets = []
     for n in pr_numbers:
-        pr = fetch_pr(n)
+        pr = prs.get(n)
         if pr is None:
             bullets.append(f"- PR #{n}")
             continue
@@ -349,7 +530,7 @@ def build_bullets(pr_numbers: list[int]) -> list[str]:
         header = f"- {title} {suffix}"
 
         body = pr.get("body")
-        notes = parse_release_notes(body)
+        notes = pr["notes"] if "notes" in pr else parse_release_notes(body)
         if notes:
             indented = "\n".join(
                 f"  {line}" for note in notes for line in note.splitlines()
@@ -533,8 +714,8 @@ def bump_manifest(new_version: str, label: str, new_block: str) -> None:
     )
 
 
-def prepend_changelog_entry(new_version: str, date: str, bullets: list[str]) -> None:
-    text = CHANGELOG.read_text()
+def changelog_entry(new_version: str, date: str, bullets: list[str]) -> str:
+    """The CHANGELOG.md section for a release, trailing blank line included."""
     # Keep the list tight (no blank lines between bullets, so renders without
     # per-item <p> wrappers) when every bullet is single-line. If any bullet
     # has an indented continuation, the list is already loose by virtue of
@@ -542,7 +723,12 @@ def prepend_changelog_entry(new_version: str, date: str, bullets: list[str]) ->
     # keep the output visually readable in the raw source.
     any_multiline = any("\n" in b for b in bullets)
     separator = "\n\n" if any_multiline else "\n"
-    entry = f"## [{new_version}] - {date}\n\n" + separator.join(bullets) + "\n\n"
+    return f"## [{new_version}] - {date}\n\n" + separator.join(bullets) + "\n\n"
+
+
+def prepend_changelog_entry(new_version: str, date: str, bullets: list[str]) -> None:
+    text = CHANGELOG.read_text()
+    entry = changelog_entry(new_version, date, bullets)
     m = re.search(r"^## \[", text, re.MULTILINE)
     if m is None:
         raise RuntimeError("CHANGELOG.md has no existing '## [X.Y.Z]' heading to insert before")
@@ -611,8 +797,20 @@ def write_github_output(key: str, value: str) -> None:
             f.write(f"{key}={value}\n")
 
 
-def main() -> int:
-    label = os.environ.get("LABEL", "").strip()
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bump the version and write release notes.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the release notes; modify no release file")
+    parser.add_argument("--label", default=None,
+                        help="release:patch | release:minor | release:major (default: $LABEL)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write the PR metadata cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    label = (args.label or os.environ.get("LABEL", "")).strip()
     trigger_pr = os.environ.get("TRIGGER_PR_NUMBER", "").strip()
     if not label:
         print("::error::LABEL env var not set", file=sys.stderr)
@@ -630,9 +828,14 @@ def main() -> int:
         print("::warning::No PRs found to include in release; using placeholder entry")
         bullets = [f"- Release {new_version}"]
     else:
-        bullets = build_bullets(pr_numbers)
+        bullets = build_bullets(pr_numbers, cache=None if args.no_cache else PR_CACHE)
 
     new_manifest_block = manifest_block_from_bullets(bullets, new_version, date)
+    if args.dry_run:
+        print(f"Dry run: {current} -> {new_version} ({len(bullets)} PR(s)); no file written\n")
+        print(changelog_entry(new_version, date, bullets), end="")
+        print(f"--- packageManifest.json releaseNotes block ---\n{new_manifest_block}")
+        return 0
 
     prepend_changelog_entry(new_version, date, bullets)
     bump_groovy_header(SERVER, new_version)
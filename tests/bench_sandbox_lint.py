@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for tests/sandbox_lint.py.
+
+Not part of CI or pytest -- run by hand when touching a hot path of the lint.
+
+Usage:
+  python tests/bench_sandbox_lint.py tokenizer [--repeat N]
+      Differential + timing run of the regex tokenizer against the original
+      character-walking stripper on every Groovy file the lint scans.
+      strip_comments_and_strings(multiline_strings=False) must reproduce
+      sandbox_lint_reference.strip_comments_and_strings_reference byte for
+      byte (exit 1 if not); the default (multi-line-aware) mode is timed
+      too, and the lines it reads differently are counted per file.
+
+  python tests/bench_sandbox_lint.py scaling [--scales 1,5,20] [--base F]
+                                             [--max-exponent X] [--bound STAGE=X]
+                                             [--stage STAGE] [--repeat N]
+      Growth-rate run on synthetic corpora. Builds a Groovy corpus (tool catalog,
+      tool guide, code-shaped filler) and a Markdown doc set (count claims, gateway
+      tables, version-history sections) at each scale times the real size, times
+      scan_source, strip_comments_and_strings, check_tool_counts and
+      check_read_write_split on them, and fits each stage's growth exponent (the
+      log-log slope of time vs input bytes: 1.0 = linear, 2.0 = quadratic). A
+      stage whose exponent exceeds its bound fails the run -- accidental quadratic
+      behavior (prefix slicing, repeated find loops) shows up here long before the
+      docs double in size. --base shrinks the 1x corpus (0.1 = a tenth of the
+      real size) for a quick run.
+
+Exit 0 = benchmark passed, exit 1 = an output mismatch or an exponent over its bound.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+# sandbox_lint lives next to this script.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sandbox_lint as sl
+import sandbox_lint_reference as ref
+
+
+def _best_of(fn, repeat):
+    """Best wall time of `repeat` calls to fn() (seconds)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_tokenizer(repeat):
+    """Compare and time the two strippers per file; return the number of mismatching files."""
+    corpus = sl.LintCorpus()
+    files = [p for p in sl.GROOVY_FILES if corpus.exists(p)]
+    mismatches = 0
+    total_ref = total_compat = total_new = 0.0
+    print(f"{'file':<40} {'lines':>7} {'reference':>10} {'compat':>9} {'default':>9} "
+          f"{'speedup':>8} {'ml-lines':>9}")
+    for path in files:
+        text = corpus.text(path)
+        reference = ref.strip_comments_and_strings_reference(text)
+        compat = sl.strip_comments_and_strings(text, multiline_strings=False)
+        default = sl.strip_comments_and_strings(text)
+        if compat != reference:
+            mismatches += 1
+            line = next(i for i, (a, b) in enumerate(zip(reference, compat, strict=True), 1) if a != b) \
+                if len(compat) == len(reference) else 0
+            print(f"MISMATCH {corpus.rel(path)}: first differing line {line}")
+        if len(default) != len(reference):
+            mismatches += 1
+            print(f"MISMATCH {corpus.rel(path)}: multi-line mode changed the line count")
+        # Lines the multi-line mode reads differently: bodies of triple-quoted strings that
+        # span lines, plus code after their closing quotes.
+        changed = sum(1 for a, b in zip(reference, default, strict=False) if a != b)
+        t_ref = _best_of(lambda t=text: ref.strip_comments_and_strings_reference(t), repeat)
+        t_compat = _best_of(lambda t=text: sl.strip_comments_and_strings(t, multiline_strings=False),
+                            repeat)
+        t_new = _best_of(lambda t=text: sl.strip_comments_and_strings(t), repeat)
+        total_ref += t_ref
+        total_compat += t_compat
+        total_new += t_new
+        print(f"{corpus.rel(path):<40} {len(reference):>7} {t_ref * 1000:>8.1f}ms "
+              f"{t_compat * 1000:>7.1f}ms {t_new * 1000:>7.1f}ms {t_ref / t_new:>7.1f}x {changed:>9}")
+    print(f"{'total':<40} {'':>7} {total_ref * 1000:>8.1f}ms {total_compat * 1000:>7.1f}ms "
+          f"{total_new * 1000:>7.1f}ms {total_ref / total_new:>7.1f}x")
+    if mismatches:
+        print(f"--- {mismatches} file(s) where the tokenizer output differs from the reference ---")
+    else:
+        print(f"--- compat output identical to the reference on all {len(files)} file(s) ---")
+    return mismatches
+
+
+# ---------------------------------------------------------------------------
+# Scaling benchmark
+# ---------------------------------------------------------------------------
+#
+# The synthetic corpora reuse the lint's own self-test builders, so they stay parseable by
+# the same extractors the real source feeds: _build_read_write_split_corpus for the
+# gateway / read-only / definitions catalog and _build_synthetic_groovy_corpus for the
+# tool guide, plus one filler method per tool made of comments, GStrings, heredocs and the
+# SELF_TEST_CASES snippets (every rule's trigger shape). The Markdown side repeats a
+# section carrying every claim shape check_tool_counts reads -- prose counts, gateway
+# tables, "sees N tools", version-history headings -- with the canonical numbers of the
+# Groovy corpus at the same scale, spread over DOC_FILES_FOR_COUNTS the way the real docs
+# are. Sizes are approximate (whole tools / sections); the fit uses the actual byte counts.
+
+SCALING_STAGES = ["scan_source", "strip_comments_and_strings",
+                  "check_tool_counts", "check_read_write_split"]
+SCALING_SCALES_DEFAULT = (1, 5, 20)
+# Linear work measures ~1.0; the slack absorbs timer noise and cache effects on the small
+# end. Anything quadratic in some input lands near 2.0.
+SCALING_MAX_EXPONENT_DEFAULT = 1.3
+# Tools per synthetic gateway; every 8th tool stays flat (proxied by no gateway).
+_SYNTHETIC_GATEWAY_SIZE = 16
+
+
+def _letters(n):
+    """0 -> "a", 25 -> "z", 26 -> "ba" ...: identifiers the gateway-name patterns
+    (`(?:manage|read)_[a-z_]+`) accept, unlike digits."""
+    out = ""
+    while True:
+        out = chr(ord("a") + n % 26) + out
+        n //= 26
+        if not n:
+            return out
+
+
+def _synthetic_catalog(n_tools):
+    """(gateways {name: [tools]}, read_only, all_tools) for `n_tools` synthetic tools.
+    Gateways alternate hub_read_* / hub_manage_*; tools in a read gateway, and the flat
+    ones, are read-only -- so the read/write-split check finds nothing to report."""
+    gateways, read_only, all_tools = {}, [], []
+    members = []
+    for i in range(n_tools):
+        name = f"hub_tool_{_letters(i)}"
+        all_tools.append(name)
+        if i % 8 == 7:
+            read_only.append(name)
+        else:
+            members.append(name)
+    for g, start in enumerate(range(0, len(members), _SYNTHETIC_GATEWAY_SIZE)):
+        tools = members[start:start + _SYNTHETIC_GATEWAY_SIZE]
+        kind = "read" if g % 2 == 0 else "manage"
+        gateways[f"hub_{kind}_{_letters(g)}"] = tools
+        if kind == "read":
+            read_only.extend(tools)
+    return gateways, read_only, all_tools
+
+
+def _synthetic_tool_method(i, name):
+    """One code-shaped filler method: comments, strings, a multi-line heredoc and the
+    i-th SELF_TEST_CASES snippet."""
+    snippet = sl.SELF_TEST_CASES[i % len(sl.SELF_TEST_CASES)][1]
+    return (
+        f"// {name}: synthetic implementation #{i}\n"
+        f"def {name}(args) {{\n"
+        "    /* validate the arguments before touching the hub */\n"
+        f'    def label = "device ${{args.deviceId}} ({name})"\n'
+        "    def help = \"\"\"Synthetic heredoc for ${label}\n"
+        "        spanning lines, with a // not-a-comment and a 'quote'\n"
+        "    \"\"\"\n"
+        f"    {snippet}\n"
+        "    return [success: true, label: label, help: help]  // trailing comment\n"
+        "}\n"
+    )
+
+
+def build_synthetic_groovy(target_bytes):
+    """(source, catalog tuple) of a synthetic Groovy corpus of roughly `target_bytes`."""
+    def build(n_tools):
+        gateways, read_only, all_tools = _synthetic_catalog(n_tools)
+        guide = "\n".join(f"{t}: synthetic guide entry" for t in all_tools)
+        parts = [sl._build_read_write_split_corpus(gateways, read_only, all_tools),
+                 sl._build_synthetic_groovy_corpus("synthetic_tools", guide)]
+        parts += [_synthetic_tool_method(i, t) for i, t in enumerate(all_tools)]
+        return "\n".join(parts), (gateways, read_only, all_tools)
+
+    probe, _ = build(64)
+    return build(max(8, round(target_bytes * 64 / len(probe))))
+
+
+def _synthetic_doc_section(i, canonical):
+    """One Markdown section carrying every claim shape check_tool_counts reads."""
+    gateways = sorted(canonical["per_gateway"].items())
+    gateway, ops = gateways[i % len(gateways)]
+    short = gateway[len("hub_"):]
+    total, core, n_gateways = canonical["total"], canonical["core"], canonical["gateways"]
+    return (
+        f"## Section {i}: `{gateway}`\n\n"
+        f"The server exposes {total} tools ({core} core + {n_gateways} gateways); "
+        f"{canonical['tools_list']} on `tools/list` and {canonical['proxied']} proxied tools.\n"
+        f"An agent that calls `{gateway}` with no arguments sees {ops} tools.\n"
+        f"The {short} gateway ({ops} tools) groups related operations.\n\n"
+        "| Gateway | Tools |\n|---|---|\n"
+        f"| `{gateway}` | {ops} |\n\n"
+        "Plain prose between the claims: configuration notes, examples and caveats that\n"
+        "the count patterns have to scan past without matching anything at all.\n\n"
+        "### Version History\n\n"
+        f"#### v0.{i}.0\n\n"
+        f"- Grew from {total - 1} tools total to {total}.\n\n"
+    )
+
+
+def build_synthetic_docs(target_bytes, canonical):
+    """{doc path: Markdown} totalling roughly `target_bytes`, round-robin over
+    DOC_FILES_FOR_COUNTS."""
+    docs = {path: [] for path in sl.DOC_FILES_FOR_COUNTS}
+    paths = list(docs)
+    size = i = 0
+    while size < target_bytes:
+        section = _synthetic_doc_section(i, canonical)
+        docs[paths[i % len(paths)]].append(section)
+        size += len(section)
+        i += 1
+    return {path: "# Synthetic document\n\n" + "".join(parts) for path, parts in docs.items()}
+
+
+def _synthetic_corpus(groovy, docs):
+    """A LintCorpus reading `groovy` as the app, `docs` as the count docs, and nothing from
+    the real libraries (each is overlaid empty so combined_text() is just `groovy`)."""
+    probe = sl.LintCorpus()
+    overlays = dict.fromkeys(probe.library_paths, "")
+    overlays[probe.server_path] = groovy
+    overlays.update(docs)
+    return sl.LintCorpus(overlays=overlays)
+
+
+def real_corpus_sizes():
+    """(Groovy bytes, Markdown bytes) of the real tree: the app + libraries, and the
+    DOC_FILES_FOR_COUNTS set."""
+    corpus = sl.LintCorpus()
+    groovy = len(corpus.combined_text() or "")
+    docs = sum(len(corpus.text(p) or "") for p in sl.DOC_FILES_FOR_COUNTS)
+    return groovy, docs
+
+
+def growth_exponent(points):
+    """Least-squares slope of log(seconds) over log(bytes) for [(bytes, seconds), ...]:
+    t ~ n**k gives k. None with fewer than two distinct sizes."""
+    pts = [(math.log(n), math.log(max(t, 1e-9))) for n, t in points]
+    if len({x for x, _ in pts}) < 2:
+        return None
+    mean_x = sum(x for x, _ in pts) / len(pts)
+    mean_y = sum(y for _, y in pts) / len(pts)
+    num = sum((x - mean_x) * (y - mean_y) for x, y in pts)
+    den = sum((x - mean_x) ** 2 for x, _ in pts)
+    return num / den
+
+
+def _time_stage(stage, groovy, docs, repeat):
+    """(input bytes, best seconds) for one stage on one synthetic corpus."""
+    if stage == "scan_source":
+        return len(groovy), _best_of(lambda: sl.scan_source(groovy, "synthetic.groovy"), repeat)
+    if stage == "strip_comments_and_strings":
+        return len(groovy), _best_of(lambda: sl.strip_comments_and_strings(groovy), repeat)
+
+    # The catalog checks get a fresh corpus per run and an empty parse cache, so each timing
+    # includes the catalog parse a real run pays once.
+    def fresh(check):
+        sl._CATALOG_CACHE.clear()
+        check(corpus=_synthetic_corpus(groovy, docs))
+
+    if stage == "check_tool_counts":
+        doc_bytes = sum(len(t) for t in docs.values())
+        return len(groovy) + doc_bytes, _best_of(lambda: fresh(sl.check_tool_counts), repeat)
+    if stage == "check_read_write_split":
+        return len(groovy), _best_of(lambda: fresh(sl.check_read_write_split), repeat)
+    raise ValueError(f"unknown stage {stage!r}")
+
+
+def bench_scaling(scales, base, stages, bounds, repeat):
+    """Time each stage at each scale; return the number of stages over their bound."""
+    real_groovy, real_docs = real_corpus_sizes()
+    print(f"real corpus: {real_groovy:,} bytes Groovy, {real_docs:,} bytes Markdown; "
+          f"1x = {base:g} of that")
+    corpora = []
+    for scale in scales:
+        groovy, catalog = build_synthetic_groovy(real_groovy * base * scale)
+        canonical = sl._extract_canonical_counts(_synthetic_corpus(groovy, {}))
+        if canonical is None:
+            raise RuntimeError("synthetic Groovy corpus does not parse -- builder out of date")
+        docs = build_synthetic_docs(real_docs * base * scale, canonical)
+        corpora.append((scale, groovy, docs))
+        print(f"  {scale:>3}x: {len(groovy):>11,} bytes Groovy ({len(catalog[2]):,} tools), "
+              f"{sum(len(t) for t in docs.values()):>11,} bytes Markdown")
+
+    print(f"{'stage':<28} " + " ".join(f"{str(s) + 'x':>10}" for s in scales)
+          + f" {'exponent':>9} {'bound':>6}")
+    over = 0
+    for stage in stages:
+        points = [_time_stage(stage, groovy, docs, repeat) for _, groovy, docs in corpora]
+        k = growth_exponent(points)
+        bound = bounds.get(stage, SCALING_MAX_EXPONENT_DEFAULT)
+        flag = ""
+        if k is not None and k > bound:
+            over += 1
+            flag = "  OVER"
+        shown = "n/a" if k is None else f"{k:.2f}"
+        print(f"{stage:<28} " + " ".join(f"{t * 1000:>8.1f}ms" for _, t in points)
+              + f" {shown:>9} {bound:>6.2f}{flag}")
+    if over:
+        print(f"--- {over} stage(s) grow faster than their bound ---")
+    else:
+        print(f"--- all {len(stages)} stage(s) within their growth bound ---")
+    return over
+
+
+def _scales(value):
+    try:
+        scales = sorted({int(v) for v in value.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}") from None
+    if len(scales) < 2 or scales[0] < 1:
+        raise argparse.ArgumentTypeError("need at least two distinct scales >= 1")
+    return scales
+
+
+def _positive_float(value):
+    x = float(value)
+    if x <= 0:
+        raise argparse.ArgumentTypeError(f"must be > 0, got {x}")
+    return x
+
+
+def _stage_bound(value):
+    stage, sep, bound = value.partition("=")
+    if not sep or stage not in SCALING_STAGES:
+        raise argparse.ArgumentTypeError(
+            f"expected STAGE=X with STAGE one of {', '.join(SCALING_STAGES)}, got {value!r}")
+    return stage, _positive_float(bound)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for tests/sandbox_lint.py")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    tok = sub.add_parser("tokenizer", help="regex tokenizer vs the character-walking reference")
+    tok.add_argument("--repeat", type=sl._positive_int, default=5,
+                     help="timing runs per file; the best one is reported (default 5)")
+    scl = sub.add_parser("scaling", help="growth exponent of the hot stages on synthetic corpora")
+    scl.add_argument("--scales", type=_scales, default=list(SCALING_SCALES_DEFAULT),
+                     help="comma-separated multiples of the real size (default 1,5,20)")
+    scl.add_argument("--base", type=_positive_float, default=1.0,
+                     help="size of 1x as a fraction of the real corpus (default 1.0)")
+    scl.add_argument("--max-exponent", type=_positive_float, default=SCALING_MAX_EXPONENT_DEFAULT,
+                     help=f"growth-exponent bound for every stage "
+                          f"(default {SCALING_MAX_EXPONENT_DEFAULT})")
+    scl.add_argument("--bound", type=_stage_bound, action="append", default=[],
+                     metavar="STAGE=X", help="per-stage bound overriding --max-exponent")
+    scl.add_argument("--stage", choices=SCALING_STAGES, action="append",
+                     help="time only this stage (repeatable; default all)")
+    scl.add_argument("--repeat", type=sl._positive_int, default=3,
+                     help="timing runs per stage and scale; the best one is used (default 3)")
+    args = parser.parse_args(argv)
+
+    if args.bench == "tokenizer":
+        return 1 if bench_tokenizer(args.repeat) else 0
+    if args.bench == "scaling":
+        bounds = dict.fromkeys(SCALING_STAGES, args.max_exponent)
+        bounds.update(args.bound)
+        stages = [s for s in SCALING_STAGES if not args.stage or s in args.stage]
+        return 1 if bench_scaling(args.scales, args.base, stages, bounds, args.repeat) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
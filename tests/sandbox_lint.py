@@ -4,16 +4,57 @@ Hubitat Groovy Sandbox Linter
 
 Scans .groovy files for patterns known to crash at runtime in the Hubitat
 sandbox even though they compile fine. Also checks version consistency
-across project files.
+across project files, and flags hub-side hot-path hazards (PERF-xxx: state
+access, whole-collection getters and hub round-trips inside loops, repeated
+serialization) as warning/info findings with a suggested batching pattern.
 
 Exit 0 = clean, exit 1 = errors found.
 Outputs GitHub Actions annotations when running in CI.
+
+Options:
+  --self-test   run the must-catch / must-not-catch fixture suites instead
+  --jobs N      scan the Groovy files (or, with --self-test, run the suites) on
+                N worker processes (default: the core count in CI, 1 locally)
+  --changed-since REF
+                sandbox-scan only the Groovy files changed relative to git REF
+                (plus untracked ones); the cross-file checks still run in full
+  --no-cache    ignore and don't update the per-file scan cache
+                (.cache/sandbox-lint-scan.json)
+  --sarif FILE / --jsonl FILE
+                also write the findings, as they are found, as a SARIF 2.1.0 log /
+                one JSON object per line ('-' = stdout instead of the text output)
+  --max-findings N
+                stop after N error findings without running the remaining checks
+                (exit 1); warnings and info never count toward N
+  --compile-budget
+                print the per-file hub compile-budget table (method count, largest
+                method in tokens vs the JVM 64KB method limit, string bytes, fan-in)
+  --lsp         run as a stdio Language Server: SANDBOX-xxx diagnostics for open
+                buffers on every edit (only the edited lines are relinted), the
+                cross-file checks after --lsp-debounce SECONDS (default 1.0) of quiet
+  --profile [FILE]
+                time every check_*, self-test suite and RULES entry (wall + CPU,
+                lines matched per rule); write the JSON report to FILE (default
+                .cache/sandbox-lint-profile.json) and print the --profile-top N
+                slowest entries
 """
 
+import argparse
+import bisect
+import concurrent.futures
+import contextlib
 import hashlib
+import io
+import json
 import os
+import queue
 import re
+import subprocess
 import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
 from pathlib import Path
 
 # Force UTF-8 on stdout/stderr so prints containing em dashes, arrows, and
@@ -68,9 +109,173 @@ VERSION_SOURCES = {
     },
 }
 
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+#
+# Every check used to read (and, for the Groovy-catalog checks, re-concatenate) the
+# app + all libraries/*.groovy on its own -- ~20 read_text calls over ~54k lines per run,
+# growing with every check added. LintCorpus is the single read-once view main() builds
+# and hands to every check: file text, the stripped lines + block-comment mask scan_file
+# needs, and the main+libraries concatenation the catalog checks parse are each computed
+# at most once per run.
+#
+# Every check keeps `corpus=None` as its default and builds a fresh LintCorpus from the
+# CURRENT REPO_ROOT at call time, so callers (and tests that monkeypatch REPO_ROOT to a
+# tmp tree) that pass nothing see exactly the old read-from-disk behavior.
+
+
+class LintCorpus:
+    """Read-once, memoized view of the files the lint inspects.
+
+    `overlays` ({Path: text}) substitutes in-memory content for a path -- an unsaved
+    editor buffer, or a synthetic document -- without touching disk. A missing file
+    reads as None, so callers keep their `if not path.exists(): skip` shape.
+    """
+
+    def __init__(self, root: Path | None = None, overlays: dict | None = None):
+        self.root = root if root is not None else REPO_ROOT
+        self._text: dict[Path, str | None] = {}
+        self._bytes: dict[Path, bytes | None] = {}
+        self._stripped: dict[Path, list[str]] = {}
+        self._lines: dict[Path, list[str]] = {}
+        self._mask: dict[Path, list[bool]] = {}
+        self._index: dict[Path, LineIndex] = {}
+        self._historical: dict[Path, HistoricalIndex] = {}
+        self._library_paths: list[Path] | None = None
+        self._combined: str | None = None
+        self._combined_done = False
+        self._catalog: ToolCatalog | None = None
+        self._overlaid: set[Path] = set()
+        for path, text in (overlays or {}).items():
+            self._text[Path(path)] = text
+            self._overlaid.add(Path(path))
+
+    @property
+    def server_path(self) -> Path:
+        return self.root / "hubitat-mcp-server.groovy"
+
+    @property
+    def library_paths(self) -> list[Path]:
+        """Sorted libraries/*.groovy -- the same order the app's concatenation used."""
+        if self._library_paths is None:
+            lib_dir = self.root / "libraries"
+            self._library_paths = sorted(lib_dir.glob("*.groovy")) if lib_dir.is_dir() else []
+        return self._library_paths
+
+    def rel(self, path: Path) -> str:
+        return str(Path(path).relative_to(self.root))
+
+    def text(self, path: Path) -> str | None:
+        """File content (utf-8, errors=replace), or None when the file does not exist."""
+        path = Path(path)
+        if path not in self._text:
+            self._text[path] = (
+                path.read_text(encoding="utf-8", errors="replace") if path.is_file() else None
+            )
+        return self._text[path]
+
+    def exists(self, path: Path) -> bool:
+        return self.text(path) is not None
+
+    def is_overlaid(self, path: Path) -> bool:
+        """True when `path`'s content came from an overlay / set_text, not from disk."""
+        return Path(path) in self._overlaid
+
+    def read_bytes(self, path: Path) -> bytes | None:
+        path = Path(path)
+        if path not in self._bytes:
+            self._bytes[path] = path.read_bytes() if path.is_file() else None
+        return self._bytes[path]
+
+    def set_text(self, path: Path, text: str | None) -> None:
+        """Replace one file's content (None = deleted) and drop everything derived from it."""
+        path = Path(path)
+        self._text[path] = text
+        self._overlaid.add(path)
+        self._bytes.pop(path, None)
+        self._stripped.pop(path, None)
+        self._lines.pop(path, None)
+        self._mask.pop(path, None)
+        self._index.pop(path, None)
+        self._historical.pop(path, None)
+        if path == self.server_path or path.parent == self.root / "libraries":
+            self._combined = None
+            self._combined_done = False
+            self._catalog = None
+            if path.suffix == ".groovy" and path.parent == self.root / "libraries":
+                self._library_paths = None
+
+    @property
+    def server_text(self) -> str | None:
+        return self.text(self.server_path)
+
+    def combined_text(self) -> str | None:
+        """The app source with every libraries/*.groovy appended ("\\n"-joined), or None
+        when the app itself is missing. The app #includes every library module, so this is
+        the whole compiled surface: tool-def chunks, read-only parts, DISCRETE_EVENT_CAPS."""
+        if not self._combined_done:
+            src = self.server_text
+            if src is not None:
+                parts = [src]
+                for lib in self.library_paths:
+                    parts.append(self.text(lib) or "")
+                src = "\n".join(parts)
+            self._combined = src
+            self._combined_done = True
+        return self._combined
+
+    def tool_catalog(self) -> "ToolCatalog | None":
+        """The ToolCatalog parsed from combined_text(), or None when the app is missing."""
+        if self._catalog is None:
+            src = self.combined_text()
+            if src is None:
+                return None
+            self._catalog = tool_catalog(src)
+        return self._catalog
+
+    def source_lines(self, path: Path) -> list[str]:
+        path = Path(path)
+        if path not in self._lines:
+            self._lines[path] = (self.text(path) or "").split("\n")
+        return self._lines[path]
+
+    def stripped_lines(self, path: Path) -> list[str]:
+        path = Path(path)
+        if path not in self._stripped:
+            self._stripped[path] = strip_comments_and_strings(self.text(path) or "")
+        return self._stripped[path]
+
+    def block_mask(self, path: Path) -> list[bool]:
+        path = Path(path)
+        if path not in self._mask:
+            self._mask[path] = _block_comment_mask(self.source_lines(path))
+        return self._mask[path]
+
+    def line_index(self, path: Path) -> "LineIndex":
+        path = Path(path)
+        if path not in self._index:
+            self._index[path] = LineIndex(self.text(path) or "")
+        return self._index[path]
+
+    def historical_index(self, path: Path) -> "HistoricalIndex":
+        path = Path(path)
+        if path not in self._historical:
+            self._historical[path] = HistoricalIndex(self.text(path) or "", self.line_index(path))
+        return self._historical[path]
+
+
 # ---------------------------------------------------------------------------
 # Anti-pattern rules
 # ---------------------------------------------------------------------------
+#
+# `prefilter` lists literal substrings at least ONE of which must be present for the rule's
+# pattern to be able to match (e.g. `\bnew\s+Thread\b` cannot match a line without
+# "Thread"). The scan gates every line on one combined literal search and only runs the
+# regexes of rules whose literals are present -- nearly every line matches none. A prefilter
+# that is not a true necessary condition silently drops findings, so keep it to a literal
+# every alternative of the pattern contains; a rule without one simply runs on every line.
+# test_rule_engine_matches_naive_scan pins engine == per-rule re.search on the whole repo.
 
 RULES = [
     {
@@ -80,78 +285,91 @@ RULES = [
         "pattern": r"\bgetClass\b",
         "message": "getClass() blocked in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("getClass",),
     },
     {
         "id": "SANDBOX-002",
         "pattern": r"\bLocale\s*\.\s*\w+",
         "message": "Locale class not available in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("Locale",),
     },
     {
         "id": "SANDBOX-003",
         "pattern": r"\.format\s*\([^)]*,\s*Locale",
         "message": "Date.format(String, Locale) overload not available in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("Locale",),
     },
     {
         "id": "SANDBOX-004",
         "pattern": r"\blog\s*\.\s*is\w+Enabled\s*\(",
         "message": "log.is*Enabled() not available in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("Enabled",),
     },
     {
         "id": "SANDBOX-005",
         "pattern": r"\bEval\s*\.\s*(?:me|x|xy)\s*\(",
         "message": "Eval not available in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("Eval",),
     },
     {
         "id": "SANDBOX-006",
         "pattern": r"\bnew\s+Thread\b",
         "message": "Thread creation blocked in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("Thread",),
     },
     {
         "id": "SANDBOX-007",
         "pattern": r"\bClass\s*\.\s*forName\s*\(|\.newInstance\s*\(",
         "message": "Reflection (Class.forName / newInstance) blocked in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("forName", "newInstance"),
     },
     {
         "id": "SANDBOX-008",
         "pattern": r"\bjava\s*\.\s*io\s*\.\s*File\b|\bnew\s+File\s*\(",
         "message": "Filesystem access blocked in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("File",),
     },
     {
         "id": "SANDBOX-009",
         "pattern": r"\bRuntime\s*\.\s*exec\s*\(|\bProcessBuilder\b",
         "message": "Process execution blocked in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("Runtime", "ProcessBuilder"),
     },
     {
         "id": "SANDBOX-010",
         "pattern": r"\batomicState\s*\.\s*\w+\s*\[.*\]\s*=",
         "message": "Nested atomicState mutation does not persist — assign the whole map back",
         "severity": "warning",
+        "prefilter": ("atomicState",),
     },
     {
         "id": "SANDBOX-011",
         "pattern": r"\bnew\s+.*HubAction\b",
         "message": "HubAction only valid in drivers, not apps",
         "severity": "error",
+        "prefilter": ("HubAction",),
     },
     {
         "id": "SANDBOX-012",
         "pattern": r"\bnew\s+(?:java\s*\.\s*util\s*\.\s*)?ArrayDeque\s*\(",
         "message": "ArrayDeque instantiation blocked in Hubitat sandbox at parse time -- use Groovy list literal `[]` (LinkedList-backed; supports addLast/removeLast for LIFO semantics)",
         "severity": "error",
+        "prefilter": ("ArrayDeque",),
     },
     {
         "id": "SANDBOX-013",
         "pattern": r"\bnew\s+(?:groovy\s*\.\s*lang\s*\.\s*)?GroovyShell\b|\bGroovyShell\s*\.",
         "message": "GroovyShell blocked in Hubitat sandbox",
         "severity": "error",
+        "prefilter": ("GroovyShell",),
     },
     {
         # The hub runs Groovy 2.4 (antlr2 parser), which rejects a bare `{ ... }`
@@ -166,6 +384,7 @@ RULES = [
         "pattern": r"\bcase\b[^:]*:\s*\{",
         "message": "Bare '{ }' block right after 'case X:' is rejected by the hub's Groovy 2.4 parser (ambiguous closure vs open block) even though hubitat_ci's Groovy 3.0 accepts it -- extract the case body to a method or remove the braces",
         "severity": "error",
+        "prefilter": ("case",),
     },
     {
         # The Hubitat sandbox forbids referencing a java.io stream/reader/writer class as a
@@ -182,6 +401,7 @@ RULES = [
         "pattern": r"\b(?:InputStream|OutputStream|FileInputStream|FileOutputStream|ByteArrayInputStream|ByteArrayOutputStream|DataInputStream|DataOutputStream|BufferedInputStream|BufferedOutputStream|BufferedReader|BufferedWriter|FileReader|FileWriter|InputStreamReader|OutputStreamWriter|RandomAccessFile|PushbackInputStream|PrintStream|PrintWriter)\b",
         "message": "java.io stream/reader/writer class referenced as a ClassExpression -- blocked by the Hubitat sandbox at parse time ('ClassExpression not allowed'). Duck-type instead: branch on byte[]/CharSequence and read via .bytes/.text rather than naming the class (e.g. avoid `instanceof InputStream`).",
         "severity": "error",
+        "prefilter": ("Stream", "Reader", "Writer", "File"),
     },
     {
         # The platform client escapes a '?' in `path` into literal path content: EXACT hub routes
@@ -198,8 +418,68 @@ RULES = [
         "pattern": r"""(?:hubInternal\w*|_radioGet(?:Safe)?|_radioPost|_modePost)\(\s*(?:"[^"$]*\?|'[^'$]*\?)""",
         "message": "Querystring embedded in a hub-request PATH. The platform client escapes the '?' into the literal path -- exact hub routes 404 and wildcard routes silently swallow it. Pass the parameters as the query map instead, e.g. hubInternalGet('/device/updateLabel', [deviceId: id, label: name]), and do NOT pre-encode the values (the query map encodes them; pre-encoding double-encodes).",
         "severity": "error",
+        "prefilter": ("hubInternal", "_radio", "_modePost"),
         "raw": True,
     },
+    # -- Performance (PERF-xxx) -------------------------------------------------------------
+    #
+    # Hub-side hot-path hazards: work that is cheap once but is paid per iteration or per call
+    # site. These rules carry a `scope` -- where on the line the pattern counts -- resolved by
+    # the engine's brace tracking (see _RuleEngine.scope_step):
+    #   "loop"        only the part of the line inside an each/collect/for/while body (and a
+    #                 while condition, which re-evaluates per iteration)
+    #   "device_loop" only inside a loop over devices (receiver, for-collection or closure
+    #                 parameter naming a dev*/Dev* value)
+    #   "repeat"      the pattern's `arg` group matched again, unchanged, in the same block or a
+    #                 nested one of the same top-level method (an intervening reassignment or
+    #                 put/add/<< of the argument's root name resets it)
+    # and a `suggestion`: the batching pattern the finding prints. None is an error -- they are
+    # heuristics, so they report without failing the lint.
+    {
+        "id": "PERF-001",
+        "pattern": r"\batomicState\s*(?:\??\.\s*\w|\[)",
+        "message": "atomicState read/write inside a loop -- every access is a synchronous database round-trip",
+        "severity": "warning",
+        "prefilter": ("atomicState",),
+        "scope": "loop",
+        "suggestion": "Copy the value into a local before the loop (def m = atomicState.key ?: [:]), work on the local, and assign atomicState.key = m once after the loop.",
+    },
+    {
+        "id": "PERF-002",
+        "pattern": r"(?<![\w.$])state\s*(?:\??\.\s*\w|\[)",
+        "message": "state accessed inside a loop -- every access goes through the app state map and every write re-marks it for the end-of-run save",
+        "severity": "info",
+        "prefilter": ("state",),
+        "scope": "loop",
+        "suggestion": "Hoist state.key into a local before the loop and write it back with one assignment after the loop.",
+    },
+    {
+        "id": "PERF-003",
+        "pattern": r"\b(?:getChildDevices|getToolDefinitions|getAllToolDefinitions)\s*\(",
+        "message": "Whole-collection getter called inside a loop -- it rebuilds the full list on every iteration",
+        "severity": "warning",
+        "prefilter": ("getChildDevices", "ToolDefinitions"),
+        "scope": "loop",
+        "suggestion": "Call it once before the loop and index the result, e.g. def byName = getToolDefinitions().collectEntries { [(it.name): it] }.",
+    },
+    {
+        "id": "PERF-004",
+        "pattern": r"\bJsonOutput\s*\.\s*toJson\s*\(\s*(?P<arg>[^()]*(?:\([^()]*\)[^()]*)*)\)",
+        "message": "JsonOutput.toJson of the same value more than once in one method -- the structure is re-serialized each time",
+        "severity": "warning",
+        "prefilter": ("toJson",),
+        "scope": "repeat",
+        "suggestion": "Serialize once into a local (def json = JsonOutput.toJson(x)) and reuse the string (its .size() / .length() included).",
+    },
+    {
+        "id": "PERF-005",
+        "pattern": r"\b(?:hubInternalGet\w*|hubInternalPost\w*|_hubRequest|_radioGet\w*|_radioPost\w*)\s*\(",
+        "message": "Hub HTTP round-trip inside per-device iteration -- N devices means N serialized requests against the hub's own web server",
+        "severity": "warning",
+        "prefilter": ("hubInternal", "_hubRequest", "_radio"),
+        "scope": "device_loop",
+        "suggestion": "Fetch once before the loop from a bulk endpoint (e.g. one hubInternalGet('/hub2/devicesList') parsed into a map keyed by device id) and look each device up in that map.",
+    },
 ]
 
 # ---------------------------------------------------------------------------
@@ -207,99 +487,204 @@ RULES = [
 # ---------------------------------------------------------------------------
 
 
-_BARE_GSTRING_IDENT_START = re.compile(r"[A-Za-z_]")
-_BARE_GSTRING_IDENT_CHAR = re.compile(r"[A-Za-z0-9_]")
-
-
-def _consume_bare_gstring_var(text: str, start: int) -> tuple[str, int]:
-    """Consume a bare `$identifier[.identifier]*` GString reference.
-
-    Assumes `text[start] == '$'` and `text[start + 1]` is an identifier
-    start character. Returns (preserved_text, index_past_end). The leading
-    `$` is blanked (we only care about what follows for rule matching) but
-    the identifier chain is preserved verbatim so rules like SANDBOX-001
-    can match `$foo.getClass` (a legal bare-form Groovy property access
-    that triggers the no-arg method at runtime).
-    """
-    n = len(text)
-    out = [" "]  # blank the $
-    k = start + 1
-    # First identifier
-    while k < n and _BARE_GSTRING_IDENT_CHAR.match(text[k]):
-        out.append(text[k])
-        k += 1
-    # Subsequent .identifier segments
-    while (
-        k + 1 < n
-        and text[k] == "."
-        and _BARE_GSTRING_IDENT_START.match(text[k + 1])
-    ):
-        out.append(".")
-        k += 1
-        while k < n and _BARE_GSTRING_IDENT_CHAR.match(text[k]):
-            out.append(text[k])
-            k += 1
-    return "".join(out), k
-
+# Token regexes for strip_comments_and_strings. Each *_RUN pattern matches the longest span of
+# literal text that can be blanked in one go, stopping at whatever needs a decision (a closing
+# quote, `${`, `$ident`, or a lone trailing backslash); code spans are copied up to the next
+# _CODE_TOKEN_RE hit. Alternation order mirrors the original character walker (kept as the
+# test oracle in sandbox_lint_reference.py): `/*`, `//`, `"""`, `'''`.
+_CODE_TOKEN_RE = re.compile(r"/\*|//|\"\"\"|'''|\"|'")
+_DQ_RUN_RE = re.compile(r'(?:[^"\\$]+|\\.|\$(?![{A-Za-z_]))*')
+_TDQ_RUN_RE = re.compile(r'(?:[^"\\$]+|\\.|"(?!"")|\$(?![{A-Za-z_]))*')
+_TDQ_SAME_LINE_RUN_RE = re.compile(r"(?:[^\\$]+|\\.|\$(?![{A-Za-z_]))*")
+_SQ_SPAN_RE = re.compile(r"(?:[^'\\]+|\\.?)*'?")
+_TSQ_RUN_RE = re.compile(r"(?:[^'\\]+|\\.?|'(?!''))*")
+_NESTED_LITERAL_RE = {
+    '"': re.compile(r'(?:[^"\\]+|\\.?)*"?'),
+    "'": re.compile(r"(?:[^'\\]+|\\.?)*'?"),
+}
+_INTERPOLATION_STOP_RE = re.compile(r"[{}\"'\\]")
+_BARE_GSTRING_VAR_RE = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)")
 
-def _consume_gstring_interpolation(text: str, start: int) -> tuple[str, int]:
-    """Walk from `start` (index of `$` in `${`) to the matching `}`, returning
-    (preserved_text, index_past_close).
+# Tokenizer states carried from one line to the next.
+_CODE, _BLOCK, _TRIPLE_DOUBLE, _TRIPLE_SINGLE = "code", "block", '"""', "'''"
 
-    The body is preserved verbatim so downstream regex rules scan the Groovy
-    expression, except that nested string literals inside the body have their
-    contents blanked (so a `}` inside `"literal }"` doesn't close the
-    interpolation early, and a stray `getClass()` inside a nested literal
-    doesn't trigger a false positive).
 
-    Assumes `text[start] == '$'` and `text[start+1] == '{'`.
-    """
-    out = ["  "]  # ${
+def _emit_interpolation(text: str, start: int, end: int, out: list) -> int:
+    """Append a `${...}` interpolation starting at `start` (bounded by `end`) to `out` and
+    return the index past its closing `}`. The expression is kept verbatim; nested
+    literals inside it are blanked (so a `}` inside `"literal }"` doesn't close the
+    interpolation early)."""
+    out.append("  ")  # ${
     depth = 1
     k = start + 2
-    n = len(text)
-    while k < n and depth > 0:
-        ch = text[k]
+    while k < end:
+        m = _INTERPOLATION_STOP_RE.search(text, k, end)
+        if m is None:
+            out.append(text[k:end])
+            return end
+        s = m.start()
+        if s > k:
+            out.append(text[k:s])
+        ch = text[s]
         if ch == "{":
             depth += 1
             out.append(ch)
-            k += 1
+            k = s + 1
         elif ch == "}":
             depth -= 1
             if depth == 0:
                 out.append(" ")  # closing }
-                k += 1
-                break
+                return s + 1
             out.append(ch)
-            k += 1
-        elif ch == '"' or ch == "'":
-            # Nested string literal inside the interpolation body. Skip past
-            # its contents (respecting escapes) so embedded `}` characters
-            # don't decrement our depth counter and stray sandbox-forbidden
-            # names inside literal text don't trigger false positives.
-            out.append(" ")
-            k += 1
-            while k < n:
-                if text[k] == "\\" and k + 1 < n:
-                    out.append("  ")
-                    k += 2
-                elif text[k] == ch:
-                    out.append(" ")
-                    k += 1
+            k = s + 1
+        elif ch == "\\":
+            k = min(s + 2, end)
+            out.append(text[s:k])
+        else:
+            k = _NESTED_LITERAL_RE[ch].match(text, s + 1, end).end()
+            out.append(" " * (k - s))
+    return k
+
+
+def _emit_gstring_run(text: str, j: int, end: int, run_re, out: list) -> int:
+    """Blank GString literal text from `j` up to the next thing `run_re` stops at, and keep
+    the `${...}` / `$ident` reference found there. Returns the new index; the caller decides
+    what a stop at a quote (or at `end`) means."""
+    k = run_re.match(text, j, end).end()
+    if k > j:
+        out.append(" " * (k - j))
+    if k >= end:
+        return k
+    ch = text[k]
+    if ch == "\\":  # lone trailing backslash
+        out.append(" ")
+        return k + 1
+    if ch == "$":
+        if text[k + 1] == "{":
+            return _emit_interpolation(text, k, end, out)
+        m = _BARE_GSTRING_VAR_RE.match(text, k, end)
+        out.append(" " + m.group(1))
+        return m.end()
+    return k
+
+
+def _strip_line(line: str, state: str, multiline_strings: bool,
+                comments: list | None = None) -> tuple[str, str]:
+    """One line of strip_comments_and_strings: (stripped line, state for the next line).
+    When `comments` is a list, each comment's [start, end) column span is appended to it."""
+    n = len(line)
+    out: list = []
+    i = 0
+    if state == _BLOCK:
+        end = line.find("*/")
+        if end == -1:
+            if comments is not None:
+                comments.append((0, n))
+            return "", _BLOCK
+        if comments is not None:
+            comments.append((0, end + 2))
+        # Keep content after the block comment close
+        out.append(" " * (end + 2))
+        i = end + 2
+    elif state == _TRIPLE_DOUBLE:
+        i = _emit_triple_double_body(line, 0, out)
+        if i < 0:
+            return "".join(out), _TRIPLE_DOUBLE
+    elif state == _TRIPLE_SINGLE:
+        i = _emit_triple_single_body(line, 0, out)
+        if i < 0:
+            return "".join(out), _TRIPLE_SINGLE
+    state = _CODE
+
+    while i < n:
+        m = _CODE_TOKEN_RE.search(line, i)
+        if m is None:
+            out.append(line[i:])
+            break
+        s = m.start()
+        if s > i:
+            out.append(line[i:s])
+        tok = m.group()
+        if tok == "/*":
+            end = line.find("*/", s + 2)
+            if comments is not None:
+                comments.append((s, n if end == -1 else end + 2))
+            if end == -1:
+                return "".join(out), _BLOCK
+            out.append(" " * (end + 2 - s))
+            i = end + 2
+        elif tok == "//":
+            if comments is not None:
+                comments.append((s, n))
+            break
+        elif tok == '"""':
+            out.append("   ")
+            if multiline_strings:
+                i = _emit_triple_double_body(line, s + 3, out)
+                if i < 0:
+                    return "".join(out), _TRIPLE_DOUBLE
+            else:
+                end = line.find('"""', s + 3)
+                if end == -1:
+                    out.append(" " * (n - s - 3))
                     break
-                else:
+                j = s + 3
+                while j < end:
+                    j = _emit_gstring_run(line, j, end, _TDQ_SAME_LINE_RUN_RE, out)
+                out.append("   ")
+                i = end + 3
+        elif tok == "'''":
+            out.append("   ")
+            if multiline_strings:
+                i = _emit_triple_single_body(line, s + 3, out)
+                if i < 0:
+                    return "".join(out), _TRIPLE_SINGLE
+            else:
+                end = line.find("'''", s + 3)
+                if end == -1:
+                    out.append(" " * (n - s - 3))
+                    break
+                out.append(" " * (end - s))
+                i = end + 3
+        elif tok == '"':
+            out.append(" ")  # opening quote
+            j = s + 1
+            while j < n:
+                j = _emit_gstring_run(line, j, n, _DQ_RUN_RE, out)
+                if j < n and line[j] == '"':
                     out.append(" ")
-                    k += 1
-        elif ch == "\\" and k + 1 < n:
-            out.append(str(text[k]) + str(text[k + 1]))
-            k += 2
+                    j += 1
+                    break
+            i = j
         else:
-            out.append(ch)
-            k += 1
-    return "".join(out), k
+            i = _SQ_SPAN_RE.match(line, s + 1).end()
+            out.append(" " * (i - s))
+    return "".join(out), state
 
 
-def strip_comments_and_strings(source: str) -> list[str]:
+def _emit_triple_double_body(line: str, j: int, out: list) -> int:
+    """Scrub a `\"\"\"` GString body from `j`; index past the closing quotes, or -1 when the
+    body runs on past the end of the line."""
+    n = len(line)
+    while j < n:
+        j = _emit_gstring_run(line, j, n, _TDQ_RUN_RE, out)
+        if j < n and line[j] == '"':  # the run only stops on a quote at `"""`
+            out.append("   ")
+            return j + 3
+    return -1
+
+
+def _emit_triple_single_body(line: str, j: int, out: list) -> int:
+    """Blank a `'''` body from `j`; index past the closing quotes, or -1 when it runs on."""
+    k = _TSQ_RUN_RE.match(line, j).end()
+    out.append(" " * (k - j))
+    if k < len(line):
+        out.append("   ")
+        return k + 3
+    return -1
+
+
+def strip_comments_and_strings(source: str, *, multiline_strings: bool = True) -> list[str]:
     """Return lines with comments and literal string contents replaced.
 
     Behavior:
@@ -311,8 +696,10 @@ def strip_comments_and_strings(source: str) -> list[str]:
       interpolation bodies AND bare $identifier[.prop...] references are
       preserved so rules scan the Groovy expression (e.g. ${foo.getClass()}
       and $foo.getClass both trigger SANDBOX-001)
-    - Triple-double-quoted strings (\"\"\"...\"\"\") → same GString treatment
-      when closing on the same line; multi-line bodies fall back to blanked
+    - Triple-double-quoted strings (\"\"\"...\"\"\") → same GString treatment,
+      including bodies that span lines: the string state carries over, so
+      every body line is scrubbed and code after the closing quotes is
+      scanned as code
 
     Invariants:
     - Output preserves the column and line count of the input so finding
@@ -320,146 +707,53 @@ def strip_comments_and_strings(source: str) -> list[str]:
     - Spaces (not sentinel tokens like __STR__) are used so downstream regex
       rules can't accidentally match the sentinel itself.
 
+    Each line is tokenized with compiled regexes that jump from one token to
+    the next, copying code and blanking literal text a span at a time rather
+    than a character at a time.
+
+    `multiline_strings=False` reproduces the original per-line behaviour
+    (an unclosed triple quote blanks the rest of its line and nothing
+    carries over), byte for byte the output of the original character
+    walker (sandbox_lint_reference.py) -- test_sandbox_lint.py and
+    bench_sandbox_lint.py check that on every Groovy file in the repo.
+
     Known limitations (deliberate, not bugs):
     - Slashy strings (/.../) and dollar-slashy ($/.../$/) are not recognized
       as strings — their content is scanned as raw source. Rare in real
       Hubitat code; the only existing use is a bare Pattern literal with no
       interpolation. False positives would require literal sandbox-forbidden
       names inside a regex body, which is implausible.
-    - Multi-line triple-quoted bodies (opening and closing on different
-      lines) are blanked wholesale.
+    - A ${...} interpolation (or a single-quoted / double-quoted string)
+      never continues onto the next line.
     """
-    lines = source.split("\n")
     result: list[str] = []
-    in_block_comment = False
-
-    for line in lines:
-        if in_block_comment:
-            end = line.find("*/")
-            if end != -1:
-                in_block_comment = False
-                # Keep content after the block comment close
-                line = " " * (end + 2) + line[end + 2 :]
-            else:
-                result.append("")
-                continue
+    state = _CODE
+    for line in source.split("\n"):
+        stripped, state = _strip_line(line, state, multiline_strings)
+        result.append(stripped)
+    return result
 
-        # Process the line character by character
-        cleaned = []
-        i = 0
-        while i < len(line):
-            # Block comment start
-            if line[i : i + 2] == "/*":
-                end = line.find("*/", i + 2)
-                if end != -1:
-                    cleaned.append(" " * (end + 2 - i))
-                    i = end + 2
-                else:
-                    in_block_comment = True
-                    break
-            # Line comment
-            elif line[i : i + 2] == "//":
-                break
-            # Triple-double-quoted GString (may contain ${...})
-            elif line[i : i + 3] == '"""':
-                end = line.find('"""', i + 3)
-                if end != -1:
-                    cleaned.append("   ")
-                    cleaned.append(_scrub_gstring_body(line[i + 3 : end]))
-                    cleaned.append("   ")
-                    i = end + 3
-                else:
-                    # Multi-line triple-quoted body — rare; fall back to blanks
-                    cleaned.append(" " * (len(line) - i))
-                    i = len(line)
-            # Triple-single-quoted (plain string, no interpolation)
-            elif line[i : i + 3] == "'''":
-                end = line.find("'''", i + 3)
-                if end != -1:
-                    cleaned.append(" " * (end + 3 - i))
-                    i = end + 3
-                else:
-                    cleaned.append(" " * (len(line) - i))
-                    i = len(line)
-            # Double-quoted GString — preserve ${...} bodies, blank literal text
-            elif line[i] == '"':
-                cleaned.append(" ")  # opening quote
-                j = i + 1
-                while j < len(line):
-                    if line[j] == "\\" and j + 1 < len(line):
-                        cleaned.append("  ")
-                        j += 2
-                    elif line[j] == '"':
-                        cleaned.append(" ")
-                        j += 1
-                        break
-                    elif line[j] == "$" and j + 1 < len(line) and line[j + 1] == "{":
-                        body, j = _consume_gstring_interpolation(line, j)
-                        cleaned.append(body)
-                    elif (
-                        line[j] == "$"
-                        and j + 1 < len(line)
-                        and _BARE_GSTRING_IDENT_START.match(line[j + 1])
-                    ):
-                        body, j = _consume_bare_gstring_var(line, j)
-                        cleaned.append(body)
-                    else:
-                        cleaned.append(" ")
-                        j += 1
-                i = j
-            # Single-quoted string — plain string in Groovy, no interpolation
-            elif line[i] == "'":
-                cleaned.append(" ")
-                j = i + 1
-                while j < len(line):
-                    if line[j] == "\\" and j + 1 < len(line):
-                        cleaned.append("  ")
-                        j += 2
-                    elif line[j] == "'":
-                        cleaned.append(" ")
-                        j += 1
-                        break
-                    else:
-                        cleaned.append(" ")
-                        j += 1
-                i = j
-            else:
-                cleaned.append(line[i])
-                i += 1
 
-        result.append("".join(cleaned))
+def comment_spans(source: str) -> list[tuple[list[tuple[int, int]], str]]:
+    """Per line of `source`: (the [start, end) column spans of its comments, delimiters
+    included; what the line opens inside -- "code", "comment" (a block comment carried
+    over) or "string" (a triple-quoted string carried over)).
 
+    The same tokenizer pass as strip_comments_and_strings, so a span is never string
+    or heredoc content, and a line that opens inside a string starts with that string's
+    own text. Slashy strings share the stripper's blind spot: their content reads as code.
+    """
+    opens = {_CODE: "code", _BLOCK: "comment", _TRIPLE_DOUBLE: "string", _TRIPLE_SINGLE: "string"}
+    result: list[tuple[list[tuple[int, int]], str]] = []
+    state = _CODE
+    for line in source.split("\n"):
+        spans: list[tuple[int, int]] = []
+        opened_in = opens[state]
+        _, state = _strip_line(line, state, True, spans)
+        result.append((spans, opened_in))
     return result
 
 
-def _scrub_gstring_body(body: str) -> str:
-    """Blank literal text in a triple-double-quoted GString body while
-    preserving ${...} interpolations and bare `$identifier[.prop...]`
-    references. Shares nested-string-aware brace handling with the
-    single-line GString walker via _consume_gstring_interpolation."""
-    out = []
-    i = 0
-    n = len(body)
-    while i < n:
-        if body[i] == "\\" and i + 1 < n:
-            out.append("  ")
-            i += 2
-        elif body[i] == "$" and i + 1 < n and body[i + 1] == "{":
-            preserved, i = _consume_gstring_interpolation(body, i)
-            out.append(preserved)
-        elif (
-            body[i] == "$"
-            and i + 1 < n
-            and _BARE_GSTRING_IDENT_START.match(body[i + 1])
-        ):
-            preserved, i = _consume_bare_gstring_var(body, i)
-            out.append(preserved)
-        else:
-            out.append(" ")
-            i += 1
-    return "".join(out)
-
-
 # ---------------------------------------------------------------------------
 # Scanning
 # ---------------------------------------------------------------------------
@@ -493,58 +787,657 @@ def _block_comment_mask(source_lines):
     inside = False
     mask = []
     for line in source_lines:
-        opens = "/*" in line
-        closes = "*/" in line
-        mask.append(inside or opens)
-        if opens and not closes:
-            inside = True
-        elif closes:
-            inside = False
+        masked, inside = _block_mask_step(line, inside)
+        mask.append(masked)
     return mask
 
 
+def _block_mask_step(line: str, inside: bool) -> tuple[bool, bool]:
+    """One line of _block_comment_mask: (this line's flag, `inside` for the next line)."""
+    opens = "/*" in line
+    closes = "*/" in line
+    if opens and not closes:
+        return True, True
+    if closes:
+        return inside or opens, False
+    return inside or opens, inside
+
+
 def scan_source(source: str, display_path: str) -> list[dict]:
     """Scan Groovy source text for sandbox anti-patterns.
 
     Separated from scan_file so the self-test can exercise the same code
     path without touching disk.
     """
-    findings = []
-    stripped_lines = strip_comments_and_strings(source)
     source_lines = source.split("\n")
-    block_mask = _block_comment_mask(source_lines)
+    return _scan_lines(
+        strip_comments_and_strings(source), source_lines,
+        _block_comment_mask(source_lines), display_path,
+    )
+
+
+def _rules_fingerprint() -> str:
+    """Digest of everything in RULES that changes what a scan reports."""
+    h = hashlib.sha256()
+    for rule in RULES:
+        h.update(repr((
+            rule["id"], rule["pattern"], rule["message"], rule["severity"],
+            bool(rule.get("raw")), tuple(rule.get("prefilter") or ()),
+            rule.get("scope"), rule.get("suggestion"),
+        )).encode("utf-8"))
+    return h.hexdigest()
+
 
+def _literal_gate(literal_sets: list[tuple[str, ...]]) -> "re.Pattern | None":
+    """One alternation over every prefilter literal, or None when some rule has no
+    prefilter (that rule must then see every line, so there is nothing to gate on)."""
+    if not literal_sets or not all(literal_sets):
+        return None
+    literals = sorted({lit for lits in literal_sets for lit in lits}, key=lambda x: (-len(x), x))
+    return re.compile("|".join(re.escape(lit) for lit in literals))
+
+
+# Loop / method scope for `scope` rules, carried from one stripped line to the next as
+# (frames, seen): `frames` has one char per open brace -- "L" a loop body, "D" a loop over
+# devices, "b" any other block -- and `seen` is the ((rule id, arg), depth) pairs a "repeat"
+# rule has matched in the blocks still open. Braces inside strings and comments are already
+# gone from the stripped line, so counting them is exact enough for block structure.
+_SCOPE_START: tuple[str, tuple] = ("", ())
+_ITERATOR_METHODS = (
+    "each", "eachWithIndex", "reverseEach", "collect", "collectEntries", "collectMany",
+    "findAll", "find", "findResults", "findIndexOf", "any", "every", "sum", "inject",
+    "groupBy", "countBy", "count", "sort", "min", "max", "times", "upto", "downto", "step",
+)
+_LOOP_OPENER_RE = re.compile(
+    r"\??\.\s*(?:" + "|".join(_ITERATOR_METHODS) + r")\s*(?:\([^(){}]*\)\s*)?(?P<closure>\{)"
+    r"|\bfor\s*\((?P<coll>[^{]*)\)\s*(?P<for>\{)"
+    r"|\bwhile\s*\([^{]*\)\s*(?P<while>\{)"
+)
+_BRACE_RE = re.compile(r"[{}]")
+_CLOSURE_PARAMS_RE = re.compile(r"\s*([\w\s,]+)->")
+_DEVICE_NAME_RE = re.compile(r"dev|Dev|DEV")
+
+
+class _LineScope:
+    """Where on one line the `scope` rules may match: `loop` / `device` are the line with
+    every character outside a (device) loop body blanked, or None when none of it is inside
+    one; `repeats` the ids of "repeat" rules whose argument was already serialized."""
+
+    __slots__ = ("device", "loop", "repeats")
+
+    def __init__(self, loop: str | None, device: str | None, repeats: frozenset = frozenset()):
+        self.loop, self.device, self.repeats = loop, device, repeats
+
+
+_OUTSIDE_LOOPS = _LineScope(None, None)
+
+
+def _blank_outside(line: str, spans: list[tuple[int, int]]) -> str | None:
+    """`line` with everything outside `spans` replaced by spaces (None when no span)."""
+    if not spans:
+        return None
+    if len(spans) == 1 and spans[0] == (0, len(line)):
+        return line
+    out, pos = [], 0
+    for start, end in spans:
+        out.append(" " * (start - pos))
+        out.append(line[start:end])
+        pos = end
+    out.append(" " * (len(line) - pos))
+    return "".join(out)
+
+
+def _merge_spans(spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        elif end > start:
+            merged.append((start, end))
+    return merged
+
+
+def _mutation_re(root: str) -> "re.Pattern":
+    """Assignment to, or an in-place change of, the value named `root` (or a member of it)."""
+    return re.compile(
+        rf"(?<![\w.]){re.escape(root)}\b(?:\s*(?:\??\.\s*\w+|\[[^\]]*\]))*\s*"
+        r"(?:(?:[-+*/]?=|<<)(?!=)|\.\s*(?:put|putAll|add|addAll|remove|removeAll|clear|push|leftShift)\s*\()"
+    )
+
+
+class _RuleEngine:
+    """RULES compiled for one cheap pass per line.
+
+    Each line is first searched once with a combined alternation of every prefilter literal
+    (one for stripped-line rules, one for `raw: True` rules). Only on a hit are the candidate
+    rules -- those with a literal present in their target -- regex-searched, in RULES order,
+    so findings come out exactly as the one-re.search-per-rule loop produced them. `scope`
+    rules search only the part of the line their _LineScope allows (see scope_step).
+    """
+
+    SCOPES = (None, "loop", "device_loop", "repeat")
+
+    def __init__(self, rules: list[dict]):
+        self.rules = []
+        for rule in rules:
+            kind = rule.get("scope")
+            if kind not in self.SCOPES:
+                raise ValueError(f"{rule['id']}: unknown scope {kind!r}")
+            self.rules.append((
+                rule, re.compile(rule["pattern"]), tuple(rule.get("prefilter") or ()),
+                bool(rule.get("raw")), kind,
+            ))
+        self.has_raw = any(raw for _, _, _, raw, _ in self.rules)
+        self.code_gate = _literal_gate([lits for _, _, lits, raw, _ in self.rules if not raw])
+        self.raw_gate = _literal_gate([lits for _, _, lits, raw, _ in self.rules if raw])
+        self.code_always = any(not raw for _, _, _, raw, _ in self.rules) and self.code_gate is None
+        self.raw_always = self.has_raw and self.raw_gate is None
+        self.scoped = any(kind for *_, kind in self.rules)
+        self.repeat_rules = [
+            (rule["id"], rx, lits) for rule, rx, lits, _, kind in self.rules if kind == "repeat"
+        ]
+        self._mutation: dict[str, re.Pattern] = {}
+
+    def scope_step(self, line: str, state: tuple) -> tuple[_LineScope, tuple]:
+        """The _LineScope of one stripped line that starts in `state`, and the state the next
+        line starts in (begin a file with _SCOPE_START)."""
+        frames, seen = state
+        if not frames:
+            seen = ()  # outside every block: a new top-level method starts here
+        elif seen:
+            seen = tuple(entry for entry in seen if not self._mutated(entry[0][1], line))
+        repeat_here = [(rule_id, rx) for rule_id, rx, lits in self.repeat_rules
+                       if not lits or any(lit in line for lit in lits)]
+        if "{" not in line and "}" not in line and not repeat_here:
+            if "L" not in frames and "D" not in frames:
+                return _OUTSIDE_LOOPS, (frames, seen)
+            return _LineScope(line, line if "D" in frames else None), (frames, seen)
+
+        openers: dict[int, str] = {}
+        loop_spans: list[tuple[int, int]] = []
+        device_spans: list[tuple[int, int]] = []
+        if "{" in line:
+            for m in _LOOP_OPENER_RE.finditer(line):
+                if m.group("closure") is not None:
+                    brace = m.start("closure")
+                    receiver = re.split(r"[=;{}]", line[:m.start()])[-1]
+                    params = _CLOSURE_PARAMS_RE.match(line, brace + 1)
+                    device = _DEVICE_NAME_RE.search(receiver) or (
+                        params is not None and _DEVICE_NAME_RE.search(params.group(1)))
+                elif m.group("for") is not None:
+                    brace = m.start("for")
+                    device = _DEVICE_NAME_RE.search(m.group("coll"))
+                else:
+                    brace = m.start("while")
+                    device = False
+                    loop_spans.append((m.start(), brace))  # the condition runs every iteration
+                openers[brace] = "D" if device else "L"
+
+        matches: list[tuple[int, str, str]] = []
+        if repeat_here:
+            for rule_id, rx in repeat_here:
+                for m in rx.finditer(line):
+                    arg = "".join((m.group("arg") or "").split())
+                    if arg:
+                        matches.append((m.start(), rule_id, arg))
+            matches.sort()
+        open_seen, repeats = list(seen), set()
+        next_match = 0
+
+        def serialize_until(pos: int) -> None:
+            nonlocal next_match
+            while next_match < len(matches) and matches[next_match][0] < pos:
+                _, rule_id, arg = matches[next_match]
+                key = (rule_id, arg)
+                if any(k == key for k, _ in open_seen):
+                    repeats.add(rule_id)
+                open_seen.append((key, len(frames)))
+                next_match += 1
+
+        pos = 0
+        for brace in _BRACE_RE.finditer(line):
+            at = brace.start()
+            serialize_until(at)
+            if "L" in frames or "D" in frames:
+                loop_spans.append((pos, at))
+                if "D" in frames:
+                    device_spans.append((pos, at))
+            if brace.group() == "{":
+                frames += openers.get(at, "b")
+            elif frames:
+                frames = frames[:-1]
+                open_seen = [entry for entry in open_seen if entry[1] <= len(frames)]
+            pos = at
+        serialize_until(len(line) + 1)
+        if "L" in frames or "D" in frames:
+            loop_spans.append((pos, len(line)))
+            if "D" in frames:
+                device_spans.append((pos, len(line)))
+        if not frames:
+            open_seen = []
+
+        loop = _blank_outside(line, _merge_spans(loop_spans))
+        device = _blank_outside(line, _merge_spans(device_spans))
+        scope = (
+            _OUTSIDE_LOOPS if loop is None and not repeats
+            else _LineScope(loop, device, frozenset(repeats))
+        )
+        return scope, (frames, tuple(open_seen))
+
+    def _mutated(self, arg: str, line: str) -> bool:
+        """True when `line` reassigns or changes in place the value `arg` is rooted at."""
+        root = re.match(r"[A-Za-z_]\w*", arg)
+        if root is None or root.group() not in line:
+            return False
+        rx = self._mutation.get(root.group())
+        if rx is None:
+            rx = self._mutation[root.group()] = _mutation_re(root.group())
+        return rx.search(line) is not None
+
+    @staticmethod
+    def _scoped_target(rule: dict, kind: str, line: str, scope: _LineScope | None) -> str | None:
+        """What a `scope` rule searches on this line (None: it cannot match here)."""
+        if scope is None:
+            return None
+        if kind == "loop":
+            return scope.loop
+        if kind == "device_loop":
+            return scope.device
+        return line if rule["id"] in scope.repeats else None
+
+    def match(self, line: str, raw_source: str, in_block_comment: bool,
+              scope: _LineScope | None = None) -> list[dict]:
+        """Rules matching one line. `line` is the stripped line; `raw_source` the original
+        line, comment-dropped here (only when a raw rule could match) for `raw: True` rules;
+        `scope` the line's scope_step result (without it no `scope` rule matches)."""
+        code_hit = self.code_always or (self.code_gate is not None and self.code_gate.search(line) is not None)
+        # A raw rule targets a comment-dropped PREFIX of the original line, so a literal
+        # absent from the whole original line cannot be in the target either.
+        raw_hit = self.has_raw and not in_block_comment and (
+            self.raw_always or self.raw_gate.search(raw_source) is not None  # type: ignore[union-attr]
+        )
+        if not code_hit and not raw_hit:
+            return []
+        raw_line = _strip_line_comment(raw_source) if raw_hit else ""
+        hits = []
+        for rule, rx, lits, raw, kind in self.rules:
+            if raw:
+                if not raw_hit:
+                    continue
+                target = raw_line
+            else:
+                if not code_hit:
+                    continue
+                target = line if kind is None else self._scoped_target(rule, kind, line, scope)
+                if target is None:
+                    continue
+            if lits and not any(lit in target for lit in lits):
+                continue
+            if self._search(rule, rx, target):
+                hits.append(rule)
+        return hits
+
+    def _search(self, rule: dict, rx: re.Pattern, target: str) -> bool:
+        """One rule's regex search of its target -- the per-rule hook _ProfilingRuleEngine
+        times, so the gating and scope logic above exist once."""
+        return rx.search(target) is not None
+
+
+_ENGINE_CACHE: dict[str, _RuleEngine] = {}
+
+
+def _rule_engine() -> _RuleEngine:
+    """The compiled engine for the CURRENT RULES, rebuilt whenever the table changes (the
+    instrumented one while a --profile run is in progress)."""
+    fingerprint = _rules_fingerprint()
+    if _PROFILE is not None:
+        return _PROFILE.rule_engine(fingerprint)
+    engine = _ENGINE_CACHE.get(fingerprint)
+    if engine is None:
+        _ENGINE_CACHE.clear()
+        engine = _ENGINE_CACHE[fingerprint] = _RuleEngine(RULES)
+    return engine
+
+
+def _scan_lines(stripped_lines: list[str], source_lines: list[str],
+                block_mask: list[bool], display_path: str) -> list[dict]:
+    """Rule loop shared by scan_source (text in hand) and scan_file (corpus-memoized
+    stripped lines + mask)."""
+    findings = []
+    engine = _rule_engine()
+    scope, scope_state = None, _SCOPE_START
     for line_num, line in enumerate(stripped_lines, start=1):
+        if engine.scoped:
+            scope, scope_state = engine.scope_step(line, scope_state)
         # A `raw: True` rule matches against the ORIGINAL line, because the text it looks for
         # lives inside a string literal that stripping removes (see SANDBOX-016). Comments are
-        # dropped first -- the line tail here, whole `/* */` blocks via block_mask -- so prose
-        # describing the anti-pattern isn't flagged as it.
-        raw_line = (
-            "" if block_mask[line_num - 1]
-            else _strip_line_comment(source_lines[line_num - 1])
-        )
-        for rule in RULES:
-            target = raw_line if rule.get("raw") else line
-            if re.search(rule["pattern"], target):
-                findings.append(
-                    {
-                        "file": display_path,
-                        "line": line_num,
-                        "rule": rule["id"],
-                        "message": rule["message"],
-                        "severity": rule["severity"],
-                        "source": source_lines[line_num - 1].strip(),
-                    }
-                )
+        # dropped first -- the line tail (inside the engine), whole `/* */` blocks via
+        # block_mask -- so prose describing the anti-pattern isn't flagged as it.
+        for rule in engine.match(line, source_lines[line_num - 1], block_mask[line_num - 1], scope):
+            findings.append(_rule_finding(rule, display_path, line_num, source_lines[line_num - 1]))
 
     return findings
 
 
-def scan_file(filepath: Path) -> list[dict]:
+def _rule_finding(rule: dict, display_path: str, line_num: int, source_line: str) -> dict:
+    finding = {
+        "file": display_path,
+        "line": line_num,
+        "rule": rule["id"],
+        "message": rule["message"],
+        "severity": rule["severity"],
+        "source": source_line.strip(),
+    }
+    if rule.get("suggestion"):
+        finding["suggestion"] = rule["suggestion"]
+    return finding
+
+
+def scan_file(filepath: Path, corpus: LintCorpus | None = None) -> list[dict]:
     """Scan a single groovy file for sandbox anti-patterns."""
-    source = filepath.read_text(encoding="utf-8", errors="replace")
-    rel_path = str(filepath.relative_to(REPO_ROOT))
-    return scan_source(source, rel_path)
+    corpus = corpus or LintCorpus()
+    return _scan_lines(
+        corpus.stripped_lines(filepath), corpus.source_lines(filepath),
+        corpus.block_mask(filepath), corpus.rel(filepath),
+    )
+
+
+def _scan_file_in_worker(filepath: Path, root: Path) -> list[dict]:
+    """Process-pool entry point: scan one file against its own single-file corpus."""
+    return scan_file(filepath, LintCorpus(root=root))
+
+
+def scan_files(files: list[Path], corpus: LintCorpus, jobs: int = 1,
+               cache: "ScanCache | None" = None) -> list[dict]:
+    """scan_file over `files`, fanned out over `jobs` worker processes when jobs > 1.
+
+    Stripping is pure-Python CPU work that dominates the lint (the largest library is
+    ~15k lines), so the per-file scans parallelize cleanly. Results are concatenated in
+    `files` order whatever order the workers finish in, so output is identical to the
+    serial scan. Workers receive paths, not text, and read their file themselves; the
+    biggest files are submitted first so one long file doesn't start last and serialize
+    the tail. Overlaid (in-memory) files always scan in-process.
+
+    With a `cache`, a file whose content digest has cached findings is not scanned at
+    all; fresh results are stored back into it (the caller saves it).
+    """
+    return list(iter_scan_files(files, corpus, jobs=jobs, cache=cache))
+
+
+def iter_scan_files(files: list[Path], corpus: LintCorpus, jobs: int = 1,
+                    cache: "ScanCache | None" = None):
+    """scan_files as a generator: each file's findings are yielded, in `files` order, as
+    soon as that file and every file before it are scanned. Closing the generator early
+    (--max-findings) cancels the scans not yet started."""
+    digests: dict[Path, str] = {}
+    cached: dict[Path, list[dict]] = {}
+    if cache is not None:
+        for path in files:
+            digests[path] = _content_digest(corpus.text(path) or "")
+            hit = cache.get(digests[path])
+            if hit is not None:
+                cached[path] = [{"file": corpus.rel(path), **f} for f in hit]
+    pending = [p for p in files if p not in cached]
+    futures: dict[Path, concurrent.futures.Future] = {}
+    pool = None
+    if jobs > 1 and len(pending) > 1:
+        by_size = sorted(
+            (p for p in pending if not corpus.is_overlaid(p)), key=lambda p: p.stat().st_size, reverse=True
+        )
+        if by_size:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(by_size)))
+            futures = {path: pool.submit(_scan_file_in_worker, path, corpus.root) for path in by_size}
+    try:
+        for path in files:
+            if path in cached:
+                yield from cached[path]
+                continue
+            findings = futures[path].result() if path in futures else scan_file(path, corpus)
+            if cache is not None:
+                cache.put(digests[path], [{k: v for k, v in f.items() if k != "file"} for f in findings])
+            yield from findings
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+# ---------------------------------------------------------------------------
+# Scan cache
+# ---------------------------------------------------------------------------
+#
+# Most commits touch one library out of ~20, yet every run re-stripped and re-scanned all
+# of them. The cache maps a file's content SHA-256 to its scan_source findings (minus the
+# display path, so a rename still hits). The whole cache is keyed by the RULES fingerprint
+# and the lint version (this script's own SHA-256 -- a tokenizer or engine change
+# invalidates it as surely as a rule change), so a stale entry can never be served: any
+# mismatch discards the file wholesale. Cross-file checks are not cached; they always run.
+
+SCAN_CACHE_PATH = REPO_ROOT / ".cache" / "sandbox-lint-scan.json"
+
+
+def _content_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _lint_version() -> str:
+    """SHA-256 of this script: any code change invalidates every cached scan."""
+    return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+
+class ScanCache:
+    """Persistent {content digest: findings} map for scan_files.
+
+    Only entries looked up or stored during this run are written back, so the file
+    tracks the current tree instead of growing with every edit ever scanned.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.key = {"lint": _lint_version(), "rules": _rules_fingerprint()}
+        self.entries: dict[str, list[dict]] = {}
+        self.used: set[str] = set()
+        self.hits = 0
+        try:
+            doc = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(doc, dict) and all(doc.get(k) == v for k, v in self.key.items()):
+            self.entries = doc.get("files") or {}
+
+    def get(self, digest: str) -> list[dict] | None:
+        hit = self.entries.get(digest)
+        if hit is not None:
+            self.used.add(digest)
+            self.hits += 1
+        return hit
+
+    def put(self, digest: str, findings: list[dict]) -> None:
+        self.entries[digest] = findings
+        self.used.add(digest)
+
+    def save(self) -> None:
+        """Write atomically; a cache that can't be written just means a cold next run."""
+        doc = {**self.key, "files": {d: self.entries[d] for d in sorted(self.used)}}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(doc, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            print(f"WARNING: could not write scan cache {self.path}: {exc}", file=sys.stderr)
+
+
+def _changed_files_since(ref: str, root: Path) -> set[Path] | None:
+    """Files differing from git `ref` (committed, staged or unstaged) plus untracked
+    files, as resolved paths; None when git can't answer (bad ref, not a checkout)."""
+    try:
+        diff = subprocess.run(
+            ["git", "diff", "--name-only", ref, "--"],
+            cwd=root, capture_output=True, text=True, check=True,
+        )
+        untracked = subprocess.run(
+            ["git", "ls-files", "--others", "--exclude-standard"],
+            cwd=root, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    names = diff.stdout.splitlines() + untracked.stdout.splitlines()
+    return {(root / name).resolve() for name in names if name.strip()}
+
+
+# ---------------------------------------------------------------------------
+# Profiling (--profile)
+# ---------------------------------------------------------------------------
+#
+# --profile times every check_* call, every self-test suite and every RULES entry (wall and
+# CPU), writes the numbers as JSON and prints the slowest entries. Per-rule numbers come from
+# an instrumented copy of the rule engine that is only used while a profile is installed, so
+# the normal scan path carries no timing overhead.
+
+PROFILE_PATH = REPO_ROOT / ".cache" / "sandbox-lint-profile.json"
+PROFILE_TOP_DEFAULT = 15
+
+_PROFILE: "LintProfile | None" = None  # the installed profile, if any (see _rule_engine)
+
+
+class LintProfile:
+    """Timings for one --profile run.
+
+    Buckets of {"name", "wall_s", "cpu_s", ...} entries: "checks" (check_* functions and the
+    per-file scan), "self_test_suites", and per-rule stats keyed by RULES id.
+    """
+
+    def __init__(self):
+        self.buckets: dict[str, list[dict]] = {"checks": [], "self_test_suites": []}
+        self.rules: dict[str, dict] = {}
+        self.gate = {"wall_s": 0.0, "cpu_s": 0.0, "lines": 0}
+        self._engines: dict[str, _ProfilingRuleEngine] = {}
+        self._start = (time.perf_counter(), time.process_time())
+
+    @contextlib.contextmanager
+    def timed(self, bucket: str, name: str):
+        """Time the body into `bucket` under `name`; yields the entry so the caller can add
+        fields (finding / failure counts)."""
+        entry = {"name": name}
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield entry
+        finally:
+            entry["wall_s"] = time.perf_counter() - wall
+            entry["cpu_s"] = time.process_time() - cpu
+            self.buckets[bucket].append(entry)
+
+    def rule_engine(self, fingerprint: str) -> "_ProfilingRuleEngine":
+        engine = self._engines.get(fingerprint)
+        if engine is None:
+            engine = self._engines[fingerprint] = _ProfilingRuleEngine(RULES, self)
+        return engine
+
+    def rule_stats(self, rule_id: str) -> dict:
+        stats = self.rules.get(rule_id)
+        if stats is None:
+            stats = self.rules[rule_id] = {
+                "wall_s": 0.0, "cpu_s": 0.0, "lines_searched": 0, "lines_matched": 0,
+            }
+        return stats
+
+    def report(self) -> dict:
+        wall, cpu = self._start
+        return {
+            "total": {"wall_s": time.perf_counter() - wall, "cpu_s": time.process_time() - cpu},
+            "checks": self.buckets["checks"],
+            "self_test_suites": self.buckets["self_test_suites"],
+            # In RULES order; a rule whose prefilter never passed has no searches to report.
+            "rules": [
+                {"id": rule["id"], **self.rules.get(rule["id"], {
+                    "wall_s": 0.0, "cpu_s": 0.0, "lines_searched": 0, "lines_matched": 0,
+                })}
+                for rule in RULES
+            ],
+            "rule_prefilter_gate": self.gate,
+        }
+
+    def top(self, n: int) -> list[tuple[str, str, float, float, str]]:
+        """The n slowest entries across every bucket: (kind, name, wall_s, cpu_s, detail)."""
+        rows = []
+        for entry in self.buckets["checks"]:
+            rows.append(("check", entry["name"], entry["wall_s"], entry["cpu_s"],
+                         f"{entry.get('findings', 0)} finding(s)"))
+        for entry in self.buckets["self_test_suites"]:
+            rows.append(("self-test", entry["name"], entry["wall_s"], entry["cpu_s"],
+                         f"{entry.get('failures', 0)} failure(s)"))
+        for rule_id, stats in self.rules.items():
+            rows.append(("rule", rule_id, stats["wall_s"], stats["cpu_s"],
+                         f"{stats['lines_matched']}/{stats['lines_searched']} line(s) matched"))
+        rows.append(("rule", "(prefilter gate)", self.gate["wall_s"], self.gate["cpu_s"],
+                     f"{self.gate['lines']} line(s)"))
+        rows.sort(key=lambda row: -row[2])
+        return rows[:n]
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), indent=2) + "\n", encoding="utf-8")
+
+    def print_top(self, n: int) -> None:
+        print(f"--- profile: top {n} by wall time ---")
+        print(f"{'kind':<10} {'name':<48} {'wall ms':>9} {'cpu ms':>9}  detail")
+        for kind, name, wall, cpu, detail in self.top(n):
+            print(f"{kind:<10} {name:<48} {wall * 1000:>9.1f} {cpu * 1000:>9.1f}  {detail}")
+
+
+class _ProfilingRuleEngine(_RuleEngine):
+    """_RuleEngine that charges each rule's regex search, and the literal gates that decide
+    which rules search at all, to a LintProfile. Same hits, in the same order."""
+
+    def __init__(self, rules: list[dict], profile: LintProfile):
+        super().__init__(rules)
+        self.profile = profile
+        self.searched_wall = self.searched_cpu = 0.0
+
+    def match(self, line: str, raw_source: str, in_block_comment: bool,
+              scope: _LineScope | None = None) -> list[dict]:
+        gate = self.profile.gate
+        self.searched_wall = self.searched_cpu = 0.0
+        wall, cpu = time.perf_counter(), time.process_time()
+        hits = super().match(line, raw_source, in_block_comment, scope)
+        gate["lines"] += 1
+        # Everything but the rule searches themselves (timed in _search) is gate time.
+        gate["wall_s"] += time.perf_counter() - wall - self.searched_wall
+        gate["cpu_s"] += time.process_time() - cpu - self.searched_cpu
+        return hits
+
+    def _search(self, rule: dict, rx: re.Pattern, target: str) -> bool:
+        stats = self.profile.rule_stats(rule["id"])
+        wall, cpu = time.perf_counter(), time.process_time()
+        found = rx.search(target) is not None
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stats["wall_s"] += wall
+        stats["cpu_s"] += cpu
+        self.searched_wall += wall
+        self.searched_cpu += cpu
+        stats["lines_searched"] += 1
+        if found:
+            stats["lines_matched"] += 1
+        return found
+
+    def scope_step(self, line: str, state: tuple) -> tuple[_LineScope, tuple]:
+        # Brace tracking for the `scope` rules decides where they search: gate time too.
+        gate = self.profile.gate
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = super().scope_step(line, state)
+        gate["wall_s"] += time.perf_counter() - wall
+        gate["cpu_s"] += time.process_time() - cpu
+        return result
+
+
+def _run_check(profile: LintProfile | None, check, **kwargs) -> list[dict]:
+    """check(**kwargs), timed into `profile` under the check's name when profiling."""
+    if profile is None:
+        return check(**kwargs)
+    with profile.timed("checks", check.__name__) as entry:
+        findings = check(**kwargs)
+        entry["findings"] = len(findings)
+    return findings
 
 
 # ---------------------------------------------------------------------------
@@ -552,17 +1445,19 @@ def scan_file(filepath: Path) -> list[dict]:
 # ---------------------------------------------------------------------------
 
 
-def check_versions() -> list[dict]:
+def check_versions(corpus: LintCorpus | None = None) -> list[dict]:
     """Extract versions from all sources and flag mismatches."""
+    corpus = corpus or LintCorpus()
     versions: dict[str, str] = {}
     findings = []
 
     for label, spec in VERSION_SOURCES.items():
         filepath = spec["file"]
-        if not filepath.exists():
+        content = corpus.text(filepath)
+        if content is None:
             findings.append(
                 {
-                    "file": str(filepath.relative_to(REPO_ROOT)),
+                    "file": corpus.rel(filepath),
                     "line": 0,
                     "rule": "VERSION",
                     "message": f"Version source file not found: {label}",
@@ -572,7 +1467,6 @@ def check_versions() -> list[dict]:
             )
             continue
 
-        content = filepath.read_text(encoding="utf-8", errors="replace")
         flags = re.MULTILINE
         if spec.get("multiline"):
             flags |= re.DOTALL
@@ -584,7 +1478,7 @@ def check_versions() -> list[dict]:
             # Find approximate line for the expected pattern
             findings.append(
                 {
-                    "file": str(filepath.relative_to(REPO_ROOT)),
+                    "file": corpus.rel(filepath),
                     "line": 0,
                     "rule": "VERSION",
                     "message": f"Could not extract version from: {label}",
@@ -615,7 +1509,7 @@ def check_versions() -> list[dict]:
         if not strict_re.match(version):
             findings.append(
                 {
-                    "file": str(VERSION_SOURCES[label]["file"].relative_to(REPO_ROOT)),
+                    "file": corpus.rel(VERSION_SOURCES[label]["file"]),
                     "line": 0,
                     "rule": "VERSION",
                     "message": (
@@ -631,6 +1525,549 @@ def check_versions() -> list[dict]:
     return findings
 
 
+# ---------------------------------------------------------------------------
+# Document line index
+# ---------------------------------------------------------------------------
+#
+# The doc checks used to turn every match offset into a line with
+# `content[:m.start()].count("\n")` and find its bounds with rfind/find -- O(offset) per
+# match, so quadratic in document size, and README / TOOL_GUIDE / BAT-v2 grow every release.
+# LineIndex records the newline offsets once per document; every lookup is then a bisect.
+
+_NEWLINE_RE = re.compile(r"\n")
+
+
+class LineIndex:
+    """Offset -> line-number / line-span lookups for one document (bisect over newlines).
+
+    Results are identical to the idioms it replaces:
+      line_of(p)    == content[:p].count("\n") + 1
+      line_start(p) == content.rfind("\n", 0, p) + 1
+      line_end(p)   == content.find("\n", p), or len(content) when there is none
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.newlines = [m.start() for m in _NEWLINE_RE.finditer(content)]
+
+    def line_of(self, pos: int) -> int:
+        return bisect.bisect_left(self.newlines, pos) + 1
+
+    def line_start(self, pos: int) -> int:
+        k = bisect.bisect_left(self.newlines, pos)
+        return self.newlines[k - 1] + 1 if k else 0
+
+    def line_end(self, pos: int) -> int:
+        k = bisect.bisect_left(self.newlines, pos)
+        return self.newlines[k] if k < len(self.newlines) else len(self.content)
+
+    def line_text(self, pos: int) -> str:
+        return self.content[self.line_start(pos):self.line_end(pos)]
+
+
+# ---------------------------------------------------------------------------
+# Tool catalog model
+# ---------------------------------------------------------------------------
+#
+# The tool surface -- getGatewayConfig(), the getAllToolDefinitions() chunks and the
+# read-only / idempotent / open-world / dev-only name-set aggregators -- used to be carved
+# out by each check with its own DOTALL regexes. ToolCatalog reads it ONCE per distinct
+# source text: methods are located by their `def name() {` ... top-level `}` shape (same as
+# the old carve, so the format-drift guards keep their meaning) and their return literals
+# are read by a small Groovy list/map literal reader, so comments and quoted text inside
+# descriptions no longer confuse the extraction.
+
+# One token of Groovy source, as far as the literal reader cares.
+_GROOVY_TOKEN_RE = re.compile(
+    r"""
+      (?P<blank>\s+|//[^\n]*|/\*.*?\*/)
+    | (?P<tdq>\"\"\"(?:[^"\\]+|\\.|"(?!""))*\"\"\")
+    | (?P<tsq>'''(?:[^'\\]+|\\.|'(?!''))*''')
+    | (?P<dq>"(?:[^"\\\n]+|\\.)*")
+    | (?P<sq>'(?:[^'\\\n]+|\\.)*')
+    | (?P<num>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?[LlGgDdFfIi]?)
+    | (?P<ident>[A-Za-z_$][\w$]*)
+    | (?P<punct>[^\s\w])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_GROOVY_STRING_QUOTE_LEN = {"tdq": 3, "tsq": 3, "dq": 1, "sq": 1}
+_GROOVY_ESCAPE_RE = re.compile(r"\\(u[0-9A-Fa-f]{4}|.)", re.DOTALL)
+_GROOVY_ESCAPES = {"b": "\b", "t": "\t", "n": "\n", "f": "\f", "r": "\r", "s": " ", "\n": ""}
+_GROOVY_OPEN = frozenset("([{")
+_GROOVY_CLOSE = frozenset(")]}")
+_GROOVY_VALUE_END = frozenset(",])")
+_TOOL_NAME_RE = re.compile(r"[a-z0-9_]+")
+
+
+def _groovy_unescape(body: str) -> str:
+    """Decode the backslash escapes of a Groovy string body (`${...}` is left as written)."""
+    if "\\" not in body:
+        return body
+
+    def _one(m):
+        esc = m.group(1)
+        if len(esc) == 5:
+            return chr(int(esc[1:], 16))
+        return _GROOVY_ESCAPES.get(esc, esc)
+
+    return _GROOVY_ESCAPE_RE.sub(_one, body)
+
+
+class _GroovyParseError(ValueError):
+    pass
+
+
+class GroovyExpr:
+    """A value the literal reader keeps as source text: a call, a variable, arithmetic."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f"GroovyExpr({self.text!r})"
+
+
+class _GroovyMap(dict):
+    """A `[key: value, ...]` literal. `offsets` maps each key to its source offset and
+    `span` is the literal's (start, end) in the source."""
+
+    def __init__(self, start: int):
+        super().__init__()
+        self.offsets: dict[str, int] = {}
+        self.span = (start, start)
+
+
+class _GroovyList(list):
+    """A `[a, b, ...]` literal; `span` is its (start, end) in the source."""
+
+    def __init__(self, start: int):
+        super().__init__()
+        self.span = (start, start)
+
+
+class _GroovyLiteralReader:
+    """Recursive-descent reader for the list / map / string / number literals the catalog
+    methods return. Anything else (method calls, variables, closures) comes back as a
+    GroovyExpr holding its source text, so an unexpected expression never derails the
+    literal around it. The span is tokenized once up front; reading walks the token list."""
+
+    def __init__(self, text: str, pos: int = 0, end: int | None = None):
+        self.text = text
+        # (kind, start, end, token text) for every non-blank token in text[pos:end]
+        self.toks = [
+            (m.lastgroup, m.start(), m.end(), m.group())
+            for m in _GROOVY_TOKEN_RE.finditer(text, pos, len(text) if end is None else end)
+            if m.lastgroup != "blank"
+        ]
+        self.i = 0
+
+    def _peek_text(self) -> str | None:
+        return self.toks[self.i][3] if self.i < len(self.toks) else None
+
+    def _take(self) -> tuple[str, int, int, str]:
+        if self.i >= len(self.toks):
+            end = self.toks[-1][2] if self.toks else 0
+            raise _GroovyParseError(f"unexpected end of source at offset {end}")
+        self.i += 1
+        return self.toks[self.i - 1]
+
+    def tokens(self):
+        """Every remaining token: (kind, start, end, token text)."""
+        while self.i < len(self.toks):
+            self.i += 1
+            yield self.toks[self.i - 1]
+
+    def seek_return(self) -> bool:
+        """Advance past the first `return` keyword; False when there is none."""
+        return any(kind == "ident" and text == "return" for kind, _, _, text in self.tokens())
+
+    def value(self):
+        """One value: a literal (with `a + b` string concatenation and `as Type` coercions
+        folded in), or a GroovyExpr for anything the reader does not evaluate."""
+        first = self.i
+        value = self._primary()
+        while True:
+            text = self._peek_text()
+            if text is None or text in _GROOVY_VALUE_END or text == ":":
+                return value
+            if text == "+":
+                self.i += 1
+                rhs = self._primary()
+                if isinstance(value, str) and isinstance(rhs, str):
+                    value += rhs
+                    continue
+            elif text == "as":
+                self.i += 1
+                self._take()
+                continue
+            return self._expression(first)
+
+    def _primary(self):
+        first = self.i
+        kind, start, end, text = self._take()
+        q = _GROOVY_STRING_QUOTE_LEN.get(kind)
+        if q:
+            return _groovy_unescape(text[q:-q])
+        if kind == "num":
+            return self._number(text)
+        if kind == "ident" and text in ("true", "false", "null"):
+            return {"true": True, "false": False, "null": None}[text]
+        if text == "[":
+            return self._bracket(start)
+        if text == "-" and self.i < len(self.toks):
+            nxt = self.toks[self.i]
+            if nxt[0] == "num" and nxt[1] == end:
+                self.i += 1
+                return -self._number(nxt[3])
+        return self._expression(first)
+
+    @staticmethod
+    def _number(text: str):
+        text = text.rstrip("LlGgDdFfIi")
+        return float(text) if any(c in text for c in ".eE") else int(text)
+
+    def _expression(self, first: int) -> GroovyExpr:
+        """Re-read from token `first` to the end of the enclosing value (a depth-0 `,`, `]`
+        or `)`)."""
+        self.i = first
+        depth = 0
+        while self.i < len(self.toks):
+            text = self.toks[self.i][3]
+            if depth == 0 and text in _GROOVY_VALUE_END:
+                break
+            if text in _GROOVY_OPEN:
+                depth += 1
+            elif text in _GROOVY_CLOSE:
+                depth -= 1
+            self.i += 1
+        if self.i == first:
+            raise _GroovyParseError(f"expected a value at offset {self.toks[first][1]}")
+        return GroovyExpr(self.text[self.toks[first][1]:self.toks[self.i - 1][2]])
+
+    def _key(self) -> str | None:
+        """A bare identifier / number map key when one is next (consumed), else None."""
+        if self.i + 1 < len(self.toks):
+            kind, _, _, text = self.toks[self.i]
+            if kind in ("ident", "num") and self.toks[self.i + 1][3] == ":":
+                self.i += 1
+                return text
+        return None
+
+    def _bracket(self, start: int):
+        """A list or map literal whose `[` sits at `start` (already consumed)."""
+        if self._peek_text() == ":":  # [:]
+            self.i += 1
+            close = self._expect("]")
+            result = _GroovyMap(start)
+            result.span = (start, close)
+            return result
+        result = None
+        while True:
+            text = self._peek_text()
+            if text is None:
+                raise _GroovyParseError(f"unterminated [ at offset {start}")
+            if text == "]":
+                close = self._take()[2]
+                break
+            item_start = self.toks[self.i][1]
+            key = self._key()
+            item = key if key is not None else self.value()
+            if self._peek_text() == ":":
+                if result is None:
+                    result = _GroovyMap(start)
+                elif not isinstance(result, _GroovyMap):
+                    raise _GroovyParseError(f"map entry inside a list at offset {item_start}")
+                self.i += 1
+                key = item if isinstance(item, str) else str(getattr(item, "text", item))
+                result.offsets[key] = item_start
+                result[key] = self.value()
+            else:
+                if result is None:
+                    result = _GroovyList(start)
+                elif not isinstance(result, _GroovyList):
+                    raise _GroovyParseError(f"list element inside a map at offset {item_start}")
+                result.append(item)
+            _, tok_start, close, text = self._take()
+            if text == "]":
+                break
+            if text != ",":
+                raise _GroovyParseError(f"expected ',' or ']' at offset {tok_start}, found {text!r}")
+        if result is None:  # []
+            result = _GroovyList(start)
+        result.span = (start, close)
+        return result
+
+    def _expect(self, text: str) -> int:
+        """Consume `text`; returns the offset just past it."""
+        _, start, end, found = self._take()
+        if found != text:
+            raise _GroovyParseError(f"expected {text!r} at offset {start}, found {found!r}")
+        return end
+
+
+# Zero-arg `def name() {` headers and top-level `}` lines: a method body runs from its header
+# to the first top-level close after it -- exactly what the old `\{(.*?)^}` carve captured.
+# Both are searched for with their leading newline (a literal prefix the regex engine scans
+# for far faster than a MULTILINE `^`); the source is searched with a "\n" prepended.
+_ZERO_ARG_DEF_RE = re.compile(r"\ndef (\w+)\(\) \{")
+_TOP_LEVEL_CLOSE_RE = re.compile(r"\n}")
+_PART_METHOD_DECL_RE = re.compile(r"def (_\w+_part\w+)\s*\(")
+
+# Tool-name set aggregators: {set: (aggregator getter, library part-method prefix)}.
+TOOL_NAME_SETS = {
+    "read_only": ("getReadOnlyToolNames", "_readOnlyToolNames_part"),
+    "idempotent_write": ("getIdempotentWriteToolNames", "_idempotentWriteToolNames_part"),
+    "open_world": ("getOpenWorldToolNames", "_openWorldToolNames_part"),
+    "developer_mode_only": ("getDeveloperModeOnlyToolNames", "_developerModeOnlyToolNames_part"),
+}
+
+
+class CatalogMethod:
+    """One located zero-arg method: `start` is the `def` offset, body is src[body_start:body_end]."""
+
+    def __init__(self, name: str, start: int, body_start: int, body_end: int):
+        self.name = name
+        self.start = start
+        self.body_start = body_start
+        self.body_end = body_end
+
+
+class CatalogGateway:
+    """A getGatewayConfig() entry: the gateway facade and the tools it proxies."""
+
+    def __init__(self, name: str, config: _GroovyMap, offset: int, src: str):
+        self.name = name
+        self.offset = offset  # source offset of the gateway key
+        description = config.get("description")
+        self.description = description if isinstance(description, str) else None
+        tools = config.get("tools")
+        self.tools = [t for t in tools if isinstance(t, str)] if isinstance(tools, list) else []
+        summaries = config.get("summaries")
+        self.summaries = dict(summaries) if isinstance(summaries, dict) else {}
+        self.config = config
+        self.source_bytes = len(src[config.span[0]:config.span[1]].encode("utf-8"))
+
+
+class CatalogTool:
+    """One getAllToolDefinitions() entry."""
+
+    def __init__(self, definition: _GroovyMap, method: str, src: str):
+        self.name = definition["name"]
+        self.method = method  # the chunk method that contributes it
+        self.offset = definition.offsets["name"]
+        description = definition.get("description")
+        self.description = description if isinstance(description, str) else None
+        self.definition = definition
+        self.source_bytes = len(src[definition.span[0]:definition.span[1]].encode("utf-8"))
+        self.description_bytes = len(self.description.encode("utf-8")) if self.description else 0
+
+
+class CatalogNameSet:
+    """A tool-name set aggregator (getReadOnlyToolNames() + its _part methods)."""
+
+    def __init__(self, getter: CatalogMethod | None, parts: list[CatalogMethod],
+                 declared_parts: int, names: set[str]):
+        self.getter = getter  # None when the aggregator method is missing
+        self.parts = parts
+        self.declared_parts = declared_parts  # distinct `def <prefix>Xxx(` declarations
+        self.names = names
+
+    @property
+    def drifted(self) -> bool:
+        """A part method is declared but the body locator missed it (format drift)."""
+        return self.declared_parts != len(self.parts)
+
+
+class ToolCatalog:
+    """The app's tool surface parsed from one source text (main + libraries).
+
+    gateway_config  -- the getGatewayConfig() method, or None when it is missing
+    gateways        -- {name: CatalogGateway}, in source order
+    definitions     -- every getAllToolDefinitions / _getAllToolDefinitions_part* method
+    tools           -- CatalogTool per definition entry, duplicates kept
+    name_sets       -- {set key in TOOL_NAME_SETS: CatalogNameSet}
+    methods         -- {name: [CatalogMethod]} for every zero-arg `def name() {` header; a
+                       one-line method's located body runs on into the next method
+    errors          -- {method name: parse error} for return literals the reader rejected
+
+    Tools that price or inspect the catalog read further literals through return_literal(),
+    body_literal(), literal_at(), call_arguments(), parse_value() and split_terms(); every
+    value they hand back is plain Python (dict / list / str / number / bool / None) with a
+    GroovyExpr standing in for anything the reader does not evaluate.
+    """
+
+    def __init__(self, src: str):
+        self.src = src
+        self._index: LineIndex | None = None
+        self.errors: dict[str, str] = {}
+        self.methods = methods = self._locate_methods(src)
+
+        found = methods.get("getGatewayConfig")
+        self.gateway_config = found[0] if found else None
+        self.gateways: dict[str, CatalogGateway] = {}
+        if self.gateway_config is not None:
+            config = self.return_literal(self.gateway_config)
+            if isinstance(config, _GroovyMap):
+                for name, value in config.items():
+                    if isinstance(value, _GroovyMap) and isinstance(value.get("tools"), list):
+                        self.gateways[name] = CatalogGateway(name, value, config.offsets[name], src)
+
+        self.definitions = [
+            m for name, found in methods.items()
+            if name == "getAllToolDefinitions" or name.startswith("_getAllToolDefinitions_part")
+            for m in found
+        ]
+        self.definitions.sort(key=lambda m: m.start)
+        self.tools: list[CatalogTool] = []
+        for method in self.definitions:
+            defs = self.return_literal(method)
+            if isinstance(defs, _GroovyList):
+                for entry in defs:
+                    if isinstance(entry, _GroovyMap) and isinstance(entry.get("name"), str):
+                        self.tools.append(CatalogTool(entry, method.name, src))
+
+        declared = set(_PART_METHOD_DECL_RE.findall(src))
+        self.name_sets: dict[str, CatalogNameSet] = {}
+        for key, (getter_name, prefix) in TOOL_NAME_SETS.items():
+            found = methods.get(getter_name)
+            getter = found[0] if found else None
+            parts = sorted((m for name, found in methods.items() if name.startswith(prefix)
+                            for m in found), key=lambda m: m.start)
+            names: set[str] = set()
+            for method in ([getter] if getter else []) + parts:
+                names |= self._string_literals(method)
+            self.name_sets[key] = CatalogNameSet(
+                getter, parts, sum(1 for d in declared if d.startswith(prefix)), names,
+            )
+
+    @staticmethod
+    def _locate_methods(src: str) -> dict[str, list[CatalogMethod]]:
+        text = "\n" + src  # offsets in `text` are one past those in `src`
+        closes = [m.end() - 2 for m in _TOP_LEVEL_CLOSE_RE.finditer(text)]
+        methods: dict[str, list[CatalogMethod]] = {}
+        for m in _ZERO_ARG_DEF_RE.finditer(text):
+            body_start = m.end() - 1
+            k = bisect.bisect_left(closes, body_start)
+            if k < len(closes):
+                methods.setdefault(m.group(1), []).append(
+                    CatalogMethod(m.group(1), m.start(), body_start, closes[k]))
+        return methods
+
+    def return_literal(self, method: CatalogMethod):
+        """The value after the method's first `return`, or None (error recorded) when unreadable."""
+        reader = _GroovyLiteralReader(self.src, method.body_start, method.body_end)
+        try:
+            if not reader.seek_return():
+                return None
+            return reader.value()
+        except _GroovyParseError as exc:
+            self.errors[method.name] = str(exc)
+            return None
+
+    def body_literal(self, method: CatalogMethod):
+        """The method body read as one bare value (`def x() {\n    [a: 1]\n}`), or None when
+        the body is empty or unreadable."""
+        reader = _GroovyLiteralReader(self.src, method.body_start, method.body_end)
+        try:
+            return reader.value() if reader.toks else None
+        except _GroovyParseError:
+            return None
+
+    def literal_at(self, start: int, end: int | None = None):
+        """The single literal starting at source offset `start`, or None when unreadable. What
+        follows it need not end a value, so the right-hand side of `def x = [...]` reads."""
+        try:
+            return _GroovyLiteralReader(self.src, start, end)._primary()
+        except _GroovyParseError:
+            return None
+
+    def call_arguments(self, method: CatalogMethod, callee: str) -> list:
+        """The first argument of every `callee(...)` call in the method body, in source order;
+        arguments the reader rejects are skipped."""
+        reader = _GroovyLiteralReader(self.src, method.body_start, method.body_end)
+        args = []
+        for kind, _, _, text in reader.tokens():
+            if kind == "ident" and text == callee and reader._peek_text() == "(":
+                reader._take()
+                try:
+                    args.append(reader.value())
+                except _GroovyParseError:
+                    continue
+        return args
+
+    @staticmethod
+    def parse_value(text: str):
+        """`text` read as one value (see return_literal), or None when unreadable."""
+        try:
+            return _GroovyLiteralReader(text).value()
+        except _GroovyParseError:
+            return None
+
+    @staticmethod
+    def split_terms(text: str, sep: str = "+") -> list[str]:
+        """`text` split at every bracket-depth-0 `sep` token; an empty term comes back as ""."""
+        reader = _GroovyLiteralReader(text)
+        terms, depth, first = [], 0, 0
+        for i, (_, _, _, tok) in enumerate(reader.toks):
+            if tok in _GROOVY_OPEN:
+                depth += 1
+            elif tok in _GROOVY_CLOSE:
+                depth -= 1
+            elif tok == sep and depth == 0:
+                terms.append((first, i))
+                first = i + 1
+        terms.append((first, len(reader.toks)))
+        return [text[reader.toks[lo][1]:reader.toks[hi - 1][2]] if lo < hi else ""
+                for lo, hi in terms]
+
+    def _string_literals(self, method: CatalogMethod) -> set[str]:
+        """Every tool-name-shaped string literal in a name-set method body (comments skipped)."""
+        reader = _GroovyLiteralReader(self.src, method.body_start, method.body_end)
+        names = set()
+        for kind, start, end, _ in reader.tokens():
+            q = _GROOVY_STRING_QUOTE_LEN.get(kind)
+            if q and _TOOL_NAME_RE.fullmatch(self.src, start + q, end - q):
+                names.add(self.src[start + q:end - q])
+        return names
+
+    @property
+    def index(self) -> LineIndex:
+        if self._index is None:
+            self._index = LineIndex(self.src)
+        return self._index
+
+    @property
+    def tool_names(self) -> set[str]:
+        return {t.name for t in self.tools}
+
+    @property
+    def proxied_names(self) -> set[str]:
+        """Tools listed under any gateway (a tool may sit in several)."""
+        names: set[str] = set()
+        for gateway in self.gateways.values():
+            names.update(gateway.tools)
+        return names
+
+
+_CATALOG_CACHE: dict[str, ToolCatalog] = {}
+_CATALOG_CACHE_LIMIT = 32
+
+
+def tool_catalog(src: str) -> ToolCatalog:
+    """The ToolCatalog for `src`, parsed once per distinct content (keyed by its digest), so
+    the checks and self-test fixtures that share a source text share one parse."""
+    key = _content_digest(src)
+    catalog = _CATALOG_CACHE.get(key)
+    if catalog is None:
+        if len(_CATALOG_CACHE) >= _CATALOG_CACHE_LIMIT:
+            _CATALOG_CACHE.clear()
+        catalog = _CATALOG_CACHE[key] = ToolCatalog(src)
+    return catalog
+
+
 # ---------------------------------------------------------------------------
 # Tool-count consistency check
 # ---------------------------------------------------------------------------
@@ -727,114 +2164,47 @@ HISTORICAL_SECTION_HEADINGS = [
 ]
 
 
-def _extract_canonical_counts() -> dict | None:
-    """Parse hubitat-mcp-server.groovy to derive canonical tool counts.
+def _extract_canonical_counts(corpus: LintCorpus | None = None) -> dict | None:
+    """Derive canonical tool counts from the corpus ToolCatalog.
 
     Returns a dict {total, core, gateways, tools_list, proxied,
     per_gateway: {name: op_count}} or None if extraction fails.
     """
-    srv_path = REPO_ROOT / "hubitat-mcp-server.groovy"
-    if not srv_path.exists():
-        return None
-    src = srv_path.read_text(encoding="utf-8", errors="replace")
-
     # Tool DEFINITIONS now live partly in #include'd library modules (issue #209): a domain's defs
     # sit in its libraries/*.groovy alongside its impl, contributed via _getAllToolDefinitions_part<Name>()
     # chunk methods. The app #includes every library module, so the canonical tool surface =
-    # main + all library modules; concatenate them so those def chunks are parsed + counted. The
-    # gateway config (getGatewayConfig) lives only in main, so the first-match carve below is unaffected.
-    _lib_dir = REPO_ROOT / "libraries"
-    if _lib_dir.is_dir():
-        for _lib in sorted(_lib_dir.glob("*.groovy")):
-            src += "\n" + _lib.read_text(encoding="utf-8", errors="replace")
-
-    # Comment-stripping intentionally NOT done. Reasoning: this codebase's
-    # tool description heredocs commonly contain both `//` (URLs like
-    # `https://...`) and `/* ... */`-shaped tokens (regex example syntax,
-    # quoted Hubitat doc snippets). A naive regex strip mangles those
-    # strings and breaks the canonical extraction more often than it helps.
-    # The hypothetical case of "tool definition commented out for
-    # deprecation" would produce an over-count (lint reports doc N vs
-    # canonical N+1, which is loud and recoverable), so the trade-off
-    # favors a simpler parser. A real Groovy AST walk would be the right
-    # fix if commented-out definitions ever become a recurring class.
-
-    # Carve out the getGatewayConfig() body
-    gw_match = re.search(
-        r"^def getGatewayConfig\(\) \{(.*?)^}",
-        src,
-        re.DOTALL | re.MULTILINE,
-    )
-    if not gw_match:
+    # main + all library modules (LintCorpus.combined_text) so those def chunks are parsed + counted.
+    catalog = (corpus or LintCorpus()).tool_catalog()
+    if catalog is None:
         return None
-    gw_block = gw_match.group(1)
-
-    per_gateway: dict[str, int] = {}
-    gateway_members: dict[str, set[str]] = {}
-    proxied_names: set[str] = set()
-    # Two-stage anchor:
-    #   1. `^\s+([a-z_]+):\s*\[\s*description:` — gateway-key indented
-    #      AND immediately opens with `description:`. This is the
-    #      structural anchor that prevents matching nested map keys
-    #      like `summaries:` or `searchHints:` as gateways (every
-    #      gateway in this codebase opens with description; the inner
-    #      maps don't).
-    #   2. `\".*?\".*?\btools:\s*\[([^\]]+)\]` — capture the tools
-    #      array regardless of what other keys (`category:`, comments,
-    #      etc.) appear between description and tools. `\btools:` with
-    #      word-boundary avoids false matches on suffixes like
-    #      `subtools:`.
-    # Escaped quotes inside description aren't currently used in this
-    # codebase; if a future maintainer adds one, the inner `\".*?\"`
-    # would terminate early — flag it then if it actually breaks.
-    for m in re.finditer(
-        r"^\s+([a-z_]+):\s*\[\s*description:\s*\".*?\".*?\btools:\s*\[([^\]]+)\]",
-        gw_block,
-        re.MULTILINE | re.DOTALL,
-    ):
-        name = m.group(1)
-        # Strip line-comments BEFORE comma-splitting. A trailing `//`
-        # comment on a tool line (e.g. `"foo", // disabled\n "bar"`)
-        # would otherwise put part of the comment AND the next entry
-        # into the same comma-separated chunk; per-entry split-on-`//`
-        # would then keep only the empty pre-comment whitespace and
-        # silently drop the next tool. Today's source has no inline
-        # comments inside tools[], but this is forward-compat.
-        no_comments = re.sub(r"//[^\n]*", "", m.group(2))
-        tool_list = [
-            t.strip().strip("\"'")
-            for t in no_comments.split(",")
-            if t.strip()
-        ]
-        per_gateway[name] = len(tool_list)
-        gateway_members[name] = set(tool_list)
-        proxied_names.update(tool_list)
 
-    if not per_gateway:
+    # The gateway config (getGatewayConfig) lives only in main; the catalog takes its first
+    # definition. Gateways are the top-level entries of its return map that carry a tools[]
+    # list (nested maps like `summaries:` / `searchHints:` are values, never entries).
+    if catalog.gateway_config is None or not catalog.gateways:
         return None
-
-    # Carve out getAllToolDefinitions() and its chunk helpers, then extract tool
-    # names. PR1C split the over-64KB-bytecode getAllToolDefinitions() body into
-    # _getAllToolDefinitions_part<Name>() chunk methods that the public method just
-    # concatenates; the tool defs now live in those chunks, so gather them all.
-    # (The dispatcher body carries no `name:` lines, so including it is harmless;
-    # a pre-split source with all defs in getAllToolDefinitions() still matches.)
-    all_bodies = re.findall(
-        r"^def (?:getAllToolDefinitions|_getAllToolDefinitions_part\w+)\(\) \{(.*?)^}",
-        src,
-        re.DOTALL | re.MULTILINE,
-    )
-    if not all_bodies:
+    if catalog.errors:
+        for method, error in catalog.errors.items():
+            print(f"sandbox_lint: canonical-count extraction failed -- {method}() return literal "
+                  f"unreadable: {error}", file=sys.stderr)
         return None
-    all_defs_text = "\n".join(all_bodies)
-    # Keep raw list separate from the set so a duplicate `name:` entry
-    # in getAllToolDefinitions() is detectable: the count check sees
-    # total = len(list) > len(docs) and fires; the self-test cross-
-    # checks list-len vs set-len. If we collapsed both into len(set),
+    per_gateway = {name: len(g.tools) for name, g in catalog.gateways.items()}
+    gateway_members = {name: set(g.tools) for name, g in catalog.gateways.items()}
+    proxied_names = catalog.proxied_names
+
+    # Tool names come from getAllToolDefinitions() and its chunk helpers. PR1C split the
+    # over-64KB-bytecode getAllToolDefinitions() body into _getAllToolDefinitions_part<Name>()
+    # chunk methods that the public method just concatenates; the catalog reads every chunk's
+    # returned list (the dispatcher body returns no literal, so it contributes nothing; a
+    # pre-split source with all defs in getAllToolDefinitions() still parses).
+    if not catalog.definitions:
+        return None
+    # catalog.tools keeps duplicates so a duplicate `name:` entry in getAllToolDefinitions()
+    # is detectable: the count check sees total = len(list) > len(docs) and fires; the
+    # self-test cross-checks list-len vs set-len. If we collapsed both into len(set),
     # duplicate-name regressions would be silent on both gates.
-    raw_name_list = re.findall(r"^\s*name:\s*['\"]([a-z0-9_]+)['\"]", all_defs_text, re.MULTILINE)
-    tool_names: set[str] = set(raw_name_list)
-    total = len(raw_name_list)
+    tool_names = catalog.tool_names
+    total = len(catalog.tools)
 
     # Count DISTINCT proxied tools, not the sum of per-gateway tool counts:
     # a tool may belong to more than one gateway (multi-gateway membership --
@@ -850,27 +2220,20 @@ def _extract_canonical_counts() -> dict | None:
     # gateway to exactly this: a dev-only top-level tool. It still counts in `total`.)
     # Like the read-only set, this is an aggregator since the #209 full split: union the
     # main getter's literals with every library-contributed _developerModeOnlyToolNames_part
-    # chunk (libraries are already concatenated into `src`).
-    dev_only_names: set[str] = set()
-    dev_bodies = re.findall(
-        r"def (?:getDeveloperModeOnlyToolNames|_developerModeOnlyToolNames_part\w+)\(\) \{(.*?)^}",
-        src, re.DOTALL | re.MULTILINE,
-    )
+    # chunk (libraries are already concatenated into the catalog's source).
+    dev_only = catalog.name_sets["developer_mode_only"]
     # Format-drift guard: a part method that is declared but no longer matched by the body
-    # regex would silently drop out of the union, under-counting dev_only_top_level and
+    # locator would silently drop out of the union, under-counting dev_only_top_level and
     # over-counting core while the invariant stays self-consistent. Fail the extraction
     # (None -> check_tool_counts emits a loud TOOL_COUNT finding) instead of drifting.
-    dev_declared = len(set(re.findall(r"def (_developerModeOnlyToolNames_part\w+)\s*\(", src)))
-    dev_parsed = len(re.findall(r"def _developerModeOnlyToolNames_part\w+\(\) \{(?:.*?)^}", src, re.DOTALL | re.MULTILINE))
-    if dev_declared != dev_parsed:
+    if dev_only.drifted:
         print(
-            f"sandbox_lint: canonical-count extraction failed -- {dev_declared} "
-            f"_developerModeOnlyToolNames_part* declared but {dev_parsed} parsed (format drift)",
+            f"sandbox_lint: canonical-count extraction failed -- {dev_only.declared_parts} "
+            f"_developerModeOnlyToolNames_part* declared but {len(dev_only.parts)} parsed (format drift)",
             file=sys.stderr,
         )
         return None
-    for body in dev_bodies:
-        dev_only_names |= set(re.findall(r"['\"]([a-z0-9_]+)['\"]", body))
+    dev_only_names = dev_only.names
     dev_only_top_level = dev_only_names - proxied_names
 
     core = total - proxied - len(dev_only_top_level)
@@ -895,7 +2258,9 @@ def _extract_canonical_counts() -> dict | None:
     }
 
 
-def _is_historical_at(content: str, match_start: int, match_end: int | None = None) -> bool:
+def _is_historical_at(content: str, match_start: int, match_end: int | None = None,
+                      index: LineIndex | None = None,
+                      historical: "HistoricalIndex | None" = None) -> bool:
     """Return True if the match falls inside a historical / migration
     context that should be skipped by the count lint.
 
@@ -911,53 +2276,137 @@ def _is_historical_at(content: str, match_start: int, match_end: int | None = No
           so far) matching HISTORICAL_SECTION_HEADINGS marks the match
           as historical. This correctly handles `### v1.0.0 ...` sub-
           headings under a `## Version History` parent.
+
+    `historical` is the document's HistoricalIndex (`index` its LineIndex);
+    callers checking many matches in one document build it once and call
+    its `.at()` directly -- without one, this builds a throwaway index.
     """
-    if match_end is None:
-        match_end = match_start
-
-    # Layer 1a: WIDE markers — version-pins anywhere on the line. These
-    # scope the entire line to historical context.
-    line_start = content.rfind("\n", 0, match_start) + 1
-    line_end_pos = content.find("\n", match_start)
-    if line_end_pos == -1:
-        line_end_pos = len(content)
-    line = content[line_start:line_end_pos]
-    for pat in HISTORICAL_LINE_PATTERNS_WIDE:
-        if pat.search(line):
-            return True
+    if historical is None:
+        historical = HistoricalIndex(content, index)
+    return historical.at(match_start, match_end)
+
+
+_HEADING_RE = re.compile(r"^(#+)\s+\S", re.MULTILINE)
+
+
+class HistoricalIndex:
+    """Per-document precomputation of `_is_historical_at`'s two layers.
 
-    # Layer 1b: NARROW markers — only inside the look-back window ending at
-    # match_start. Historical markers describe PAST state that precedes a live
-    # claim; a trailing "was N" or "previously N" appearing AFTER the count
-    # describes the live count's own history and should not suppress the live
-    # count. Anchoring the window to [match_start - window, match_start]
-    # (look-back only) correctly reflects this semantic.
-    win_start = max(0, match_start - HISTORICAL_NEAR_MATCH_WINDOW)
-    win_end = match_start  # exclusive — do not extend past the count itself
-    window = content[win_start:win_end]
-    for pat in HISTORICAL_LINE_PATTERNS_NARROW:
-        if pat.search(window):
+    The per-match form rescanned the document for every count match: the
+    ancestor walk listed every heading before the match (O(offset) per match,
+    so quadratic in document size), and docs like BAT-v2.md and the version
+    history sections are mostly historical context that keeps growing. Built
+    once per document instead:
+
+      - wide_lines: the lines a HISTORICAL_LINE_PATTERNS_WIDE marker hits,
+        found with one pass per pattern over the whole text.
+      - headings: every _HEADING_RE match as parallel (start, end, level)
+        lists, plus per heading whether it or any ANCESTOR (the nearest
+        earlier heading of strictly lower level, and so on up) is a
+        HISTORICAL_SECTION_HEADINGS heading -- the same chain the backward
+        walk follows, resolved with one stack pass.
+
+    A match then costs a bisect for its line and one for its enclosing
+    heading. The NARROW markers keep their per-match look-back window: it is
+    a fixed HISTORICAL_NEAR_MATCH_WINDOW chars, and the window's slice edges
+    are part of what those patterns match (a `\b` at the cut, a number the
+    match start truncates), so a precomputed hit list could not reproduce it.
+
+    `.at()` is identical to the old per-match walk; tests pin it against that
+    walk on every doc in DOC_FILES_FOR_COUNTS.
+    """
+
+    def __init__(self, content: str, index: LineIndex | None = None):
+        self.content = content
+        self.index = index if index is not None else LineIndex(content)
+        self.wide_lines = self._find_wide_lines()
+
+        self.heading_starts: list[int] = []
+        self.heading_ends: list[int] = []
+        self.heading_levels: list[int] = []
+        # ancestor_historical[i]: heading i's ancestor chain (i itself included) has a
+        # historical heading. parent[i]: index of heading i's nearest ancestor, or -1.
+        self.ancestor_historical: list[bool] = []
+        self.parent: list[int] = []
+        stack: list[int] = []  # headings whose levels strictly increase toward the top
+        for m in _HEADING_RE.finditer(content):
+            level = len(m.group(1))
+            i = len(self.heading_starts)
+            while stack and self.heading_levels[stack[-1]] >= level:
+                stack.pop()
+            parent = stack[-1] if stack else -1
+            line = content[m.start():self.index.line_end(m.start())]
+            self.heading_starts.append(m.start())
+            self.heading_ends.append(m.end())
+            self.heading_levels.append(level)
+            self.parent.append(parent)
+            self.ancestor_historical.append(
+                self._is_historical_heading(line)
+                or (parent >= 0 and self.ancestor_historical[parent])
+            )
+            stack.append(i)
+
+    def _find_wide_lines(self) -> set[int]:
+        """Line numbers with a WIDE marker. The markers are line-scoped, so a whole-text
+        hit that crosses a newline does not count; the lines it spans are re-searched one
+        at a time in case it hid a same-line hit."""
+        lines: set[int] = set()
+        recheck: set[int] = set()
+        for pat in HISTORICAL_LINE_PATTERNS_WIDE:
+            for m in pat.finditer(self.content):
+                first = self.index.line_of(m.start())
+                if "\n" in m.group(0):
+                    recheck.update(range(first, self.index.line_of(m.end()) + 1))
+                else:
+                    lines.add(first)
+        for line_no in recheck - lines:
+            start = self.index.newlines[line_no - 2] + 1 if line_no > 1 else 0
+            line = self.index.line_text(start)
+            if any(pat.search(line) for pat in HISTORICAL_LINE_PATTERNS_WIDE):
+                lines.add(line_no)
+        return lines
+
+    @staticmethod
+    def _is_historical_heading(line: str) -> bool:
+        return any(pat.match(line) for pat in HISTORICAL_SECTION_HEADINGS)
+
+    def at(self, match_start: int, match_end: int | None = None) -> bool:
+        """True when the match at [match_start, match_end) is historical context."""
+        # Layer 1a: WIDE markers — version-pins anywhere on the line. These
+        # scope the entire line to historical context.
+        if self.index.line_of(match_start) in self.wide_lines:
             return True
 
-    # Layer 2: ancestor walk through preceding headings. Track the
-    # smallest level seen so far — only a heading at strictly smaller
-    # level (i.e. an ancestor section) can mark this match as historical.
-    # Sibling/descendant historical headings don't propagate.
-    preceding = content[:match_start]
-    min_level = float("inf")
-    for m in reversed(list(re.finditer(r"^(#+)\s+\S", preceding, re.MULTILINE))):
-        level = len(m.group(1))
-        if level >= min_level:
-            continue  # sibling or descendant; not an ancestor of the match
-        min_level = level
-        line_end = preceding.find("\n", m.start())
-        if line_end == -1:
-            line_end = len(preceding)
-        heading_line = preceding[m.start():line_end]
-        for pat in HISTORICAL_SECTION_HEADINGS:
-            if pat.match(heading_line):
+        # Layer 1b: NARROW markers — only inside the look-back window ending at
+        # match_start. Historical markers describe PAST state that precedes a live
+        # claim; a trailing "was N" or "previously N" appearing AFTER the count
+        # describes the live count's own history and should not suppress the live
+        # count. Anchoring the window to [match_start - window, match_start]
+        # (look-back only) correctly reflects this semantic.
+        win_start = max(0, match_start - HISTORICAL_NEAR_MATCH_WINDOW)
+        window = self.content[win_start:match_start]  # exclusive of the count itself
+        for pat in HISTORICAL_LINE_PATTERNS_NARROW:
+            if pat.search(window):
                 return True
-    return False
+
+        # Layer 2: ancestor walk through preceding headings. Only a heading at
+        # strictly smaller level than every later one seen (i.e. an ancestor
+        # section) can mark this match as historical; sibling/descendant
+        # historical headings don't propagate. The headings that count are the
+        # ones that END at or before match_start -- exactly those a scan of
+        # content[:match_start] finds. The nearest one's chain is precomputed,
+        # except when it sits on the match's own line: its text is then cut at
+        # the match, so that one heading is re-tested on the cut line.
+        k = bisect.bisect_right(self.heading_ends, match_start) - 1
+        if k < 0:
+            return False
+        start = self.heading_starts[k]
+        if self.index.line_end(start) <= match_start:
+            return self.ancestor_historical[k]
+        if self._is_historical_heading(self.content[start:match_start]):
+            return True
+        parent = self.parent[k]
+        return parent >= 0 and self.ancestor_historical[parent]
 
 
 # Backward-compat alias: callers that pass only match_start still work.
@@ -1080,12 +2529,13 @@ def _gateway_family_expected(canonical: dict, family: str) -> int:
     )
 
 
-def check_tool_counts() -> list[dict]:
+def check_tool_counts(corpus: LintCorpus | None = None) -> list[dict]:
     """Verify documented tool counts match the canonical counts derived
     from hubitat-mcp-server.groovy. Skips historical / migration
     contexts."""
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    canonical = _extract_canonical_counts()
+    canonical = _extract_canonical_counts(corpus)
     if canonical is None:
         findings.append(
             {
@@ -1105,10 +2555,12 @@ def check_tool_counts() -> list[dict]:
         return findings
 
     for doc_path in DOC_FILES_FOR_COUNTS:
-        if not doc_path.exists():
+        content = corpus.text(doc_path)
+        if content is None:
             continue
-        rel = str(doc_path.relative_to(REPO_ROOT)).replace("\\", "/")
-        content = doc_path.read_text(encoding="utf-8", errors="replace")
+        rel = corpus.rel(doc_path).replace("\\", "/")
+        index = corpus.line_index(doc_path)
+        historical = corpus.historical_index(doc_path)
 
         # High-level counts. Track (line, kind, actual) so the same drift
         # surfaced by two overlapping patterns doesn't dupe.
@@ -1116,21 +2568,17 @@ def check_tool_counts() -> list[dict]:
         for pat, kind in COUNT_PATTERNS:
             expected = canonical[kind]
             for m in pat.finditer(content):
-                if _is_historical_at(content, m.start(), m.end()):
+                if historical.at(m.start(), m.end()):
                     continue
                 actual = int(m.group(1))
                 if actual == expected:
                     continue
-                line_no = content[:m.start()].count("\n") + 1
+                line_no = index.line_of(m.start())
                 dedup_key = (line_no, kind, actual)
                 if dedup_key in seen:
                     continue
                 seen.add(dedup_key)
-                line_start = content.rfind("\n", 0, m.start()) + 1
-                line_end = content.find("\n", m.start())
-                if line_end == -1:
-                    line_end = len(content)
-                line_text = content[line_start:line_end].strip()
+                line_text = index.line_text(m.start()).strip()
                 findings.append(
                     {
                         "file": rel,
@@ -1151,22 +2599,18 @@ def check_tool_counts() -> list[dict]:
         # Gateway-family subtotals: "Read gateways (8):" / "Manage gateways (15):".
         family_seen: set[tuple[int, str, int]] = set()
         for m in GATEWAY_FAMILY_PATTERN.finditer(content):
-            if _is_historical_at(content, m.start(), m.end()):
+            if historical.at(m.start(), m.end()):
                 continue
             family = m.group(1).lower()
             actual = int(m.group(2))
             expected = _gateway_family_expected(canonical, family)
             if actual == expected:
                 continue
-            line_no = content[:m.start()].count("\n") + 1
+            line_no = index.line_of(m.start())
             dedup_key = (line_no, family, actual)
             if dedup_key in family_seen:
                 continue
             family_seen.add(dedup_key)
-            line_start = content.rfind("\n", 0, m.start()) + 1
-            line_end = content.find("\n", m.start())
-            if line_end == -1:
-                line_end = len(content)
             findings.append(
                 {
                     "file": rel,
@@ -1177,7 +2621,7 @@ def check_tool_counts() -> list[dict]:
                         f"canonical is {expected}."
                     ),
                     "severity": "error",
-                    "source": content[line_start:line_end].strip()[:200],
+                    "source": index.line_text(m.start()).strip()[:200],
                 }
             )
 
@@ -1189,11 +2633,11 @@ def check_tool_counts() -> list[dict]:
             + list(PER_GATEWAY_TABLE_PATTERN.finditer(content))
             + list(PER_GATEWAY_SEES_PATTERN.finditer(content))
         ):
-            if _is_historical_at(content, m.start(), m.end()):
+            if historical.at(m.start(), m.end()):
                 continue
             gw_name = _normalize_gateway_name(m.group(1))
             actual = int(m.group(2))
-            line_no_dedup = content[:m.start()].count("\n") + 1
+            line_no_dedup = index.line_of(m.start())
             dedup_key = (line_no_dedup, gw_name, actual)
             if dedup_key in per_gw_seen:
                 continue
@@ -1203,7 +2647,7 @@ def check_tool_counts() -> list[dict]:
                 # Unknown gateway name in docs — likely a renamed or
                 # removed gateway; surface the canonical list to make
                 # the typo / stale-rename obvious.
-                line_no = content[:m.start()].count("\n") + 1
+                line_no = index.line_of(m.start())
                 known = ", ".join(sorted(canonical["per_gateway"].keys()))
                 findings.append(
                     {
@@ -1222,12 +2666,8 @@ def check_tool_counts() -> list[dict]:
                 )
                 continue
             if actual != expected:
-                line_no = content[:m.start()].count("\n") + 1
-                line_start = content.rfind("\n", 0, m.start()) + 1
-                line_end = content.find("\n", m.start())
-                if line_end == -1:
-                    line_end = len(content)
-                line_text = content[line_start:line_end].strip()
+                line_no = index.line_of(m.start())
+                line_text = index.line_text(m.start()).strip()
                 findings.append(
                     {
                         "file": rel,
@@ -1296,24 +2736,36 @@ TOOL_TABLE_HEADER_NAMES = {"tool", "name", "mcp tool", "tool name"}
 TOOL_NAME_ALLOWLIST: set[str] = set()
 
 
-def _table_header_for_match(content: str, match_start: int) -> str | None:
+def _table_header_for_match(content: str, match_start: int,
+                            separators: list[int] | None = None,
+                            index: LineIndex | None = None) -> str | None:
     """Return the column-1 header text for the markdown table containing
     `match_start`, or None if no table-header context is found.
 
     Scans backward for the nearest table-separator line (`|---|---|`).
     The line immediately above the separator is the header row; column 1
     is everything between the leading `|` and the next `|`. Returns the
-    header text lowercased and stripped of `**` emphasis."""
-    sep_match = None
-    for m in TABLE_SEPARATOR_PATTERN.finditer(content, 0, match_start):
-        sep_match = m
-    if sep_match is None:
+    header text lowercased and stripped of `**` emphasis.
+
+    `separators` (the start offsets of every TABLE_SEPARATOR_PATTERN match
+    in `content`) and `index` let a caller resolving many rows in one
+    document find the nearest separator by bisect instead of re-scanning
+    the document up to each row."""
+    if separators is None:
+        sep_start = None
+        for m in TABLE_SEPARATOR_PATTERN.finditer(content, 0, match_start):
+            sep_start = m.start()
+    else:
+        k = bisect.bisect_left(separators, match_start)
+        sep_start = separators[k - 1] if k else None
+    if sep_start is None:
         return None
-    header_end = content.rfind("\n", 0, sep_match.start())
+    if index is None:
+        index = LineIndex(content)
+    header_end = index.line_start(sep_start) - 1
     if header_end == -1:
         return None
-    header_start = content.rfind("\n", 0, header_end) + 1
-    header_line = content[header_start:header_end]
+    header_line = index.line_text(header_end)
     cells = header_line.split("|")
     if len(cells) < 2:
         return None
@@ -1321,7 +2773,7 @@ def _table_header_for_match(content: str, match_start: int) -> str | None:
     return col1
 
 
-def check_tool_name_consistency() -> list[dict]:
+def check_tool_name_consistency(corpus: LintCorpus | None = None) -> list[dict]:
     """Verify tool-name references in doc tables match canonical names.
 
     For each markdown table row in the form `| `<name>` | ...`, check
@@ -1334,8 +2786,9 @@ def check_tool_name_consistency() -> list[dict]:
     `_extract_canonical_counts()`. A future doc author who wraps a tool
     table in an HTML comment to suppress it would still have its rows
     linted; today's docs don't trigger this."""
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    canonical = _extract_canonical_counts()
+    canonical = _extract_canonical_counts(corpus)
     if canonical is None:
         # check_tool_counts already flagged this with a clearer message.
         return findings
@@ -1343,34 +2796,33 @@ def check_tool_name_consistency() -> list[dict]:
     valid_names = canonical["tool_names"] | canonical["gateway_names"] | TOOL_NAME_ALLOWLIST
 
     for doc_path in DOC_FILES_FOR_TOOL_NAMES:
-        if not doc_path.exists():
+        content = corpus.text(doc_path)
+        if content is None:
             continue
-        rel = str(doc_path.relative_to(REPO_ROOT)).replace("\\", "/")
-        content = doc_path.read_text(encoding="utf-8", errors="replace")
+        rel = corpus.rel(doc_path).replace("\\", "/")
+        index = corpus.line_index(doc_path)
+        historical = corpus.historical_index(doc_path)
+        separators = [sm.start() for sm in TABLE_SEPARATOR_PATTERN.finditer(content)]
 
         seen: set[tuple[int, str]] = set()
         for m in TOOL_TABLE_ROW_PATTERN.finditer(content):
-            if _is_historical_line(content, m.start()):
+            if historical.at(m.start()):
                 continue
             name = m.group(1)
             if name in valid_names:
                 continue
-            header_col1 = _table_header_for_match(content, m.start())
+            header_col1 = _table_header_for_match(content, m.start(), separators, index)
             if header_col1 not in TOOL_TABLE_HEADER_NAMES:
                 # This row is in a non-tool table (RM action types,
                 # condition operators, gateway op lists with their own
                 # naming scheme, etc.). Skip — outside scope of this lint.
                 continue
-            line_no = content[:m.start()].count("\n") + 1
+            line_no = index.line_of(m.start())
             dedup_key = (line_no, name)
             if dedup_key in seen:
                 continue
             seen.add(dedup_key)
-            line_start = content.rfind("\n", 0, m.start()) + 1
-            line_end = content.find("\n", m.start())
-            if line_end == -1:
-                line_end = len(content)
-            line_text = content[line_start:line_end].strip()
+            line_text = index.line_text(m.start()).strip()
             findings.append(
                 {
                     "file": rel,
@@ -1413,7 +2865,8 @@ GATEWAY_ATTRIBUTION_PATTERN = re.compile(
 
 
 def _scan_gateway_attributions(
-    content: str, tool_names: set, gateway_members: dict
+    content: str, tool_names: set, gateway_members: dict, index: LineIndex | None = None,
+    historical: HistoricalIndex | None = None,
 ) -> list[tuple[int, str, str, str, str]]:
     """Return (line_no, tool, claimed_gateway, kind, line_text) for every bad
     attribution. kind='wrong_gateway' when the claimed gateway exists but does
@@ -1421,18 +2874,18 @@ def _scan_gateway_attributions(
     neither a gateway nor a tool (a renamed-away gateway must fire, not skip —
     only a claimed name that is a KNOWN tool is legitimate prose to skip)."""
     bad: list[tuple[int, str, str, str, str]] = []
+    if index is None:
+        index = LineIndex(content)
+    if historical is None:
+        historical = HistoricalIndex(content, index)
     for m in GATEWAY_ATTRIBUTION_PATTERN.finditer(content):
-        if _is_historical_at(content, m.start(), m.end()):
+        if historical.at(m.start(), m.end()):
             continue
         tool = m.group(1)
         if tool not in tool_names:
             continue
-        line_no = content[:m.start()].count("\n") + 1
-        line_start = content.rfind("\n", 0, m.start()) + 1
-        line_end = content.find("\n", m.start())
-        if line_end == -1:
-            line_end = len(content)
-        line_text = content[line_start:line_end].strip()
+        line_no = index.line_of(m.start())
+        line_text = index.line_text(m.start()).strip()
         for claimed in re.findall(r"`(hub_[a-z_]+)`", m.group(2)):
             members = gateway_members.get(claimed)
             if members is None:
@@ -1445,7 +2898,8 @@ def _scan_gateway_attributions(
 
 
 def check_gateway_attributions(docs_override: list | None = None,
-                               canonical_override: dict | None = None) -> list[dict]:
+                               canonical_override: dict | None = None,
+                               corpus: LintCorpus | None = None) -> list[dict]:
     """Verify doc attribution claims ("`tool` (in `gateway`)") against
     getGatewayConfig() membership.
 
@@ -1453,21 +2907,22 @@ def check_gateway_attributions(docs_override: list | None = None,
     ({"tool_names", "gateway_members"}) let the self-test route must-catch
     fixtures through THIS function — the doc loop and the finding-dict
     construction, not just the scan helper."""
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    canonical = canonical_override or _extract_canonical_counts()
+    canonical = canonical_override or _extract_canonical_counts(corpus)
     if canonical is None:
         return findings  # check_tool_counts already reports the extractor failure
     if docs_override is not None:
-        docs = docs_override
+        docs = [(rel, content, LineIndex(content), None) for rel, content in docs_override]
     else:
         docs = [
-            (str(p.relative_to(REPO_ROOT)).replace("\\", "/"),
-             p.read_text(encoding="utf-8", errors="replace"))
-            for p in DOC_FILES_FOR_COUNTS if p.exists()
+            (corpus.rel(p).replace("\\", "/"), corpus.text(p), corpus.line_index(p),
+             corpus.historical_index(p))
+            for p in DOC_FILES_FOR_COUNTS if corpus.exists(p)
         ]
-    for rel, content in docs:
+    for rel, content, index, historical in docs:
         for line_no, tool, claimed, kind, line_text in _scan_gateway_attributions(
-            content, canonical["tool_names"], canonical["gateway_members"]
+            content, canonical["tool_names"], canonical["gateway_members"], index, historical
         ):
             actual = sorted(
                 g for g, members in canonical["gateway_members"].items()
@@ -1639,7 +3094,8 @@ IS_CI = os.environ.get("CI") == "true" or os.environ.get("GITHUB_ACTIONS") == "t
 
 def check_tool_guide_pointers(src_override: str | None = None,
                               tg_override: str | None = None,
-                              anchors_override: dict | None = None) -> list[dict]:
+                              anchors_override: dict | None = None,
+                              corpus: LintCorpus | None = None) -> list[dict]:
     """Verify every get_tool_guide(section='X') pointer in the .groovy schemas
     references a section key that actually exists in getToolGuideSections().
 
@@ -1675,21 +3131,16 @@ def check_tool_guide_pointers(src_override: str | None = None,
        heading-presence check at step 2/3 cannot see. Emitted as one of
        `tool-guide-anchor-missing-{both,source,doc}`.
     """
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    server = REPO_ROOT / "hubitat-mcp-server.groovy"
-    tool_guide = REPO_ROOT / "TOOL_GUIDE.md"
-    if src_override is not None:
-        src = src_override
-    else:
-        if not server.exists():
-            return findings
-        src = server.read_text(encoding="utf-8", errors="replace")
-    if tg_override is not None:
-        tg = tg_override
-    else:
-        if not tool_guide.exists():
-            return findings
-        tg = tool_guide.read_text(encoding="utf-8", errors="replace")
+    server = corpus.server_path
+    tool_guide = corpus.root / "TOOL_GUIDE.md"
+    src = src_override if src_override is not None else corpus.server_text
+    if src is None:
+        return findings
+    tg = tg_override if tg_override is not None else corpus.text(tool_guide)
+    if tg is None:
+        return findings
 
     # 1. Extract every section key from getToolGuideSections().
     #    Match lines like `        device_authorization: '''## Device Authorization (CRITICAL)`
@@ -1700,7 +3151,7 @@ def check_tool_guide_pointers(src_override: str | None = None,
     )
     if not sections_block_match:
         findings.append({
-            "file": str(server.relative_to(REPO_ROOT)),
+            "file": corpus.rel(server),
             "line": 1,
             "severity": "error",
             "rule": "tool-guide-no-sections",
@@ -1736,7 +3187,7 @@ def check_tool_guide_pointers(src_override: str | None = None,
         for ptr in pointer_re.findall(line):
             if ptr not in section_keys:
                 findings.append({
-                    "file": str(server.relative_to(REPO_ROOT)),
+                    "file": corpus.rel(server),
                     "line": line_no,
                     "severity": "error",
                     "rule": "tool-guide-broken-pointer",
@@ -1778,7 +3229,7 @@ def check_tool_guide_pointers(src_override: str | None = None,
             # New section added to the .groovy without a hint mapping above.
             # Fail loud rather than silently skip -- keeps this lint honest.
             findings.append({
-                "file": str(server.relative_to(REPO_ROOT)),
+                "file": corpus.rel(server),
                 "line": 1,
                 "severity": "error",
                 "rule": "tool-guide-no-heading-hint",
@@ -1792,7 +3243,7 @@ def check_tool_guide_pointers(src_override: str | None = None,
             continue
         if hint not in tg:
             findings.append({
-                "file": str(tool_guide.relative_to(REPO_ROOT)),
+                "file": corpus.rel(tool_guide),
                 "line": 1,
                 "severity": "error",
                 "rule": "tool-guide-heading-missing",
@@ -1872,7 +3323,7 @@ def check_tool_guide_pointers(src_override: str | None = None,
                 })
             elif not in_body:
                 findings.append({
-                    "file": str(server.relative_to(REPO_ROOT)),
+                    "file": corpus.rel(server),
                     "line": 1,
                     "severity": "error",
                     "rule": "tool-guide-anchor-missing-source",
@@ -1886,7 +3337,7 @@ def check_tool_guide_pointers(src_override: str | None = None,
                 })
             elif not in_tg:
                 findings.append({
-                    "file": str(tool_guide.relative_to(REPO_ROOT)),
+                    "file": corpus.rel(tool_guide),
                     "line": 1,
                     "severity": "error",
                     "rule": "tool-guide-anchor-missing-doc",
@@ -1904,6 +3355,7 @@ def check_tool_guide_pointers(src_override: str | None = None,
 def check_discrete_event_caps_doc_parity(
     src_override: str | None = None,
     doc_surfaces_override: dict | None = None,
+    corpus: LintCorpus | None = None,
 ) -> list[dict]:
     """Verify every doc surface that lists discrete-event sensor capabilities
     only names capabilities that are in production's DISCRETE_EVENT_CAPS map.
@@ -1936,22 +3388,20 @@ def check_discrete_event_caps_doc_parity(
     src_override / doc_surfaces_override let the self-test drive this with
     synthetic corpora. doc_surfaces_override is a dict {label: text}.
     """
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    server = REPO_ROOT / "hubitat-mcp-server.groovy"
+    server = corpus.server_path
     if src_override is not None:
         src = src_override
     else:
-        if not server.exists():
-            return findings
-        src = server.read_text(encoding="utf-8", errors="replace")
         # DISCRETE_EVENT_CAPS now lives in the McpNativeRulesLib #include library
         # (issue #209 native-RM extraction); the app includes every libraries/*.groovy,
-        # so append them so the map is found wherever it resides. The src_override path
-        # stays main-only for the synthetic self-test corpora.
-        _lib_dir = REPO_ROOT / "libraries"
-        if _lib_dir.is_dir():
-            for _lib in sorted(_lib_dir.glob("*.groovy")):
-                src += "\n" + _lib.read_text(encoding="utf-8", errors="replace")
+        # so scan the main+libraries concatenation so the map is found wherever it
+        # resides. The src_override path stays main-only for the synthetic self-test
+        # corpora.
+        src = corpus.combined_text()
+        if src is None:
+            return findings
 
     # 1. Extract the canonical DISCRETE_EVENT_CAPS set from production.
     #    The map literal shape is:
@@ -1966,7 +3416,7 @@ def check_discrete_event_caps_doc_parity(
     )
     if not map_match:
         findings.append({
-            "file": str(server.relative_to(REPO_ROOT)),
+            "file": corpus.rel(server),
             "line": 1,
             "severity": "error",
             "rule": "discrete-event-caps-no-map",
@@ -1981,7 +3431,7 @@ def check_discrete_event_caps_doc_parity(
     canonical_caps = set(re.findall(r'"([^"]+)"\s*:', map_match.group(1)))
     if not canonical_caps:
         findings.append({
-            "file": str(server.relative_to(REPO_ROOT)),
+            "file": corpus.rel(server),
             "line": 1,
             "severity": "error",
             "rule": "discrete-event-caps-empty",
@@ -1996,8 +3446,8 @@ def check_discrete_event_caps_doc_parity(
     if doc_surfaces_override is not None:
         doc_surfaces = doc_surfaces_override
     else:
-        tool_guide = REPO_ROOT / "TOOL_GUIDE.md"
-        action_schemas = REPO_ROOT / "docs" / "rm_action_subtype_schemas.md"
+        tool_guide = corpus.root / "TOOL_GUIDE.md"
+        action_schemas = corpus.root / "docs" / "rm_action_subtype_schemas.md"
         doc_surfaces = {}
         # Two inline surfaces in the server source: extract narrow scope so we
         # only scan the "discrete events" / "discrete-event" notes, not the
@@ -2009,8 +3459,8 @@ def check_discrete_event_caps_doc_parity(
         ):
             label = f"hubitat-mcp-server.groovy:{src[:m.start()].count(chr(10)) + 1}"
             doc_surfaces[label] = m.group(0)
-        if tool_guide.exists():
-            tg = tool_guide.read_text(encoding="utf-8", errors="replace")
+        tg = corpus.text(tool_guide)
+        if tg is not None:
             for m in re.finditer(
                 r"(?:report discrete events|discrete-event capability|some sensor capabilities).{0,800}",
                 tg,
@@ -2018,8 +3468,8 @@ def check_discrete_event_caps_doc_parity(
             ):
                 label = f"TOOL_GUIDE.md:{tg[:m.start()].count(chr(10)) + 1}"
                 doc_surfaces[label] = m.group(0)
-        if action_schemas.exists():
-            as_text = action_schemas.read_text(encoding="utf-8", errors="replace")
+        as_text = corpus.text(action_schemas)
+        if as_text is not None:
             # The discrete-event table in this file is the authoritative table.
             m = re.search(
                 r"###\s*Sensor capabilities with discrete event states.*?(?=\n##|\Z)",
@@ -2180,6 +3630,7 @@ def _run_discrete_event_caps_self_test() -> int:
 
 def check_trailing_updaterule_envelope_parity(
     src_override: str | None = None,
+    corpus: LintCorpus | None = None,
 ) -> list[dict]:
     """Verify every `catch (Exception updateExc)` block in the RM dispatcher
     is followed by the full 5-slot trailing-updateRule envelope shape:
@@ -2202,14 +3653,12 @@ def check_trailing_updaterule_envelope_parity(
     fixed-char scan with brace-balanced block detection rather than just
     enlarging the window.
     """
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    server = REPO_ROOT / "hubitat-mcp-server.groovy"
-    if src_override is not None:
-        src = src_override
-    else:
-        if not server.exists():
-            return findings
-        src = server.read_text(encoding="utf-8", errors="replace")
+    server = corpus.server_path
+    src = src_override if src_override is not None else corpus.server_text
+    if src is None:
+        return findings
 
     # Each match marks the start of a trailing-updateRule catch block. Scope
     # to the literal handler shape so we don't false-positive on broader
@@ -2243,7 +3692,7 @@ def check_trailing_updaterule_envelope_parity(
         if missing:
             line_no = src[:m.start()].count("\n") + 1
             findings.append({
-                "file": str(server.relative_to(REPO_ROOT)),
+                "file": corpus.rel(server),
                 "line": line_no,
                 "severity": "error",
                 "rule": "trailing-updaterule-envelope-incomplete",
@@ -2393,7 +3842,8 @@ def _run_envelope_parity_self_test() -> int:
     return failures
 
 
-def check_read_write_split(src_override: str | None = None) -> list[dict]:
+def check_read_write_split(src_override: str | None = None,
+                           corpus: LintCorpus | None = None) -> list[dict]:
     """Enforce BOTH directions of the gateway read/write-split invariant
     (AGENTS.md "Gateway read/write split" -- a hard CI failure):
 
@@ -2423,24 +3873,21 @@ def check_read_write_split(src_override: str | None = None) -> list[dict]:
 
     src_override lets the self-test drive this with synthetic corpora.
     """
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    server = REPO_ROOT / "hubitat-mcp-server.groovy"
+    server = corpus.server_path
     if src_override is not None:
         src = src_override
     else:
-        if not server.exists():
-            return findings
-        src = server.read_text(encoding="utf-8", errors="replace")
         # Tool defs now live partly in #include'd library modules (issue #209); the app includes
-        # every libraries/*.groovy, so append them so moved def chunks (e.g.
-        # _getAllToolDefinitions_partRooms) are seen by the gateway-vs-defs reachability checks
-        # below. The src_override path stays main-only for the synthetic self-test corpora.
-        _lib_dir = REPO_ROOT / "libraries"
-        if _lib_dir.is_dir():
-            for _lib in sorted(_lib_dir.glob("*.groovy")):
-                src += "\n" + _lib.read_text(encoding="utf-8", errors="replace")
+        # every libraries/*.groovy, so scan the main+libraries concatenation so moved def chunks
+        # (e.g. _getAllToolDefinitions_partRooms) are seen by the gateway-vs-defs reachability
+        # checks below. The src_override path stays main-only for the synthetic self-test corpora.
+        src = corpus.combined_text()
+        if src is None:
+            return findings
 
-    rel = str(server.relative_to(REPO_ROOT))
+    rel = corpus.rel(server)
 
     def _fail(rule: str, message: str) -> list[dict]:
         findings.append({
@@ -2449,25 +3896,25 @@ def check_read_write_split(src_override: str | None = None) -> list[dict]:
         })
         return findings
 
-    # 1. getGatewayConfig() -> {gateway_name: [tool, ...]}. Same two-stage anchor
-    #    _extract_canonical_counts() uses, but we keep the full tool LISTS (not
-    #    just counts) and the gateway names (to split hub_read_ vs hub_manage_).
-    gw_match = re.search(r"^def getGatewayConfig\(\) \{(.*?)^}", src, re.DOTALL | re.MULTILINE)
-    if not gw_match:
+    catalog = tool_catalog(src)
+
+    # 1. getGatewayConfig() -> {gateway_name: [tool, ...]}, from the same catalog
+    #    _extract_canonical_counts() reads, keeping the full tool LISTS (not just
+    #    counts) and the gateway names (to split hub_read_ vs hub_manage_).
+    if catalog.gateway_config is None:
         return _fail(
             "read-write-split-no-gateway-config",
             "Could not locate getGatewayConfig() return literal -- has the function shape "
             "changed? The read/write-split guard cannot run until the parser is updated.",
         )
-    gateway_tools: dict[str, list[str]] = {}
-    gateway_pos: dict[str, int] = {}  # absolute src offset of each gateway, for line numbers
-    for m in re.finditer(
-        r"^\s+([a-z_]+):\s*\[\s*description:\s*\".*?\".*?\btools:\s*\[([^\]]+)\]",
-        gw_match.group(1), re.MULTILINE | re.DOTALL,
-    ):
-        no_comments = re.sub(r"//[^\n]*", "", m.group(2))
-        gateway_tools[m.group(1)] = [t.strip().strip("\"'") for t in no_comments.split(",") if t.strip()]
-        gateway_pos[m.group(1)] = gw_match.start(1) + m.start()
+    if "getGatewayConfig" in catalog.errors:
+        return _fail(
+            "read-write-split-no-gateway-config",
+            f"getGatewayConfig() return literal could not be parsed "
+            f"({catalog.errors['getGatewayConfig']}) -- parser/source shape mismatch.",
+        )
+    gateway_tools = {name: g.tools for name, g in catalog.gateways.items()}
+    gateway_pos = {name: g.offset for name, g in catalog.gateways.items()}  # for line numbers
     if not gateway_tools:
         return _fail(
             "read-write-split-no-gateway-config",
@@ -2480,30 +3927,25 @@ def check_read_write_split(src_override: str | None = None) -> list[dict]:
     #    _readOnlyToolNames_part<Name>() chunk (the libraries are concatenated into
     #    `src` above), and the main body keeps only the main-resident remainder -- so
     #    the read set is the union of literals across the getter AND every part method.
-    ro_match = re.search(r"^def getReadOnlyToolNames\(\) \{(.*?)^}", src, re.DOTALL | re.MULTILINE)
-    if not ro_match:
+    ro_set = catalog.name_sets["read_only"]
+    ro_getter = ro_set.getter
+    if ro_getter is None:
         return _fail(
             "read-write-split-no-readonly-list",
             "Could not locate getReadOnlyToolNames() return literal -- has the function shape changed?",
         )
-    part_bodies = re.findall(
-        r"^def _readOnlyToolNames_part\w+\(\) \{(.*?)^}", src, re.DOTALL | re.MULTILINE,
-    )
     # Format-drift guard: if part methods are MENTIONED (declared or called in the
-    # aggregator) but the body regex parses fewer, the read set would silently
+    # aggregator) but the body locator parses fewer, the read set would silently
     # under-count and the split check would quietly stop enforcing -- fail loud instead.
-    declared = len(set(re.findall(r"def (_readOnlyToolNames_part\w+)\s*\(", src)))
-    if declared != len(part_bodies):
+    if ro_set.drifted:
         return _fail(
             "read-write-split-part-format-drift",
-            f"{declared} _readOnlyToolNames_part* method(s) declared but {len(part_bodies)} parsed -- "
-            "the part-method body regex no longer matches the declaration format; the read-only set "
-            "would silently under-count. Align the declaration shape or update the regex.",
+            f"{ro_set.declared_parts} _readOnlyToolNames_part* method(s) declared but "
+            f"{len(ro_set.parts)} parsed -- the part-method body regex no longer matches the "
+            "declaration format; the read-only set would silently under-count. Align the "
+            "declaration shape or update the regex.",
         )
-    ro_bodies = [ro_match.group(1), *part_bodies]
-    read_only: set[str] = set()
-    for body in ro_bodies:
-        read_only |= set(re.findall(r'"([a-z_]+)"', re.sub(r"//[^\n]*", "", body)))
+    read_only = ro_set.names
     if not read_only:
         return _fail(
             "read-write-split-no-readonly-list",
@@ -2513,21 +3955,21 @@ def check_read_write_split(src_override: str | None = None) -> list[dict]:
     # 3. Flat (top-level) tools = every getAllToolDefinitions() tool that no
     #    gateway proxies. A read-only tool that is flat satisfies the invariant.
     #    The defs are split across per-domain _getAllToolDefinitions_part<Name>() chunk
-    #    methods (64KB-method-bytecode cap); gather names from all of them.
-    all_bodies = re.findall(
-        r"^def (?:getAllToolDefinitions|_getAllToolDefinitions_part\w+)\(\) \{(.*?)^}",
-        src, re.DOTALL | re.MULTILINE,
-    )
-    if not all_bodies:
+    #    methods (64KB-method-bytecode cap); the catalog gathers names from all of them.
+    if not catalog.definitions:
         return _fail(
             "read-write-split-no-tool-definitions",
             "Could not locate getAllToolDefinitions() return literal -- has the function shape changed?",
         )
-    all_tool_names = set(re.findall(r"^\s*name:\s*['\"]([a-z_]+)['\"]", "\n".join(all_bodies), re.MULTILINE))
-    proxied: set[str] = set()
-    for tools in gateway_tools.values():
-        proxied.update(tools)
-    flat_tools = all_tool_names - proxied
+    unreadable = sorted(m.name for m in catalog.definitions if m.name in catalog.errors)
+    if unreadable:
+        return _fail(
+            "read-write-split-no-tool-definitions",
+            f"Tool-definition chunk(s) {unreadable} could not be parsed -- their tools would "
+            "silently drop out of the flat-tool set. Parser/source shape mismatch.",
+        )
+    proxied = catalog.proxied_names
+    flat_tools = catalog.tool_names - proxied
 
     # 4. Read-gateway reach: every tool surfaced by a gateway whose name carries
     #    the hub_read_ prefix (derived, not hard-coded).
@@ -2538,14 +3980,15 @@ def check_read_write_split(src_override: str | None = None) -> list[dict]:
 
     # 5. The invariant. A read-only tool is stranded iff it is neither flat nor in
     #    any hub_read_* gateway -- i.e. reachable ONLY through hub_manage_*.
-    ro_body_start = ro_match.start(1)
+    index = catalog.index
+    ro_body_start = ro_getter.body_start
     for tool in sorted(read_only):
         if tool in read_gateway_tools or tool in flat_tools:
             continue
         holders = sorted(n for n, ts in gateway_tools.items() if tool in ts)
         where = f"only via hub_manage_* gateway(s) {holders}" if holders else "by no gateway at all (and it is not flat)"
         idx = src.find(f'"{tool}"', ro_body_start)
-        line_no = (src[:idx].count("\n") + 1) if idx != -1 else (src[:ro_match.start()].count("\n") + 1)
+        line_no = index.line_of(idx if idx != -1 else ro_getter.start)
         findings.append({
             "file": rel,
             "line": line_no,
@@ -2571,9 +4014,9 @@ def check_read_write_split(src_override: str | None = None) -> list[dict]:
         for tool in gateway_tools[name]:
             if tool in read_only:
                 continue
-            g_abs = gateway_pos.get(name, ro_match.start())
+            g_abs = gateway_pos.get(name, ro_getter.start)
             idx = src.find(f'"{tool}"', g_abs)
-            line_no = (src[:idx].count("\n") + 1) if idx != -1 else (src[:g_abs].count("\n") + 1)
+            line_no = index.line_of(idx if idx != -1 else g_abs)
             findings.append({
                 "file": rel,
                 "line": line_no,
@@ -2763,16 +4206,177 @@ def format_finding(f: dict) -> str:
     parts = [f"{severity}: {loc}: {msg}"]
     if f["source"]:
         parts.append(f"  > {f['source']}")
+    if f.get("suggestion"):
+        parts.append(f"  suggestion: {f['suggestion']}")
     return "\n".join(parts)
 
 
 def format_annotation(f: dict) -> str:
     """Format a finding as a GitHub Actions annotation."""
-    level = "warning" if f["severity"] == "warning" else "error"
+    level = {"warning": "warning", "info": "notice"}.get(f["severity"], "error")
     line_part = f",line={f['line']}" if f["line"] else ""
     return f"::{level} file={f['file']}{line_part}::[{f['rule']}] {f['message']}"
 
 
+# ---------------------------------------------------------------------------
+# Findings pipeline
+# ---------------------------------------------------------------------------
+#
+# A lint run is a stream: each finding goes from its check straight to every emitter instead
+# of into one list that is sorted and printed at the end. The per-file scans stream file by
+# file (GROOVY_FILES order, see iter_scan_files); each cross-file check needs the whole
+# corpus anyway, so its findings arrive as one batch, sorted by file and line. Emitters write
+# as they receive, so --max-findings stops a badly broken branch after N errors without
+# scanning the rest, and a SARIF / JSONL file is complete up to the last finding written.
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+_SARIF_LEVEL = {"error": "error", "warning": "warning", "info": "note"}
+
+
+def _finding_order(f: dict) -> tuple:
+    return (f["file"], f["line"])
+
+
+class FindingCounts:
+    """Per-severity tally of what the pipeline emitted; `truncated` when --max-findings
+    stopped it with errors still coming."""
+
+    def __init__(self):
+        self.by_severity: dict[str, int] = {"error": 0, "warning": 0, "info": 0}
+        self.total = 0
+        self.truncated = False
+
+    def add(self, f: dict) -> None:
+        self.by_severity[f["severity"]] = self.by_severity.get(f["severity"], 0) + 1
+        self.total += 1
+
+    @property
+    def errors(self) -> int:
+        return self.by_severity["error"]
+
+
+class TextEmitter:
+    """format_finding blocks, then the summary line -- the lint's classic output."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def emit(self, f: dict) -> None:
+        self.stream.write(format_finding(f) + "\n\n")
+
+    def close(self, counts: FindingCounts) -> None:
+        if not counts.total:
+            self.stream.write("Sandbox lint: all checks passed.\n")
+        if counts.truncated:
+            self.stream.write(f"--- stopped after {counts.errors} error(s) (--max-findings) ---\n")
+        by = counts.by_severity
+        self.stream.write(f"--- {by['error']} error(s), {by['warning']} warning(s), {by['info']} info ---\n")
+        self.stream.flush()
+
+
+class AnnotationEmitter:
+    """One GitHub Actions `::error` / `::warning` / `::notice` line per finding."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def emit(self, f: dict) -> None:
+        self.stream.write(format_annotation(f) + "\n")
+
+    def close(self, counts: FindingCounts) -> None:
+        self.stream.flush()
+
+
+class JsonlEmitter:
+    """One JSON object per finding per line, flushed as written (`tail -f`-able)."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def emit(self, f: dict) -> None:
+        self.stream.write(json.dumps(f, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def close(self, counts: FindingCounts) -> None:
+        self.stream.flush()
+
+
+class SarifEmitter:
+    """A SARIF 2.1.0 log for code-scanning upload, written as the results arrive.
+
+    The run's `results` array is opened up front and each result appended as it is
+    emitted; `tool` (whose rule list names every rule a result used) and `invocations`
+    follow it when the pipeline closes -- JSON member order is free, so the log is
+    still one valid document.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.rule_ids: list[str] = []
+        self.results = 0
+        self.stream.write(json.dumps({"$schema": SARIF_SCHEMA, "version": "2.1.0"})[:-1]
+                          + ', "runs": [{"results": [')
+
+    def emit(self, f: dict) -> None:
+        if f["rule"] not in self.rule_ids:
+            self.rule_ids.append(f["rule"])
+        result = {
+            "ruleId": f["rule"],
+            "ruleIndex": self.rule_ids.index(f["rule"]),
+            "level": _SARIF_LEVEL.get(f["severity"], "error"),
+            "message": {"text": f["message"]},
+        }
+        if f["file"]:
+            location = {"artifactLocation": {"uri": f["file"].replace("\\", "/"), "uriBaseId": "%SRCROOT%"}}
+            if f["line"]:
+                location["region"] = {"startLine": f["line"]}
+            result["locations"] = [{"physicalLocation": location}]
+        self.stream.write(("\n" if not self.results else ",\n") + json.dumps(result))
+        self.results += 1
+
+    def close(self, counts: FindingCounts) -> None:
+        rules_by_id = {rule["id"]: rule for rule in RULES}
+        descriptors = []
+        for rule_id in self.rule_ids:
+            rule = rules_by_id.get(rule_id)
+            descriptor: dict = {"id": rule_id}
+            if rule is not None:
+                descriptor["shortDescription"] = {"text": rule["message"]}
+                descriptor["defaultConfiguration"] = {"level": _SARIF_LEVEL.get(rule["severity"], "error")}
+                if rule.get("suggestion"):
+                    descriptor["help"] = {"text": rule["suggestion"]}
+            descriptors.append(descriptor)
+        tool = {"driver": {"name": "sandbox-lint", "rules": descriptors}}
+        invocation = {"executionSuccessful": not counts.truncated}
+        self.stream.write("\n], " + json.dumps({"tool": tool, "invocations": [invocation]})[1:-1] + "}]}\n")
+        self.stream.flush()
+
+
+def emit_findings(findings, emitters: list, max_findings: int | None = None) -> FindingCounts:
+    """Drain the `findings` iterator into every emitter, in order, then close them.
+
+    With `max_findings`, the (max_findings + 1)-th error is not emitted: the iterator is
+    closed there (a generator's pending work -- scans not yet run -- never happens) and the
+    counts are marked truncated. Warnings and info never count toward the cap -- they do
+    not fail a run, so they must not end one early either."""
+    counts = FindingCounts()
+    try:
+        for f in findings:
+            if max_findings is not None and f["severity"] == "error" and counts.errors >= max_findings:
+                counts.truncated = True
+                break
+            for emitter in emitters:
+                emitter.emit(f)
+            counts.add(f)
+    finally:
+        close = getattr(findings, "close", None)
+        if close is not None:
+            close()
+    for emitter in emitters:
+        emitter.close(counts)
+    return counts
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
@@ -3003,6 +4607,101 @@ SELF_TEST_CASES = [
         "return d.text  // Reader/InputStream -- may throw mid-stream",
         [("SANDBOX-015", False)],
     ),
+    (
+        "atomicState read inside an each closure is flagged",
+        "def f() {\n    items.each { i ->\n        def m = atomicState.counts\n    }\n}",
+        [("PERF-001", True)],
+    ),
+    (
+        "atomicState as the receiver of the loop itself is NOT flagged (read once)",
+        "def f() {\n    atomicState.actions.eachWithIndex { a, idx ->\n        log.debug a\n    }\n}",
+        [("PERF-001", False)],
+    ),
+    (
+        "atomicState after a one-line loop closed is NOT flagged",
+        "def f() {\n    items.each { i -> total += i }; atomicState.total = total\n}",
+        [("PERF-001", False)],
+    ),
+    (
+        "state write inside a for-in loop is flagged",
+        "def f() {\n    for (x in items) {\n        state.last = x\n    }\n}",
+        [("PERF-002", True)],
+    ),
+    (
+        "state in a while condition is flagged (it re-evaluates every iteration)",
+        "def f() {\n    while (state.queue.size() > 10) {\n        n++\n    }\n}",
+        [("PERF-002", True)],
+    ),
+    (
+        "a device's own .state property in a loop is NOT flagged",
+        "def f() {\n    devs.each { d ->\n        def s = d.state\n    }\n}",
+        [("PERF-002", False)],
+    ),
+    (
+        "state outside any loop is NOT flagged",
+        "def f() {\n    state.last = now()\n}",
+        [("PERF-002", False)],
+    ),
+    (
+        "getChildDevices() inside a loop is flagged",
+        "def f() {\n    ids.each { id ->\n        def d = getChildDevices().find { it.id == id }\n    }\n}",
+        [("PERF-003", True)],
+    ),
+    (
+        "getToolDefinitions() inside a for loop is flagged",
+        "def f() {\n    for (n in names) {\n        def t = getToolDefinitions().find { it.name == n }\n    }\n}",
+        [("PERF-003", True)],
+    ),
+    (
+        "getChildDevices() as the loop receiver is NOT flagged",
+        "def f() {\n    getChildDevices().each { d ->\n        log.debug d\n    }\n}",
+        [("PERF-003", False)],
+    ),
+    (
+        "the same value serialized twice in one method is flagged",
+        "def f() {\n    def a = JsonOutput.toJson(result)\n    log.debug a\n    def b = JsonOutput.toJson( result )\n}",
+        [("PERF-004", True)],
+    ),
+    (
+        "the same value serialized in exclusive if/else branches is NOT flagged",
+        "def f() {\n    if (x) {\n        return JsonOutput.toJson(result)\n    } else {\n        return JsonOutput.toJson(result)\n    }\n}",
+        [("PERF-004", False)],
+    ),
+    (
+        "re-serializing after the value was changed is NOT flagged",
+        "def f() {\n    def a = JsonOutput.toJson(result)\n    result.page = 2\n    def b = JsonOutput.toJson(result)\n}",
+        [("PERF-004", False)],
+    ),
+    (
+        "the same name serialized in two different methods is NOT flagged",
+        "def f() {\n    return JsonOutput.toJson(result)\n}\ndef g() {\n    return JsonOutput.toJson(result)\n}",
+        [("PERF-004", False)],
+    ),
+    (
+        "hubInternalGet inside a loop over devices is flagged",
+        "def f() {\n    devices.each { d ->\n        def j = hubInternalGet(\"/device/fullJson/${d.id}\")\n    }\n}",
+        [("PERF-005", True)],
+    ),
+    (
+        "_hubRequest inside a for loop over a device list is flagged",
+        "def f() {\n    for (id in deviceIds) {\n        _hubRequest('get', '/device/edit', [id: id])\n    }\n}",
+        [("PERF-005", True)],
+    ),
+    (
+        "hubInternalGet in a loop whose closure parameter is a device is flagged",
+        "def f() {\n    selected.each { dev ->\n        hubInternalGet('/device/fullJson', [id: dev.id])\n    }\n}",
+        [("PERF-005", True)],
+    ),
+    (
+        "hubInternalGet in a loop over non-device items is NOT flagged",
+        "def f() {\n    channels.each { c ->\n        hubInternalGet('/hub/zigbee/scan', [ch: c])\n    }\n}",
+        [("PERF-005", False)],
+    ),
+    (
+        "one hubInternalGet before a device loop is NOT flagged",
+        "def f() {\n    def all = hubInternalGet('/hub2/devicesList')\n    devices.each { d -> log.debug all[d.id] }\n}",
+        [("PERF-005", False)],
+    ),
 ]
 
 
@@ -3449,15 +5148,17 @@ COUNT_SELF_TEST_CASES = [
 ]
 
 
-def _check_doc_against_canonical(content: str, canonical_override: dict) -> set[str]:
+def _check_doc_against_canonical(content: str, canonical_override: dict,
+                                 real: dict | None = None) -> set[str]:
     """Run the doc-scanning checks against `content` with a synthetic
     canonical dict overlaid on the real extractor result. Returns the
     set of finding-kinds reported (e.g. {'total', 'core',
     'per_gateway:manage_logs'}). Used by `_run_count_self_test` to
     verify each pattern fires on drift and each historical-skip rule
-    holds.
+    holds. `real` is the extractor result when the caller already has it
+    (the suite extracts once, not once per fixture).
     """
-    real = _extract_canonical_counts() or {
+    real = real or _extract_canonical_counts() or {
         "total": 0, "core": 0, "gateways": 0, "tools_list": 0,
         "proxied": 0, "dev_only_top_level": 0, "per_gateway": {}, "tool_names": set(),
         "gateway_names": set(), "proxied_names": set(),
@@ -3474,17 +5175,19 @@ def _check_doc_against_canonical(content: str, canonical_override: dict) -> set[
 
     kinds: set[str] = set()
     seen: set[tuple[int, str, int]] = set()
+    index = LineIndex(content)
+    historical = HistoricalIndex(content, index)
 
     # COUNT_PATTERNS scan
     for pat, kind in COUNT_PATTERNS:
         expected = canonical[kind]
         for m in pat.finditer(content):
-            if _is_historical_at(content, m.start(), m.end()):
+            if historical.at(m.start(), m.end()):
                 continue
             actual = int(m.group(1))
             if actual == expected:
                 continue
-            line_no = content[:m.start()].count("\n") + 1
+            line_no = index.line_of(m.start())
             dedup = (line_no, kind, actual)
             if dedup in seen:
                 continue
@@ -3494,11 +5197,11 @@ def _check_doc_against_canonical(content: str, canonical_override: dict) -> set[
     # Gateway-family subtotal scan
     family_seen: set[tuple[int, str, int]] = set()
     for m in GATEWAY_FAMILY_PATTERN.finditer(content):
-        if _is_historical_at(content, m.start(), m.end()):
+        if historical.at(m.start(), m.end()):
             continue
         family = m.group(1).lower()
         actual = int(m.group(2))
-        line_no = content[:m.start()].count("\n") + 1
+        line_no = index.line_of(m.start())
         dedup = (line_no, family, actual)
         if dedup in family_seen:
             continue
@@ -3513,11 +5216,11 @@ def _check_doc_against_canonical(content: str, canonical_override: dict) -> set[
         + list(PER_GATEWAY_TABLE_PATTERN.finditer(content))
         + list(PER_GATEWAY_SEES_PATTERN.finditer(content))
     ):
-        if _is_historical_at(content, m.start(), m.end()):
+        if historical.at(m.start(), m.end()):
             continue
         gw_name = _normalize_gateway_name(m.group(1))
         actual = int(m.group(2))
-        line_no = content[:m.start()].count("\n") + 1
+        line_no = index.line_of(m.start())
         dedup = (line_no, gw_name, actual)
         if dedup in per_gw_seen:
             continue
@@ -3531,10 +5234,11 @@ def _check_doc_against_canonical(content: str, canonical_override: dict) -> set[
 
 def _run_count_self_test() -> int:
     failures = 0
+    real = _extract_canonical_counts()
     for i, (desc, content, override, expected_kinds) in enumerate(
         COUNT_SELF_TEST_CASES, start=1
     ):
-        actual_kinds = _check_doc_against_canonical(content, override)
+        actual_kinds = _check_doc_against_canonical(content, override, real)
         expected_set = set(expected_kinds)
         if actual_kinds != expected_set:
             failures += 1
@@ -3671,7 +5375,7 @@ def _run_tool_guide_anchor_self_test() -> int:
     return failures
 
 
-def run_self_test() -> int:
+def _run_sandbox_rule_self_test() -> int:
     """Scan inline fixtures through scan_source and confirm each rule
     triggers where expected. Uses scan_source (not strip_comments_and_strings
     + inline rule loop) so the self-test exercises the same code path
@@ -3692,11 +5396,15 @@ def run_self_test() -> int:
                     f"  source: {source!r}\n"
                     f"  stripped: {stripped!r}"
                 )
+    return failures
+
 
-    # Sanity-check the canonical tool-count extractor: must succeed and
-    # return a self-consistent count breakdown. Extractor failure here
-    # would otherwise only surface as opaque "could not extract" errors
-    # during real lint runs.
+def _run_extractor_self_test() -> int:
+    """Sanity-check the canonical tool-count extractor: must succeed and
+    return a self-consistent count breakdown. Extractor failure here
+    would otherwise only surface as opaque "could not extract" errors
+    during real lint runs."""
+    failures = 0
     canonical = _extract_canonical_counts()
     if canonical is None:
         failures += 1
@@ -3788,68 +5496,23 @@ def run_self_test() -> int:
                 "either remove the gateway entry or add the tool to "
                 "getAllToolDefinitions()."
             )
+    return failures
 
-    # Doc-content fixtures for COUNT_PATTERNS + historical-skip rules.
-    count_failures = _run_count_self_test()
-    failures += count_failures
-
-    # Gateway-attribution must-catch / must-not-catch fixtures.
-    failures += _run_gateway_attribution_self_test()
-
-    # Tool-guide-anchor must-catch / must-not-catch fixtures (PIPELINE.md Rule 13:
-    # the anchor-drift check inside check_tool_guide_pointers is a class-wide
-    # mechanism; it ships with positive + negative fixtures so a future regression
-    # in the dispatch logic surfaces here rather than silently weakening the lint).
-    anchor_failures = _run_tool_guide_anchor_self_test()
-    failures += anchor_failures
-
-    # Discrete-event-caps must-catch / must-not-catch fixtures (PIPELINE.md Rule 13).
-    discrete_event_failures = _run_discrete_event_caps_self_test()
-    failures += discrete_event_failures
-
-    # Trailing-updateRule envelope parity must-catch / must-not-catch fixtures
-    # (PIPELINE.md Rule 13).
-    envelope_parity_failures = _run_envelope_parity_self_test()
-    failures += envelope_parity_failures
-
-    # Read/write-split must-catch / must-not-catch fixtures (PIPELINE.md Rule 13):
-    # the guard that a read-only tool is never stranded behind only a hub_manage_*
-    # gateway ships with positive + negative fixtures so a regression in the
-    # dispatch logic surfaces here rather than silently weakening the lint.
-    read_write_split_failures = _run_read_write_split_self_test()
-    failures += read_write_split_failures
 
-    # BP20 library file-scope block-comment guard: must-catch / must-not-catch fixtures.
-    failures += _run_library_block_comment_self_test()
+_INCLUDE_RE = re.compile(r"(?m)^[ \t]*#include[ \t]+([A-Za-z0-9_]+)\.([A-Za-z0-9_]+)[ \t]*$")
 
-    # Vendored MCP schema provenance guard: must-catch / must-not-catch fixtures.
-    failures += _run_vendored_schema_hash_self_test()
 
-    if failures:
-        print(f"--- {failures} self-test failure(s) ---")
-        return 1
-    total_cases = (
-        len(SELF_TEST_CASES)
-        + len(COUNT_SELF_TEST_CASES)
-        + len(GATEWAY_ATTRIBUTION_SELF_TEST_CASES)
-        + len(TOOL_GUIDE_ANCHOR_SELF_TEST_CASES)
-        + len(DISCRETE_EVENT_CAPS_SELF_TEST_CASES)
-        + len(ENVELOPE_PARITY_SELF_TEST_CASES)
-        + len(READ_WRITE_SPLIT_SELF_TEST_CASES)
-    )
-    print(
-        f"Self-test: {total_cases} case(s) passed "
-        f"({len(SELF_TEST_CASES)} sandbox, {len(COUNT_SELF_TEST_CASES)} count, "
-        f"{len(GATEWAY_ATTRIBUTION_SELF_TEST_CASES)} gateway-attribution, "
-        f"{len(TOOL_GUIDE_ANCHOR_SELF_TEST_CASES)} tool-guide-anchor, "
-        f"{len(DISCRETE_EVENT_CAPS_SELF_TEST_CASES)} discrete-event-caps, "
-        f"{len(ENVELOPE_PARITY_SELF_TEST_CASES)} envelope-parity, "
-        f"{len(READ_WRITE_SPLIT_SELF_TEST_CASES)} read-write-split)."
-    )
-    return 0
+def _library_key(text: str) -> tuple[str, str] | None:
+    """(namespace, name) from a library file's library(...) declaration, or None."""
+    m = re.search(r"(?m)^library\s*\((.*)\)\s*$", text)
+    if not m:
+        return None
+    nm = re.search(r"name:\s*['\"]([^'\"]+)['\"]", m.group(1))
+    ns = re.search(r"namespace:\s*['\"]([^'\"]+)['\"]", m.group(1))
+    return (ns.group(1), nm.group(1)) if nm and ns else None
 
 
-def check_include_library_lockstep() -> list[dict]:
+def check_include_library_lockstep(corpus: LintCorpus | None = None) -> list[dict]:
     """Every `#include mcp.X` in the app must stay in lockstep with its delivery (issues #209/#250):
     (1) a libraries/*.groovy whose library() declares (namespace=X.ns, name=X.name), and
     (2) a tools/build-bundle.py LIBS entry (else the HPM bundle -- the sole delivery path, and
@@ -3863,53 +5526,40 @@ def check_include_library_lockstep() -> list[dict]:
     library files declaring the same (namespace, name), since a duplicate makes the hub's
     #include bind ambiguously (only one of the two copies wins).
     """
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    server = REPO_ROOT / "hubitat-mcp-server.groovy"
-    if not server.exists():
+    src = corpus.server_text
+    if src is None:
         return findings
-    src = server.read_text(encoding="utf-8", errors="replace")
     rel = "hubitat-mcp-server.groovy"
 
-    includes = re.findall(
-        r"(?m)^[ \t]*#include[ \t]+([A-Za-z0-9_]+)\.([A-Za-z0-9_]+)[ \t]*$", src
-    )
+    includes = _INCLUDE_RE.findall(src)
     if not includes:
         return findings
 
     # (1) libraries declared by (namespace, name) from each libraries/*.groovy library() call.
     declared: dict[tuple[str, str], str] = {}
-    lib_dir = REPO_ROOT / "libraries"
-    if lib_dir.is_dir():
-        for lib in sorted(lib_dir.glob("*.groovy")):
-            text = lib.read_text(encoding="utf-8", errors="replace")
-            m = re.search(r"(?m)^library\s*\((.*)\)\s*$", text)
-            if not m:
-                continue
-            decl = m.group(1)
-            nm = re.search(r"name:\s*['\"]([^'\"]+)['\"]", decl)
-            ns = re.search(r"namespace:\s*['\"]([^'\"]+)['\"]", decl)
-            if nm and ns:
-                key = (ns.group(1), nm.group(1))
-                if key in declared:
-                    findings.append({
-                        "file": f"libraries/{lib.name}", "line": 1, "severity": "error",
-                        "rule": "INCLUDE_LOCKSTEP", "source": "",
-                        "message": (
-                            f"Duplicate library declaration namespace='{key[0]}', name='{key[1]}' in "
-                            f"both {declared[key]} and {lib.name} -- a duplicate (namespace, name) makes "
-                            f"the hub's #include bind ambiguously (only one copy wins). Rename or remove one."
-                        ),
-                    })
-                else:
-                    declared[key] = lib.name
+    for lib in corpus.library_paths:
+        key = _library_key(corpus.text(lib) or "")
+        if key is not None:
+            if key in declared:
+                findings.append({
+                    "file": f"libraries/{lib.name}", "line": 1, "severity": "error",
+                    "rule": "INCLUDE_LOCKSTEP", "source": "",
+                    "message": (
+                        f"Duplicate library declaration namespace='{key[0]}', name='{key[1]}' in "
+                        f"both {declared[key]} and {lib.name} -- a duplicate (namespace, name) makes "
+                        f"the hub's #include bind ambiguously (only one copy wins). Rename or remove one."
+                    ),
+                })
+            else:
+                declared[key] = lib.name
 
     # (2) build-bundle.py LIBS dest names ({NAMESPACE}.<Name>.groovy).
-    bb = REPO_ROOT / "tools" / "build-bundle.py"
+    bb_text = corpus.text(corpus.root / "tools" / "build-bundle.py")
     bundled_names: set[str] = set()
-    if bb.exists():
-        bundled_names = set(
-            re.findall(r"\{NAMESPACE\}\.(\w+)\.groovy", bb.read_text(encoding="utf-8", errors="replace"))
-        )
+    if bb_text is not None:
+        bundled_names = set(re.findall(r"\{NAMESPACE\}\.(\w+)\.groovy", bb_text))
 
     include_line: dict[str, int] = {}
     for i, line in enumerate(src.splitlines(), 1):
@@ -3942,6 +5592,183 @@ def check_include_library_lockstep() -> list[dict]:
     return findings
 
 
+# ---------------------------------------------------------------------------
+# Compile budget
+# ---------------------------------------------------------------------------
+#
+# The hub recompiles the app and every #include'd library (pasted into one class) on each
+# deploy, and the e2e deploy's recompile window -- minutes of 504s -- grows with the amount
+# of code and literal text. This estimates the drivers per file from source alone: method
+# count, the largest method body in tokens (and, at COMPILE_BUDGET_BYTES_PER_TOKEN, its
+# bytecode against the JVM's 64KB per-method cap -- the wall that split getAllToolDefinitions()
+# into _getAllToolDefinitions_part<Name>() chunks), string-literal bytes (the tool-description
+# blobs; a single constant is also capped at 64KB), and #include fan-in. Estimates, not a
+# compile: COMPILE_BUDGET warns at COMPILE_BUDGET_WARN_RATIO of a limit, never errors.
+
+JVM_METHOD_BYTES_LIMIT = 65535
+JVM_STRING_CONSTANT_LIMIT = 65535
+# Bytecode per source token in a Groovy method body: a dynamic call is ~10 bytes for a
+# callsite load plus invoke, a list/map literal element ~8 (dup, index push, constant,
+# store). 4 leans high, so a warning comes before the real cap does.
+COMPILE_BUDGET_BYTES_PER_TOKEN = 4
+COMPILE_BUDGET_WARN_RATIO = 0.8
+
+_METHOD_HEADER_RE = re.compile(
+    r"^\s*(?:@\w+(?:\([^)]*\))?\s+)*"
+    r"(?:(?:private|protected|public|static|final|synchronized|abstract)\s+)*"
+    r"(?:def|void|[\w.]+(?:<[^{}]*?>)?(?:\[\])*)\s+(\w+)\s*\("
+)
+_SOURCE_TOKEN_RE = re.compile(r"\w+|[^\s\w]")
+_BLANK_RUN_RE = re.compile(r" +")
+
+
+class CompileBudget:
+    """Compile-cost drivers of one Groovy file (see compile_budget)."""
+
+    def __init__(self, display_path: str):
+        self.display_path = display_path
+        self.methods: list[tuple[str, int, int]] = []  # (name, header line, body tokens)
+        self.string_bytes = 0
+        self.largest_string = (0, 0)  # (bytes, line it starts on)
+        self.fan_in = 0  # the app: libraries it #includes; a library: files #including it
+
+    @property
+    def largest_method(self) -> tuple[str, int, int] | None:
+        return max(self.methods, key=lambda m: m[2]) if self.methods else None
+
+    @staticmethod
+    def bytecode_estimate(tokens: int) -> int:
+        return tokens * COMPILE_BUDGET_BYTES_PER_TOKEN
+
+
+def compile_budget(text: str, display_path: str) -> CompileBudget:
+    """Method count, per-method body tokens and string-literal bytes of one Groovy source.
+
+    One tokenizer pass (_strip_line, so strings and comments are exactly what the lint
+    strips): a top-level declaration header opens a method, which runs until its braces
+    balance; its tokens are the stripped code tokens plus one per string literal. A string
+    literal is a blanked run whose original text is not whitespace; a heredoc's runs are
+    joined across lines, so largest_string is per literal (each GString segment separately,
+    as the compiler stores them). Inline /* */ comments count as string bytes -- close enough.
+    """
+    budget = CompileBudget(display_path)
+    state, depth = _CODE, 0
+    method: list | None = None  # [name, line, tokens, opened]
+    open_string = None  # [bytes, line] of a literal still open at the end of the line
+    for line_num, raw in enumerate(text.split("\n"), start=1):
+        stripped, next_state = _strip_line(raw, state, True)
+        literals = 0
+        runs = [m for m in _BLANK_RUN_RE.finditer(stripped) if raw[m.start():m.end()].strip()]
+        for k, run in enumerate(runs):
+            size = len(raw[run.start():run.end()].strip().encode("utf-8"))
+            budget.string_bytes += size
+            if k == 0 and open_string is not None and run.start() == 0:
+                open_string[0] += size + 1  # the heredoc's newline
+            else:
+                if open_string is not None:
+                    budget.largest_string = max(budget.largest_string, tuple(open_string))
+                open_string = [size, line_num]
+                literals += 1
+        if stripped == "" and open_string is not None and state in (_TRIPLE_DOUBLE, _TRIPLE_SINGLE):
+            open_string[0] += 1  # a blank line inside the heredoc
+        if open_string is not None and next_state not in (_TRIPLE_DOUBLE, _TRIPLE_SINGLE):
+            budget.largest_string = max(budget.largest_string, tuple(open_string))
+            open_string = None
+
+        if method is None and depth == 0:
+            header = _METHOD_HEADER_RE.match(stripped)
+            if header:
+                method = [header.group(1), line_num, 0, False]
+        if method is not None:
+            method[2] += len(_SOURCE_TOKEN_RE.findall(stripped)) + literals
+        for ch in stripped:
+            if ch == "{":
+                depth += 1
+                if method is not None:
+                    method[3] = True
+            elif ch == "}" and depth:
+                depth -= 1
+                if depth == 0 and method is not None and method[3]:
+                    budget.methods.append((method[0], method[1], method[2]))
+                    method = None
+        state = next_state
+    if open_string is not None:
+        budget.largest_string = max(budget.largest_string, tuple(open_string))
+    return budget
+
+
+def compile_budgets(corpus: LintCorpus | None = None) -> list[CompileBudget]:
+    """compile_budget of the app and of every libraries/*.groovy (app first), with fan-in."""
+    corpus = corpus or LintCorpus()
+    src = corpus.server_text
+    if src is None:
+        return []
+    app = compile_budget(src, corpus.rel(corpus.server_path))
+    includes = set(_INCLUDE_RE.findall(src))
+    app.fan_in = len(includes)
+    budgets = [app]
+    for lib in corpus.library_paths:
+        text = corpus.text(lib) or ""
+        budget = compile_budget(text, corpus.rel(lib))
+        key = _library_key(text)
+        includers = [src] + [corpus.text(other) or "" for other in corpus.library_paths if other != lib]
+        budget.fan_in = 0 if key is None else sum(key in set(_INCLUDE_RE.findall(t)) for t in includers)
+        budgets.append(budget)
+    return budgets
+
+
+def check_compile_budget(corpus: LintCorpus | None = None) -> list[dict]:
+    """COMPILE_BUDGET warnings for a method whose estimated bytecode, or a string literal
+    whose bytes, reach COMPILE_BUDGET_WARN_RATIO of the JVM's 64KB cap."""
+    findings: list[dict] = []
+    for budget in compile_budgets(corpus):
+        for name, line, tokens in budget.methods:
+            estimate = budget.bytecode_estimate(tokens)
+            if estimate >= COMPILE_BUDGET_WARN_RATIO * JVM_METHOD_BYTES_LIMIT:
+                findings.append({
+                    "file": budget.display_path, "line": line, "severity": "warning",
+                    "rule": "COMPILE_BUDGET", "source": "",
+                    "message": (
+                        f"{name}() is ~{tokens} tokens, an estimated {estimate} bytes of bytecode "
+                        f"({estimate / JVM_METHOD_BYTES_LIMIT:.0%} of the JVM's 64KB per-method limit) -- "
+                        f"split it before the hub refuses to compile the app (the "
+                        f"_getAllToolDefinitions_part<Name>() chunking is the precedent)."
+                    ),
+                })
+        size, line = budget.largest_string
+        if size >= COMPILE_BUDGET_WARN_RATIO * JVM_STRING_CONSTANT_LIMIT:
+            findings.append({
+                "file": budget.display_path, "line": line, "severity": "warning",
+                "rule": "COMPILE_BUDGET", "source": "",
+                "message": (
+                    f"String literal of {size} bytes ({size / JVM_STRING_CONSTANT_LIMIT:.0%} of the "
+                    f"JVM's 64KB string-constant limit) -- split the text or move it to a file."
+                ),
+            })
+    return findings
+
+
+def format_compile_budget(budgets: list[CompileBudget]) -> str:
+    """The --compile-budget table: one row per file, then the whole compile unit (method and
+    string-byte totals, the largest method anywhere; fan-in is per file, so `-`)."""
+    rows = [f"{'file':<44} {'methods':>7} {'largest method':<40} {'tokens':>7} "
+            f"{'64KB':>5} {'str bytes':>10} {'fan-in':>6}"]
+    for budget in budgets:
+        largest = budget.largest_method
+        name, tokens = (f"{largest[0]}:{largest[1]}", largest[2]) if largest else ("-", 0)
+        share = budget.bytecode_estimate(tokens) / JVM_METHOD_BYTES_LIMIT
+        flag = "  <-- near limit" if share >= COMPILE_BUDGET_WARN_RATIO else ""
+        rows.append(f"{budget.display_path:<44} {len(budget.methods):>7} {name[:40]:<40} {tokens:>7} "
+                    f"{share:>5.0%} {budget.string_bytes:>10} {budget.fan_in:>6}{flag}")
+    if budgets:
+        largest_tokens = max((b.largest_method[2] for b in budgets if b.largest_method), default=0)
+        rows.append(f"{'compile unit (app + libraries)':<44} {sum(len(b.methods) for b in budgets):>7} "
+                    f"{'':<40} {largest_tokens:>7} "
+                    f"{CompileBudget.bytecode_estimate(largest_tokens) / JVM_METHOD_BYTES_LIMIT:>5.0%} "
+                    f"{sum(b.string_bytes for b in budgets):>10} {'-':>6}")
+    return "\n".join(rows)
+
+
 def _advance_triple_quote_state(line: str, state: "str | None") -> "str | None":
     r"""Return the triple-quoted-string state at the END of `line`, given the state at its
     start (the delimiter we are inside -- triple-double or triple-single -- or None).
@@ -4019,16 +5846,13 @@ def _scan_library_block_comments(name: str, text: str) -> list[dict]:
     return findings
 
 
-def check_library_no_file_scope_block_comments() -> list[dict]:
+def check_library_no_file_scope_block_comments(corpus: LintCorpus | None = None) -> list[dict]:
     """BP20 library hygiene: no file-scope /* */ or /** */ block comments in any
     libraries/*.groovy (see _scan_library_block_comments for the rationale)."""
+    corpus = corpus or LintCorpus()
     findings: list[dict] = []
-    lib_dir = REPO_ROOT / "libraries"
-    if not lib_dir.is_dir():
-        return findings
-    for lib in sorted(lib_dir.glob("*.groovy")):
-        findings.extend(_scan_library_block_comments(
-            f"libraries/{lib.name}", lib.read_text(encoding="utf-8", errors="replace")))
+    for lib in corpus.library_paths:
+        findings.extend(_scan_library_block_comments(f"libraries/{lib.name}", corpus.text(lib) or ""))
     return findings
 
 
@@ -4163,16 +5987,17 @@ def _scan_vendored_schema_hashes(readme: str, actual: dict) -> list[dict]:
     return findings
 
 
-def check_vendored_mcp_schema_hashes() -> list[dict]:
+def check_vendored_mcp_schema_hashes(corpus: LintCorpus | None = None) -> list[dict]:
     """The vendored MCP JSON Schemas must match the hashes recorded in their README."""
-    readme = MCP_SCHEMA_DIR / "README.md"
-    if not readme.is_file():
+    corpus = corpus or LintCorpus()
+    readme = corpus.text(MCP_SCHEMA_DIR / "README.md")
+    if readme is None:
         return []
     actual = {}
     for f in sorted(MCP_SCHEMA_DIR.glob("*/schema.json")):
-        raw = f.read_bytes()
+        raw = corpus.read_bytes(f) or b""
         actual[f"{f.parent.name}/{f.name}"] = (len(raw), hashlib.sha256(raw).hexdigest())
-    return _scan_vendored_schema_hashes(readme.read_text(encoding="utf-8", errors="replace"), actual)
+    return _scan_vendored_schema_hashes(readme, actual)
 
 
 def _run_vendored_schema_hash_self_test() -> int:
@@ -4210,88 +6035,711 @@ def _run_vendored_schema_hash_self_test() -> int:
     return failures
 
 
-def main() -> int:
-    if "--self-test" in sys.argv[1:]:
-        return run_self_test()
+# ---------------------------------------------------------------------------
+# Self-test runner
+# ---------------------------------------------------------------------------
+#
+# The suites share nothing but read-only module state (fixture tables, RULES, the repo
+# files some of them read), so each is an independent unit a worker process can run on
+# its own. A suite reports by printing; the runner captures each suite's stdout/stderr
+# and replays them in SELF_TEST_SUITES order once every suite is done, so the aggregated
+# output is the same whatever order the workers finish in -- only the trailing timing
+# table varies run to run.
+
+SELF_TEST_SUITES = [
+    ("sandbox-rules", _run_sandbox_rule_self_test),
+    ("tool-count-extractor", _run_extractor_self_test),
+    # Doc-content fixtures for COUNT_PATTERNS + historical-skip rules.
+    ("count", _run_count_self_test),
+    # Gateway-attribution must-catch / must-not-catch fixtures.
+    ("gateway-attribution", _run_gateway_attribution_self_test),
+    # Tool-guide-anchor must-catch / must-not-catch fixtures (PIPELINE.md Rule 13:
+    # the anchor-drift check inside check_tool_guide_pointers is a class-wide
+    # mechanism; it ships with positive + negative fixtures so a future regression
+    # in the dispatch logic surfaces here rather than silently weakening the lint).
+    ("tool-guide-anchor", _run_tool_guide_anchor_self_test),
+    # Discrete-event-caps must-catch / must-not-catch fixtures (PIPELINE.md Rule 13).
+    ("discrete-event-caps", _run_discrete_event_caps_self_test),
+    # Trailing-updateRule envelope parity must-catch / must-not-catch fixtures
+    # (PIPELINE.md Rule 13).
+    ("envelope-parity", _run_envelope_parity_self_test),
+    # Read/write-split must-catch / must-not-catch fixtures (PIPELINE.md Rule 13):
+    # the guard that a read-only tool is never stranded behind only a hub_manage_*
+    # gateway ships with positive + negative fixtures so a regression in the
+    # dispatch logic surfaces here rather than silently weakening the lint.
+    ("read-write-split", _run_read_write_split_self_test),
+    # BP20 library file-scope block-comment guard: must-catch / must-not-catch fixtures.
+    ("library-block-comments", _run_library_block_comment_self_test),
+    # Vendored MCP schema provenance guard: must-catch / must-not-catch fixtures.
+    ("vendored-schema-hashes", _run_vendored_schema_hash_self_test),
+]
 
-    all_findings: list[dict] = []
 
-    # Scan groovy files
-    for gf in GROOVY_FILES:
-        if gf.exists():
-            all_findings.extend(scan_file(gf))
-        else:
-            print(f"WARNING: Expected file not found: {gf}")
+def _run_self_test_suite(name: str) -> dict:
+    """Run one SELF_TEST_SUITES entry with its output captured: {name, failures, stdout,
+    stderr, wall_s, cpu_s}. Process-pool entry point, so it takes the suite by name."""
+    suite = dict(SELF_TEST_SUITES)[name]
+    out, err = io.StringIO(), io.StringIO()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        failures = suite()
+    return {
+        "name": name, "failures": failures, "stdout": out.getvalue(), "stderr": err.getvalue(),
+        "wall_s": time.perf_counter() - wall0, "cpu_s": time.process_time() - cpu0,
+    }
+
+
+def _print_self_test_timings(results: list[dict], wall_s: float, jobs: int) -> None:
+    width = max(len(r["name"]) for r in results)
+    print(f"Self-test suites ({jobs} worker(s), {wall_s:.2f}s wall):")
+    for r in results:
+        status = "FAIL" if r["failures"] else "ok"
+        print(f"  {r['name']:<{width}}  {r['wall_s']:>6.2f}s  {status}")
+
+
+def run_self_test(profile: "LintProfile | None" = None, jobs: int = 1) -> int:
+    """Run every self-test suite, on `jobs` worker processes when jobs > 1. Suite output is
+    printed in SELF_TEST_SUITES order either way, followed by per-suite timings. With a
+    LintProfile the suites run serially in-process, each timed into it."""
+    names = [name for name, _ in SELF_TEST_SUITES]
+    start = time.perf_counter()
+    if profile is not None:
+        results = []
+        for name in names:
+            with profile.timed("self_test_suites", name) as entry:
+                result = _run_self_test_suite(name)
+                entry["failures"] = result["failures"]
+            results.append(result)
+    elif jobs <= 1:
+        results = [_run_self_test_suite(name) for name in names]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(names))) as pool:
+            futures = [pool.submit(_run_self_test_suite, name) for name in names]
+            results = [future.result() for future in futures]
+    wall_s = time.perf_counter() - start
+
+    failures = 0
+    for result in results:
+        sys.stdout.write(result["stdout"])
+        sys.stderr.write(result["stderr"])
+        failures += result["failures"]
+    _print_self_test_timings(results, wall_s, 1 if profile is not None else jobs)
+
+    if failures:
+        print(f"--- {failures} self-test failure(s) ---")
+        return 1
+    total_cases = (
+        len(SELF_TEST_CASES)
+        + len(COUNT_SELF_TEST_CASES)
+        + len(GATEWAY_ATTRIBUTION_SELF_TEST_CASES)
+        + len(TOOL_GUIDE_ANCHOR_SELF_TEST_CASES)
+        + len(DISCRETE_EVENT_CAPS_SELF_TEST_CASES)
+        + len(ENVELOPE_PARITY_SELF_TEST_CASES)
+        + len(READ_WRITE_SPLIT_SELF_TEST_CASES)
+    )
+    print(
+        f"Self-test: {total_cases} case(s) passed "
+        f"({len(SELF_TEST_CASES)} sandbox, {len(COUNT_SELF_TEST_CASES)} count, "
+        f"{len(GATEWAY_ATTRIBUTION_SELF_TEST_CASES)} gateway-attribution, "
+        f"{len(TOOL_GUIDE_ANCHOR_SELF_TEST_CASES)} tool-guide-anchor, "
+        f"{len(DISCRETE_EVENT_CAPS_SELF_TEST_CASES)} discrete-event-caps, "
+        f"{len(ENVELOPE_PARITY_SELF_TEST_CASES)} envelope-parity, "
+        f"{len(READ_WRITE_SPLIT_SELF_TEST_CASES)} read-write-split)."
+    )
+    return 0
 
-    # Check version consistency
-    all_findings.extend(check_versions())
+
+# Every check that runs after the per-file sandbox scan, in report order. Each takes a
+# `corpus=` LintCorpus and reads what it needs across files (source, libraries, docs), so
+# the CLI run and the --lsp server's debounced pass share this one list.
+CROSS_FILE_CHECKS = [
+    # Version consistency.
+    check_versions,
 
     # Check tool-count consistency between Groovy source and docs
-    all_findings.extend(check_tool_counts())
-    all_findings.extend(check_gateway_attributions())
+    check_tool_counts,
+    check_gateway_attributions,
 
     # Check tool-name references in doc tables match canonical tool names
-    all_findings.extend(check_tool_name_consistency())
+    check_tool_name_consistency,
 
     # Check that every get_tool_guide(section='X') pointer in the schemas
     # references a section that actually exists in getToolGuideSections().
     # Catches the silent-truncation regression class of "trim points caller
     # at get_tool_guide(section=Y), but Y was never added to the dispatcher".
-    all_findings.extend(check_tool_guide_pointers())
+    check_tool_guide_pointers,
 
     # Check that every doc surface that lists discrete-event sensor capabilities
     # only names capabilities that are in production's DISCRETE_EVENT_CAPS map.
     # Catches the "doc surface drifts ahead of production" class -- agents
     # copying a stale-doc example would build a condition the live walker rejects.
-    all_findings.extend(check_discrete_event_caps_doc_parity())
+    check_discrete_event_caps_doc_parity,
 
     # Check that every `catch (Exception updateExc)` block in the RM dispatcher
     # is followed by the full 5-slot trailing-updateRule envelope shape.
     # Catches the "dispatcher catches the click rejection but forgets to thread
     # the dedicated slots into the return shape" class -- callers cannot detect
     # the not-live state without log-grep otherwise.
-    all_findings.extend(check_trailing_updaterule_envelope_parity())
+    check_trailing_updaterule_envelope_parity,
 
     # Enforce the gateway read/write-split invariant: a read-only tool must be
     # reachable from a hub_read_* gateway or be flat -- NEVER stranded behind only
     # a hub_manage_* gateway (AGENTS.md "Gateway read/write split"). Catches the
     # "a read got added to a manage gateway but never surfaced on the read side"
     # class, which mislabels the read as a write and hides it from the read path.
-    all_findings.extend(check_read_write_split())
+    check_read_write_split,
 
     # Issue #209/#250 lockstep: every #include'd library must have a libraries/ file + a
     # build-bundle.py LIBS entry, so a broken/undelivered library fails CI here instead of
     # failing the app's compile on a user's hub.
-    all_findings.extend(check_include_library_lockstep())
+    check_include_library_lockstep,
+
+    # Estimated per-method bytecode and string-constant sizes against the JVM's 64KB caps
+    # (see "Compile budget"); warnings only.
+    check_compile_budget,
 
     # BP20: no file-scope block comments in #include libraries (hub-parser hazard).
-    all_findings.extend(check_library_no_file_scope_block_comments())
+    check_library_no_file_scope_block_comments,
 
     # The conformance leg's referee is the vendored MCP JSON Schemas; make the byte hashes
     # their README records ENFORCED, so a loosened or half-refreshed schema fails here
     # instead of quietly weakening every McpWireSchemaConformanceSpec verdict.
-    all_findings.extend(check_vendored_mcp_schema_hashes())
+    check_vendored_mcp_schema_hashes,
+]
+
+
+# ---------------------------------------------------------------------------
+# Language server (--lsp)
+# ---------------------------------------------------------------------------
+#
+# A stdio Language Server Protocol endpoint, so editors surface SANDBOX-xxx findings while
+# the code is being typed instead of at commit time. It keeps every open buffer in memory
+# as an IncrementalScan: an edit re-strips and re-matches only the lines it touched, plus
+# the lines after them whose tokenizer state (inside a block comment or triple-quoted
+# string) the edit changed, and republishes that document's diagnostics at once. The
+# cross-file checks (CROSS_FILE_CHECKS: tool counts, include lockstep, ...) take seconds
+# and depend on every file, so they run on a background thread against a snapshot of the
+# open buffers, only once the edits have been quiet for --lsp-debounce seconds.
+#
+# Only what the lint needs of the protocol is implemented: incremental text sync,
+# publishDiagnostics, shutdown/exit. Messages are handled on one thread, in arrival order.
+
+LSP_DEBOUNCE_DEFAULT = 1.0  # seconds of quiet before the cross-file checks rerun
+_LSP_SEVERITY = {"error": 1, "warning": 2, "info": 3}
+_LSP_METHOD_NOT_FOUND = -32601
+
+
+class IncrementalScan:
+    """scan_source for one open document, kept per line so an edit relints only what it touched.
 
-    # Sort by file, then line
-    all_findings.sort(key=lambda f: (f["file"], f["line"]))
+    Per line it records the source text, the stripped text, the tokenizer state the line
+    STARTS in (_CODE / _BLOCK / a triple quote), the block-comment mask flag and the
+    `inside` state it starts in, the brace/loop scope state it starts in (for the `scope`
+    rules), and the rules that hit it. `findings()` equals
+    scan_source over the full text at every point -- the tests pin that across edits.
+    """
+
+    def __init__(self, text: str, display_path: str):
+        self.display_path = display_path
+        self.reset(text)
+
+    def reset(self, text: str) -> int:
+        """Replace the whole text; returns the number of lines relinted."""
+        self.lines = text.split("\n")
+        n = len(self.lines)
+        self.stripped: list[str | None] = [None] * n
+        self.states: list[str | None] = [_CODE] + [None] * (n - 1)
+        self.inside: list[bool | None] = [False] + [None] * (n - 1)
+        self.scopes: list[tuple | None] = [_SCOPE_START] + [None] * (n - 1)
+        self.masked: list[bool | None] = [None] * n
+        self.hits: list[list[dict]] = [[] for _ in range(n)]
+        return self._relint(0, n)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def edit(self, start: tuple[int, int], end: tuple[int, int], new_text: str) -> int:
+        """Replace the text between two (line, column) positions (0-based, columns in code
+        points); returns the number of lines relinted."""
+        (start_line, start_col), (end_line, end_col) = start, end
+        last = len(self.lines) - 1
+        if start_line > last:
+            start_line, start_col = last, len(self.lines[last])
+        if end_line > last:
+            end_line, end_col = last, len(self.lines[last])
+        new_lines = (
+            self.lines[start_line][:start_col] + new_text + self.lines[end_line][end_col:]
+        ).split("\n")
+        span = slice(start_line, end_line + 1)
+        fresh = len(new_lines)
+        self.lines[span] = new_lines
+        self.stripped[span] = [None] * fresh
+        self.masked[span] = [None] * fresh
+        self.hits[span] = [[] for _ in range(fresh)]
+        # Line start_line keeps the state it starts in; the lines after it inside the edit
+        # get theirs from the relint. Lines past the edit keep their OLD start state, which
+        # is what the relint compares against to know when it has converged.
+        self.states[start_line + 1:end_line + 1] = [None] * (fresh - 1)
+        self.inside[start_line + 1:end_line + 1] = [None] * (fresh - 1)
+        self.scopes[start_line + 1:end_line + 1] = [None] * (fresh - 1)
+        return self._relint(start_line, start_line + fresh)
+
+    def _relint(self, first: int, until: int) -> int:
+        """Relint from line `first`: at least up to `until`, then on until a line starts in
+        the state it started in before (everything after it is unchanged)."""
+        engine = _rule_engine()
+        state, inside, scope_state = self.states[first], self.inside[first], self.scopes[first]
+        n = len(self.lines)
+        i = first
+        while i < n:
+            line = self.lines[i]
+            stripped, next_state = _strip_line(line, state, True)
+            masked, next_inside = _block_mask_step(line, inside)
+            scope, next_scope = (
+                engine.scope_step(stripped, scope_state) if engine.scoped else (None, scope_state)
+            )
+            self.stripped[i], self.masked[i] = stripped, masked
+            self.hits[i] = engine.match(stripped, line, masked, scope)
+            i += 1
+            if i == n:
+                break
+            if (i >= until and self.states[i] == next_state and self.inside[i] == next_inside
+                    and self.scopes[i] == next_scope):
+                break
+            self.states[i], self.inside[i], self.scopes[i] = state, inside, scope_state = (
+                next_state, next_inside, next_scope,
+            )
+        return i - first
+
+    def findings(self) -> list[dict]:
+        return [
+            _rule_finding(rule, self.display_path, i + 1, self.lines[i])
+            for i, rules in enumerate(self.hits) for rule in rules
+        ]
+
+
+def _utf16_to_index(line: str, units: int) -> int:
+    """Code-point index of an LSP `character` offset (UTF-16 code units) in `line`."""
+    if line.isascii():
+        return min(units, len(line))
+    count = 0
+    for i, ch in enumerate(line):
+        if count >= units:
+            return i
+        count += 2 if ord(ch) > 0xFFFF else 1
+    return len(line)
+
+
+def _utf16_len(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-16-le")) // 2
+
+
+def _read_lsp_message(stream) -> dict | None:
+    """One JSON-RPC message from a binary stream (Content-Length framing), or None at EOF."""
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.rstrip(b"\r\n")
+        if not line:
+            if length is None:
+                continue  # stray blank line between messages
+            break
+        name, _, value = line.decode("ascii", errors="replace").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+
+def _write_lsp_message(stream, message: dict) -> None:
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    stream.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    stream.flush()
+
+
+def _uri_to_path(uri: str) -> Path:
+    parsed = urllib.parse.urlparse(uri)
+    return Path(urllib.request.url2pathname(urllib.parse.unquote(parsed.path)))
+
+
+class _OpenDocument:
+    def __init__(self, uri: str, path: Path, display_path: str, text: str):
+        self.uri, self.path, self.display_path = uri, path, display_path
+        # Only Groovy buffers are sandbox-scanned; any other open file (a doc the count
+        # checks read) is tracked just for its text.
+        self.scan = IncrementalScan(text, display_path) if path.suffix == ".groovy" else None
+        self.lines = None if self.scan else text.split("\n")
+
+    @property
+    def text(self) -> str:
+        return self.scan.text if self.scan else "\n".join(self.lines)
+
+
+class LanguageServer:
+    """The --lsp server: JSON-RPC over a binary reader/writer pair (stdin/stdout)."""
+
+    def __init__(self, reader, writer, root: Path | None = None,
+                 debounce: float = LSP_DEBOUNCE_DEFAULT):
+        self.reader, self.writer = reader, writer
+        self.root = root if root is not None else REPO_ROOT
+        self.debounce = debounce
+        self.documents: dict[str, _OpenDocument] = {}
+        self.inbox: queue.Queue[tuple[str, object]] = queue.Queue()
+        self.cross_file: dict[str, list[dict]] = {}  # uri -> findings of the last pass
+        self.cross_file_due: float | None = None
+        self.cross_file_running = False
+        self.shutdown_requested = False
+        self.exit_code: int | None = None
+        self.handlers = {
+            "initialize": self._initialize,
+            "initialized": lambda params: self._schedule_cross_file(),
+            "shutdown": self._shutdown,
+            "exit": self._exit,
+            "textDocument/didOpen": self._did_open,
+            "textDocument/didChange": self._did_change,
+            "textDocument/didSave": lambda params: self._schedule_cross_file(),
+            "textDocument/didClose": self._did_close,
+            "workspace/didChangeWatchedFiles": lambda params: self._schedule_cross_file(),
+        }
+
+    def serve(self) -> int:
+        """Handle messages until `exit` (or EOF); returns the process exit code."""
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        while self.exit_code is None:
+            timeout = None
+            if self.cross_file_due is not None and not self.cross_file_running:
+                timeout = max(0.0, self.cross_file_due - time.monotonic())
+            try:
+                kind, payload = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                self._start_cross_file()
+                continue
+            if kind == "eof":
+                return 0 if self.shutdown_requested else 1
+            if kind == "cross_file":
+                self._finish_cross_file(payload)
+            else:
+                self.handle(payload)
+        return self.exit_code
+
+    def _read_loop(self) -> None:
+        while True:
+            message = _read_lsp_message(self.reader)
+            if message is None:
+                self.inbox.put(("eof", None))
+                return
+            self.inbox.put(("message", message))
+
+    def send(self, message: dict) -> None:
+        _write_lsp_message(self.writer, {"jsonrpc": "2.0", **message})
+
+    def handle(self, message: dict) -> None:
+        method = message.get("method")
+        handler = self.handlers.get(method)
+        if "id" not in message:
+            if handler is not None:
+                handler(message.get("params") or {})
+            return  # unknown notifications ($/cancelRequest, ...) are ignored
+        if handler is None:
+            self.send({"id": message["id"], "error": {
+                "code": _LSP_METHOD_NOT_FOUND, "message": f"unsupported method {method!r}"}})
+            return
+        self.send({"id": message["id"], "result": handler(message.get("params") or {})})
+
+    # -- lifecycle -----------------------------------------------------------------------
+
+    def _initialize(self, params: dict) -> dict:
+        return {
+            "capabilities": {
+                # 2 = incremental: didChange carries ranged edits, not the whole buffer.
+                "textDocumentSync": {"openClose": True, "change": 2, "save": {"includeText": False}},
+            },
+            "serverInfo": {"name": "sandbox-lint"},
+        }
+
+    def _shutdown(self, params: dict) -> None:
+        self.shutdown_requested = True
+        return None
+
+    def _exit(self, params: dict) -> None:
+        self.exit_code = 0 if self.shutdown_requested else 1
+
+    # -- documents -----------------------------------------------------------------------
+
+    def _display_path(self, path: Path) -> str:
+        try:
+            return str(path.resolve().relative_to(self.root.resolve())).replace("\\", "/")
+        except ValueError:
+            return path.name
+
+    def _did_open(self, params: dict) -> None:
+        item = params["textDocument"]
+        path = _uri_to_path(item["uri"])
+        self.documents[item["uri"]] = _OpenDocument(
+            item["uri"], path, self._display_path(path), item.get("text", ""))
+        self.publish(item["uri"])
+        self._schedule_cross_file()
+
+    def _did_change(self, params: dict) -> None:
+        doc = self.documents.get(params["textDocument"]["uri"])
+        if doc is None:
+            return
+        for change in params.get("contentChanges", []):
+            if "range" not in change:
+                if doc.scan:
+                    doc.scan.reset(change["text"])
+                else:
+                    doc.lines = change["text"].split("\n")
+                continue
+            lines = doc.scan.lines if doc.scan else doc.lines
+            start, end = (self._position(lines, change["range"][k]) for k in ("start", "end"))
+            if doc.scan:
+                doc.scan.edit(start, end, change["text"])
+            else:
+                text = lines[start[0]][:start[1]] + change["text"] + lines[end[0]][end[1]:]
+                lines[start[0]:end[0] + 1] = text.split("\n")
+        self.publish(doc.uri)
+        self._schedule_cross_file()
+
+    def _did_close(self, params: dict) -> None:
+        uri = params["textDocument"]["uri"]
+        if self.documents.pop(uri, None) is not None:
+            self.publish(uri)  # drops the buffer's sandbox findings, keeps cross-file ones
+            self._schedule_cross_file()  # the file now reads from disk again
+
+    @staticmethod
+    def _position(lines: list[str], position: dict) -> tuple[int, int]:
+        line = min(position["line"], len(lines) - 1)
+        return line, _utf16_to_index(lines[line], position["character"])
+
+    # -- diagnostics ---------------------------------------------------------------------
+
+    def publish(self, uri: str) -> None:
+        doc = self.documents.get(uri)
+        findings = list(doc.scan.findings()) if doc and doc.scan else []
+        findings += self.cross_file.get(uri, [])
+        lines = (doc.scan.lines if doc.scan else doc.lines) if doc else None
+        self.send({"method": "textDocument/publishDiagnostics", "params": {
+            "uri": uri, "diagnostics": [self._diagnostic(f, lines) for f in findings],
+        }})
+
+    @staticmethod
+    def _diagnostic(finding: dict, lines: list[str] | None) -> dict:
+        line = max(finding["line"] - 1, 0)  # line 0 = a file-level finding
+        width = _utf16_len(lines[line]) if lines and line < len(lines) else 0
+        return {
+            "range": {"start": {"line": line, "character": 0},
+                      "end": {"line": line, "character": width}},
+            "severity": _LSP_SEVERITY.get(finding["severity"], 3),
+            "code": finding["rule"],
+            "source": "sandbox-lint",
+            "message": (
+                f"{finding['message']}\n{finding['suggestion']}" if finding.get("suggestion")
+                else finding["message"]
+            ),
+        }
+
+    # -- debounced cross-file checks -----------------------------------------------------
+
+    def _schedule_cross_file(self) -> None:
+        self.cross_file_due = time.monotonic() + self.debounce
+
+    def _start_cross_file(self) -> None:
+        self.cross_file_due = None
+        self.cross_file_running = True
+        overlays = {doc.path: doc.text for doc in self.documents.values()}
+        threading.Thread(target=self._cross_file_worker, args=(overlays,), daemon=True).start()
+
+    def _cross_file_worker(self, overlays: dict) -> None:
+        """Run CROSS_FILE_CHECKS against a snapshot of the open buffers (off the message
+        thread: a keystroke's diagnostics never wait on them) and post the result back."""
+        corpus = LintCorpus(root=self.root, overlays=overlays)
+        findings: list[dict] = []
+        for check in CROSS_FILE_CHECKS:
+            try:
+                findings.extend(check(corpus=corpus))
+            except Exception as exc:  # one broken check must not take the server down
+                findings.append({
+                    "file": "", "line": 0, "rule": check.__name__, "severity": "warning",
+                    "message": f"{check.__name__} crashed: {exc!r}", "source": "",
+                })
+        self.inbox.put(("cross_file", findings))
+
+    def _finish_cross_file(self, findings: list[dict]) -> None:
+        self.cross_file_running = False
+        by_uri: dict[str, list[dict]] = {}
+        for f in findings:
+            if not f["file"]:
+                continue  # nowhere to anchor it in an editor
+            path = Path(f["file"])
+            by_uri.setdefault((path if path.is_absolute() else self.root / path).as_uri(), []).append(f)
+        stale = set(self.cross_file) - set(by_uri)
+        self.cross_file = by_uri
+        for uri in sorted(stale | set(by_uri)):
+            self.publish(uri)
+
+
+def run_language_server(debounce: float = LSP_DEBOUNCE_DEFAULT) -> int:
+    # A private reader over fd 0, not sys.stdin.buffer: the reader thread may still be blocked
+    # in it at exit, and interpreter shutdown would then deadlock on sys.stdin's buffer lock.
+    reader = open(sys.stdin.fileno(), "rb", closefd=False)
+    return LanguageServer(reader, sys.stdout.buffer, debounce=debounce).serve()
 
-    # Output
-    errors = [f for f in all_findings if f["severity"] == "error"]
-    warnings = [f for f in all_findings if f["severity"] == "warning"]
 
-    if all_findings:
-        for f in all_findings:
-            print(format_finding(f))
+def _default_jobs() -> int:
+    """Worker processes for the per-file scan: every core in CI, where the lint is on the
+    critical path of each PR; serial locally, where the pre-commit hook shares the machine."""
+    return (os.cpu_count() or 1) if IS_CI else 1
+
+
+def _positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be >= 1, got {n}")
+    return n
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="sandbox_lint.py",
+        description="Hubitat Groovy sandbox linter + cross-file doc/catalog consistency checks.",
+    )
+    parser.add_argument("--self-test", action="store_true",
+                        help="run the must-catch / must-not-catch fixture suites")
+    parser.add_argument("--lsp", action="store_true",
+                        help="serve diagnostics to an editor as a stdio Language Server")
+    parser.add_argument("--lsp-debounce", type=float, default=LSP_DEBOUNCE_DEFAULT, metavar="SECONDS",
+                        help="quiet time after an edit before --lsp reruns the cross-file checks "
+                             f"(default {LSP_DEBOUNCE_DEFAULT})")
+    parser.add_argument("--jobs", type=_positive_int, default=None, metavar="N",
+                        help="scan Groovy files / run self-test suites on N worker processes "
+                             "(default: core count in CI, else 1)")
+    parser.add_argument("--changed-since", metavar="REF",
+                        help="sandbox-scan only Groovy files changed relative to git REF "
+                             "(cross-file checks still run in full)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write the per-file scan cache")
+    parser.add_argument("--sarif", metavar="FILE",
+                        help="also write the findings as a SARIF 2.1.0 log to FILE ('-': stdout, "
+                             "replacing the text output) for code-scanning upload")
+    parser.add_argument("--jsonl", metavar="FILE",
+                        help="also write one JSON object per finding to FILE ('-': stdout, "
+                             "replacing the text output)")
+    parser.add_argument("--compile-budget", action="store_true",
+                        help="print the per-file compile-budget table (methods, largest method, "
+                             "string bytes, #include fan-in) instead of linting")
+    parser.add_argument("--max-findings", type=_positive_int, default=None, metavar="N",
+                        help="stop after N error findings without running the remaining scans "
+                             "(warnings and info do not count)")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_PATH, type=Path, metavar="FILE",
+                        help="time every check, self-test suite and rule; write the JSON report "
+                             f"to FILE (default {PROFILE_PATH.relative_to(REPO_ROOT)}) and print "
+                             "the slowest entries (implies --jobs 1 --no-cache)")
+    parser.add_argument("--profile-top", type=_positive_int, default=PROFILE_TOP_DEFAULT, metavar="N",
+                        help=f"rows in the --profile table (default {PROFILE_TOP_DEFAULT})")
+    args = parser.parse_args(argv)
+    if args.sarif == args.jsonl == "-":
+        parser.error("--sarif and --jsonl cannot both write to stdout")
+    if args.jobs is None:
+        args.jobs = _default_jobs()
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    if args.lsp:
+        return run_language_server(args.lsp_debounce)
+    if args.profile is None:
+        return _run(args, None)
+    global _PROFILE
+    profile = _PROFILE = LintProfile()
+    try:
+        status = _run(args, profile)
+    finally:
+        _PROFILE = None
+    profile.print_top(args.profile_top)
+    profile.write(args.profile)
+    print(f"profile: wrote {args.profile}")
+    return status
+
+
+def _run(args: argparse.Namespace, profile: LintProfile | None) -> int:
+    if args.self_test:
+        return run_self_test(profile, jobs=1 if profile else args.jobs)
+    if args.compile_budget:
+        print(format_compile_budget(compile_budgets()))
+        return 0
+
+    # Machine-readable output on stdout owns it; the progress notes then go to stderr.
+    log = sys.stderr if "-" in (args.sarif, args.jsonl) else sys.stdout
+    # One read-once corpus for every check below: each file is read (and the app+libraries
+    # concatenated, stripped, masked) at most once per run, however many checks consume it.
+    corpus = LintCorpus()
+
+    # Scan groovy files
+    present = []
+    for gf in GROOVY_FILES:
+        if corpus.exists(gf):
+            present.append(gf)
+        else:
+            print(f"WARNING: Expected file not found: {gf}", file=log)
+    if args.changed_since:
+        changed = _changed_files_since(args.changed_since, corpus.root)
+        if changed is None:
+            print(f"WARNING: git could not diff against {args.changed_since!r}; scanning every Groovy file", file=log)
+        else:
+            n_present = len(present)
+            present = [gf for gf in present if gf.resolve() in changed]
+            print(f"--changed-since {args.changed_since}: scanning {len(present)} of {n_present} Groovy file(s)", file=log)
+    # Profiling scans every file in this process: cached or pooled files would report no
+    # per-rule numbers.
+    cache = None if args.no_cache or profile else ScanCache(SCAN_CACHE_PATH)
+    jobs = 1 if profile else args.jobs
+
+    with contextlib.ExitStack() as stack:
+        emitters: list = []
+        if "-" not in (args.sarif, args.jsonl):
+            emitters.append(TextEmitter(sys.stdout))
             if IS_CI:
-                print(format_annotation(f))
-            print()
-    else:
-        print("Sandbox lint: all checks passed.")
+                emitters.append(AnnotationEmitter(sys.stdout))
+        for path, emitter_class in ((args.sarif, SarifEmitter), (args.jsonl, JsonlEmitter)):
+            if path is None:
+                continue
+            if path == "-":
+                emitters.append(emitter_class(sys.stdout))
+            else:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                emitters.append(emitter_class(stack.enter_context(Path(path).open("w", encoding="utf-8"))))
+        counts = emit_findings(
+            _iter_findings(profile, corpus, present, jobs, cache), emitters, args.max_findings,
+        )
 
-    # Summary
-    print(f"--- {len(errors)} error(s), {len(warnings)} warning(s) ---")
+    # An early stop only ever follows N errors, so the error count alone sets the status.
+    return 1 if counts.errors else 0
 
-    return 1 if errors else 0
+
+def _iter_findings(profile: LintProfile | None, corpus: LintCorpus, files: list[Path],
+                   jobs: int, cache: "ScanCache | None"):
+    """Every finding of a lint run, in emit order: the per-file scans (streamed file by file
+    unless profiling, which times scan_files as one check), then each cross-file check."""
+    try:
+        if profile is None:
+            yield from iter_scan_files(files, corpus, jobs=jobs, cache=cache)
+        else:
+            yield from _run_check(profile, scan_files, files=files, corpus=corpus, jobs=jobs, cache=cache)
+    finally:
+        # Entries for the files that were scanned are kept even when the run stops early.
+        if cache is not None:
+            cache.save()
+
+    # The cross-file checks always run in full.
+    for check in CROSS_FILE_CHECKS:
+        yield from sorted(_run_check(profile, check, corpus=corpus), key=_finding_order)
 
 
 if __name__ == "__main__":
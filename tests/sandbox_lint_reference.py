@@ -0,0 +1,235 @@
+"""The original character-walking comment/string stripper that sandbox_lint's regex
+tokenizer replaced, kept only as its test oracle.
+
+strip_comments_and_strings(source, multiline_strings=False) must reproduce
+strip_comments_and_strings_reference(source) byte for byte; test_sandbox_lint.py
+asserts it on every Groovy file and self-test source, and bench_sandbox_lint.py
+times the two against each other. Nothing in the lint itself imports this module.
+"""
+
+import re
+
+_BARE_GSTRING_IDENT_START = re.compile(r"[A-Za-z_]")
+_BARE_GSTRING_IDENT_CHAR = re.compile(r"[A-Za-z0-9_]")
+
+
+def _consume_bare_gstring_var(text: str, start: int) -> tuple[str, int]:
+    """Consume a bare `$identifier[.identifier]*` GString reference.
+
+    Assumes `text[start] == '$'` and `text[start + 1]` is an identifier
+    start character. Returns (preserved_text, index_past_end). The leading
+    `$` is blanked (we only care about what follows for rule matching) but
+    the identifier chain is preserved verbatim so rules like SANDBOX-001
+    can match `$foo.getClass` (a legal bare-form Groovy property access
+    that triggers the no-arg method at runtime).
+    """
+    n = len(text)
+    out = [" "]  # blank the $
+    k = start + 1
+    # First identifier
+    while k < n and _BARE_GSTRING_IDENT_CHAR.match(text[k]):
+        out.append(text[k])
+        k += 1
+    # Subsequent .identifier segments
+    while (
+        k + 1 < n
+        and text[k] == "."
+        and _BARE_GSTRING_IDENT_START.match(text[k + 1])
+    ):
+        out.append(".")
+        k += 1
+        while k < n and _BARE_GSTRING_IDENT_CHAR.match(text[k]):
+            out.append(text[k])
+            k += 1
+    return "".join(out), k
+
+
+def _consume_gstring_interpolation(text: str, start: int) -> tuple[str, int]:
+    """Walk from `start` (index of `$` in `${`) to the matching `}`, returning
+    (preserved_text, index_past_close).
+
+    The body is preserved verbatim so downstream regex rules scan the Groovy
+    expression, except that nested string literals inside the body have their
+    contents blanked (so a `}` inside `"literal }"` doesn't close the
+    interpolation early, and a stray `getClass()` inside a nested literal
+    doesn't trigger a false positive).
+
+    Assumes `text[start] == '$'` and `text[start+1] == '{'`.
+    """
+    out = ["  "]  # ${
+    depth = 1
+    k = start + 2
+    n = len(text)
+    while k < n and depth > 0:
+        ch = text[k]
+        if ch == "{":
+            depth += 1
+            out.append(ch)
+            k += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                out.append(" ")  # closing }
+                k += 1
+                break
+            out.append(ch)
+            k += 1
+        elif ch == '"' or ch == "'":
+            # Nested string literal inside the interpolation body. Skip past
+            # its contents (respecting escapes) so embedded `}` characters
+            # don't decrement our depth counter and stray sandbox-forbidden
+            # names inside literal text don't trigger false positives.
+            out.append(" ")
+            k += 1
+            while k < n:
+                if text[k] == "\\" and k + 1 < n:
+                    out.append("  ")
+                    k += 2
+                elif text[k] == ch:
+                    out.append(" ")
+                    k += 1
+                    break
+                else:
+                    out.append(" ")
+                    k += 1
+        elif ch == "\\" and k + 1 < n:
+            out.append(str(text[k]) + str(text[k + 1]))
+            k += 2
+        else:
+            out.append(ch)
+            k += 1
+    return "".join(out), k
+
+
+def strip_comments_and_strings_reference(source: str) -> list[str]:
+    """Strip comments and blank string literals, one line at a time (an unclosed
+    triple quote blanks the rest of its line; nothing carries over)."""
+    lines = source.split("\n")
+    result: list[str] = []
+    in_block_comment = False
+
+    for line in lines:
+        if in_block_comment:
+            end = line.find("*/")
+            if end != -1:
+                in_block_comment = False
+                # Keep content after the block comment close
+                line = " " * (end + 2) + line[end + 2 :]
+            else:
+                result.append("")
+                continue
+
+        # Process the line character by character
+        cleaned = []
+        i = 0
+        while i < len(line):
+            # Block comment start
+            if line[i : i + 2] == "/*":
+                end = line.find("*/", i + 2)
+                if end != -1:
+                    cleaned.append(" " * (end + 2 - i))
+                    i = end + 2
+                else:
+                    in_block_comment = True
+                    break
+            # Line comment
+            elif line[i : i + 2] == "//":
+                break
+            # Triple-double-quoted GString (may contain ${...})
+            elif line[i : i + 3] == '"""':
+                end = line.find('"""', i + 3)
+                if end != -1:
+                    cleaned.append("   ")
+                    cleaned.append(_scrub_gstring_body(line[i + 3 : end]))
+                    cleaned.append("   ")
+                    i = end + 3
+                else:
+                    # Multi-line triple-quoted body — rare; fall back to blanks
+                    cleaned.append(" " * (len(line) - i))
+                    i = len(line)
+            # Triple-single-quoted (plain string, no interpolation)
+            elif line[i : i + 3] == "'''":
+                end = line.find("'''", i + 3)
+                if end != -1:
+                    cleaned.append(" " * (end + 3 - i))
+                    i = end + 3
+                else:
+                    cleaned.append(" " * (len(line) - i))
+                    i = len(line)
+            # Double-quoted GString — preserve ${...} bodies, blank literal text
+            elif line[i] == '"':
+                cleaned.append(" ")  # opening quote
+                j = i + 1
+                while j < len(line):
+                    if line[j] == "\\" and j + 1 < len(line):
+                        cleaned.append("  ")
+                        j += 2
+                    elif line[j] == '"':
+                        cleaned.append(" ")
+                        j += 1
+                        break
+                    elif line[j] == "$" and j + 1 < len(line) and line[j + 1] == "{":
+                        body, j = _consume_gstring_interpolation(line, j)
+                        cleaned.append(body)
+                    elif (
+                        line[j] == "$"
+                        and j + 1 < len(line)
+                        and _BARE_GSTRING_IDENT_START.match(line[j + 1])
+                    ):
+                        body, j = _consume_bare_gstring_var(line, j)
+                        cleaned.append(body)
+                    else:
+                        cleaned.append(" ")
+                        j += 1
+                i = j
+            # Single-quoted string — plain string in Groovy, no interpolation
+            elif line[i] == "'":
+                cleaned.append(" ")
+                j = i + 1
+                while j < len(line):
+                    if line[j] == "\\" and j + 1 < len(line):
+                        cleaned.append("  ")
+                        j += 2
+                    elif line[j] == "'":
+                        cleaned.append(" ")
+                        j += 1
+                        break
+                    else:
+                        cleaned.append(" ")
+                        j += 1
+                i = j
+            else:
+                cleaned.append(line[i])
+                i += 1
+
+        result.append("".join(cleaned))
+
+    return result
+
+
+def _scrub_gstring_body(body: str) -> str:
+    """Blank literal text in a triple-double-quoted GString body while
+    preserving ${...} interpolations and bare `$identifier[.prop...]`
+    references. Shares nested-string-aware brace handling with the
+    single-line GString walker via _consume_gstring_interpolation."""
+    out = []
+    i = 0
+    n = len(body)
+    while i < n:
+        if body[i] == "\\" and i + 1 < n:
+            out.append("  ")
+            i += 2
+        elif body[i] == "$" and i + 1 < n and body[i + 1] == "{":
+            preserved, i = _consume_gstring_interpolation(body, i)
+            out.append(preserved)
+        elif (
+            body[i] == "$"
+            and i + 1 < n
+            and _BARE_GSTRING_IDENT_START.match(body[i + 1])
+        ):
+            preserved, i = _consume_bare_gstring_var(body, i)
+            out.append(preserved)
+        else:
+            out.append(" ")
+            i += 1
+    return "".join(out)
@@ -0,0 +1,434 @@
+"""pytest unit tests for tools/build-bundle.py's incremental build.
+
+The builder runs against a scratch repo of three tiny libraries; every incremental
+result is held byte-for-byte to a from-scratch ZipFile.writestr build of the same
+sources (the pre-manifest builder), which is what keeps the e2e cmp check honest.
+"""
+
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import zipfile
+from pathlib import Path
+
+import pytest
+
+_SPEC = importlib.util.spec_from_file_location(
+    "build_bundle", Path(__file__).resolve().parent.parent / "tools" / "build-bundle.py")
+bb = importlib.util.module_from_spec(_SPEC)
+_SPEC.loader.exec_module(bb)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    lib_dir = tmp_path / "libraries"
+    lib_dir.mkdir()
+    libs = []
+    for name in ("Alpha", "Beta", "Gamma"):
+        source = lib_dir / f"mcp-{name.lower()}-lib.groovy"
+        source.write_text(f"library(name: \"Mcp{name}Lib\")\r\n" + f"def {name.lower()}() {{ 1 }}\n" * 50)
+        libs.append({"source": source, "dest": f"mcp.Mcp{name}Lib.groovy"})
+    monkeypatch.setattr(bb, "REPO_ROOT", tmp_path)
+    monkeypatch.setattr(bb, "LIB_DIR", lib_dir)
+    monkeypatch.setattr(bb, "LIBS", libs)
+    monkeypatch.setattr(bb, "OUTPUT_DIR", tmp_path / "bundles")
+    monkeypatch.setattr(bb, "OUTPUT_ZIP", tmp_path / "bundles" / "mcp-libraries.zip")
+    monkeypatch.setattr(bb, "MANIFEST_JSON", tmp_path / "bundles" / "mcp-libraries.manifest.json")
+    monkeypatch.setattr(bb, "LINE_MAP_JSON", tmp_path / "bundles" / "mcp-libraries.linemap.json")
+    return libs
+
+
+def _reference_zip() -> bytes:
+    """A from-scratch build through ZipFile.writestr, as the builder did before the manifest."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zf:
+        for name, _, data in bb._entries():
+            info = zipfile.ZipInfo(filename=name, date_time=bb._FIXED_DT)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            info.create_system = 3
+            zf.writestr(info, data, compresslevel=bb._DEFLATE_LEVEL)
+    return out.getvalue()
+
+
+def test_fresh_build_matches_writestr_and_records_every_entry(repo):
+    result = bb.build()
+    bb.verify(result)
+    assert bb.OUTPUT_ZIP.read_bytes() == _reference_zip()
+    record = json.loads(bb.MANIFEST_JSON.read_text())
+    assert record == result.record
+    assert [e["name"] for e in record["entries"]] == [
+        "mcp.McpAlphaLib.groovy", "mcp.McpBetaLib.groovy", "mcp.McpGammaLib.groovy",
+        "install.txt", "update.txt"]
+    assert record["entries"][0]["source"] == "libraries/mcp-alpha-lib.groovy"
+    # update.txt is install.txt's bytes, so its stream is shared within the build.
+    assert result.deflated == [e["name"] for e in record["entries"][:4]]
+
+
+def test_zip_writer_round_trips_through_zipfile():
+    """_ZipWriter's records read back through zipfile (testzip inflates and CRC-checks every
+    entry), and a non-ASCII name carries the UTF-8 flag."""
+    entries = [("a.groovy", b"def a() { 1 }\n" * 20), ("d\u00e9j\u00e0.txt", b"caf\xc3\xa9"), ("empty", b"")]
+    out = io.BytesIO()
+    writer = bb._ZipWriter(out)
+    for name, data in entries:
+        writer.add(name, data, bb._deflate(data))
+    writer.close()
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert [(i.filename, zf.read(i)) for i in zf.infolist()] == entries
+        assert [i.flag_bits for i in zf.infolist()] == [0, bb._ZIP_UTF8, 0]
+
+
+def test_unchanged_rebuild_is_a_no_op(repo):
+    bb.build()
+    before = bb.OUTPUT_ZIP.stat().st_mtime_ns, bb.MANIFEST_JSON.stat().st_mtime_ns
+    result = bb.build()
+    bb.verify(result)
+    assert result.unchanged and result.deflated == []
+    assert (bb.OUTPUT_ZIP.stat().st_mtime_ns, bb.MANIFEST_JSON.stat().st_mtime_ns) == before
+
+
+def test_one_changed_library_deflates_only_that_entry(repo):
+    bb.build()
+    repo[1]["source"].write_text(repo[1]["source"].read_text() + "def extra() { 2 }\n")
+    result = bb.build()
+    bb.verify(result)
+    assert result.deflated == ["mcp.McpBetaLib.groovy"] and not result.unchanged
+    assert bb.OUTPUT_ZIP.read_bytes() == _reference_zip()
+
+
+def test_reordered_libraries_reuse_streams_by_content(repo, monkeypatch):
+    bb.build()
+    monkeypatch.setattr(bb, "LIBS", [repo[2], repo[0], repo[1]])
+    result = bb.build()
+    # install.txt lists the libraries, so only it (and its copy) changed.
+    assert result.deflated == ["install.txt"]
+    assert bb.OUTPUT_ZIP.read_bytes() == _reference_zip()
+
+
+def test_zip_edited_behind_the_manifest_is_rebuilt_without_its_streams(repo):
+    bb.build()
+    record = json.loads(bb.MANIFEST_JSON.read_text())
+    data = bytearray(bb.OUTPUT_ZIP.read_bytes())
+    alpha = zipfile.ZipFile(bb.OUTPUT_ZIP).getinfo("mcp.McpAlphaLib.groovy")
+    data[alpha.header_offset + 30 + len(alpha.filename) + 5] ^= 0xFF
+    bb.OUTPUT_ZIP.write_bytes(bytes(data))
+    result = bb.build()
+    assert result.deflated == ["mcp.McpAlphaLib.groovy"]
+    assert bb.OUTPUT_ZIP.read_bytes() == _reference_zip()
+    assert result.record == record
+
+
+def test_manifest_from_another_zlib_or_force_deflates_everything(repo):
+    bb.build()
+    record = json.loads(bb.MANIFEST_JSON.read_text())
+    record["zlib"] = "0.0.0"
+    bb.MANIFEST_JSON.write_text(json.dumps(record))
+    assert len(bb.build().deflated) == 4
+    assert len(bb.build(force=True).deflated) == 4
+    assert bb.OUTPUT_ZIP.read_bytes() == _reference_zip()
+
+
+def test_parallel_deflate_is_byte_identical_to_serial(repo):
+    bb.build(force=True, jobs=1)
+    serial = bb.OUTPUT_ZIP.read_bytes(), bb.MANIFEST_JSON.read_bytes()
+    for jobs in (None, 2, 8):
+        result = bb.build(force=True, jobs=jobs)
+        assert (bb.OUTPUT_ZIP.read_bytes(), bb.MANIFEST_JSON.read_bytes()) == serial
+        # Reported in LIBS order, not completion order.
+        assert result.deflated == [e["name"] for e in result.record["entries"][:4]]
+    assert serial[0] == _reference_zip()
+
+
+@pytest.mark.parametrize("jobs", ["0", "-2", "two"])
+def test_jobs_must_be_a_positive_integer(jobs, capsys):
+    with pytest.raises(SystemExit):
+        bb._parse_args(["--jobs", jobs])
+    assert "--jobs" in capsys.readouterr().err
+
+
+def test_default_jobs_is_one_thread_per_cpu(monkeypatch):
+    workers = []
+
+    class Pool(bb.ThreadPoolExecutor):
+        def __init__(self, max_workers=None):
+            workers.append(max_workers)
+            super().__init__(max_workers=max_workers)
+
+    monkeypatch.setattr(bb, "ThreadPoolExecutor", Pool)
+    monkeypatch.setattr(bb.os, "cpu_count", lambda: 3)
+    blobs = {"a": b"a" * 100, "b": b"b" * 10}
+    assert bb._deflate_all(blobs, None) == {d: bb._deflate(data) for d, data in blobs.items()}
+    assert workers == [3]
+
+
+def test_verify_rejects_an_entry_the_manifest_does_not_record(repo):
+    result = bb.build()
+    result.record["entries"][0]["compress_size"] += 1
+    with pytest.raises(RuntimeError, match=r"mcp\.McpAlphaLib\.groovy: stored CRC"):
+        bb.verify(result)
+
+
+def _patched(offset_of, mutate):
+    """The built zip with one byte flipped at offset_of(zip bytes, Beta's ZipInfo)."""
+    data = bytearray(bb.OUTPUT_ZIP.read_bytes())
+    beta = zipfile.ZipFile(bb.OUTPUT_ZIP).getinfo("mcp.McpBetaLib.groovy")
+    data[offset_of(data, beta)] = mutate(data[offset_of(data, beta)])
+    return bytes(data)
+
+
+def test_verify_catches_a_zip_that_drifted_from_the_manifest(repo):
+    result = bb.build()
+    # The zip itself no longer matches the digest the manifest recorded.
+    bb.OUTPUT_ZIP.write_bytes(_patched(lambda d, i: i.header_offset + 30 + len(i.filename) + 5,
+                                       lambda b: b ^ 0xFF))
+    with pytest.raises(RuntimeError, match="is not the zip"):
+        bb.verify(result)
+    # ... and with the zip digest re-recorded, the stream digest still gives it away.
+    result.record["zip"]["sha256"] = bb._sha256(bb.OUTPUT_ZIP.read_bytes())
+    with pytest.raises(RuntimeError, match=r"McpBetaLib\.groovy: stored stream digest"):
+        bb.verify(result)
+
+
+@pytest.mark.parametrize("offset", [14, 30 + 4])  # the CRC's low byte; a filename byte
+def test_verify_catches_a_local_header_disagreeing_with_the_central_directory(repo, offset):
+    result = bb.build()
+    bb.OUTPUT_ZIP.write_bytes(_patched(lambda d, i: i.header_offset + offset, lambda b: b ^ 0x01))
+    result.record["zip"]["sha256"] = bb._sha256(bb.OUTPUT_ZIP.read_bytes())
+    with pytest.raises(RuntimeError, match="or its local header"):
+        bb.verify(result)
+
+
+def test_paranoid_verify_re_deflates(repo, monkeypatch):
+    result = bb.build()
+    bb.verify(result, paranoid=True)
+    # A stream that inflates correctly but is not this level's deflate passes the cheap checks.
+    monkeypatch.setattr(bb, "_DEFLATE_LEVEL", 1)
+    bb.verify(result)
+    with pytest.raises(RuntimeError, match="does not reproduce the stored stream"):
+        bb.verify(result, paranoid=True)
+
+
+def test_adopt_takes_a_published_artifact_without_deflating(repo, tmp_path, monkeypatch):
+    bb.build()
+    artifact = tmp_path / "artifact"
+    artifact.mkdir()
+    for path in (bb.OUTPUT_ZIP, bb.MANIFEST_JSON):
+        (artifact / path.name).write_bytes(path.read_bytes())
+    published = bb.OUTPUT_ZIP.read_bytes()
+    bb.OUTPUT_ZIP.unlink()
+    bb.MANIFEST_JSON.unlink()
+    monkeypatch.setattr(bb, "_deflate", None)  # adopting must never compress
+    result = bb.adopt(artifact / bb.OUTPUT_ZIP.name)
+    assert result.unchanged and result.deflated == []
+    assert bb.OUTPUT_ZIP.read_bytes() == published
+    assert json.loads(bb.MANIFEST_JSON.read_text()) == result.record
+
+
+def test_adopt_refuses_an_artifact_of_other_sources(repo, tmp_path, capsys):
+    bb.build()
+    artifact = tmp_path / "artifact"
+    artifact.mkdir()
+    for path in (bb.OUTPUT_ZIP, bb.MANIFEST_JSON):
+        (artifact / path.name).write_bytes(path.read_bytes())
+    repo[0]["source"].write_text("library(name: \"McpAlphaLib\")\n")
+    with pytest.raises(RuntimeError, match="does not record this checkout's library sources"):
+        bb.adopt(artifact / bb.OUTPUT_ZIP.name)
+    (artifact / bb.MANIFEST_JSON.name).unlink()
+    assert bb.main(["--from", str(artifact / bb.OUTPUT_ZIP.name)]) == 1
+    assert "is not this checkout's bundle" in capsys.readouterr().err
+
+
+def test_main_reports_reuse(repo, capsys):
+    assert bb.main([]) == 0
+    assert "deflated 4 of 5 entries, reused 1" in capsys.readouterr().out
+    assert bb.main([]) == 0
+    assert "is current" in capsys.readouterr().out
+
+
+def _commit(root, when):
+    env = {**os.environ, "GIT_AUTHOR_DATE": f"{when} +0000", "GIT_COMMITTER_DATE": f"{when} +0000",
+           "GIT_AUTHOR_NAME": "t", "GIT_AUTHOR_EMAIL": "t@t", "GIT_COMMITTER_NAME": "t",
+           "GIT_COMMITTER_EMAIL": "t@t"}
+    subprocess.run(["git", "-C", str(root), "add", "libraries"], check=True, env=env)
+    subprocess.run(["git", "-C", str(root), "commit", "-qm", "libs"], check=True, env=env)
+
+
+def test_size_history_recomputes_each_library_commit(repo, tmp_path):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    _commit(tmp_path, 1_700_000_000)
+    first = bb.build().record["zip"]["size"]
+    repo[1]["source"].write_text(repo[1]["source"].read_text() + "def more() { 'x' }\n" * 40)
+    _commit(tmp_path, 1_700_000_000 + 10 * 86400)
+    second = bb.build().record["zip"]["size"]
+    history = bb.size_history(5)
+    assert [size for _, _, size in history] == [first, second]
+    assert [when for _, when, _ in history] == [1_700_000_000, 1_700_864_000]
+    assert bb.size_history(1) == history[1:]
+
+
+def test_projection_and_report():
+    day = 86400
+    history = [("a", 0, 1_000_000), ("b", 10 * day, 1_100_000), ("c", 20 * day, 1_200_000)]
+    assert bb.project(history) == (pytest.approx(10_000), 80)
+    assert bb.project(history[::-1][:1]) is None
+    assert bb.project([("a", 0, 5), ("b", day, 4)]) == (pytest.approx(-1), None)
+    record = {"zip": {"name": "z.zip", "size": 1_200_000}, "entries": [
+        {"name": "mcp.A.groovy", "source": "libraries/a.groovy", "size": 4_000_000,
+         "compress_size": 1_000_000},
+        {"name": "install.txt", "source": None, "size": 40, "compress_size": 30}]}
+    report = bb.format_report(record, 1_100_000, history)
+    assert "mcp.A.groovy" in report and "83.3%" in report
+    assert "headroom 800,000 bytes" in report and "OVER by 100,000 bytes" in report
+    assert "+10,000 bytes/day -- the cap is reached around 1970-04-11 (80 days" in report
+
+
+def test_report_gate(repo, capsys):
+    assert bb.main(["--report", "--history", "0"]) == 0
+    out = capsys.readouterr().out
+    assert "mcp.McpAlphaLib.groovy" in out and "Hub fetch cap 2,000,000 bytes" in out
+    # No git repo here: the history degrades to a note instead of failing the build.
+    assert bb.main(["--report", "--max-bytes", "100"]) == 1
+    captured = capsys.readouterr()
+    assert "History: unavailable" in captured.out and "over the 100-byte threshold" in captured.err
+
+
+def test_delta_bundle_carries_only_changed_libraries(repo, tmp_path, monkeypatch):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    _commit(tmp_path, 1_700_000_000)
+    full = bb.build()
+    assert bb.build_delta("HEAD", full) is None
+
+    repo[1]["source"].write_text(repo[1]["source"].read_text() + "def extra() { 2 }\n")
+    new_lib = {"source": tmp_path / "libraries" / "mcp-delta-lib.groovy", "dest": "mcp.McpDeltaLib.groovy"}
+    new_lib["source"].write_text('library(name: "McpDeltaLib")\n')
+    # Gamma leaves LIBS; its CRLF-only rewrite of Alpha is no change once normalized.
+    repo[0]["source"].write_bytes(repo[0]["source"].read_bytes().replace(b"\r\n", b"\n"))
+    monkeypatch.setattr(bb, "LIBS", [repo[0], repo[1], new_lib])
+    full = bb.build()
+    out_dir, delta = bb.build_delta("HEAD", full)
+
+    base = subprocess.run(["git", "-C", str(tmp_path), "rev-parse", "HEAD"], capture_output=True,
+                          text=True, check=True).stdout.strip()
+    assert out_dir == bb.OUTPUT_DIR / "delta" / base[:12]
+    assert delta.record["delta"] == {"ref": "HEAD", "base": base,
+                                     "dropped": ["libraries/mcp-gamma-lib.groovy"]}
+    with zipfile.ZipFile(out_dir / "mcp-libraries.zip") as zf:
+        assert zf.namelist() == ["mcp.McpBetaLib.groovy", "mcp.McpDeltaLib.groovy",
+                                 "install.txt", "update.txt"]
+        assert zf.read("update.txt") == zf.read("install.txt") == (
+            b"mcp\nmcp_libraries\nlibrary mcp.McpBetaLib.groovy\nlibrary mcp.McpDeltaLib.groovy\n")
+    # Library streams come from the full build; only the listing files are new.
+    assert delta.deflated == ["install.txt"]
+    full_streams = {e["name"]: e["deflated_sha256"] for e in full.record["entries"]}
+    assert all(e["deflated_sha256"] == full_streams[e["name"]] for e in delta.record["entries"][:2])
+
+
+def test_delta_package_manifest_repoints_only_the_bundle(repo, tmp_path):
+    package = {"version": "1.0.0", "apps": [{"location": "https://x/app.groovy"}],
+               "bundles": [{"name": "libs", "location": "https://x/branches/main/mcp-libraries.zip"}]}
+    (tmp_path / "packageManifest.json").write_text(json.dumps(package))
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    written = json.loads(bb.delta_package_manifest(out_dir, "https://x/deltas/abc/").read_text())
+    assert written["bundles"] == [{"name": "libs", "location": "https://x/deltas/abc/mcp-libraries.zip"}]
+    assert written["apps"] == package["apps"]
+    assert json.loads((tmp_path / "packageManifest.json").read_text()) == package
+    package["bundles"].append(dict(package["bundles"][0]))
+    (tmp_path / "packageManifest.json").write_text(json.dumps(package))
+    with pytest.raises(ValueError, match="declares 2 bundle"):
+        bb.delta_package_manifest(out_dir, "https://x")
+
+
+def test_main_delta_flags(repo, tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        bb.main(["--delta-url", "https://x"])
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    _commit(tmp_path, 1_700_000_000)
+    assert bb.main(["--delta-since", "no-such-ref"]) == 1
+    assert "does not name a commit" in capsys.readouterr().err
+    assert bb.main(["--delta-since", "HEAD"]) == 0
+    assert "No library changed since HEAD" in capsys.readouterr().out
+
+
+_COMMENTED = '''\
+/**
+ * Library docblock.
+ */
+library(name: "McpAlphaLib")
+
+// A section banner.
+def alpha() {
+    def n = 1 // trailing note
+    /* inline */ def m = 2
+    def s = """
+    // heredoc text, kept
+        indented
+"""
+    def re = ~/^https?:\\/\\// // a slashy regex the tokenizer reads as code
+    return n + m
+}
+'''
+
+
+def test_compact_source_strips_comments_but_keeps_strings_and_maps_lines():
+    text, line_map = bb.compact_source(_COMMENTED)
+    assert text.split("\n") == [
+        'library(name: "McpAlphaLib")',
+        "def alpha() {",
+        "def n = 1",
+        "def m = 2",
+        'def s = """',
+        "    // heredoc text, kept",
+        "        indented",
+        '"""',
+        # A `//` glued to code may be a slashy regex: the rest of the line stays verbatim.
+        "def re = ~/^https?:\\/\\// // a slashy regex the tokenizer reads as code",
+        "return n + m",
+        "}",
+        "",
+    ]
+    assert line_map == [4, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16]
+
+
+def test_compact_build_writes_a_line_map_and_main_maps_lines_back(repo, capsys):
+    repo[0]["source"].write_text(_COMMENTED)
+    result = bb.build(compact=True)
+    bb.verify(result, paranoid=True)
+    assert result.record["compact"] is True
+    line_map = json.loads(bb.LINE_MAP_JSON.read_text())
+    assert line_map["libraries"]["mcp.McpAlphaLib.groovy"] == {
+        "source": "libraries/mcp-alpha-lib.groovy", "lines": [[4, 1], [7, 10]]}
+    assert bb.source_line(line_map, "mcp.McpAlphaLib.groovy", 3) == ("libraries/mcp-alpha-lib.groovy", 8)
+    assert bb.main(["--map-line", "mcp.McpAlphaLib.groovy:2"]) == 0
+    assert capsys.readouterr().out == "libraries/mcp-alpha-lib.groovy:7\n"
+    assert bb.main(["--map-line", "mcp.McpAlphaLib.groovy:12"]) == 1
+    assert "has no compacted line 12" in capsys.readouterr().err
+    # Switching back rebuilds the full sources and drops the now-stale map.
+    assert not bb.build().unchanged
+    assert bb.OUTPUT_ZIP.read_bytes() == _reference_zip()
+    assert not bb.LINE_MAP_JSON.exists()
+
+
+def test_compacted_repo_libraries_keep_every_code_token():
+    """On the real libraries: compaction removes no code (the lint's code view matches
+    with whitespace ignored), every mapped line comes from its source line, and no
+    shipped file carries a file-scope block comment (BP20)."""
+    sl = pytest.importorskip("sandbox_lint")
+    for lib in bb.LIBS:
+        source = lib["source"].read_text(encoding="utf-8")
+        text, line_map = bb.compact_source(source)
+
+        def code(t):
+            return "".join("".join(sl.strip_comments_and_strings(t)).split())
+
+        assert code(text) == code(source), lib["dest"]
+        lines = source.split("\n")
+        for out, number in zip(text.removesuffix("\n").split("\n"), line_map, strict=True):
+            # Comments come out from inside the line, so its characters are a subsequence.
+            rest = iter(lines[number - 1])
+            assert all(char in rest for char in out), (lib["dest"], number)
+        assert sl._scan_library_block_comments(lib["dest"], text) == []
@@ -0,0 +1,244 @@
+"""pytest unit tests for tools/catalog_size.py (the static tools/list size profile).
+
+A synthetic app + library pins the flat/gateway transforms byte for byte; the real
+tree is held to the handleMcpRequest guard, the same budget CI enforces.
+"""
+
+import json
+import os
+import sys
+
+# catalog_size lives in tools/ and imports sandbox_lint from tests/.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+import catalog_size as cs
+import pytest
+import sandbox_lint as sl
+
+_SERVER = '''\
+def hubResponseCapBytes() { 2000 }
+
+def handleMcpRequest() {
+    def maxResponseSize = hubResponseCapBytes() - 72 // =1928
+}
+
+def cacheHintTtlMs() { 300000 }
+
+def currentVersion() {
+    return "1.2.3"
+}
+
+def getGatewayConfig() {
+    return [
+        hub_manage_things: [
+            description: "Manage things.",
+            tools: ["hub_delete_thing"],
+            summaries: [hub_delete_thing: "Delete a thing."]
+        ]
+    ]
+}
+
+def getReadOnlyToolNames() {
+    return ["hub_get_thing", "hub_search_tools"] as Set
+}
+
+def getIdempotentWriteToolNames() {
+    return [] as Set
+}
+
+def getOpenWorldToolNames() {
+    return [] as Set
+}
+
+def getDeveloperModeOnlyToolNames() {
+    return [] as Set
+}
+
+def getHiddenToolNames() {
+    def hide = [] as Set
+    def mode = getCustomEngineMode()
+    if (mode == "off") {
+        ["hub_get_thing", "hub_delete_thing"].each { hide << it }
+    } else if (mode == "readonly") {
+        ["hub_delete_thing"].each { hide << it }
+    }
+    return hide
+}
+
+def getToolDisplayMeta() {
+    def meta = [:]
+    [_toolDisplayMeta_partThings()].each { meta.putAll(it) }
+    meta.putAll([
+        hub_manage_things: [title: "Manage Things", summary: "x"]
+    ])
+    return meta
+}
+
+def getAllToolDefinitions() {
+    return _getAllToolDefinitions_partThings()
+}
+'''
+
+_LIBRARY = '''\
+def _toolDisplayMeta_partThings() {
+    return [
+        hub_get_thing: [title: "Get Thing", summary: "x"]
+    ]
+}
+
+def _thingKinds() { ["a", "b"] }
+
+def _getAllToolDefinitions_partThings() {
+    def idField = [type: "string"]
+    return [
+        [
+            name: "hub_search_tools",
+            description: "Search.",
+            inputSchema: [type: "object", properties: [:]]
+        ],
+        [
+            name: "hub_get_thing",
+            description: "Get a thing.[[FLAT_TRIM]] Long prose.[[/FLAT_TRIM]]",
+            inputSchema: [type: "object", properties: [
+                id: idField + [description: "Thing id.[[FLAT_TRIM]] More.[[/FLAT_TRIM]]"],
+                kind: [type: "string", enum: _thingKinds()]
+            ]],
+            outputSchema: [type: "object", required: ["id"]]
+        ],
+        [
+            name: "hub_delete_thing",
+            description: "Delete a thing.",
+            inputSchema: [type: "object", properties: [:]]
+        ]
+    ]
+}
+'''
+
+
+def _write_repo(tmp_path, server=_SERVER, library=_LIBRARY):
+    (tmp_path / "hubitat-mcp-server.groovy").write_text(server)
+    (tmp_path / "libraries").mkdir()
+    (tmp_path / "libraries" / "things-lib.groovy").write_text(library)
+    return sl.LintCorpus(root=tmp_path)
+
+
+def _tool(size, name):
+    return next(t for t in size.tools if t.name == name)
+
+
+def _bytes(value):
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+def test_flat_mode_drops_search_tool_trim_blocks_and_output_schema(tmp_path):
+    size = cs.measure(_write_repo(tmp_path))
+    assert _tool(size, "hub_search_tools").flat_bytes is None
+    assert _tool(size, "hub_get_thing").flat_bytes == 1 + _bytes({
+        "name": "hub_get_thing",
+        "description": "Get a thing.",
+        "inputSchema": {"type": "object", "properties": {
+            "id": {"type": "string", "description": "Thing id."},
+            "kind": {"type": "string", "enum": ["a", "b"]},
+        }},
+        "annotations": {"title": "Get Thing", "readOnlyHint": True,
+                        "idempotentHint": True, "openWorldHint": False},
+    })
+    assert size.unresolved == []
+
+
+def test_gateway_mode_keeps_trimmed_prose_and_prices_the_gateway_entry(tmp_path):
+    size = cs.measure(_write_repo(tmp_path))
+    thing = _tool(size, "hub_get_thing")
+    # Gateway mode strips only the marker tokens; the wrapped prose stays.
+    assert thing.gateway_bytes - thing.flat_bytes == len(" Long prose.") + len(" More.")
+    assert _tool(size, "hub_delete_thing").gateway_bytes is None
+    (gateway,) = size.gateways
+    assert gateway.tools == ["hub_delete_thing"]
+    assert gateway.flat_bytes == _tool(size, "hub_delete_thing").flat_bytes
+    assert gateway.entry_bytes == 1 + _bytes({
+        "name": "hub_manage_things",
+        "description": "Manage things." + cs.GATEWAY_CALL_HINT + "- hub_delete_thing: Delete a thing.",
+        "inputSchema": {"type": "object", "properties": {
+            "tool": {"type": "string", "description": cs.GATEWAY_TOOL_DESCRIPTION,
+                     "enum": ["hub_delete_thing"]},
+            "args": {"type": "object", "description": cs.GATEWAY_ARGS_DESCRIPTION},
+        }},
+        "annotations": {"title": "Manage Things", "readOnlyHint": False, "destructiveHint": True,
+                        "idempotentHint": False, "openWorldHint": False},
+    })
+
+
+def test_publish_output_schemas_ships_wire_form(tmp_path):
+    corpus = _write_repo(tmp_path)
+    plain = _tool(cs.measure(corpus), "hub_get_thing").gateway_bytes
+    published = _tool(cs.measure(corpus, publish_output_schemas=True), "hub_get_thing").gateway_bytes
+    assert published - plain == len(',"outputSchema":{"type":"object"}')
+
+
+def test_wire_totals_guard_and_library_attribution(tmp_path):
+    size = cs.measure(_write_repo(tmp_path))
+    assert size.guard == 1928
+    flat = [t.flat_bytes for t in size.tools if t.flat_bytes]
+    # Each entry carries its comma; the array has one fewer, and its "[]" is in the frame.
+    assert size.flat_wire == size.envelope_bytes + sum(flat) - 1
+    assert [row[:2] for row in size.libraries()] == [("libraries/things-lib.groovy", 3)]
+
+
+def test_default_install_hides_developer_and_readonly_engine_tools(tmp_path):
+    """--default-install hides what getHiddenToolNames() hides with Developer Mode off and
+    the custom engine in its default "readonly" mode; the default profile hides nothing."""
+    server = _SERVER.replace('def getDeveloperModeOnlyToolNames() {\n    return [] as Set',
+                             'def getDeveloperModeOnlyToolNames() {\n    return ["hub_get_thing"] as Set')
+    corpus = _write_repo(tmp_path, server=server)
+    size = cs.measure(corpus, default_install=True)
+    for name in ("hub_get_thing", "hub_delete_thing"):
+        tool = _tool(size, name)
+        assert tool.flat_bytes is None and tool.gateway_bytes is None
+    (gateway,) = size.gateways
+    assert gateway.entry_bytes == 0
+    assert all(t.flat_bytes for t in cs.measure(corpus).tools if t.name != "hub_search_tools")
+
+
+def test_default_install_needs_a_readable_engine_list(tmp_path):
+    server = _SERVER.replace('["hub_delete_thing"].each', 'readonlyEngineTools().each')
+    corpus = _write_repo(tmp_path, server=server)
+    with pytest.raises(ValueError, match="readonly"):
+        cs.measure(corpus, default_install=True)
+    assert cs.measure(corpus).flat_wire
+
+
+def test_unresolved_values_are_reported(tmp_path):
+    library = _LIBRARY.replace("enum: _thingKinds()", "enum: kindsFor(location)")
+    size = cs.measure(_write_repo(tmp_path, library=library))
+    assert size.unresolved == [("hub_get_thing", "kindsFor(location)")]
+    assert "1 value(s) sized from source text" in cs.format_catalog_size(size, size.guard)
+
+
+def test_unreadable_catalog_raises(tmp_path):
+    library = _LIBRARY.replace('name: "hub_delete_thing",', 'name: "hub_delete_thing",,')
+    with pytest.raises(ValueError, match="_getAllToolDefinitions_partThings"):
+        cs.measure(_write_repo(tmp_path, library=library))
+
+
+def test_main_fails_over_budget(tmp_path, monkeypatch, capsys):
+    _write_repo(tmp_path)
+    monkeypatch.setattr(sl, "REPO_ROOT", tmp_path)
+    assert cs.main(["--top", "0"]) == 0
+    assert cs.main(["--budget", "100"]) == 1
+    err = capsys.readouterr().err
+    assert "flat-mode tools/list response" in err and "100-byte budget" in err
+    assert cs.main(["--json"]) == 0
+    profile = json.loads(capsys.readouterr().out)
+    assert profile["budget"] == profile["guard"] == 1928
+    assert profile["flat"]["headroom"] == 1928 - profile["flat"]["bytes"]
+
+
+def test_repo_catalog_fits_the_response_guard():
+    """The budget CI enforces: both modes of the real catalog fit under the guard, and
+    every definition value was read as a literal (no size estimated from source text)."""
+    size = cs.measure()
+    assert size.guard == 124000
+    assert size.flat_wire < size.guard, cs.format_catalog_size(size, size.guard)
+    assert size.gateway_wire < size.guard
+    assert size.unresolved == []
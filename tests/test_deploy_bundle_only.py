@@ -61,6 +61,19 @@ def test_deploy_builds_the_bundle_in_ci_instead_of_fetching_the_committed_zip():
         )
 
 
+def test_deploy_adopts_the_published_artifact_only_with_a_build_fallback():
+    """The deploy skips its CI rebuild only when build-bundle.py --from digest-verifies this
+    SHA's published artifact against the checkout; any miss must still fall back to the full
+    build, or a fork PR / racing publish would leave no zip to compare and install."""
+    text = SCRIPT.read_text()
+    assert "tools/build-bundle.py --from" in text, (
+        f"{SCRIPT.name} no longer tries to adopt the published artifact via its digest manifest."
+    )
+    assert text.index("tools/build-bundle.py --from") < text.index("python3 tools/build-bundle.py )"), (
+        f"{SCRIPT.name}: the full build must be the FALLBACK after a failed --from adoption."
+    )
+
+
 def test_deploy_verifies_landed_libraries_after_the_bundle_step():
     """Run 27322480301: hub_install_bundle reported success while leaving pre-existing
     libraries STALE -- the deploy must re-verify every #include'd library (one copy per
@@ -0,0 +1,190 @@
+"""pytest unit tests for tools/hub_call_cost.py (the static hub round-trip cost model).
+
+A synthetic app + library exercises each path shape -- straight-line calls, branches,
+device loops, stacked case labels, recursion -- with the hub primitives as leaves.
+"""
+
+import json
+import os
+import sys
+
+# hub_call_cost lives in tools/ and imports sandbox_lint from tests/.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+import hub_call_cost as hc
+import pytest
+import sandbox_lint as sl
+
+_SERVER = '''\
+def executeTool(toolName, args) {
+    switch (toolName) {
+        case "hub_get_thing": return toolGetThing(args)
+        case "hub_list_things":
+        case "hub_find_things":
+            return toolListThings(args)
+        case "hub_walk_tree":
+            return toolWalkTree(args)
+        case "hub_quiet": return toolQuiet(args)
+        default:
+            throw new IllegalArgumentException("Unknown tool: ${toolName}")
+    }
+}
+
+def hubInternalGet(path) {
+    return httpGet(path)
+}
+
+def hubInternalPostForm(path, body) {
+    return httpPost(path, body)
+}
+'''
+
+_LIBRARY = '''\
+def toolGetThing(args) {
+    if (!args.id) throw new IllegalArgumentException("id is required")
+    def page = hubInternalGet("/thing/${args.id}")
+    if (args.refresh) {
+        hubInternalPostForm("/thing/${args.id}/refresh", [:])
+    }
+    return page ?: hubInternalGet("/thing/fallback")
+}
+
+def toolListThings(args) {
+    def devices = args.ids.collect { id -> getDeviceById(id) }
+    def result = []
+    devices.each { device ->
+        result << _fetchState(device.id)
+    }
+    return result
+}
+
+def _fetchState(id) {
+    hubInternalGet("/device/${id}/state")
+    return hubInternalGet("/device/${id}/events")
+}
+
+def toolWalkTree(args) {
+    return _walk(args.root)
+}
+
+def _walk(node) {
+    def page = hubInternalGet("/node/${node}")
+    // hubInternalGet("/never") -- comments and strings are not calls
+    def label = "hubInternalPostForm(x)"
+    return page.children ? _walk(page.children[0]) : page
+}
+
+def toolQuiet(args) {
+    return [ok: true, name: "quiet"]
+}
+'''
+
+
+def _write_repo(tmp_path, server=_SERVER, library=_LIBRARY):
+    (tmp_path / "hubitat-mcp-server.groovy").write_text(server)
+    (tmp_path / "libraries").mkdir()
+    (tmp_path / "libraries" / "things-lib.groovy").write_text(library)
+    return sl.LintCorpus(root=tmp_path)
+
+
+def test_straight_line_calls_set_min_and_branches_set_max(tmp_path):
+    cost, impls = hc.analyze(_write_repo(tmp_path))["hub_get_thing"]
+    # One unconditional GET; the refresh POST and the `?:` fallback are conditional.
+    assert (cost.min, cost.max) == (1, 3)
+    assert cost.loops == {} and impls == ["toolGetThing"]
+
+
+def test_device_loop_is_unbounded_and_priced_per_iteration(tmp_path):
+    cost, _ = hc.analyze(_write_repo(tmp_path))["hub_list_things"]
+    assert (cost.min, cost.max) == (0, None)
+    assert cost.device_fanout
+    assert cost.loops == {"libraries/things-lib.groovy:13 .each": (True, 2)}
+
+
+def test_stacked_case_labels_share_one_cost(tmp_path):
+    tools = hc.analyze(_write_repo(tmp_path))
+    assert tools["hub_find_things"] == tools["hub_list_things"]
+
+
+def test_recursion_through_hub_calls_is_unbounded(tmp_path):
+    cost, _ = hc.analyze(_write_repo(tmp_path))["hub_walk_tree"]
+    assert cost.recursive
+    assert (cost.min, cost.max) == (1, None)
+
+
+_CYCLE = '''\
+def a(x) {
+    hubInternalGet("/x")
+    if (x) {
+        b(x)
+    }
+}
+
+def b(x) {
+    a(x)
+}
+
+def quietA(x) {
+    if (x) { quietB(x) }
+}
+
+def quietB(x) {
+    quietA(x)
+}
+'''
+
+
+@pytest.mark.parametrize("first", ["a", "b"])
+def test_mutual_recursion_is_priced_as_one_cycle_whichever_member_comes_first(first):
+    model = hc.CostModel(hc.parse_methods(_CYCLE, "cycle.groovy"))
+    model.cost(first)
+    for name in ("a", "b"):
+        cost = model.cost(name)
+        assert (cost.min, cost.max, cost.recursive) == (1, None, True), name
+    for name in ("quietB", "quietA") if first == "b" else ("quietA", "quietB"):
+        cost = model.cost(name)
+        assert (cost.min, cost.max, cost.recursive) == (0, 0, False), name
+
+
+def test_comments_and_strings_are_not_calls(tmp_path):
+    tools = hc.analyze(_write_repo(tmp_path))
+    assert (tools["hub_quiet"][0].min, tools["hub_quiet"][0].max) == (0, 0)
+    # _walk's commented-out GET and quoted POST add nothing to its one real call.
+    assert tools["hub_walk_tree"][0].min == 1
+
+
+def test_ranking_puts_device_loops_first(tmp_path):
+    ranked = list(hc.analyze(_write_repo(tmp_path)))
+    assert ranked[:2] == ["hub_find_things", "hub_list_things"]
+    assert ranked[2] == "hub_walk_tree"
+    assert ranked[-1] == "hub_quiet"
+
+
+def test_missing_app_raises(tmp_path):
+    with pytest.raises(ValueError, match=r"hubitat-mcp-server\.groovy"):
+        hc.analyze(sl.LintCorpus(root=tmp_path))
+
+
+def test_main_table_json_and_filters(tmp_path, monkeypatch, capsys):
+    _write_repo(tmp_path)
+    monkeypatch.setattr(sl, "REPO_ROOT", tmp_path)
+    assert hc.main(["--top", "1"]) == 0
+    table = capsys.readouterr().out.splitlines()
+    assert len(table) == 2 and table[1].startswith("hub_find_things")
+    assert "per device, 2/iteration" in table[1]
+    assert hc.main(["--json", "--tool", "hub_walk_tree"]) == 0
+    (walk,) = json.loads(capsys.readouterr().out)
+    assert walk == {"tool": "hub_walk_tree", "implementations": ["toolWalkTree"],
+                    "min": 1, "max": None, "recursive": True, "loops": []}
+    monkeypatch.setattr(sl, "REPO_ROOT", tmp_path / "missing")
+    assert hc.main([]) == 1
+
+
+def test_repo_every_catalog_tool_has_a_dispatch_case():
+    """Every tool the catalog advertises reaches a tool* implementation through executeTool."""
+    corpus = sl.LintCorpus()
+    tools = hc.analyze(corpus)
+    catalog = corpus.tool_catalog()
+    assert set(tools) == catalog.tool_names
+    assert all(impls for _, impls in tools.values())
@@ -1,7 +1,9 @@
 """pytest unit tests for .github/scripts/release_bump.py
 
 Covers: parse_release_notes, split_release_blocks, filter_same_minor,
-        manifest_block_from_bullets, and bump_manifest (integration scenarios).
+        manifest_block_from_bullets, bump_manifest (integration scenarios),
+        fetch_prs' batched GraphQL and fetch_prs_cached's on-disk cache
+        (against a fake `gh` on PATH), and main's --dry-run.
 """
 
 import json
@@ -661,7 +663,7 @@ def test_build_bullets_warns_on_section_with_no_bullets(monkeypatch, capsys):
         "author": {"login": "alice"},
         "body": "## Release Notes\nThis fixes a thing but the author wrote prose.",
     }
-    monkeypatch.setattr(rb, "fetch_pr", lambda _: fake_pr)
+    monkeypatch.setattr(rb, "fetch_prs", lambda numbers: dict.fromkeys(numbers, fake_pr))
     bullets = rb.build_bullets([42])
     # Title-only fallback shape
     assert len(bullets) == 1
@@ -683,7 +685,7 @@ def test_build_bullets_no_warning_when_section_absent(monkeypatch, capsys):
         "author": {"login": "alice"},
         "body": "## Summary\nNo release notes section at all.",
     }
-    monkeypatch.setattr(rb, "fetch_pr", lambda _: fake_pr)
+    monkeypatch.setattr(rb, "fetch_prs", lambda numbers: dict.fromkeys(numbers, fake_pr))
     rb.build_bullets([42])
     captured = capsys.readouterr()
     assert "::warning::" not in captured.err
@@ -731,6 +733,181 @@ def test_build_bullets_warns_when_fetch_pr_fails(monkeypatch, capsys):
     assert "#99" in captured.err
 
 
+
+# ---------------------------------------------------------------------------
+# fetch_prs — batched GraphQL through a fake `gh` on PATH
+# ---------------------------------------------------------------------------
+
+_FAKE_GH = """\
+import json, os, re, sys
+
+args = sys.argv[1:]
+with open(os.environ["FAKE_GH_LOG"], "a") as log:
+    log.write(json.dumps(args) + "\\n")
+missing = {int(n) for n in os.environ.get("FAKE_GH_MISSING", "").split(",") if n}
+
+def pr(n):
+    return {"number": n, "title": f"PR {n}", "url": f"https://example.com/{n}",
+            "body": f"## Release Notes\\n- note {n}", "author": {"login": "alice"},
+            "updatedAt": os.environ.get(f"FAKE_GH_UPDATED_{n}", "2026-01-01T00:00:00Z")}
+
+if args[:2] == ["api", "graphql"]:
+    if os.environ.get("FAKE_GH_GRAPHQL_DOWN"):
+        sys.stderr.write("gh: HTTP 502\\n")
+        sys.exit(1)
+    query = next(a for a in args if a.startswith("query="))
+    numbers = [int(n) for n in re.findall(r"pr(\\d+): pullRequest", query)]
+    data = {f"pr{n}": None if n in missing else pr(n) for n in numbers}
+    errors = [{"path": ["repository", f"pr{n}"], "message": "Could not resolve to a PullRequest"}
+              for n in numbers if n in missing]
+    print(json.dumps({"data": {"repository": data}, **({"errors": errors} if errors else {})}))
+    sys.exit(1 if errors else 0)
+if args[:2] == ["pr", "view"]:
+    n = int(args[2])
+    if n in missing:
+        sys.stderr.write("no pull requests found\\n")
+        sys.exit(1)
+    print(json.dumps(pr(n)))
+    sys.exit(0)
+sys.exit(2)
+"""
+
+
+@pytest.fixture
+def fake_gh(tmp_path, monkeypatch):
+    """Put a scripted `gh` first on PATH; returns a reader for its call log."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    gh = bin_dir / "gh"
+    gh.write_text(f"#!{sys.executable}\n" + _FAKE_GH)
+    gh.chmod(0o755)
+    log = tmp_path / "gh.log"
+    log.write_text("")
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_GH_LOG", str(log))
+    return lambda: [json.loads(line) for line in log.read_text().splitlines()]
+
+
+def test_fetch_prs_batches_graphql_queries(fake_gh):
+    """120 PRs resolve in three aliased queries (50 + 50 + 20), not 120 processes."""
+    numbers = list(range(1, 121))
+    prs = rb.fetch_prs(numbers)
+    assert sorted(prs) == numbers
+    assert prs[7]["title"] == "PR 7" and prs[7]["author"] == {"login": "alice"}
+    calls = fake_gh()
+    assert [call[:2] for call in calls] == [["api", "graphql"]] * 3
+    queries = [next(a for a in call if a.startswith("query=")) for call in calls]
+    assert [query.count("pullRequest(") for query in queries] == [50, 50, 20]
+    assert "owner={owner}" in calls[0] and "name={repo}" in calls[0]
+
+
+def test_build_bullets_from_batched_fetch(fake_gh):
+    assert rb.build_bullets([3, 4]) == [
+        "- PR 3 ([#3](https://example.com/3), @alice)\n  - note 3",
+        "- PR 4 ([#4](https://example.com/4), @alice)\n  - note 4",
+    ]
+    assert len(fake_gh()) == 1
+
+
+def test_fetch_prs_warns_per_unresolved_pr(fake_gh, monkeypatch, capsys):
+    """A PR the query cannot resolve warns on its own and falls back to the
+    placeholder; the rest of the batch still resolves from the same call."""
+    monkeypatch.setenv("FAKE_GH_MISSING", "5")
+    bullets = rb.build_bullets([4, 5, 6])
+    assert bullets[1] == "- PR #5"
+    assert bullets[0].startswith("- PR 4 ") and bullets[2].startswith("- PR 6 ")
+    err = capsys.readouterr().err
+    assert "::warning::fetch_prs: GraphQL could not resolve PR #5: Could not resolve" in err
+    assert "#4" not in err and "#6" not in err
+    assert len(fake_gh()) == 1
+
+
+def test_fetch_prs_falls_back_to_per_pr_view_when_graphql_fails(fake_gh, monkeypatch, capsys):
+    monkeypatch.setenv("FAKE_GH_GRAPHQL_DOWN", "1")
+    monkeypatch.setenv("FAKE_GH_MISSING", "9")
+    prs = rb.fetch_prs([8, 9])
+    assert prs[8]["title"] == "PR 8" and prs[9] is None
+    err = capsys.readouterr().err
+    assert "::warning::fetch_prs: gh api graphql failed for 2 PR(s)" in err
+    assert "::warning::fetch_pr: gh CLI failed for PR #9: no pull requests found" in err
+    assert [call[:3] for call in fake_gh()] == [["api", "graphql", "-f"], ["pr", "view", "8"], ["pr", "view", "9"]]
+
+
+# ---------------------------------------------------------------------------
+# fetch_prs_cached — the on-disk PR metadata cache
+# ---------------------------------------------------------------------------
+
+def _queries(calls):
+    return [next(a for a in call if a.startswith("query=")) for call in calls]
+
+
+def test_cached_rerun_only_validates_updated_at(fake_gh, tmp_path):
+    cache = tmp_path / "cache" / "release-prs.json"
+    first = rb.build_bullets([3, 4], cache=cache)
+    record = json.loads(cache.read_text())
+    assert record["prs"]["3"]["notes"] == ["- note 3"]
+    assert record["prs"]["3"]["updatedAt"] == "2026-01-01T00:00:00Z"
+    assert rb.build_bullets([3, 4], cache=cache) == first
+    queries = _queries(fake_gh())
+    assert len(queries) == 2
+    # The rerun asks for updatedAt alone: no body, no title.
+    assert "body" not in queries[1] and "title" not in queries[1]
+    assert queries[1].count("updatedAt") == 2
+
+
+def test_cache_refetches_only_changed_and_new_prs(fake_gh, tmp_path, monkeypatch):
+    cache = tmp_path / "release-prs.json"
+    rb.fetch_prs_cached([3, 4], cache)
+    monkeypatch.setenv("FAKE_GH_UPDATED_4", "2026-02-02T00:00:00Z")
+    prs = rb.fetch_prs_cached([3, 4, 5], cache)
+    assert prs[4]["updatedAt"] == "2026-02-02T00:00:00Z"
+    probe, refetch = _queries(fake_gh()[1:])
+    assert "pr3:" in probe and "pr4:" in probe and "pr5:" not in probe
+    assert "pr3:" not in refetch and "pr4:" in refetch and "pr5:" in refetch
+    assert sorted(json.loads(cache.read_text())["prs"]) == ["3", "4", "5"]
+
+
+def test_unresolvable_cached_pr_is_not_trusted(fake_gh, tmp_path, monkeypatch, capsys):
+    cache = tmp_path / "release-prs.json"
+    rb.fetch_prs_cached([3], cache)
+    monkeypatch.setenv("FAKE_GH_MISSING", "3")
+    assert rb.build_bullets([3], cache=cache) == ["- PR #3"]
+    assert "could not resolve PR #3" in capsys.readouterr().err
+    assert json.loads(cache.read_text())["prs"] == {}
+
+
+@pytest.mark.parametrize("content", ["{not json", json.dumps({"format": 0, "prs": {}})])
+def test_unusable_cache_is_ignored(fake_gh, tmp_path, content):
+    cache = tmp_path / "release-prs.json"
+    cache.write_text(content)
+    assert rb.fetch_prs_cached([3], cache)[3]["title"] == "PR 3"
+    assert "title" in _queries(fake_gh())[0]
+    assert json.loads(cache.read_text())["format"] == 1
+
+
+def test_main_dry_run_prints_notes_and_writes_nothing(fake_gh, tmp_path, monkeypatch, capsys):
+    missing = tmp_path / "absent"
+    for name in ("MANIFEST", "CHANGELOG", "README", "SERVER", "RULE"):
+        monkeypatch.setattr(rb, name, missing / name)
+    monkeypatch.setattr(rb, "PR_CACHE", tmp_path / "release-prs.json")
+    monkeypatch.setattr(rb, "latest_tag", lambda: "v1.2.3")
+    monkeypatch.setattr(rb, "merged_pr_numbers_since", lambda tag: [3])
+    monkeypatch.setenv("GITHUB_OUTPUT", str(tmp_path / "output"))
+    monkeypatch.delenv("LABEL", raising=False)
+    assert rb.main(["--dry-run"]) == 1
+    assert rb.main(["--dry-run", "--label", "release:minor"]) == 0
+    out = capsys.readouterr().out
+    assert "Dry run: 1.2.3 -> 1.3.0 (1 PR(s))" in out
+    assert "## [1.3.0] - " in out and "- PR 3 ([#3](https://example.com/3), @alice)\n  - note 3" in out
+    assert "\n- PR 3 (#3)\n  - note 3" in out
+    assert not missing.exists() and not (tmp_path / "output").exists()
+    assert (tmp_path / "release-prs.json").exists()
+    assert rb.main(["--dry-run", "--label", "release:minor", "--no-cache"]) == 0
+    # --no-cache fetches in full instead of validating the cache it just warmed.
+    queries = _queries(fake_gh())
+    assert len(queries) == 2 and "title" in queries[1]
+
+
 def test_bump_manifest_legacy_blob_shrinkage_regression_anchor(tmp_path, monkeypatch):
     """Regression anchor for the headline 65 KB → small shrinkage.
 
@@ -9,14 +9,21 @@ individual parametrized pytest tests, then adds coverage for:
 All 19 original self-test cases are preserved with zero coverage loss.
 """
 
+import io
+import json
 import os
+import re
+import subprocess
 import sys
+import time
 
 # sandbox_lint lives in tests/ — add that directory to the path.
 sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
 
+import bench_sandbox_lint as bench
 import pytest
 import sandbox_lint as sl
+import sandbox_lint_reference as ref
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -161,6 +168,88 @@ def test_strip_preserves_line_count():
     assert len(stripped) == 4
 
 
+def test_strip_multiline_triple_double_scrubs_every_body_line():
+    """A triple-double-quoted GString spanning lines keeps ${...} on every body line, blanks
+    the prose, and scans code after the closing quotes as code."""
+    source = 'def s = """first getClass() line\nsecond ${obj.getClass()} line\nend""" + x.getClass()'
+    stripped = sl.strip_comments_and_strings(source)
+    assert stripped[0].strip() == "def s ="
+    assert "first" not in stripped[0] and "getClass" not in stripped[0]
+    assert "obj.getClass()" in stripped[1]
+    assert "second" not in stripped[1]
+    assert "end" not in stripped[2]
+    assert "x.getClass()" in stripped[2]
+    assert [len(s) for s in stripped] == [len(s) for s in source.split("\n")]
+
+
+def test_strip_multiline_triple_single_blanks_body():
+    """A triple-single-quoted string spanning lines is blanked up to its close, then code resumes."""
+    source = "def s = '''one\n// not a comment /* nor this\nthree''' + y"
+    stripped = sl.strip_comments_and_strings(source)
+    assert stripped[1].strip() == ""
+    assert stripped[2].strip() == "+ y"
+
+
+def test_strip_multiline_mode_false_matches_reference_quirk():
+    """multiline_strings=False keeps the old per-line reading: the closing line re-opens."""
+    source = 'def s = """body\nend""" + x.getClass()'
+    assert sl.strip_comments_and_strings(source, multiline_strings=False) == \
+        ref.strip_comments_and_strings_reference(source)
+    assert "getClass" not in sl.strip_comments_and_strings(source, multiline_strings=False)[1]
+
+
+_TOKENIZER_EDGE_CASES = [
+    'a = "x\\"y" + b',
+    'a = "trailing backslash \\',
+    'a = "dollar at end $',
+    'a = "$foo.bar.baz() and ${ m["k}"] } and $ and ${ "\\"" }"',
+    "a = '${not.interpolated}' + '\\'' + c",
+    'a = """${ unterminated',
+    'a = """ok""" /* c */ + """$x.y"""',
+    'a = "unterminated ${ { nested } ',
+    "a = ''' x ''' + '''",
+    "a = /* open\n still */ b // tail",
+    'u = "http://x" // note',
+]
+
+
+@pytest.mark.parametrize("source", _TOKENIZER_EDGE_CASES)
+def test_tokenizer_compat_mode_matches_reference_edge_cases(source):
+    """Escapes, lone `$` / backslashes, nested literals and unterminated tokens come out
+    exactly as the character-walking reference produces them."""
+    assert sl.strip_comments_and_strings(source, multiline_strings=False) == \
+        ref.strip_comments_and_strings_reference(source)
+
+
+def test_tokenizer_compat_mode_matches_reference_on_repo_and_fixtures():
+    """Byte-identical to the reference on every Groovy file and every self-test source."""
+    sources = [p.read_text(encoding="utf-8") for p in sl.GROOVY_FILES if p.exists()]
+    sources += [case[1] for case in sl.SELF_TEST_CASES]
+    for source in sources:
+        assert sl.strip_comments_and_strings(source, multiline_strings=False) == \
+            ref.strip_comments_and_strings_reference(source)
+
+
+def test_tokenizer_default_mode_preserves_line_count_on_repo():
+    """The multi-line-aware mode still yields one output line per input line."""
+    for path in sl.GROOVY_FILES:
+        if path.exists():
+            source = path.read_text(encoding="utf-8")
+            assert len(sl.strip_comments_and_strings(source)) == len(source.split("\n"))
+
+
+
+def test_comment_spans_marks_comments_and_carried_over_state():
+    source = 'def x = 1 /* a\nstill */ y // z\ndef s = """\n// text\n"""'
+    assert sl.comment_spans(source) == [
+        ([(10, 14)], "code"),
+        ([(0, 8), (11, 15)], "comment"),
+        ([], "code"),
+        ([], "string"),
+        ([], "string"),
+    ]
+
+
 # ---------------------------------------------------------------------------
 # scan_source — rule-specific spot checks
 # ---------------------------------------------------------------------------
@@ -228,6 +317,149 @@ def test_clean_source_no_findings():
     assert hits(source) == set()
 
 
+# ---------------------------------------------------------------------------
+# Rule engine — prefiltered single pass must equal the per-rule re.search loop
+# ---------------------------------------------------------------------------
+
+def _naive_scan(source: str, display_path: str) -> list[dict]:
+    """The pre-engine scan: every RULES pattern re.search'd on every line (the `scope`
+    rules, which need the engine's brace tracking, are compared by _scoped_findings)."""
+    findings = []
+    stripped_lines = sl.strip_comments_and_strings(source)
+    source_lines = source.split("\n")
+    block_mask = sl._block_comment_mask(source_lines)
+    for line_num, line in enumerate(stripped_lines, start=1):
+        raw_line = "" if block_mask[line_num - 1] else sl._strip_line_comment(source_lines[line_num - 1])
+        for rule in sl.RULES:
+            if rule.get("scope"):
+                continue
+            if re.search(rule["pattern"], raw_line if rule.get("raw") else line):
+                findings.append({
+                    "file": display_path, "line": line_num, "rule": rule["id"],
+                    "message": rule["message"], "severity": rule["severity"],
+                    "source": source_lines[line_num - 1].strip(),
+                })
+    return findings
+
+
+def _unscoped(findings: list[dict]) -> list[dict]:
+    scoped = {rule["id"] for rule in sl.RULES if rule.get("scope")}
+    return [f for f in findings if f["rule"] not in scoped]
+
+
+def _scoped_hits(findings: list[dict]) -> list[tuple[int, str]]:
+    scoped = {rule["id"] for rule in sl.RULES if rule.get("scope")}
+    return [(f["line"], f["rule"]) for f in findings if f["rule"] in scoped]
+
+
+def _naive_scoped_scan(source: str) -> list[tuple[int, str]]:
+    """(line, rule) of every `scope` rule hit, each pattern re.search'd on its scope's
+    target directly -- no prefilter literals, no combined gate."""
+    engine = sl._RuleEngine(sl.RULES)
+    state, out = sl._SCOPE_START, []
+    for line_num, line in enumerate(sl.strip_comments_and_strings(source), start=1):
+        scope, state = engine.scope_step(line, state)
+        for rule in sl.RULES:
+            kind = rule.get("scope")
+            target = {"loop": scope.loop, "device_loop": scope.device}.get(kind)
+            if kind == "repeat":
+                target = line if rule["id"] in scope.repeats else None
+            if target is not None and re.search(rule["pattern"], target):
+                out.append((line_num, rule["id"]))
+    return out
+
+
+def test_rule_engine_matches_naive_scan():
+    """Identical findings on every self-test fixture and every scanned repo file.
+    A prefilter literal that is not a true necessary condition of its pattern
+    would drop findings here."""
+    for desc, source, _expected in sl.SELF_TEST_CASES:
+        findings = sl.scan_source(source, "<t>")
+        assert _unscoped(findings) == _naive_scan(source, "<t>"), desc
+        assert _scoped_hits(findings) == _naive_scoped_scan(source), desc
+    for gf in sl.GROOVY_FILES:
+        source = gf.read_text(encoding="utf-8", errors="replace")
+        findings = sl.scan_source(source, gf.name)
+        assert _unscoped(findings) == _naive_scan(source, gf.name), gf.name
+        assert _scoped_hits(findings) == _naive_scoped_scan(source), gf.name
+
+
+def test_rule_engine_prefilter_literals_are_necessary():
+    """Each rule's pattern, run over the self-test sources, only ever matches a
+    target containing one of its prefilter literals."""
+    for rule in sl.RULES:
+        lits = rule.get("prefilter")
+        if not lits:
+            continue
+        for _desc, source, _expected in sl.SELF_TEST_CASES:
+            for line in source.split("\n"):
+                m = re.search(rule["pattern"], line)
+                if m:
+                    assert any(lit in m.group(0) for lit in lits), (rule["id"], line)
+
+
+def test_rule_engine_rebuilds_when_rules_change(monkeypatch):
+    """A rule added at runtime (no prefilter) is honored on the next scan."""
+    assert "SANDBOX-TEST" not in hits("def x = frobnicate()")
+    monkeypatch.setattr(sl, "RULES", [*sl.RULES, {
+        "id": "SANDBOX-TEST", "pattern": r"\bfrobnicate\s*\(",
+        "message": "test rule", "severity": "warning",
+    }])
+    assert "SANDBOX-TEST" in hits("def x = frobnicate()")
+    assert "SANDBOX-001" in hits("def c = obj.getClass()")
+
+
+# ---------------------------------------------------------------------------
+# PERF-xxx — loop / method scoped rules
+# ---------------------------------------------------------------------------
+
+def test_perf_rules_carry_a_non_error_severity_and_a_suggestion():
+    perf = [rule for rule in sl.RULES if rule["id"].startswith("PERF-")]
+    assert perf
+    for rule in perf:
+        assert rule["severity"] in ("warning", "info"), rule["id"]
+        assert rule.get("suggestion") and rule.get("scope"), rule["id"]
+    source = "def f() {\n    devices.each { d ->\n        _hubRequest('get', '/x')\n    }\n}"
+    (finding,) = sl.scan_source(source, "<t>")
+    assert finding["rule"] == "PERF-005" and finding["line"] == 3
+    assert finding["suggestion"] == next(r for r in perf if r["id"] == "PERF-005")["suggestion"]
+    assert "suggestion" not in sl.scan_source("def c = obj.getClass()", "<t>")[0]
+
+
+def test_scope_step_tracks_nested_loops_and_blanks_code_outside_them():
+    engine = sl._RuleEngine(sl.RULES)
+    state = sl._SCOPE_START
+    scope, state = engine.scope_step("def f() {", state)
+    assert scope.loop is None and state[0] == "b"
+    # The receiver and the code after the one-line loop are blanked; the body is kept.
+    scope, state = engine.scope_step("  devices.each { d -> x(d) }; y()", state)
+    assert scope.device == scope.loop == " " * 15 + "{ d -> x(d)" + " " * 7
+    assert state[0] == "b"
+    scope, state = engine.scope_step("  for (i in items) {", state)
+    assert scope.loop.strip() == "{" and scope.device is None and state[0] == "bL"
+    # Already inside a loop: the whole line counts, receiver included.
+    scope, state = engine.scope_step("    list.each { it ->", state)
+    assert scope.loop == "    list.each { it ->" and scope.device is None and state[0] == "bLL"
+    scope, state = engine.scope_step("    }", state)
+    scope, state = engine.scope_step("  }", state)
+    assert state[0] == "b"
+    scope, state = engine.scope_step("}", state)
+    assert scope.loop is None and state == sl._SCOPE_START
+
+
+def test_scope_rule_with_unknown_scope_is_rejected():
+    with pytest.raises(ValueError, match="PERF-TEST"):
+        sl._RuleEngine([{"id": "PERF-TEST", "pattern": "x", "message": "m",
+                         "severity": "info", "scope": "nested"}])
+
+
+def test_perf_finding_suggestion_reaches_lsp_diagnostics():
+    finding = {**_sample_finding(severity="info"), "suggestion": "Batch it."}
+    diagnostic = sl.LanguageServer._diagnostic(finding, None)
+    assert diagnostic["severity"] == 3
+    assert diagnostic["message"].endswith("\nBatch it.")
+
+
 # ---------------------------------------------------------------------------
 # format_finding / format_annotation
 # ---------------------------------------------------------------------------
@@ -292,6 +524,17 @@ def test_format_annotation_warning():
     assert text.startswith("::warning")
 
 
+def test_format_annotation_info_is_a_notice():
+    text = sl.format_annotation(_sample_finding(severity="info"))
+    assert text.startswith("::notice")
+
+
+def test_format_finding_prints_the_suggestion():
+    finding = {**_sample_finding(severity="info"), "suggestion": "Hoist it out of the loop."}
+    assert sl.format_finding(finding).splitlines()[-1] == "  suggestion: Hoist it out of the loop."
+    assert "suggestion" not in sl.format_finding(_sample_finding())
+
+
 def test_format_annotation_line_number_present():
     """format_annotation includes the line number when line > 0."""
     text = sl.format_annotation(_sample_finding(line=10))
@@ -696,6 +939,84 @@ def test_lockstep_duplicate_library_declaration_flagged(monkeypatch, tmp_path):
     assert "McpFooLib" in dups[0]["message"]
 
 
+# ---------------------------------------------------------------------------
+# compile budget — method / token / string-literal estimates per file
+# ---------------------------------------------------------------------------
+
+_BUDGET_SOURCE = '''library(name: "McpFooLib", namespace: "mcp", author: "x", description: "y")
+@Field static final Map LIMITS = [a: 1]
+
+def one() { return 1 }
+
+private Map two(String a,
+                Integer b = 2)
+{
+    def s = """first ${a}
+middle
+
+last"""
+    [(a): b].each { k, v ->
+        log.debug "k=${k}"
+    }
+    return [x: 'y']
+}
+'''
+
+
+def test_compile_budget_counts_methods_tokens_and_strings():
+    budget = sl.compile_budget(_BUDGET_SOURCE, "libraries/foo.groovy")
+    # The library() call, the @Field map and the closure are not methods.
+    assert [(name, line) for name, line, _ in budget.methods] == [("one", 4), ("two", 6)]
+    tokens = {name: n for name, _, n in budget.methods}
+    assert tokens["one"] == len(["def", "one", "(", ")", "{", "return", "1", "}"])
+    assert tokens["two"] > tokens["one"]
+    assert budget.largest_method[0] == "two"
+    # The heredoc splits at its interpolation; the run after it is joined across lines (the
+    # interpolation's own braces are blanked with the string, so they count too).
+    assert budget.largest_string == (len('}\nmiddle\n\nlast"""'), 9)
+    literal_bytes = sum(len(t) for t in ['"McpFooLib"', '"mcp"', '"x"', '"y"', '"""first ${', '}',
+                                         'middle', 'last"""', '"k=${', '}"', "'y'"])
+    assert budget.string_bytes == literal_bytes
+
+
+def test_check_compile_budget_warns_near_the_64kb_caps(monkeypatch, tmp_path):
+    _write_lockstep_repo(tmp_path, **_LOCKSTEP_OK)
+    lib = tmp_path / "libraries" / "mcp-foo-lib.groovy"
+    big_string = "x" * int(sl.JVM_STRING_CONSTANT_LIMIT * 0.9)
+    lib.write_text(lib.read_text() + _BUDGET_SOURCE + f"def blob() {{ return '{big_string}' }}\n")
+    monkeypatch.setattr(sl, "REPO_ROOT", tmp_path)
+    findings = sl.check_compile_budget()
+    assert [(f["file"], f["line"]) for f in findings] == [("libraries/mcp-foo-lib.groovy", 19)]
+    assert "string-constant limit" in findings[0]["message"]
+    # Price tokens so that two(), the largest method, alone reaches the per-method cap.
+    two_tokens = {n: t for n, _, t in sl.compile_budget(_BUDGET_SOURCE, "x").methods}["two"]
+    monkeypatch.setattr(sl, "COMPILE_BUDGET_BYTES_PER_TOKEN", sl.JVM_METHOD_BYTES_LIMIT // two_tokens + 1)
+    methods = [f for f in sl.check_compile_budget() if "per-method limit" in f["message"]]
+    assert [(f["line"], f["severity"]) for f in methods] == [(7, "warning")]
+    assert "two()" in methods[0]["message"]
+
+
+def test_compile_budgets_fan_in_and_table(monkeypatch, tmp_path):
+    _write_lockstep_repo(tmp_path, **{
+        **_LOCKSTEP_OK,
+        "libraries": [("mcp-foo-lib.groovy", "mcp", "McpFooLib"), ("mcp-bar-lib.groovy", "mcp", "McpBarLib")],
+    })
+    monkeypatch.setattr(sl, "REPO_ROOT", tmp_path)
+    budgets = sl.compile_budgets()
+    assert [(b.display_path, b.fan_in) for b in budgets] == [
+        ("hubitat-mcp-server.groovy", 1),
+        ("libraries/mcp-bar-lib.groovy", 0),
+        ("libraries/mcp-foo-lib.groovy", 1),
+    ]
+    table = sl.format_compile_budget(budgets).splitlines()
+    assert table[0].split()[:2] == ["file", "methods"]
+    assert table[-1].startswith("compile unit (app + libraries)")
+    assert len(table) == 1 + len(budgets) + 1
+    # The unit row: the largest method anywhere (not a sum), and no fan-in of its own.
+    largest = max((b.largest_method[2] for b in budgets if b.largest_method), default=0)
+    assert table[-1].split()[-4] == str(largest) and table[-1].split()[-1] == "-"
+
+
 # ---------------------------------------------------------------------------
 # _extract_canonical_counts dev_only_top_level partition (issue #250)
 # ---------------------------------------------------------------------------
@@ -775,3 +1096,831 @@ def test_extract_canonical_counts_dev_only_name_with_digits(monkeypatch, tmp_pat
     assert c["total"] == 3
     assert c["dev_only_top_level"] == 1  # hub_tool_v2 matched despite the digit
     assert c["core"] == 0              # 3 - 2 - 1
+
+
+# ---------------------------------------------------------------------------
+# LintCorpus — read-once view shared by every check
+# ---------------------------------------------------------------------------
+# main() builds one LintCorpus and hands it to every check so each file is read
+# (and the app+libraries concatenation built) once per run. These pin the two
+# properties that make that safe: the corpus reads each file once however many
+# checks consume it, and corpus-fed checks report exactly what the
+# read-from-disk default path reports.
+
+def test_corpus_reads_each_file_once(monkeypatch, tmp_path):
+    """Every consumer of the same path shares one read."""
+    _write_lockstep_repo(tmp_path, **_LOCKSTEP_OK)
+    monkeypatch.setattr(sl, "REPO_ROOT", tmp_path)
+    reads: list[str] = []
+    real_read_text = sl.Path.read_text
+
+    def counting_read_text(self, *args, **kwargs):
+        reads.append(self.name)
+        return real_read_text(self, *args, **kwargs)
+
+    monkeypatch.setattr(sl.Path, "read_text", counting_read_text)
+    corpus = sl.LintCorpus()
+    sl.check_include_library_lockstep(corpus=corpus)
+    sl.check_library_no_file_scope_block_comments(corpus=corpus)
+    sl._extract_canonical_counts(corpus)
+    sl.check_read_write_split(corpus=corpus)
+    assert sorted(reads) == sorted(set(reads)), f"a file was read more than once: {reads}"
+    assert "hubitat-mcp-server.groovy" in reads
+
+
+def test_corpus_combined_text_matches_concatenation(monkeypatch, tmp_path):
+    """combined_text() is the app followed by every sorted library, newline-joined --
+    the exact string the catalog checks used to build by hand."""
+    (tmp_path / "hubitat-mcp-server.groovy").write_text("main\n")
+    (tmp_path / "libraries").mkdir()
+    (tmp_path / "libraries" / "b.groovy").write_text("bee\n")
+    (tmp_path / "libraries" / "a.groovy").write_text("ay\n")
+    corpus = sl.LintCorpus(root=tmp_path)
+    assert corpus.combined_text() == "main\n\nay\n\nbee\n"
+    assert sl.LintCorpus(root=tmp_path / "missing").combined_text() is None
+
+
+def test_corpus_overlay_replaces_disk_content(tmp_path):
+    """An overlay is served instead of the on-disk file, and scan_file sees it."""
+    path = tmp_path / "app.groovy"
+    path.write_text("def x = 1\n")
+    corpus = sl.LintCorpus(root=tmp_path, overlays={path: "def c = obj.getClass()\n"})
+    findings = sl.scan_file(path, corpus)
+    assert [f["rule"] for f in findings] == ["SANDBOX-001"]
+    assert findings[0]["file"] == "app.groovy"
+
+
+def test_corpus_checks_match_default_path():
+    """Passing a shared corpus changes nothing about what the real-repo checks report."""
+    corpus = sl.LintCorpus()
+    for check in (
+        sl.check_versions,
+        sl.check_tool_counts,
+        sl.check_gateway_attributions,
+        sl.check_tool_name_consistency,
+        sl.check_tool_guide_pointers,
+        sl.check_discrete_event_caps_doc_parity,
+        sl.check_read_write_split,
+        sl.check_include_library_lockstep,
+    ):
+        assert check(corpus=corpus) == check(), check.__name__
+    for gf in sl.GROOVY_FILES[:2]:
+        assert sl.scan_file(gf, corpus) == sl.scan_source(
+            gf.read_text(encoding="utf-8", errors="replace"), str(gf.relative_to(sl.REPO_ROOT))
+        )
+
+
+# ---------------------------------------------------------------------------
+# LineIndex — bisect offset -> line lookups used by the doc checks
+# ---------------------------------------------------------------------------
+# Must agree exactly with the slice/rfind/find idioms it replaced, including at
+# the edges: offset 0, an offset ON a newline, and a document without a
+# trailing newline.
+
+@pytest.mark.parametrize("content", [
+    "",
+    "one line, no newline",
+    "a\nbb\n\nccc\n",
+    "\n\nlead\ntrail",
+])
+def test_line_index_matches_slice_idioms(content):
+    index = sl.LineIndex(content)
+    for pos in range(len(content) + 1):
+        end = content.find("\n", pos)
+        assert index.line_of(pos) == content[:pos].count("\n") + 1
+        assert index.line_start(pos) == content.rfind("\n", 0, pos) + 1
+        assert index.line_end(pos) == (len(content) if end == -1 else end)
+
+
+def test_table_header_bisect_matches_rescan():
+    """The separator-bisect path of _table_header_for_match returns exactly what
+    the rescan-to-the-row path does, for every tool-table row in the real docs."""
+    for doc in sl.DOC_FILES_FOR_TOOL_NAMES + sl.DOC_FILES_FOR_COUNTS:
+        if not doc.exists():
+            continue
+        content = doc.read_text(encoding="utf-8", errors="replace")
+        index = sl.LineIndex(content)
+        separators = [m.start() for m in sl.TABLE_SEPARATOR_PATTERN.finditer(content)]
+        for m in sl.TOOL_TABLE_ROW_PATTERN.finditer(content):
+            assert sl._table_header_for_match(content, m.start(), separators, index) == \
+                sl._table_header_for_match(content, m.start()), (doc.name, m.start())
+
+
+# ---------------------------------------------------------------------------
+# HistoricalIndex — per-document precomputation of _is_historical_at
+# ---------------------------------------------------------------------------
+# _legacy_is_historical_at is the per-match walk the index replaced, kept here as
+# the oracle: the index must agree with it at every offset, including a heading
+# on the match's own line (cut at the match) and markers that straddle a newline.
+
+def _legacy_is_historical_at(content, match_start, index=None):
+    index = index or sl.LineIndex(content)
+    line = index.line_text(match_start)
+    if any(pat.search(line) for pat in sl.HISTORICAL_LINE_PATTERNS_WIDE):
+        return True
+    window = content[max(0, match_start - sl.HISTORICAL_NEAR_MATCH_WINDOW):match_start]
+    if any(pat.search(window) for pat in sl.HISTORICAL_LINE_PATTERNS_NARROW):
+        return True
+    min_level = float("inf")
+    for m in reversed(list(sl._HEADING_RE.finditer(content, 0, match_start))):
+        level = len(m.group(1))
+        if level >= min_level:
+            continue
+        min_level = level
+        heading_line = content[m.start():min(index.line_end(m.start()), match_start)]
+        if any(pat.match(heading_line) for pat in sl.HISTORICAL_SECTION_HEADINGS):
+            return True
+    return False
+
+
+_HISTORICAL_EDGE_CASES = [
+    "",
+    "# Version History 12 tools total\n",
+    "## Version History\n### v1.0.0\n74 tools\n## Usage\n90 tools\n#### Deep\n5 tools\n",
+    "# Changelog\n## Current\n12 tools\n# Guide\n## Migration\n### Steps\n3 tools\n",
+    "#\n\n# Release Notes\n1 tool\n#\n\n\n## x 2 tools\n",
+    "see v0.7.7\n(all 74 tools) and **v0.8.0**\n: 80 tools; v1.2 v1.3 (5 tools)\n",
+    "22 core tools today, was 18 previously → 30\n(v0.8.0 had 9 gateways)\n",
+    "## History\nold\n# Live\n###### six\n## two\n1 tool\n",
+]
+
+
+@pytest.mark.parametrize("content", _HISTORICAL_EDGE_CASES)
+def test_historical_index_matches_legacy_walk_every_offset(content):
+    historical = sl.HistoricalIndex(content)
+    for pos in range(len(content) + 1):
+        assert historical.at(pos) == _legacy_is_historical_at(content, pos), pos
+
+
+def test_historical_index_matches_legacy_walk_on_docs():
+    """Every count / per-gateway / attribution / tool-row match in the real docs, plus
+    every line start, classifies the same as the per-match walk."""
+    patterns = [pat for pat, _ in sl.COUNT_PATTERNS] + [
+        sl.GATEWAY_FAMILY_PATTERN, sl.PER_GATEWAY_PATTERN, sl.PER_GATEWAY_TABLE_PATTERN,
+        sl.PER_GATEWAY_SEES_PATTERN, sl.GATEWAY_ATTRIBUTION_PATTERN, sl.TOOL_TABLE_ROW_PATTERN,
+    ]
+    docs = set(sl.DOC_FILES_FOR_COUNTS + sl.DOC_FILES_FOR_TOOL_NAMES) | {sl.REPO_ROOT / "CHANGELOG.md"}
+    checked = 0
+    for doc in sorted(docs):
+        if not doc.exists():
+            continue
+        content = doc.read_text(encoding="utf-8", errors="replace")
+        index = sl.LineIndex(content)
+        historical = sl.HistoricalIndex(content, index)
+        offsets = {m.start() for pat in patterns for m in pat.finditer(content)}
+        offsets.update(m.end() for m in re.finditer(r"^", content, re.MULTILINE))
+        # The legacy walk is O(offset) per call; a spread-out sample keeps this quick.
+        offsets = sorted(offsets)
+        for pos in offsets[::max(1, len(offsets) // 150)]:
+            assert historical.at(pos) == _legacy_is_historical_at(content, pos, index), (doc.name, pos)
+            checked += 1
+    assert checked > 500
+
+
+def test_corpus_historical_index_is_memoized_and_reset():
+    doc = sl.DOC_FILES_FOR_COUNTS[0]
+    corpus = sl.LintCorpus(overlays={doc: "## Version History\n5 tools\n"})
+    historical = corpus.historical_index(doc)
+    assert corpus.historical_index(doc) is historical
+    assert historical.at(len("## Version History\n"))
+    corpus.set_text(doc, "## Usage\n5 tools\n")
+    assert not corpus.historical_index(doc).at(len("## Usage\n"))
+
+
+# ---------------------------------------------------------------------------
+# ToolCatalog — one parse of the tool surface shared by the catalog checks
+# ---------------------------------------------------------------------------
+
+def _read_literal(text):
+    reader = sl._GroovyLiteralReader(text)
+    assert reader.seek_return()
+    return reader.value()
+
+
+def test_groovy_literal_reader_values():
+    """Maps, lists, escapes, concatenation, `as Set`, negatives and opaque expressions."""
+    value = _read_literal(
+        'return [a: [1, -2, 3.5], "b c": "x" + \'y\', d: foo(1, [2]) ?: bar, '
+        'e: [:], f: ["p", "q"] as Set, g: "a\\"b\\u0041", h: """multi\nline""", i: true]'
+    )
+    assert value == {
+        "a": [1, -2, 3.5], "b c": "xy", "d": value["d"], "e": {}, "f": ["p", "q"],
+        "g": 'a"bA', "h": "multi\nline", "i": True,
+    }
+    assert isinstance(value["d"], sl.GroovyExpr) and value["d"].text == "foo(1, [2]) ?: bar"
+    assert value.offsets["a"] == len("return [")
+
+
+def test_groovy_literal_reader_skips_comments_and_rejects_bad_shapes():
+    """Comments between entries are blank; a list/map mix is a parse error, not a guess."""
+    assert _read_literal('return [\n  // "hub_ghost",\n  "hub_real" /* , "x" */\n]') == ["hub_real"]
+    with pytest.raises(sl._GroovyParseError):
+        _read_literal('return [a: 1, "b"]')
+
+
+def _legacy_catalog_extract(src):
+    """The per-check DOTALL carve the catalog replaced, for the equivalence test."""
+    gw = re.search(r"^def getGatewayConfig\(\) \{(.*?)^}", src, re.DOTALL | re.MULTILINE).group(1)
+    gateways = {}
+    for m in re.finditer(r"^\s+([a-z_]+):\s*\[\s*description:\s*\".*?\".*?\btools:\s*\[([^\]]+)\]",
+                         gw, re.MULTILINE | re.DOTALL):
+        tools = re.sub(r"//[^\n]*", "", m.group(2))
+        gateways[m.group(1)] = [t.strip().strip("\"'") for t in tools.split(",") if t.strip()]
+    bodies = re.findall(r"^def (?:getAllToolDefinitions|_getAllToolDefinitions_part\w+)\(\) \{(.*?)^}",
+                        src, re.DOTALL | re.MULTILINE)
+    names = re.findall(r"^\s*name:\s*['\"]([a-z0-9_]+)['\"]", "\n".join(bodies), re.MULTILINE)
+    ro_bodies = re.findall(r"^def (?:getReadOnlyToolNames|_readOnlyToolNames_part\w+)\(\) \{(.*?)^}",
+                           src, re.DOTALL | re.MULTILINE)
+    read_only = set()
+    for body in ro_bodies:
+        read_only |= set(re.findall(r'"([a-z_]+)"', re.sub(r"//[^\n]*", "", body)))
+    return gateways, names, read_only
+
+
+def test_tool_catalog_matches_legacy_extraction_on_repo():
+    """The parsed model yields the same gateways, tool names (duplicates included) and
+    read-only set the per-check regexes did, with no unreadable literal."""
+    src = sl.LintCorpus().combined_text()
+    catalog = sl.ToolCatalog(src)
+    gateways, names, read_only = _legacy_catalog_extract(src)
+    assert catalog.errors == {}
+    assert {n: g.tools for n, g in catalog.gateways.items()} == gateways
+    assert sorted(t.name for t in catalog.tools) == sorted(names)
+    assert catalog.name_sets["read_only"].names == read_only
+    assert all(not s.drifted for s in catalog.name_sets.values())
+    for tool in catalog.tools:
+        assert tool.description and tool.source_bytes > tool.description_bytes > 0
+        assert src[tool.offset:].startswith("name")
+
+
+def test_tool_catalog_parsed_once_per_content(monkeypatch):
+    """The canonical-count, name-consistency, attribution and read/write-split checks share
+    one parse per source text; editing a file through the corpus reparses."""
+    built = []
+
+    class CountingCatalog(sl.ToolCatalog):
+        def __init__(self, src):
+            built.append(len(src))
+            super().__init__(src)
+
+    monkeypatch.setattr(sl, "ToolCatalog", CountingCatalog)
+    monkeypatch.setattr(sl, "_CATALOG_CACHE", {})
+    corpus = sl.LintCorpus()
+    sl.check_tool_counts(corpus=corpus)
+    sl.check_tool_name_consistency(corpus=corpus)
+    sl.check_gateway_attributions(corpus=corpus)
+    sl.check_read_write_split(corpus=corpus)
+    sl._extract_canonical_counts()  # a fresh corpus over the same content hits the cache
+    assert len(built) == 1
+    corpus.set_text(corpus.server_path, corpus.server_text + "\n// edited\n")
+    assert sl._extract_canonical_counts(corpus) is not None
+    assert len(built) == 2
+
+
+def test_tool_catalog_ignores_commented_out_definition():
+    """A tool definition commented out inside a chunk no longer counts (the old line regex
+    counted it -- the over-count the extraction comment used to accept)."""
+    src = sl._build_read_write_split_corpus({"hub_read_x": ["hub_get_x"]}, ["hub_get_x"], ["hub_get_x"])
+    src = src.replace('        [\n            name: "hub_get_x"\n        ],',
+                      '        [\n            name: "hub_get_x"\n        ],\n'
+                      '        /*\n        [\n            name: "hub_old_x"\n        ],\n        */')
+    assert "hub_old_x" in src
+    assert sl.ToolCatalog(src).tool_names == {"hub_get_x"}
+
+
+def test_tool_catalog_public_extraction_api():
+    """The methods tools like catalog_size read literals through: bare bodies, a literal at
+    an offset, call arguments, and top-level `+` terms."""
+    src = (
+        "def bare() {\n    [a: 1]\n}\n"
+        "def meta() {\n    def m = [x: [1, 2]]\n    m.putAll([b: 2])\n    m.putAll(other())\n"
+        "    return m\n}\n"
+    )
+    catalog = sl.ToolCatalog(src)
+    assert catalog.body_literal(catalog.methods["bare"][0]) == {"a": 1}
+    meta = catalog.methods["meta"][0]
+    assert catalog.literal_at(src.index("[x:"), meta.body_end) == {"x": [1, 2]}
+    args = catalog.call_arguments(meta, "putAll")
+    assert args[0] == {"b": 2} and isinstance(args[1], sl.GroovyExpr) and args[1].text == "other()"
+    assert sl.ToolCatalog.split_terms("a() + [b: [1] + [2]] + c") == ["a()", "[b: [1] + [2]]", "c"]
+    assert sl.ToolCatalog.split_terms("a() + ") == ["a()", ""]
+    assert sl.ToolCatalog.parse_value('"x" + "y"') == "xy"
+    assert sl.ToolCatalog.parse_value("[a: 1, 2]") is None
+
+
+# ---------------------------------------------------------------------------
+# scan_files --jobs — process-pool fan-out of the per-file scan
+# ---------------------------------------------------------------------------
+
+def test_scan_files_parallel_matches_serial(tmp_path):
+    """A pooled scan returns the serial scan's findings in the same order, and an
+    overlaid (in-memory) file is scanned in-process from the overlay."""
+    files = []
+    for i, body in enumerate([
+        "def a = obj.getClass()\n",
+        "def t = new Thread({ -> })\ndef l = Locale.default\n",
+        "def ok = 1\n",
+    ]):
+        path = tmp_path / f"f{i}.groovy"
+        path.write_text(body)
+        files.append(path)
+    overlay = tmp_path / "unsaved.groovy"
+    files.append(overlay)
+    corpus = sl.LintCorpus(root=tmp_path, overlays={overlay: "Runtime.exec('ls')\n"})
+    serial = sl.scan_files(files, corpus, jobs=1)
+    pooled = sl.scan_files(files, corpus, jobs=2)
+    assert pooled == serial
+    assert [f["rule"] for f in serial] == ["SANDBOX-001", "SANDBOX-006", "SANDBOX-002", "SANDBOX-009"]
+
+
+def test_parse_args_jobs_default_and_validation(monkeypatch):
+    monkeypatch.setattr(sl, "IS_CI", False)
+    assert sl._parse_args([]).jobs == 1
+    monkeypatch.setattr(sl, "IS_CI", True)
+    assert sl._parse_args([]).jobs == (os.cpu_count() or 1)
+    assert sl._parse_args(["--jobs", "3"]).jobs == 3
+    with pytest.raises(SystemExit):
+        sl._parse_args(["--jobs", "0"])
+
+
+# ---------------------------------------------------------------------------
+# ScanCache / --changed-since — skip re-scanning unchanged Groovy files
+# ---------------------------------------------------------------------------
+
+def _cache_fixture(tmp_path):
+    path = tmp_path / "a.groovy"
+    path.write_text("def a = obj.getClass()\n")
+    return path, sl.LintCorpus(root=tmp_path)
+
+
+def test_scan_cache_warm_run_skips_scanning(monkeypatch, tmp_path):
+    """A second run over unchanged content is served from the cache -- same
+    findings, display path restored -- without calling scan_file."""
+    path, corpus = _cache_fixture(tmp_path)
+    cache_path = tmp_path / "cache.json"
+    cache = sl.ScanCache(cache_path)
+    cold = sl.scan_files([path], corpus, cache=cache)
+    cache.save()
+
+    def no_scan(*_a, **_k):
+        raise AssertionError("scan_file called on a cached file")
+
+    monkeypatch.setattr(sl, "scan_file", no_scan)
+    warm_cache = sl.ScanCache(cache_path)
+    warm = sl.scan_files([path], sl.LintCorpus(root=tmp_path), cache=warm_cache)
+    assert warm == cold
+    assert warm_cache.hits == 1
+    assert warm[0]["file"] == "a.groovy"
+
+
+def test_scan_cache_invalidated_by_rules_change(monkeypatch, tmp_path):
+    """A RULES edit changes the fingerprint, so the whole cache is discarded."""
+    path, corpus = _cache_fixture(tmp_path)
+    cache_path = tmp_path / "cache.json"
+    cache = sl.ScanCache(cache_path)
+    sl.scan_files([path], corpus, cache=cache)
+    cache.save()
+    monkeypatch.setattr(sl, "RULES", [r for r in sl.RULES if r["id"] != "SANDBOX-001"])
+    fresh = sl.ScanCache(cache_path)
+    assert fresh.entries == {}
+    assert sl.scan_files([path], sl.LintCorpus(root=tmp_path), cache=fresh) == []
+
+
+def test_scan_cache_edited_file_rescanned(tmp_path):
+    """A changed file has a new digest and is scanned; the save keeps only the
+    entries used this run."""
+    path, corpus = _cache_fixture(tmp_path)
+    cache_path = tmp_path / "cache.json"
+    cache = sl.ScanCache(cache_path)
+    sl.scan_files([path], corpus, cache=cache)
+    cache.save()
+    path.write_text("def t = new Thread({ -> })\n")
+    cache = sl.ScanCache(cache_path)
+    findings = sl.scan_files([path], sl.LintCorpus(root=tmp_path), cache=cache)
+    assert [f["rule"] for f in findings] == ["SANDBOX-006"]
+    assert cache.hits == 0
+    cache.save()
+    assert len(sl.ScanCache(cache_path).entries) == 1
+
+
+def test_scan_cache_corrupt_file_is_cold(tmp_path):
+    cache_path = tmp_path / "cache.json"
+    cache_path.write_text("{not json")
+    assert sl.ScanCache(cache_path).entries == {}
+
+
+def test_changed_files_since(tmp_path):
+    """Committed-since-ref, unstaged and untracked changes are all reported; a bad
+    ref yields None so the caller falls back to a full scan."""
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    git("-c", "user.email=t@t", "-c", "user.name=t", "commit", "-q", "--allow-empty", "-m", "base")
+    (tmp_path / "committed.groovy").write_text("a\n")
+    (tmp_path / "edited.groovy").write_text("b\n")
+    (tmp_path / "untouched.groovy").write_text("c\n")
+    git("add", ".")
+    git("-c", "user.email=t@t", "-c", "user.name=t", "commit", "-q", "-m", "add")
+    (tmp_path / "edited.groovy").write_text("b2\n")
+    (tmp_path / "new.groovy").write_text("d\n")
+
+    since_base = sl._changed_files_since("HEAD~1", tmp_path)
+    assert {p.name for p in since_base} == {"committed.groovy", "edited.groovy", "untouched.groovy", "new.groovy"}
+    since_head = sl._changed_files_since("HEAD", tmp_path)
+    assert {p.name for p in since_head} == {"edited.groovy", "new.groovy"}
+    assert sl._changed_files_since("no-such-ref", tmp_path) is None
+
+
+# ---------------------------------------------------------------------------
+# --profile — per-check / per-suite / per-rule timing report
+# ---------------------------------------------------------------------------
+
+def test_profiling_engine_same_hits_and_counts_matches(monkeypatch):
+    """The instrumented engine reports exactly the plain engine's findings, and each
+    rule's lines_matched equals the findings it produced."""
+    sources = [case[1] for case in sl.SELF_TEST_CASES]
+    plain = [sl.scan_source(src, "<t>") for src in sources]
+    profile = sl.LintProfile()
+    monkeypatch.setattr(sl, "_PROFILE", profile)
+    assert [sl.scan_source(src, "<t>") for src in sources] == plain
+    produced = {}
+    for findings in plain:
+        for f in findings:
+            produced[f["rule"]] = produced.get(f["rule"], 0) + 1
+    assert {rid: s["lines_matched"] for rid, s in profile.rules.items() if s["lines_matched"]} == produced
+    assert all(s["lines_searched"] >= s["lines_matched"] for s in profile.rules.values())
+    assert profile.gate["lines"] == sum(len(src.split("\n")) for src in sources)
+
+
+def test_profile_report_and_top_table(tmp_path, capsys):
+    """Checks and suites land in their buckets with wall/CPU times; every RULES entry is
+    in the report; the table lists the slowest rows first."""
+    profile = sl.LintProfile()
+    findings = sl._run_check(profile, sl.check_read_write_split,
+                             src_override=sl.READ_WRITE_SPLIT_SELF_TEST_CASES[3][1])
+    assert [f["rule"] for f in findings] == ["read-write-split-stranded-read"]
+    with profile.timed("self_test_suites", "demo") as entry:
+        entry["failures"] = 0
+    out = tmp_path / "profile.json"
+    profile.write(out)
+    report = json.loads(out.read_text())
+    assert [c["name"] for c in report["checks"]] == ["check_read_write_split"]
+    assert report["checks"][0]["findings"] == 1
+    assert report["self_test_suites"][0]["name"] == "demo"
+    assert [r["id"] for r in report["rules"]] == [r["id"] for r in sl.RULES]
+    for entry in report["checks"] + report["self_test_suites"]:
+        assert entry["wall_s"] >= 0 and entry["cpu_s"] >= 0
+    walls = [row[2] for row in profile.top(10)]
+    assert walls == sorted(walls, reverse=True)
+    profile.print_top(3)
+    assert "check_read_write_split" in capsys.readouterr().out
+
+
+def test_parse_args_profile():
+    assert sl._parse_args([]).profile is None
+    assert sl._parse_args(["--profile"]).profile == sl.PROFILE_PATH
+    assert sl._parse_args(["--profile", "x.json", "--profile-top", "3"]).profile_top == 3
+
+
+# ---------------------------------------------------------------------------
+# Parallel self-test runner
+# ---------------------------------------------------------------------------
+
+def _suite_output(text: str) -> str:
+    """Self-test output minus the timing table, the one part that varies run to run."""
+    head, sep, tail = text.partition("Self-test suites (")
+    return head + tail.split("\n", len(sl.SELF_TEST_SUITES) + 1)[-1] if sep else text
+
+
+def test_parallel_self_test_matches_serial(capsys):
+    assert sl.run_self_test(jobs=1) == 0
+    serial = capsys.readouterr().out
+    assert sl.run_self_test(jobs=3) == 0
+    parallel = capsys.readouterr().out
+    assert _suite_output(parallel) == _suite_output(serial)
+    for name, _ in sl.SELF_TEST_SUITES:
+        assert re.search(rf"^  {re.escape(name)} +\d+\.\d\ds  ok$", parallel, re.MULTILINE)
+
+
+def _slow_passing_suite():
+    time.sleep(0.2)
+    print("slow suite output")
+    return 0
+
+
+def _fast_failing_suite():
+    print("fast suite output")
+    return 2
+
+
+def test_parallel_self_test_output_in_suite_order(monkeypatch, capsys):
+    """The slow first suite finishes last, yet its output still comes first and the
+    failures are summed across workers."""
+    monkeypatch.setattr(sl, "SELF_TEST_SUITES", [("slow", _slow_passing_suite),
+                                                 ("fast", _fast_failing_suite)])
+    assert sl.run_self_test(jobs=2) == 1
+    out = capsys.readouterr().out
+    assert out.index("slow suite output") < out.index("fast suite output")
+    assert "--- 2 self-test failure(s) ---" in out
+    assert re.search(r"^  fast +\d+\.\d\ds  FAIL$", out, re.MULTILINE)
+
+# ---------------------------------------------------------------------------
+# Scaling benchmark (bench_sandbox_lint.py scaling)
+# ---------------------------------------------------------------------------
+
+
+def test_growth_exponent_fit():
+    assert bench.growth_exponent([(1000, 0.01), (5000, 0.05), (20000, 0.2)]) == pytest.approx(1.0)
+    assert bench.growth_exponent([(1000, 0.01), (5000, 0.25), (20000, 4.0)]) == pytest.approx(2.0)
+    assert bench.growth_exponent([(1000, 0.01), (1000, 0.02)]) is None
+
+
+def test_synthetic_scaling_corpora_are_clean():
+    """The synthetic corpora parse with the real extractors and carry consistent claims,
+    so the benchmark times the checks' normal path, not their error exits."""
+    groovy, (gateways, _read_only, all_tools) = bench.build_synthetic_groovy(40_000)
+    assert 30_000 < len(groovy) < 50_000
+    canonical = sl._extract_canonical_counts(bench._synthetic_corpus(groovy, {}))
+    assert canonical["total"] == len(all_tools)
+    assert canonical["per_gateway"] == {name: len(tools) for name, tools in gateways.items()}
+    docs = bench.build_synthetic_docs(20_000, canonical)
+    assert set(docs) == set(sl.DOC_FILES_FOR_COUNTS)
+    assert sum(len(t) for t in docs.values()) >= 20_000
+    corpus = bench._synthetic_corpus(groovy, docs)
+    assert sl.check_tool_counts(corpus=corpus) == []
+    assert sl.check_read_write_split(corpus=corpus) == []
+
+
+# ---------------------------------------------------------------------------
+# Language server (--lsp)
+# ---------------------------------------------------------------------------
+
+_LSP_EDIT_SNIPPETS = ['"""', "'''", "/*", "*/", "\n", "\n\n", "// note", "x",
+                      '"${dev.getClass()}"', "new Thread()\n", "",
+                      "devices.each { d -> hubInternalGet(d)", "{", "}\n",
+                      "state.n = JsonOutput.toJson(result)\n"]
+
+
+def test_incremental_scan_matches_full_scan_across_edits():
+    """After any sequence of ranged edits -- including ones that open or close a
+    multi-line string or block comment -- the per-line state equals a fresh scan."""
+    import random
+    rng = random.Random(209)
+    text = (sl.REPO_ROOT / "hubitat-mcp-rule.groovy").read_text(encoding="utf-8")
+    scan = sl.IncrementalScan(text, "t.groovy")
+    assert scan.findings() == sl.scan_source(text, "t.groovy")
+    for step in range(150):
+        a = rng.randrange(len(scan.lines))
+        b = min(len(scan.lines) - 1, a + rng.choice([0, 0, 1, 4]))
+        col_a = rng.randint(0, len(scan.lines[a]))
+        col_b = rng.randint(col_a if b == a else 0, len(scan.lines[b]))
+        scan.edit((a, col_a), (b, col_b), rng.choice(_LSP_EDIT_SNIPPETS))
+        if step % 25 == 0:
+            assert scan.stripped == sl.strip_comments_and_strings(scan.text)
+            assert scan.findings() == sl.scan_source(scan.text, "t.groovy")
+    assert scan.findings() == sl.scan_source(scan.text, "t.groovy")
+
+
+def test_incremental_scan_relints_only_what_an_edit_reaches():
+    body = "\n".join(f"def v{i} = {i}" for i in range(200))
+    scan = sl.IncrementalScan(body, "t.groovy")
+    assert scan.edit((100, 0), (100, 0), "def c = obj.getClass(); ") == 1
+    assert [f["line"] for f in scan.findings()] == [101]
+    # Opening a heredoc re-reads every following line (they all change state), and so does
+    # closing it again; an edit inside it stops as soon as the state is back in step.
+    assert scan.edit((50, 0), (50, 0), 'def s = """') == 150
+    assert scan.findings() == []
+    assert scan.edit((60, 0), (60, 0), '"""') == 140
+    assert scan.edit((55, 0), (55, 0), "still inside the heredoc ") == 1
+    assert scan.findings() == sl.scan_source(scan.text, "t.groovy")
+    assert [f["line"] for f in scan.findings()] == [101]
+
+
+def test_utf16_positions():
+    assert sl._utf16_to_index("abc", 2) == 2
+    assert sl._utf16_to_index("a\U0001F600b", 3) == 2  # the emoji is two UTF-16 units
+    assert sl._utf16_to_index("é", 5) == 1
+    assert sl._utf16_len("a\U0001F600") == 3
+
+
+def _lsp_frame(message):
+    body = json.dumps({"jsonrpc": "2.0", **message}).encode("utf-8")
+    return b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+
+def _lsp_messages(data):
+    import io
+    stream, out = io.BytesIO(data), []
+    while (message := sl._read_lsp_message(stream)) is not None:
+        out.append(message)
+    return out
+
+
+def test_language_server_cross_file_pass(monkeypatch, tmp_path):
+    """The debounced pass reads open buffers over disk, anchors findings to their file's
+    URI, and clears a file's diagnostics once its findings go away."""
+    import io
+    seen = []
+
+    def fake_check(corpus):
+        text = corpus.text(corpus.server_path)
+        seen.append(text)
+        return [{"file": "hubitat-mcp-server.groovy", "line": 2, "rule": "TOOL_COUNT",
+                 "message": "drift", "severity": "error", "source": ""}] if "drift" in text else []
+
+    monkeypatch.setattr(sl, "CROSS_FILE_CHECKS", [fake_check])
+    out = io.BytesIO()
+    server = sl.LanguageServer(io.BytesIO(), out, root=tmp_path, debounce=0)
+    uri = (tmp_path / "hubitat-mcp-server.groovy").as_uri()
+    server.handle({"method": "textDocument/didOpen", "params": {"textDocument": {
+        "uri": uri, "languageId": "groovy", "version": 1, "text": "def a = 1\n// drift"}}})
+    server._start_cross_file()
+    server._finish_cross_file(server.inbox.get(timeout=10)[1])
+    server.handle({"method": "textDocument/didChange", "params": {
+        "textDocument": {"uri": uri, "version": 2},
+        "contentChanges": [{"range": {"start": {"line": 1, "character": 3},
+                                      "end": {"line": 1, "character": 8}}, "text": "ok"}]}})
+    server._start_cross_file()
+    server._finish_cross_file(server.inbox.get(timeout=10)[1])
+    assert seen == ["def a = 1\n// drift", "def a = 1\n// ok"]
+    published = [m["params"]["diagnostics"] for m in _lsp_messages(out.getvalue())]
+    # open, cross-file pass (1 finding), edit (still showing it), cross-file pass (cleared)
+    assert [[d["code"] for d in diags] for diags in published] == [[], ["TOOL_COUNT"], ["TOOL_COUNT"], []]
+    assert published[1][0]["range"]["start"]["line"] == 1
+
+
+def test_language_server_stdio_session():
+    """End to end over stdio: diagnostics on open, cleared by an incremental edit, and a
+    clean shutdown/exit. The cross-file pass is debounced out of the way."""
+    uri = (sl.REPO_ROOT / "scratch.groovy").as_uri()
+    messages = [
+        {"id": 1, "method": "initialize", "params": {"capabilities": {}}},
+        {"method": "initialized", "params": {}},
+        {"method": "textDocument/didOpen", "params": {"textDocument": {
+            "uri": uri, "languageId": "groovy", "version": 1,
+            "text": "def x = 1\ndef c = obj.getClass()\n"}}},
+        {"method": "textDocument/didChange", "params": {
+            "textDocument": {"uri": uri, "version": 2},
+            "contentChanges": [{"range": {"start": {"line": 1, "character": 12},
+                                          "end": {"line": 1, "character": 22}}, "text": "name"}]}},
+        {"id": 2, "method": "hover", "params": {}},
+        {"id": 3, "method": "shutdown"},
+        {"method": "exit"},
+    ]
+    proc = subprocess.run(
+        [sys.executable, str(sl.REPO_ROOT / "tests" / "sandbox_lint.py"), "--lsp", "--lsp-debounce", "600"],
+        input=b"".join(_lsp_frame(m) for m in messages), capture_output=True, timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr
+    replies = _lsp_messages(proc.stdout)
+    assert replies[0]["id"] == 1 and replies[0]["result"]["capabilities"]["textDocumentSync"]["change"] == 2
+    diagnostics = [m["params"]["diagnostics"] for m in replies
+                   if m.get("method") == "textDocument/publishDiagnostics"]
+    assert [[d["code"] for d in diags] for diags in diagnostics] == [["SANDBOX-001"], []]
+    assert diagnostics[0][0]["range"] == {"start": {"line": 1, "character": 0},
+                                          "end": {"line": 1, "character": 22}}
+    errors = {m["id"]: m for m in replies if "error" in m}
+    assert errors[2]["error"]["code"] == -32601
+    assert {"id": 3, "result": None, "jsonrpc": "2.0"} in replies
+
+
+def test_parse_args_lsp():
+    args = sl._parse_args(["--lsp", "--lsp-debounce", "0.25"])
+    assert args.lsp and args.lsp_debounce == 0.25
+    assert sl._parse_args([]).lsp is False
+
+
+# ---------------------------------------------------------------------------
+# Findings pipeline — streaming emitters, SARIF / JSONL, --max-findings
+# ---------------------------------------------------------------------------
+
+def _pipeline_findings():
+    return [
+        _sample_finding(),
+        {**_sample_finding(severity="warning", line=0), "rule": "TOOL_COUNT", "file": "README.md"},
+        {**_sample_finding(severity="info"), "rule": "PERF-002", "suggestion": "Hoist it."},
+    ]
+
+
+def _two_error_findings():
+    return [*_pipeline_findings(), {**_sample_finding(line=50), "rule": "SANDBOX-002"},
+            {**_sample_finding(severity="info", line=60), "rule": "PERF-002"}]
+
+
+def test_emit_findings_stops_pulling_at_max_findings():
+    pulled = []
+
+    def source():
+        for f in _two_error_findings():
+            pulled.append(f["rule"])
+            yield f
+        pulled.append("<end>")
+
+    out = io.StringIO()
+    counts = sl.emit_findings(source(), [sl.JsonlEmitter(out)], max_findings=1)
+    assert counts.errors == 1 and counts.total == 3 and counts.truncated
+    # The second error was pulled (that is how truncation is known), what follows never was.
+    assert pulled == ["SANDBOX-001", "TOOL_COUNT", "PERF-002", "SANDBOX-002"]
+    assert len(out.getvalue().splitlines()) == 3
+    exact = sl.emit_findings(iter(_two_error_findings()), [], max_findings=2)
+    assert exact.total == 5 and not exact.truncated
+
+
+def test_max_findings_never_counts_warnings_or_info():
+    counts = sl.emit_findings(iter(_pipeline_findings()[1:] * 3), [], max_findings=1)
+    assert counts.total == 6 and counts.errors == 0 and not counts.truncated
+
+
+def test_text_and_annotation_emitters():
+    out = io.StringIO()
+    counts = sl.emit_findings(iter(_pipeline_findings()), [sl.TextEmitter(out), sl.AnnotationEmitter(out)])
+    text = out.getvalue()
+    assert counts.errors == 1 and counts.by_severity == {"error": 1, "warning": 1, "info": 1}
+    assert "::error file=hubitat-mcp-server.groovy,line=42::[SANDBOX-001]" in text
+    assert "::notice file=" in text and "  suggestion: Hoist it." in text
+    assert text.endswith("--- 1 error(s), 1 warning(s), 1 info ---\n")
+    empty = io.StringIO()
+    sl.emit_findings(iter([]), [sl.TextEmitter(empty)])
+    assert empty.getvalue().startswith("Sandbox lint: all checks passed.\n")
+
+
+def test_jsonl_emitter_round_trips_each_finding():
+    out = io.StringIO()
+    sl.emit_findings(iter(_pipeline_findings()), [sl.JsonlEmitter(out)])
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == _pipeline_findings()
+
+
+def test_sarif_emitter_writes_one_valid_log():
+    out = io.StringIO()
+    sl.emit_findings(iter(_two_error_findings()), [sl.SarifEmitter(out)], max_findings=1)
+    log = json.loads(out.getvalue())
+    assert log["version"] == "2.1.0" and log["$schema"] == sl.SARIF_SCHEMA
+    (run,) = log["runs"]
+    assert [r["ruleId"] for r in run["results"]] == ["SANDBOX-001", "TOOL_COUNT", "PERF-002"]
+    first, second, _ = run["results"]
+    assert first["level"] == "error" and first["ruleIndex"] == 0
+    assert first["locations"][0]["physicalLocation"]["region"] == {"startLine": 42}
+    # A file-level finding (line 0) has a location but no region.
+    assert "region" not in second["locations"][0]["physicalLocation"]
+    rules = run["tool"]["driver"]["rules"]
+    assert [r["id"] for r in rules] == ["SANDBOX-001", "TOOL_COUNT", "PERF-002"]
+    assert rules[0]["defaultConfiguration"] == {"level": "error"}
+    assert rules[1] == {"id": "TOOL_COUNT"}
+    assert run["invocations"] == [{"executionSuccessful": False}]
+    empty = io.StringIO()
+    sl.emit_findings(iter([]), [sl.SarifEmitter(empty)])
+    assert json.loads(empty.getvalue())["runs"][0]["results"] == []
+
+
+def test_iter_scan_files_streams_file_by_file(tmp_path, monkeypatch):
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.groovy"
+        path.write_text("def c = obj.getClass()\n")
+        paths.append(path)
+    scanned = []
+    real_scan_file = sl.scan_file
+    monkeypatch.setattr(sl, "scan_file", lambda p, corpus=None: scanned.append(p.name) or real_scan_file(p, corpus))
+    stream = sl.iter_scan_files(paths, sl.LintCorpus(root=tmp_path))
+    assert next(stream)["file"] == "a.groovy"
+    assert scanned == ["a.groovy"]
+    stream.close()
+    assert scanned == ["a.groovy"]
+
+
+def test_main_writes_jsonl_and_stops_at_max_findings(tmp_path, monkeypatch, capsys):
+    def check_two_errors(corpus=None):
+        return [_sample_finding(line=2), _sample_finding(line=1)]
+
+    monkeypatch.setattr(sl, "GROOVY_FILES", [])
+    monkeypatch.setattr(sl, "CROSS_FILE_CHECKS", [check_two_errors])
+    out = tmp_path / "findings.jsonl"
+    assert sl.main(["--no-cache", "--jsonl", str(out)]) == 1
+    # Each cross-file check's batch is emitted sorted by file and line.
+    assert [json.loads(line)["line"] for line in out.read_text(encoding="utf-8").splitlines()] == [1, 2]
+    capsys.readouterr()
+    assert sl.main(["--no-cache", "--max-findings", "1", "--jsonl", str(out)]) == 1
+    assert len(out.read_text(encoding="utf-8").splitlines()) == 1
+    assert "--- stopped after 1 error(s) (--max-findings) ---" in capsys.readouterr().out
+
+
+def test_main_max_findings_passes_a_tree_with_only_non_error_findings(monkeypatch, capsys):
+    """A green tree stays green under --max-findings however many warnings and info
+    findings it has: they are all reported and none of them stops or fails the run."""
+    def check_non_errors(corpus=None):
+        return [_sample_finding(severity=severity, line=line)
+                for line, severity in enumerate(["info", "warning", "info", "info"], 1)]
+
+    monkeypatch.setattr(sl, "GROOVY_FILES", [])
+    monkeypatch.setattr(sl, "CROSS_FILE_CHECKS", [check_non_errors])
+    assert sl.main(["--no-cache", "--max-findings", "2"]) == 0
+    out = capsys.readouterr().out
+    assert "--- 0 error(s), 1 warning(s), 3 info ---" in out and "stopped after" not in out
+
+
+def test_parse_args_rejects_two_stdout_emitters():
+    with pytest.raises(SystemExit):
+        sl._parse_args(["--sarif", "-", "--jsonl", "-"])
+    args = sl._parse_args(["--sarif", "out.sarif", "--max-findings", "5"])
+    assert args.sarif == "out.sarif" and args.max_findings == 5 and args.jsonl is None
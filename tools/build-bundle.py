@@ -32,20 +32,90 @@ is deterministic (fixed DOS epoch, pinned deflate level) so two builds of the
 same library source on the same zlib are byte-identical and can be compared
 directly (the e2e cmp-byte-verifies the published artifact against its own CI rebuild).
 
-Run:  python3 tools/build-bundle.py
+Incremental: the build writes bundles/mcp-libraries.manifest.json beside the zip
+recording, per entry, the SHA-256 of the normalized source, the CRC-32, and the
+size + SHA-256 of its deflated stream. The previous zip is the cache: its streams
+are looked up by source SHA-256, so a library whose source is unchanged is spliced
+in raw (byte-identical -- the same level on the same zlib gives the same stream)
+and only changed sources are deflated. When every source and the zip itself still
+match the manifest, the build is a no-op. A manifest from another deflate level or
+zlib version, or a stream whose digest no longer matches, is simply not reused.
+
+Entries that do need deflating are compressed in parallel on a thread pool (zlib
+drops the GIL) and the zip is then assembled in LIBS order, so the output is
+byte-identical to a serial build.
+
+verify() holds the zip to the manifest without compressing anything: central
+directory records, local headers, stored-stream digests, and each stream inflated
+back to its recorded CRC and source digest. --paranoid adds a full re-deflate.
+The manifest is published next to the zip, so a consumer holding the artifact
+(the e2e deploy) can `--from` it: the artifact is adopted when its manifest
+records exactly this checkout's sources and the zip verifies -- the same proof
+as a byte-compare against a rebuild, without the rebuild.
+
+--report prints each library's raw and compressed size and share of the zip, the
+headroom under the hub's 2,000,000-byte fetch cap, the zip size at each of the
+last N commits touching libraries/ (recomputed from git, each distinct blob
+deflated once), and a least-squares projection of when the cap is reached; it
+exits 1 when the zip is over --max-bytes.
+
+--delta-since REF also writes bundles/delta/<sha>/mcp-libraries.zip (+ manifest):
+only the libraries whose source changed since REF, with install.txt/update.txt
+listing just those, under the same namespace, bundle name and zip basename so
+the hub updates the existing bundle entity. --delta-url writes a copy of
+packageManifest.json beside it with the bundle pointed at the delta's URL; the
+repo's manifest is never rewritten, since a fresh install needs every library.
+
+--compact strips comments, indentation and blank lines from the library sources
+before packaging (compact_source; the lint's comment tokenizer decides what is a
+comment, so string and heredoc content is untouched) -- the zip is about half the
+size, and the shipped files carry no file-scope block comment for the hub to trip
+on (sandbox_lint BP20). Line numbers in a hub error for a library then refer to the
+compacted file: bundles/mcp-libraries.linemap.json maps them back, and
+--map-line NAME:LINE prints the repo file and line. The manifest records
+"compact": true; the published artifact stays uncompacted.
+
+Run:  python3 tools/build-bundle.py [--force] [--jobs N] [--compact] [--paranoid] [--from ZIP]
+                                    [--report [--history N] [--max-bytes BYTES]]
+                                    [--delta-since REF [--delta-url URL]]
+      python3 tools/build-bundle.py --map-line NAME:LINE
+
+  --force     ignore the manifest and deflate every entry (the output is the same bytes)
+  --jobs N    deflate threads (default: one per CPU; 1 = serial)
+  --compact   package comment-stripped libraries and write the line map
+  --map-line NAME:LINE  print the repo source line of line LINE of compacted entry NAME
+  --paranoid  verify also re-deflates every entry and requires the identical stream
+  --from ZIP  adopt ZIP (+ the <name>.manifest.json beside it) instead of building;
+              exit 1 when it is not this checkout's bundle
+  --report    size report + history trend; exit 1 over --max-bytes (default 1,600,000)
+  --delta-since REF  also build the delta bundle of libraries changed since REF
+  --delta-url URL    with --delta-since: write the delta's packageManifest.json
 """
 
 from __future__ import annotations
 
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import shutil
+import struct
+import subprocess
 import sys
 import zipfile
 import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 LIB_DIR = REPO_ROOT / "libraries"
 OUTPUT_DIR = REPO_ROOT / "bundles"
 OUTPUT_ZIP = OUTPUT_DIR / "mcp-libraries.zip"
+MANIFEST_JSON = OUTPUT_DIR / "mcp-libraries.manifest.json"
+LINE_MAP_JSON = OUTPUT_DIR / "mcp-libraries.linemap.json"
 
 NAMESPACE = "mcp"
 BUNDLE_NAME = "mcp_libraries"
@@ -141,56 +211,357 @@ LIBS = [
 _FIXED_DT = (1980, 1, 1, 0, 0, 0)
 _DEFLATE_LEVEL = 9  # pinned so deflate output is reproducible build-to-build
 
+# The hub's /bundle2/uploadZipFromUrl fetch cap (above), and the --report default failure
+# threshold below it: over the cap is only ever a generic error on a user's hub, so CI
+# fails while there is still a fifth of the cap in hand.
+HUB_FETCH_CAP = 2_000_000
+REPORT_MAX_BYTES = 1_600_000
+
+
+# Bump when the manifest layout or the entry encoding changes: an old manifest is then not reused.
+_MANIFEST_FORMAT = 1
+# Zip records (PKWARE APPNOTE 4.3.7, 4.3.12, 4.3.16), written by _ZipWriter and read back
+# by _stream / verify.
+# Local file header: signature, versions, flags, method, time, date, CRC, sizes, name/extra lengths.
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+# Central directory header: signature, creator version + system, extract version, reserved,
+# flags, method, time, date, CRC, sizes, name/extra/comment lengths, disk, internal and
+# external attributes, local header offset.
+_CENTRAL_HEADER = struct.Struct("<4s4B4H3L5H2L")
+# End of central directory: signature, disk numbers, entry counts, directory size and
+# offset, comment length.
+_END_OF_DIRECTORY = struct.Struct("<4s4H2LH")
+_ZIP_VERSION = 20  # 2.0: deflate
+_ZIP_UTF8 = 0x800  # general purpose flag bit 11: the name is UTF-8
+_DOS_DATE = (_FIXED_DT[0] - 1980) << 9 | _FIXED_DT[1] << 5 | _FIXED_DT[2]
+_DOS_TIME = _FIXED_DT[3] << 11 | _FIXED_DT[4] << 5 | _FIXED_DT[5] // 2
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _deflate(data: bytes) -> bytes:
+    """Raw deflate at the pinned level -- the same stream ZipFile.writestr produces."""
+    co = zlib.compressobj(_DEFLATE_LEVEL, zlib.DEFLATED, -15)
+    return co.compress(data) + co.flush()
+
+
+class _ZipWriter:
+    """Writes a zip from entries deflated ahead of time, which zipfile has no public API
+    for (writestr always compresses). Each entry is a local header plus its stream;
+    close() appends the central directory and the end record. The fields are exactly the
+    ones ZipFile.writestr writes for a seekable file -- versions 2.0, creator system 3
+    (unix: ZipInfo would default to 0 on Windows, so a zip built there would differ),
+    the fixed DOS timestamp, 0644 attributes, no extra field, comment or zip64 -- so the
+    output stays byte-identical to a writestr build and readable by zipfile."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.offset = 0
+        self.central: list[bytes] = []
+
+    def add(self, name: str, data: bytes, stream: bytes) -> int:
+        """Append `data` as the deflated `stream`; returns its CRC-32."""
+        try:
+            raw, flags = name.encode("ascii"), 0
+        except UnicodeEncodeError:
+            raw, flags = name.encode("utf-8"), _ZIP_UTF8
+        crc = zlib.crc32(data)
+        fields = (flags, zipfile.ZIP_DEFLATED, _DOS_TIME, _DOS_DATE, crc, len(stream), len(data))
+        self.central.append(_CENTRAL_HEADER.pack(
+            b"PK\x01\x02", _ZIP_VERSION, 3, _ZIP_VERSION, 0, *fields,
+            len(raw), 0, 0, 0, 0, 0o644 << 16, self.offset) + raw)
+        header = _LOCAL_HEADER.pack(b"PK\x03\x04", _ZIP_VERSION, *fields, len(raw), 0) + raw
+        self.fp.write(header)
+        self.fp.write(stream)
+        self.offset += len(header) + len(stream)
+        return crc
+
+    def close(self) -> None:
+        directory = b"".join(self.central)
+        self.fp.write(directory)
+        self.fp.write(_END_OF_DIRECTORY.pack(b"PK\x05\x06", 0, 0, len(self.central), len(self.central),
+                                             len(directory), self.offset, 0))
+
+
+def _read_manifest(path: Path) -> dict:
+    """A manifest file's record; ValueError when it is unreadable or another format."""
+    try:
+        record = json.loads(path.read_text(encoding="utf-8"))
+    except OSError as exc:
+        raise ValueError(f"cannot read {path}: {exc}") from exc
+    if not isinstance(record, dict) or record.get("format") != _MANIFEST_FORMAT:
+        raise ValueError(f"{path} is not a format-{_MANIFEST_FORMAT} bundle manifest")
+    return record
+
 
-def _add(zf: zipfile.ZipFile, name: str, data: bytes) -> None:
-    info = zipfile.ZipInfo(filename=name, date_time=_FIXED_DT)
-    info.compress_type = zipfile.ZIP_DEFLATED
-    info.external_attr = 0o644 << 16
-    # ZipInfo defaults create_system from the running platform (0 on Windows,
-    # 3 elsewhere) -- pin it so a zip built on Windows is byte-identical to the
-    # rebuild on any other machine (CI workflows, the e2e deploy).
-    info.create_system = 3
-    # Pass the level HERE: a ZipFile(compresslevel=...) is IGNORED for a pre-built
-    # ZipInfo (CPython only copies it onto entries it builds from an arcname string),
-    # so the pin only takes effect when handed to writestr.
-    zf.writestr(info, data, compresslevel=_DEFLATE_LEVEL)
+def _load_manifest() -> dict | None:
+    """The previous build's manifest, or None when it is missing, unreadable, or from
+    another format / deflate level / zlib (its streams would not match a fresh deflate)."""
+    try:
+        record = _read_manifest(MANIFEST_JSON)
+    except ValueError:
+        return None
+    if (record.get("deflate_level"), record.get("zlib")) != (_DEFLATE_LEVEL, zlib.ZLIB_RUNTIME_VERSION):
+        return None
+    return record
 
 
-def build() -> str:
-    for lib in LIBS:
+def _stream(zip_bytes: bytes, info: zipfile.ZipInfo) -> tuple[tuple, bytes]:
+    """An entry's local file header fields and its raw (still deflated) stream."""
+    header = _LOCAL_HEADER.unpack_from(zip_bytes, info.header_offset)
+    start = info.header_offset + _LOCAL_HEADER.size + header[9] + header[10]
+    return header, zip_bytes[start:start + info.compress_size]
+
+
+def _cached_streams(record: dict, zip_bytes: bytes) -> dict[str, bytes]:
+    """{source sha256: deflated stream} read straight out of the previous zip. A stream
+    is kept only when its digest still matches the manifest, so a zip edited or
+    rebuilt behind the manifest's back can never leak a wrong stream into the build."""
+    streams: dict[str, bytes] = {}
+    try:
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+            for entry in record.get("entries", []):
+                info = zf.getinfo(entry["name"])
+                _, stream = _stream(zip_bytes, info)
+                if _sha256(stream) == entry["deflated_sha256"] and info.CRC == entry["crc"]:
+                    streams[entry["sha256"]] = stream
+    except (KeyError, TypeError, struct.error, zipfile.BadZipFile):
+        return {}
+    return streams
+
+
+def _normalized(source: Path) -> bytes:
+    # Read as text + normalize CRLF->LF so the ZIP is byte-identical
+    # regardless of the builder's git core.autocrlf / platform.
+    return source.read_text(encoding="utf-8").replace("\r\n", "\n").encode("utf-8")
+
+
+def compact_source(text: str) -> tuple[str, list[int]]:
+    """(`text` without comments, indentation, trailing blanks or empty lines; the 1-based
+    source line of each output line). Comments are the lint tokenizer's (comment_spans),
+    so string and heredoc content -- a line inside a triple-quoted string, its leading
+    and trailing whitespace included -- is kept byte for byte. A comment is dropped only
+    where it starts its line or follows whitespace: a `//` glued to code is most likely
+    inside a slashy regex the tokenizer reads as code (`/^https?:\\/\\//`), so it and the
+    rest of its line (and a block comment it opens) stay verbatim."""
+    # Imported here: only compact builds pay for loading the lint.
+    sys.path.insert(0, str(REPO_ROOT / "tests"))
+    import sandbox_lint as sl
+
+    body, newline = (text[:-1], "\n") if text.endswith("\n") else (text, "")
+    lines = body.split("\n")
+    layout = sl.comment_spans(body)
+    out: list[str] = []
+    line_map: list[int] = []
+    verbatim_block = False
+    for index, (line, (spans, opened_in)) in enumerate(zip(lines, layout, strict=True)):
+        closes_in = layout[index + 1][1] if index + 1 < len(layout) else "code"
+        if verbatim_block:
+            kept = line
+            verbatim_block = closes_in == "comment"
+        else:
+            pieces: list[str] = []
+            pos = 0
+            for start, end in spans:
+                if start > 0 and line[start - 1] not in " \t":
+                    verbatim_block = closes_in == "comment"
+                    break
+                pieces.append(line[pos:start])
+                pos = end
+            pieces.append(line[pos:])
+            kept = "".join(pieces)
+        if opened_in != "string":
+            kept = kept.lstrip(" \t")
+        if closes_in != "string":
+            kept = kept.rstrip(" \t")
+        if kept or opened_in == "string" or closes_in == "string":
+            out.append(kept)
+            line_map.append(index + 1)
+    return "\n".join(out) + newline, line_map
+
+
+def _entries(libs: list[dict] | None = None,
+             line_maps: dict[str, list[int]] | None = None) -> list[tuple[str, str | None, bytes]]:
+    """(zip name, source path relative to the repo, normalized bytes) in zip order, for
+    LIBS or the given subset of it. With `line_maps` the libraries are compacted
+    (compact_source) and each one's line map is stored there under its zip name."""
+    libs = LIBS if libs is None else libs
+    for lib in libs:
         if not lib["source"].exists():
             print(
                 f"ERROR: source library not found at {lib['source']}", file=sys.stderr
             )
             raise SystemExit(1)
+    lib_lines = "\n".join(f"library {lib['dest']}" for lib in libs)
+    manifest = f"{NAMESPACE}\n{BUNDLE_NAME}\n{lib_lines}\n".encode()
+    entries = [
+        (
+            lib["dest"],
+            lib["source"].relative_to(REPO_ROOT).as_posix(),
+            _normalized(lib["source"]),
+        )
+        for lib in libs
+    ]
+    if line_maps is not None:
+        for i, (name, source, data) in enumerate(entries):
+            text, line_maps[name] = compact_source(data.decode("utf-8"))
+            entries[i] = (name, source, text.encode("utf-8"))
+    return [*entries, ("install.txt", None, manifest), ("update.txt", None, manifest)]
+
+
+class BuildResult:
+    """What build() produced: the install.txt text, the manifest record it wrote (or
+    found current), and which entries had to be deflated this run."""
 
+    def __init__(self, manifest: str, record: dict, deflated: list[str], unchanged: bool):
+        self.manifest = manifest
+        self.record = record
+        self.deflated = deflated
+        self.unchanged = unchanged
+
+
+def _deflate_all(blobs: dict[str, bytes], jobs: int | None) -> dict[str, bytes]:
+    """{digest: stream} for every blob. zlib releases the GIL while it compresses, so a
+    thread pool deflates the entries in parallel; each stream depends only on its own
+    bytes, so the result is the same whatever the scheduling. The largest go first so
+    one big library doesn't start last and set the wall time on its own. jobs=None
+    means one thread per CPU."""
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(blobs) < 2:
+        return {digest: _deflate(data) for digest, data in blobs.items()}
+    order = sorted(blobs, key=lambda digest: len(blobs[digest]), reverse=True)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return dict(zip(order, pool.map(_deflate, (blobs[d] for d in order)), strict=True))
+
+
+def build(force: bool = False, jobs: int | None = None, compact: bool = False) -> BuildResult:
+    line_maps: dict[str, list[int]] | None = {} if compact else None
+    entries = _entries(line_maps=line_maps)
+    manifest = entries[-1][2].decode()
+    digests = [_sha256(data) for _, _, data in entries]
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    lib_lines = "\n".join(f"library {lib['dest']}" for lib in LIBS)
-    manifest = f"{NAMESPACE}\n{BUNDLE_NAME}\n{lib_lines}\n"
-
-    with zipfile.ZipFile(OUTPUT_ZIP, "w") as zf:
-        for lib in LIBS:
-            # Read as text + normalize CRLF->LF so the committed ZIP is byte-identical
-            # regardless of the builder's git core.autocrlf / platform.
-            content = (
-                lib["source"]
-                .read_text(encoding="utf-8")
-                .replace("\r\n", "\n")
-                .encode("utf-8")
-            )
-            _add(zf, lib["dest"], content)
-        _add(zf, "install.txt", manifest.encode())
-        _add(zf, "update.txt", manifest.encode())
-    return manifest
+    _write_line_map(LINE_MAP_JSON, entries, line_maps)
+
+    previous = None if force else _load_manifest()
+    zip_bytes = OUTPUT_ZIP.read_bytes() if previous and OUTPUT_ZIP.exists() else None
+    if previous and zip_bytes is not None:
+        planned = [(name, digest) for (name, _, _), digest in zip(entries, digests, strict=True)]
+        recorded = [(e.get("name"), e.get("sha256")) for e in previous.get("entries", [])]
+        if planned == recorded and previous.get("zip", {}).get("sha256") == _sha256(zip_bytes):
+            return BuildResult(manifest, previous, [], True)
+    streams = _cached_streams(previous, zip_bytes) if previous and zip_bytes is not None else {}
+
+    # Deflate every missing stream up front (in parallel), then assemble serially in LIBS
+    # order, so the zip is byte-identical to a one-entry-at-a-time build.
+    missing: dict[str, tuple[str, bytes]] = {}
+    for (name, _, data), digest in zip(entries, digests, strict=True):
+        if digest not in streams:
+            missing.setdefault(digest, (name, data))
+    streams.update(_deflate_all({digest: data for digest, (_, data) in missing.items()}, jobs))
+    deflated = [name for name, _ in missing.values()]
+
+    record = _write_bundle(OUTPUT_ZIP, MANIFEST_JSON, entries, digests, streams,
+                           extra={"compact": True} if compact else None)
+    return BuildResult(manifest, record, deflated, False)
+
+
+def _write_line_map(path: Path, entries: list, line_maps: dict[str, list[int]] | None) -> None:
+    """Write the compact build's line map beside its zip, or remove a stale one when the
+    build is not compact. Per library it records runs of [first source line, count]:
+    output line n comes from source line first + (n - start of the run)."""
+    if line_maps is None:
+        path.unlink(missing_ok=True)
+        return
+    libraries = {}
+    for name, source, _ in entries:
+        if name not in line_maps:
+            continue
+        runs: list[list[int]] = []
+        for line in line_maps[name]:
+            if runs and runs[-1][0] + runs[-1][1] == line:
+                runs[-1][1] += 1
+            else:
+                runs.append([line, 1])
+        libraries[name] = {"source": source, "lines": runs}
+    record = {"format": _MANIFEST_FORMAT, "libraries": libraries}
+    path.write_text(json.dumps(record, separators=(",", ":")) + "\n", encoding="utf-8")
 
 
-def verify(manifest: str) -> None:
-    """Re-open the built ZIP and verify the layout HPM requires.
+def source_line(line_map: dict, name: str, line: int) -> tuple[str, int]:
+    """(repo source path, source line) for line `line` of the compacted entry `name` --
+    what a hub error's library line number means in the repo. Raises ValueError when
+    the map has no such entry or line."""
+    library = line_map.get("libraries", {}).get(name)
+    if library is None:
+        raise ValueError(f"the line map has no entry {name!r}")
+    remaining = line
+    if remaining >= 1:
+        for first, count in library["lines"]:
+            if remaining <= count:
+                return library["source"], first + remaining - 1
+            remaining -= count
+    raise ValueError(f"{name} has no compacted line {line}")
+
+
+def _write_bundle(zip_path: Path, manifest_path: Path, entries: list, digests: list[str],
+                  streams: dict[str, bytes], extra: dict | None = None) -> dict:
+    """Assemble the zip from already-deflated streams in entry order, then write and return
+    its manifest record (plus any `extra` keys)."""
+    record_entries: list[dict] = []
+    tmp = zip_path.with_name(zip_path.name + ".tmp")
+    with tmp.open("wb") as fp:
+        writer = _ZipWriter(fp)
+        for (name, source, data), digest in zip(entries, digests, strict=True):
+            stream = streams[digest]
+            crc = writer.add(name, data, stream)
+            record_entries.append({
+                "name": name,
+                "source": source,
+                "sha256": digest,
+                "size": len(data),
+                "crc": crc,
+                "compress_size": len(stream),
+                "deflated_sha256": _sha256(stream),
+            })
+        writer.close()
+    # Replace, never truncate in place: the old zip is the stream cache until this one is whole.
+    os.replace(tmp, zip_path)
+
+    zip_bytes = zip_path.read_bytes()
+    record = {
+        "format": _MANIFEST_FORMAT,
+        "deflate_level": _DEFLATE_LEVEL,
+        "zlib": zlib.ZLIB_RUNTIME_VERSION,
+        "zip": {"name": zip_path.name, "size": len(zip_bytes), "sha256": _sha256(zip_bytes)},
+        **(extra or {}),
+        "entries": record_entries,
+    }
+    manifest_path.write_text(json.dumps(record, indent=2) + "\n", encoding="utf-8")
+    return record
+
+
+def verify(result: BuildResult, zip_path: Path | None = None, paranoid: bool = False,
+           libs: list[dict] | None = None) -> None:
+    """Re-open the built ZIP and verify the layout HPM requires, then hold it to the
+    manifest: the zip's own digest, every central directory record (order, method,
+    pinned timestamp and attributes, CRC, sizes) and its local header, and every
+    stored stream's digest. Each stream is inflated (cheap) and its CRC and source
+    digest checked, so the zip provably carries the recorded sources. paranoid also
+    re-deflates each entry and requires the identical stream -- the only check that
+    costs a full compression, so it is opt-in.
 
     Uses explicit raises (not assert) so the checks still run under ``python -O``.
     """
-    expected = {lib["dest"] for lib in LIBS} | {"install.txt", "update.txt"}
-    with zipfile.ZipFile(OUTPUT_ZIP) as zf:
+    zip_path = zip_path or OUTPUT_ZIP
+    libs = LIBS if libs is None else libs
+    manifest = result.manifest
+    record = result.record
+    expected = {lib["dest"] for lib in libs} | {"install.txt", "update.txt"}
+    zip_bytes = zip_path.read_bytes()
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
         names = set(zf.namelist())
         if names != expected:
             raise RuntimeError(
@@ -205,32 +576,384 @@ def verify(manifest: str) -> None:
             raise RuntimeError(f"manifest line 1 {lines[0]!r} != namespace")
         if lines[1] != BUNDLE_NAME:
             raise RuntimeError(f"manifest line 2 {lines[1]!r} != bundle name")
-        for lib in LIBS:
+        for lib in libs:
             if f"library {lib['dest']}" not in lines:
                 raise RuntimeError(f"missing library line for {lib['dest']}")
-        # Every entry must be DEFLATE at the pinned level. A ZipFile(compresslevel=...) arg is
-        # silently IGNORED for pre-built ZipInfo entries, so this guards that exact regression and
-        # keeps rebuilds byte-reproducible (the e2e cmp-compares the artifact against its CI rebuild).
-        for info in zf.infolist():
-            data = zf.read(info.filename)
-            co = zlib.compressobj(_DEFLATE_LEVEL, zlib.DEFLATED, -15)
-            expected = len(co.compress(data) + co.flush())
-            if info.compress_type != zipfile.ZIP_DEFLATED or info.compress_size != expected:
+
+        if (len(zip_bytes), _sha256(zip_bytes)) != (record["zip"]["size"], record["zip"]["sha256"]):
+            raise RuntimeError(f"{zip_path.name} is not the zip {MANIFEST_JSON.name} records")
+        infos = zf.infolist()
+        if [info.filename for info in infos] != [entry["name"] for entry in record["entries"]]:
+            raise RuntimeError(f"central directory order != the entries {MANIFEST_JSON.name} records")
+        # Every entry must be DEFLATE with the pinned timestamp and attributes and exactly the
+        # stream the manifest recorded -- anything else breaks byte-reproducibility, which the
+        # e2e relies on to compare the published artifact against this checkout.
+        for info, entry in zip(infos, record["entries"], strict=True):
+            header, stream = _stream(zip_bytes, info)
+            central = (info.compress_type, info.date_time, info.create_system, info.external_attr,
+                       info.flag_bits, info.extra)
+            if central != (zipfile.ZIP_DEFLATED, _FIXED_DT, 3, 0o644 << 16, 0, b""):
+                raise RuntimeError(f"{info.filename}: central directory record {central} is not "
+                                   f"a pinned level-{_DEFLATE_LEVEL} deflate entry")
+            if (info.CRC, info.file_size, info.compress_size) != (
+                entry["crc"], entry["size"], entry["compress_size"]
+            ) or (header[3], header[6], header[7], header[8]) != (
+                info.compress_type, info.CRC, info.compress_size, info.file_size
+            ) or zip_bytes[info.header_offset + _LOCAL_HEADER.size:][:header[9]] != info.filename.encode():
                 raise RuntimeError(
-                    f"{info.filename}: stored compress_size {info.compress_size} (type "
-                    f"{info.compress_type}) != level-{_DEFLATE_LEVEL} deflate {expected} -- the pinned "
-                    f"deflate level is not applied; rebuilds may not be byte-reproducible."
+                    f"{info.filename}: stored CRC {info.CRC:08x} / size {info.file_size} / "
+                    f"compress_size {info.compress_size} != {MANIFEST_JSON.name} or its local header "
+                    f"-- rebuilds may not be byte-reproducible."
                 )
+            if _sha256(stream) != entry["deflated_sha256"]:
+                raise RuntimeError(f"{info.filename}: stored stream digest != {MANIFEST_JSON.name}")
+            data = zlib.decompress(stream, -15)
+            if zlib.crc32(data) != info.CRC or _sha256(data) != entry["sha256"]:
+                raise RuntimeError(f"{info.filename}: stream does not inflate to the recorded source")
+            if paranoid and _deflate(data) != stream:
+                raise RuntimeError(
+                    f"{info.filename}: re-deflating at level {_DEFLATE_LEVEL} on zlib "
+                    f"{zlib.ZLIB_RUNTIME_VERSION} does not reproduce the stored stream"
+                )
+
+
+def adopt(zip_path: Path, paranoid: bool = False) -> BuildResult:
+    """Take a prebuilt zip -- the published bundle artifact -- as this checkout's build,
+    without deflating anything. Its sidecar manifest (<name>.manifest.json beside it)
+    must record exactly this checkout's entries and source digests, and the zip must
+    verify against it; only then are both copied into bundles/. Raises RuntimeError /
+    ValueError when the artifact is not this checkout's bundle."""
+    if zip_path.name != OUTPUT_ZIP.name:
+        raise ValueError(f"{zip_path.name} is not the builder's {OUTPUT_ZIP.name}")
+    record = _read_manifest(zip_path.with_name(MANIFEST_JSON.name))
+    entries = _entries()
+    planned = [(name, _sha256(data)) for name, _, data in entries]
+    if planned != [(e.get("name"), e.get("sha256")) for e in record.get("entries", [])]:
+        raise RuntimeError(f"{MANIFEST_JSON.name} does not record this checkout's library sources")
+    result = BuildResult(entries[-1][2].decode(), record, [], True)
+    verify(result, zip_path=zip_path, paranoid=paranoid)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    if zip_path.resolve() != OUTPUT_ZIP.resolve():
+        shutil.copyfile(zip_path, OUTPUT_ZIP)
+        shutil.copyfile(zip_path.with_name(MANIFEST_JSON.name), MANIFEST_JSON)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# --report: per-library sizes, cap headroom, and the trend over git history
+# ---------------------------------------------------------------------------
+
+# Fixed per-entry zip bytes beside the name and stream: the 30-byte local header and the
+# 46-byte central directory record (no extras, no zip64), plus the 22-byte end record.
+_ENTRY_OVERHEAD = _LOCAL_HEADER.size + _CENTRAL_HEADER.size
+_END_RECORD = _END_OF_DIRECTORY.size
+_SECONDS_PER_DAY = 86400
+
+
+def _zip_size(entries: list[tuple[str, int]]) -> int:
+    """Exact size of a builder zip holding (name, compress_size) entries."""
+    return sum(_ENTRY_OVERHEAD + 2 * len(name.encode()) + size for name, size in entries) + _END_RECORD
+
+
+def _git(*args: str, stdin: bytes | None = None) -> bytes:
+    return subprocess.run(["git", "-C", str(REPO_ROOT), *args], input=stdin,
+                          capture_output=True, check=True).stdout
+
+
+def _tree_blobs(rev: str, paths: list[str]) -> dict[str, str]:
+    """{repo path: blob id} for the paths present in `rev`'s tree."""
+    blobs = {}
+    for line in _git("ls-tree", rev, "--", *paths).decode().splitlines():
+        meta, path = line.split("\t", 1)
+        blobs[path] = meta.split()[2]
+    return blobs
+
 
+def _read_blobs(blob_ids) -> dict[str, bytes]:
+    """{blob id: content} through one `git cat-file --batch`, CRLF->LF normalized the same
+    way the build normalizes the working tree."""
+    wanted = sorted(blob_ids)
+    raw = _git("cat-file", "--batch", stdin="".join(f"{blob}\n" for blob in wanted).encode())
+    contents: dict[str, bytes] = {}
+    pos = 0
+    for blob in wanted:
+        header_end = raw.index(b"\n", pos)
+        size = int(raw[pos:header_end].split()[2])
+        data = raw[header_end + 1:header_end + 1 + size]
+        contents[blob] = data.decode("utf-8").replace("\r\n", "\n").encode("utf-8")
+        pos = header_end + 1 + size + 1
+    return contents
 
-def main() -> int:
-    manifest = build()
-    verify(manifest)
+
+def size_history(limit: int, jobs: int | None = None) -> list[tuple[str, int, int]]:
+    """[(short sha, commit time, bundle zip bytes)] for the last `limit` commits touching
+    libraries/, oldest first -- the size the builder would have produced at each one for
+    the LIBS sources present then. Each distinct library blob is deflated once. Raises
+    OSError / subprocess.CalledProcessError when git or the history is unavailable."""
+    sources = {lib["source"].relative_to(REPO_ROOT).as_posix(): lib["dest"] for lib in LIBS}
+    commits = [line.split() for line in _git(
+        "log", f"-n{limit}", "--format=%H %ct", "--", LIB_DIR.relative_to(REPO_ROOT).as_posix()
+    ).decode().splitlines()]
+    trees: list[list[tuple[str, str]]] = []  # per commit: [(dest, blob id)] in LIBS order
+    for sha, _ in commits:
+        blobs = _tree_blobs(sha, list(sources))
+        trees.append([(dest, blobs[path]) for path, dest in sources.items() if path in blobs])
+    contents = _read_blobs({blob for tree in trees for _, blob in tree})
+    compressed = {blob: len(stream) for blob, stream in _deflate_all(contents, jobs).items()}
+
+    history = []
+    for (sha, when), tree in zip(commits, trees, strict=True):
+        listing = "\n".join(f"library {dest}" for dest, _ in tree)
+        manifest_size = len(_deflate(f"{NAMESPACE}\n{BUNDLE_NAME}\n{listing}\n".encode()))
+        entries = [(dest, compressed[blob]) for dest, blob in tree]
+        entries += [("install.txt", manifest_size), ("update.txt", manifest_size)]
+        history.append((sha[:7], int(when), _zip_size(entries)))
+    return history[::-1]
+
+
+def project(history: list[tuple[str, int, int]], cap: int = HUB_FETCH_CAP) -> tuple[float, int | None] | None:
+    """(bytes/day least-squares slope, days until the latest size reaches `cap` -- None
+    when not growing) over the history, or None with fewer than two distinct commit times."""
+    if len({when for _, when, _ in history}) < 2:
+        return None
+    xs = [when / _SECONDS_PER_DAY for _, when, _ in history]
+    ys = [size for _, _, size in history]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    slope = (sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys, strict=True))
+             / sum((x - mean_x) ** 2 for x in xs))
+    if slope <= 0:
+        return slope, None
+    return slope, max(0, math.ceil((cap - ys[-1]) / slope))
+
+
+def format_report(record: dict, max_bytes: int, history: list | None = None,
+                  history_error: str | None = None) -> str:
+    """The --report text: per-library sizes from the manifest, headroom, and the trend."""
+    zip_size = record["zip"]["size"]
+    libs = sorted((e for e in record["entries"] if e["source"]),
+                  key=lambda e: e["compress_size"], reverse=True)
+    lines = [f"Bundle size report: {record['zip']['name']} ({zip_size:,} bytes)",
+             f"  {'library':<34} {'raw bytes':>11} {'compressed':>11} {'ratio':>6} {'share':>6}"]
+    for e in libs:
+        lines.append(f"  {e['name']:<34} {e['size']:>11,} {e['compress_size']:>11,} "
+                     f"{e['compress_size'] / e['size']:>6.1%} {e['compress_size'] / zip_size:>6.1%}")
+    rest = zip_size - sum(e["compress_size"] for e in libs)
+    lines.append(f"  {'(install/update.txt + zip headers)':<34} {'':>11} {rest:>11,} {'':>6} "
+                 f"{rest / zip_size:>6.1%}")
+    lines.append(f"  {'total':<34} {sum(e['size'] for e in libs):>11,} {zip_size:>11,}")
+    lines.append(f"Hub fetch cap {HUB_FETCH_CAP:,} bytes: headroom {HUB_FETCH_CAP - zip_size:,} bytes "
+                 f"({zip_size / HUB_FETCH_CAP:.1%} of the cap used)")
+    verdict = "OVER" if zip_size > max_bytes else "under"
+    lines.append(f"Failure threshold {max_bytes:,} bytes: {verdict} by {abs(max_bytes - zip_size):,} bytes")
+    if history_error:
+        lines.append(f"History: unavailable ({history_error})")
+    elif history is not None:
+        lines.append(f"History ({len(history)} commit(s) touching libraries/, oldest first):")
+        previous = None
+        for sha, when, size in history:
+            day = datetime.fromtimestamp(when, tz=UTC).strftime("%Y-%m-%d")
+            delta = "" if previous is None else f" ({size - previous:+,})"
+            lines.append(f"  {day} {sha} {size:>11,}{delta}")
+            previous = size
+        projection = project(history)
+        if projection is None:
+            lines.append("Projection: needs at least two library commits at different times")
+        elif projection[1] is None:
+            lines.append(f"Projection: {projection[0]:+,.0f} bytes/day -- not growing toward the cap")
+        else:
+            slope, days = projection
+            when = datetime.fromtimestamp(history[-1][1], tz=UTC) + timedelta(days=days)
+            lines.append(f"Projection: {slope:+,.0f} bytes/day -- the cap is reached around "
+                         f"{when:%Y-%m-%d} ({days:,} days after the last library commit)")
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# --delta-since: a bundle of only the libraries changed since a git ref
+# ---------------------------------------------------------------------------
+
+
+def changed_since(ref: str) -> tuple[str, list[dict], list[str]]:
+    """(the ref's commit SHA, the LIBS entries whose normalized source differs from the
+    ref's or is new since it, the ref's libraries/*.groovy files no longer in LIBS).
+    Compares the working tree, so uncommitted edits count. Raises
+    ValueError when the ref does not name a commit."""
+    try:
+        sha = _git("rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}").decode().strip()
+    except subprocess.CalledProcessError:
+        raise ValueError(f"{ref!r} does not name a commit") from None
+    by_path = {lib["source"].relative_to(REPO_ROOT).as_posix(): lib for lib in LIBS}
+    blobs = _tree_blobs(sha, list(by_path))
+    then = _read_blobs(set(blobs.values()))
+    changed = [lib for path, lib in by_path.items()
+               if path not in blobs or then[blobs[path]] != _normalized(lib["source"])]
+    lib_dir = LIB_DIR.relative_to(REPO_ROOT).as_posix()
+    dropped = sorted(path for path in _tree_blobs(sha, [f"{lib_dir}/"])
+                     if path.endswith(".groovy") and path not in by_path)
+    return sha, changed, dropped
+
+
+def build_delta(ref: str, full: BuildResult) -> tuple[Path, BuildResult] | None:
+    """Write bundles/delta/<sha>/ -- a zip + manifest holding only the libraries changed
+    since `ref`, or None when none did. It keeps the full bundle's namespace, bundle
+    name and zip basename (the hub keys the bundle entity on them, so anything else can
+    import a second entity with duplicate libraries), and its install.txt/update.txt
+    list only the libraries it carries; a compact full build gives a compact delta (and
+    its line map). The library streams are the full build's, so
+    only the two listing files are deflated. The manifest's "delta" key records the
+    base SHA and any library the ref had that LIBS no longer ships -- a delta cannot
+    remove those from a hub."""
+    sha, libs, dropped = changed_since(ref)
+    if not libs:
+        return None
+    out_dir = OUTPUT_DIR / "delta" / sha[:12]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    line_maps: dict[str, list[int]] | None = {} if full.record.get("compact") else None
+    entries = _entries(libs, line_maps=line_maps)
+    digests = [_sha256(data) for _, _, data in entries]
+    _write_line_map(out_dir / LINE_MAP_JSON.name, entries, line_maps)
+    streams = _cached_streams(full.record, OUTPUT_ZIP.read_bytes())
+    missing: dict[str, tuple[str, bytes]] = {}
+    for (name, _, data), digest in zip(entries, digests, strict=True):
+        if digest not in streams:
+            missing.setdefault(digest, (name, data))
+    streams.update(_deflate_all({digest: data for digest, (_, data) in missing.items()}, 1))
+    extra = {"compact": True} if line_maps is not None else {}
+    extra["delta"] = {"ref": ref, "base": sha, "dropped": dropped}
+    record = _write_bundle(out_dir / OUTPUT_ZIP.name, out_dir / MANIFEST_JSON.name, entries, digests,
+                           streams, extra=extra)
+    result = BuildResult(entries[-1][2].decode(), record, [name for name, _ in missing.values()], False)
+    verify(result, zip_path=out_dir / OUTPUT_ZIP.name, libs=libs)
+    return out_dir, result
+
+
+def delta_package_manifest(out_dir: Path, url: str) -> Path:
+    """Write <out_dir>/packageManifest.json: the repo's packageManifest.json with the
+    bundle this builder produces pointed at `url` (the directory the delta zip is served
+    from). It is written beside the delta, never over the repo's manifest -- a fresh
+    install from it would get only the changed libraries, so publishing it is a decision
+    for an update channel whose hubs are known to be at the delta's base."""
+    manifest = json.loads((REPO_ROOT / "packageManifest.json").read_text(encoding="utf-8"))
+    targets = [bundle for bundle in manifest.get("bundles", [])
+               if bundle.get("location", "").rsplit("/", 1)[-1] == OUTPUT_ZIP.name]
+    if len(targets) != 1:
+        raise ValueError(f"packageManifest.json declares {len(targets)} bundle(s) at "
+                         f".../{OUTPUT_ZIP.name}; expected exactly one to repoint")
+    targets[0]["location"] = f"{url.rstrip('/')}/{OUTPUT_ZIP.name}"
+    path = out_dir / "packageManifest.json"
+    path.write_text(json.dumps(manifest, indent=4, ensure_ascii=False) + "\n", encoding="utf-8")
+    return path
+
+
+def _positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be >= 1, got {n}")
+    return n
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the HPM bundle ZIP for the #include libraries.")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore the manifest and deflate every entry")
+    parser.add_argument("--jobs", type=_positive_int, default=None, metavar="N",
+                        help="deflate threads (default: one per CPU; 1 = serial)")
+    parser.add_argument("--compact", action="store_true",
+                        help="strip comments and indentation from the libraries; write a line map")
+    parser.add_argument("--map-line", default=None, metavar="NAME:LINE",
+                        help="print the repo source line of a compacted library line, then exit")
+    parser.add_argument("--paranoid", action="store_true",
+                        help="verify by re-deflating every entry too")
+    parser.add_argument("--from", dest="from_zip", type=Path, default=None, metavar="ZIP",
+                        help="adopt a prebuilt zip + its manifest instead of building")
+    parser.add_argument("--report", action="store_true",
+                        help="print per-library sizes, cap headroom and the size trend")
+    parser.add_argument("--history", type=int, default=20, metavar="N",
+                        help="--report: library commits to trend over (default 20; 0 = none)")
+    parser.add_argument("--max-bytes", type=int, default=REPORT_MAX_BYTES, metavar="BYTES",
+                        help=f"--report: exit 1 when the zip exceeds BYTES (default {REPORT_MAX_BYTES:,})")
+    parser.add_argument("--delta-since", default=None, metavar="REF",
+                        help="also write bundles/delta/<sha>/ with only the libraries changed since REF")
+    parser.add_argument("--delta-url", default=None, metavar="URL",
+                        help="--delta-since: also write a packageManifest.json pointing the bundle at URL")
+    args = parser.parse_args(argv)
+    if args.delta_url and not args.delta_since:
+        parser.error("--delta-url requires --delta-since")
+    return args
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    if args.map_line is not None:
+        name, _, line = args.map_line.rpartition(":")
+        try:
+            source, number = source_line(_read_manifest(LINE_MAP_JSON), name, int(line))
+        except ValueError as exc:
+            print(f"ERROR: cannot map {args.map_line!r}: {exc}", file=sys.stderr)
+            return 1
+        print(f"{source}:{number}")
+        return 0
+    if args.from_zip is not None:
+        try:
+            result = adopt(args.from_zip, paranoid=args.paranoid)
+        except (RuntimeError, ValueError) as exc:
+            print(f"ERROR: {args.from_zip} is not this checkout's bundle: {exc}", file=sys.stderr)
+            return 1
+    else:
+        result = build(force=args.force, jobs=args.jobs, compact=args.compact)
+        verify(result, paranoid=args.paranoid)
     size = OUTPUT_ZIP.stat().st_size
-    print(f"Built {OUTPUT_ZIP.relative_to(REPO_ROOT)} ({size:,} bytes)")
-    with zipfile.ZipFile(OUTPUT_ZIP) as zf:
-        for info in zf.infolist():
-            print(f"  {info.filename:32s} {info.file_size:>6,} bytes")
+    if args.from_zip is not None:
+        print(f"Adopted {args.from_zip} as {OUTPUT_ZIP.relative_to(REPO_ROOT)} ({size:,} bytes; "
+              f"verified against this checkout, nothing deflated)")
+    elif result.unchanged:
+        print(f"{OUTPUT_ZIP.relative_to(REPO_ROOT)} is current ({size:,} bytes) -- nothing to rebuild")
+    else:
+        total = len(result.record["entries"])
+        print(f"Built {OUTPUT_ZIP.relative_to(REPO_ROOT)} ({size:,} bytes; deflated "
+              f"{len(result.deflated)} of {total} entries, reused {total - len(result.deflated)})")
+    if result.record.get("compact"):
+        print(f"  compact: comments and indentation stripped; map hub line numbers back with "
+              f"--map-line NAME:LINE ({LINE_MAP_JSON.relative_to(REPO_ROOT)})")
+    if args.delta_since:
+        try:
+            delta = build_delta(args.delta_since, result)
+            if delta is not None and args.delta_url:
+                delta_package_manifest(delta[0], args.delta_url)
+        except (OSError, ValueError, subprocess.CalledProcessError) as exc:
+            print(f"ERROR: cannot build the delta since {args.delta_since!r}: {exc}", file=sys.stderr)
+            return 1
+        if delta is None:
+            print(f"No library changed since {args.delta_since} -- no delta bundle")
+        else:
+            out_dir, delta_result = delta
+            info = delta_result.record["delta"]
+            libs = [e["name"] for e in delta_result.record["entries"] if e["source"]]
+            print(f"Delta since {args.delta_since} ({info['base'][:12]}): "
+                  f"{(out_dir / OUTPUT_ZIP.name).relative_to(REPO_ROOT)} "
+                  f"({delta_result.record['zip']['size']:,} bytes; {len(libs)} of {len(LIBS)} "
+                  f"libraries: {', '.join(libs)})")
+            for path in info["dropped"]:
+                print(f"  note: {path} is gone since {args.delta_since}; a delta cannot remove it "
+                      f"from a hub")
+    if not args.report:
+        with zipfile.ZipFile(OUTPUT_ZIP) as zf:
+            for info in zf.infolist():
+                print(f"  {info.filename:32s} {info.file_size:>6,} bytes")
+        return 0
+
+    history = history_error = None
+    if args.history > 0:
+        try:
+            history = size_history(args.history, jobs=args.jobs)
+        except (OSError, subprocess.CalledProcessError) as exc:
+            history_error = str(exc)
+    print(format_report(result.record, args.max_bytes, history, history_error))
+    if size > args.max_bytes:
+        print(f"ERROR: {OUTPUT_ZIP.name} is {size:,} bytes, over the {args.max_bytes:,}-byte threshold "
+              f"(hub fetch cap {HUB_FETCH_CAP:,}; over it, installs fail with only \"Cannot retrieve "
+              f"zip file\"). Shrink or split the libraries before it ships.", file=sys.stderr)
+        return 1
     return 0
 
 
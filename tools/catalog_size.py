@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""Static tools/list size profile for the MCP Rule Server's tool catalog.
+
+Every tools/list response has to fit under the response-size guard in
+handleMcpRequest() (`hubResponseCapBytes() - 7072` = 124,000 bytes, ~7 KB under
+the hub's 131,072-byte cap). Over it, the hub answers -32603 and the client sees
+ZERO tools -- and the flat catalog (useGateways=false, every tool advertised
+individually) is the largest response the app serves. This profiler prices that
+budget without a hub: it reads the tool definitions with sandbox_lint's catalog
+extraction (getGatewayConfig + the _getAllToolDefinitions_part<Name>() chunks the
+libraries contribute), rebuilds the wire form of both catalog modes the way
+getToolDefinitions() does, and serializes them the way JsonOutput.toJson does
+(compact separators, non-ASCII as \\uXXXX escapes).
+
+  flat mode     every tool minus hub_search_tools; [[FLAT_TRIM]] blocks dropped,
+                outputSchema dropped, hub_set_rule folded to _setRuleFlatTool(),
+                leaf annotations added
+  gateway mode  the base tools (not behind a gateway) plus one entry per gateway
+                (description + "- name: summary" catalog + tool/args selector);
+                marker tokens stripped, outputSchema only with
+                --publish-output-schemas (wire form: `required` arrays dropped)
+
+Both are sized as the whole JSON-RPC response (jsonRpcResult frame, ttlMs /
+cacheScope hints, resultType and the _meta serverInfo block), since that is what
+the guard measures.
+
+Visibility follows getHiddenToolNames(). By default nothing is hidden -- the
+largest catalog a user can configure: both masters on, the custom rule engine in
+"full" mode, Developer Mode on, no #114 disabled tools or gateways.
+--default-install prices a fresh install instead: Developer Mode off (the
+getDeveloperModeOnlyToolNames() set hidden) and the custom engine in its default
+"readonly" mode (the list getHiddenToolNames() hides for it, read from the source).
+The enableRead / enableWrite masters and the #114 overrides are not modelled: they
+default to hiding nothing and can only remove tools, so either profile stays an
+upper bound for every configuration that shares its Developer Mode and engine mode.
+
+Values the literal reader cannot evaluate (a local variable, a method call whose
+body is not a plain literal) are sized as their source text and counted in the
+report, so a growing estimate error stays visible.
+
+Usage:
+  python3 tools/catalog_size.py [--budget BYTES] [--top N] [--json]
+                                [--default-install] [--publish-output-schemas]
+
+  --budget BYTES  fail (exit 1) when either mode's tools/list response exceeds
+                  BYTES (default: the handleMcpRequest guard read from the source)
+  --top N         list the N most expensive flat-mode tools (default 10, 0 = none)
+  --json          print the profile as JSON instead of tables
+  --default-install
+                  price the default install (see Visibility above)
+
+Exit 0 = both modes fit the budget, exit 1 = over budget or the catalog could not
+be read.
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import re
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# The catalog extraction lives in the lint.
+sys.path.insert(0, str(REPO_ROOT / "tests"))
+
+import sandbox_lint as sl  # noqa: E402
+
+# Fallbacks for when the source no longer spells the guard the way the regexes expect.
+HUB_RESPONSE_CAP_BYTES = 131072
+RESPONSE_GUARD_MARGIN_BYTES = 7072
+
+_CAP_RE = re.compile(r"def hubResponseCapBytes\(\)\s*\{\s*(\d+)\s*\}")
+_GUARD_RE = re.compile(r"maxResponseSize\s*=\s*hubResponseCapBytes\(\)\s*-\s*(\d+)")
+_VERSION_RE = re.compile(r"def currentVersion\(\)\s*\{\s*return\s*\"([^\"]+)\"")
+_TTL_RE = re.compile(r"def cacheHintTtlMs\(\)\s*\{\s*(\d+)\s*\}")
+_CALL_RE = re.compile(r"(\w+)\(\)")
+_IDENT_RE = re.compile(r"[A-Za-z_]\w*")
+_UNIQUE_RE = re.compile(r"\((.*)\)\.unique\(\)", re.S)
+# getHiddenToolNames(): the tools the legacy custom engine hides in its default mode.
+_READONLY_ENGINE_RE = re.compile(r'mode\s*==\s*"readonly"\s*\)\s*\{\s*')
+
+# stripFlatTrim(): dropContent=true removes whole blocks (own-line first, then inline);
+# dropContent=false strips only the marker tokens.
+_FLAT_TRIM_BLOCK_RE = re.compile(r"\n\[\[FLAT_TRIM\]\]\n.*?\n\[\[/FLAT_TRIM\]\]\n", re.S)
+_FLAT_TRIM_INLINE_RE = re.compile(r"\[\[FLAT_TRIM\]\].*?\[\[/FLAT_TRIM\]\]", re.S)
+_FLAT_TRIM_LINE_TOKEN_RE = re.compile(r"^\[\[/?FLAT_TRIM\]\]\n", re.M)
+_FLAT_TRIM_TOKEN_RE = re.compile(r"\[\[/?FLAT_TRIM\]\]")
+
+GATEWAY_CALL_HINT = ("\n\nCall with no args to see full parameter schemas. Call with tool='<name>' "
+                     "and args={...} to execute.\n\nAvailable tools:\n")
+GATEWAY_TOOL_DESCRIPTION = "Tool to execute. Omit to see full schemas for all tools in this group."
+GATEWAY_ARGS_DESCRIPTION = "Arguments for the tool. Call with just tool name first to see required parameters."
+
+# A request id as long as a client is likely to send (a UUID string): the guard has to
+# hold for the longest frame, not the `id: 1` of a unit test.
+ENVELOPE_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def _json_bytes(value) -> int:
+    """Serialized size of `value` as JsonOutput.toJson writes it (ASCII-only output)."""
+    return len(json.dumps(value, ensure_ascii=True, separators=(",", ":")))
+
+
+def _strip_flat_trim(text, drop_content: bool):
+    if not isinstance(text, str) or "[[" not in text:
+        return text
+    if drop_content:
+        return _FLAT_TRIM_INLINE_RE.sub("", _FLAT_TRIM_BLOCK_RE.sub("", text))
+    return _FLAT_TRIM_TOKEN_RE.sub("", _FLAT_TRIM_LINE_TOKEN_RE.sub("", text))
+
+
+def _strip_schema_descriptions(node, drop_content: bool):
+    """_stripFlatTrimDeep(): every `description` in a schema, at any depth."""
+    if isinstance(node, list):
+        return [_strip_schema_descriptions(v, drop_content) for v in node]
+    if not isinstance(node, dict):
+        return node
+    return {k: (_strip_flat_trim(v, drop_content) if k == "description"
+                else _strip_schema_descriptions(v, drop_content))
+            for k, v in node.items()}
+
+
+def _wire_output_schema(schema):
+    """_wireOutputSchema(): drop schema-keyword `required` arrays, recursively."""
+    if not isinstance(schema, dict):
+        return schema
+    return {k: (_wire_output_schema(v) if isinstance(v, dict)
+                else [_wire_output_schema(i) for i in v] if isinstance(v, list) else v)
+            for k, v in schema.items() if not (k == "required" and isinstance(v, list))}
+
+
+class ToolCost:
+    """One tool definition's share of each catalog mode (bytes include its list comma).
+
+    flat_bytes     -- None when flat mode does not advertise it (hub_search_tools, hidden)
+    gateway_bytes  -- None when it sits behind a gateway (or is hidden) in gateway mode
+    """
+
+    def __init__(self, name: str, library: str, method: str, gateways: list[str]):
+        self.name = name
+        self.library = library
+        self.method = method
+        self.gateways = gateways
+        self.flat_bytes: int | None = None
+        self.gateway_bytes: int | None = None
+
+
+class GatewayCost:
+    """A gateway's gateway-mode entry and what its members cost when flattened."""
+
+    def __init__(self, name: str, tools: list[str], entry_bytes: int, flat_bytes: int):
+        self.name = name
+        self.tools = tools
+        self.entry_bytes = entry_bytes
+        self.flat_bytes = flat_bytes
+
+
+class CatalogSize:
+    """The tools/list size profile of one source tree.
+
+    tools        -- ToolCost per tool definition, in getAllToolDefinitions() order
+    gateways     -- GatewayCost per gateway, in getGatewayConfig() order
+    flat_wire    -- whole flat-mode tools/list response, in bytes
+    gateway_wire -- whole gateway-mode tools/list response, in bytes
+    guard        -- the handleMcpRequest response-size guard, in bytes
+    unresolved   -- [(tool, source text)] values sized as their source text
+    """
+
+    def __init__(self, tools, gateways, flat_wire, gateway_wire, envelope_bytes, guard, unresolved):
+        self.tools: list[ToolCost] = tools
+        self.gateways: list[GatewayCost] = gateways
+        self.flat_wire: int = flat_wire
+        self.gateway_wire: int = gateway_wire
+        self.envelope_bytes: int = envelope_bytes
+        self.guard: int = guard
+        self.unresolved: list[tuple[str, str]] = unresolved
+
+    def libraries(self) -> list[tuple[str, int, int, int]]:
+        """[(file, tools, flat bytes, gateway-mode base-tool bytes)], largest flat cost first."""
+        totals: dict[str, list[int]] = {}
+        for tool in self.tools:
+            row = totals.setdefault(tool.library, [0, 0, 0])
+            row[0] += 1
+            row[1] += tool.flat_bytes or 0
+            row[2] += tool.gateway_bytes or 0
+        return sorted(((lib, *row) for lib, row in totals.items()), key=lambda r: (-r[2], r[0]))
+
+    def as_dict(self) -> dict:
+        return {
+            "guard": self.guard,
+            "envelope_bytes": self.envelope_bytes,
+            "flat": {"bytes": self.flat_wire, "headroom": self.guard - self.flat_wire,
+                     "tools": sum(1 for t in self.tools if t.flat_bytes is not None)},
+            "gateway": {"bytes": self.gateway_wire, "headroom": self.guard - self.gateway_wire,
+                        "tools": sum(1 for t in self.tools if t.gateway_bytes is not None)
+                        + len(self.gateways)},
+            "libraries": [{"file": lib, "tools": n, "flat_bytes": flat, "gateway_bytes": gw}
+                          for lib, n, flat, gw in self.libraries()],
+            "gateways": [{"name": g.name, "tools": len(g.tools), "entry_bytes": g.entry_bytes,
+                          "flat_bytes": g.flat_bytes} for g in self.gateways],
+            "tools": [{"name": t.name, "library": t.library, "method": t.method,
+                       "gateways": t.gateways, "flat_bytes": t.flat_bytes,
+                       "gateway_bytes": t.gateway_bytes} for t in self.tools],
+            "unresolved": [{"tool": tool, "source": text} for tool, text in self.unresolved],
+        }
+
+
+class _Resolver:
+    """Turns the lint's Groovy literal values into JSON-ready Python values.
+
+    A `name()` call whose multi-line method body returns (or simply is) a literal is
+    read through; any other GroovyExpr becomes its source text, recorded in
+    `unresolved` against the tool being sized. Everything is read through ToolCatalog's
+    public extraction API."""
+
+    def __init__(self, catalog: sl.ToolCatalog):
+        self.catalog = catalog
+        self.methods = catalog.methods
+        self.unresolved: list[tuple[str, str]] = []
+        self._calls: dict[str, object] = {}
+
+    def method_literal(self, name: str):
+        """The literal a zero-arg method returns (explicit `return`, a bare literal body, or
+        a one-line `def x() { <expression> }`), or None."""
+        if name not in self._calls:
+            self._calls[name] = None  # a self-referencing chain resolves to None, not a loop
+            value = None
+            found = self.methods.get(name)
+            src = self.catalog.src
+            # The body locator only finds the close of multi-line methods; a one-liner's
+            # located "body" runs on into the next method.
+            if found and src.startswith("\n", found[0].body_start):
+                method = found[0]
+                value = self.catalog.return_literal(method)
+                if value is None and name not in self.catalog.errors:
+                    value = self.catalog.body_literal(method)
+            else:
+                one_line = re.search(rf"^def {re.escape(name)}\(\)\s*\{{\s*(?:return\s+)?(.+?)\s*\}}[ \t]*$",
+                                     src, re.M)
+                value = self._expression(one_line.group(1), None) if one_line else None
+            if isinstance(value, sl.GroovyExpr):
+                value = self._expression(value.text, None)
+            self._calls[name] = value
+        return self._calls[name]
+
+    def local_literal(self, method_name: str | None, name: str):
+        """The literal a `def name = [...]` local in `method_name`'s body is assigned, or None."""
+        found = self.methods.get(method_name) if method_name else None
+        if not found:
+            return None
+        method = found[0]
+        assign = re.compile(rf"\bdef\s+{re.escape(name)}\s*=\s*").search(
+            self.catalog.src, method.body_start, method.body_end)
+        if assign is None:
+            return None
+        value = self.catalog.literal_at(assign.end(), method.body_end)
+        return None if isinstance(value, sl.GroovyExpr) else value
+
+    def _expression(self, text: str, method: str | None):
+        """A `+` chain of literals, `name()` calls and `def name = ...` locals (map merge /
+        list concat), optionally wrapped in `( ... ).unique()`; None when any term is not
+        one of those."""
+        unique = _UNIQUE_RE.fullmatch(text.strip())
+        if unique:
+            text = unique.group(1)
+        result = None
+        for term in sl.ToolCatalog.split_terms(text, "+"):
+            if not term:
+                return None
+            if _CALL_RE.fullmatch(term):
+                value = self.method_literal(term[:-2])
+            elif _IDENT_RE.fullmatch(term):
+                value = self.local_literal(method, term)
+            else:
+                value = sl.ToolCatalog.parse_value(term)
+            if isinstance(value, sl.GroovyExpr) or value is None:
+                return None
+            if result is None:
+                result = value
+            elif isinstance(result, dict) and isinstance(value, dict):
+                result = {**result, **value}
+            elif isinstance(result, list) and isinstance(value, list):
+                result = result + value
+            else:
+                return None
+        if unique and isinstance(result, list):
+            result = [v for i, v in enumerate(result) if v not in result[:i]]
+        return result
+
+    def plain(self, value, owner: str, method: str | None = None):
+        """`value` as JSON-ready Python; `method` is the chunk whose locals it may name."""
+        if isinstance(value, sl.GroovyExpr):
+            literal = self._expression(value.text, method)
+            if literal is None:
+                self.unresolved.append((owner, value.text))
+                return value.text
+            return self.plain(literal, owner, method)
+        if isinstance(value, dict):
+            return {str(k): self.plain(v, owner, method) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.plain(v, owner, method) for v in value]
+        return value
+
+    def display_meta(self) -> dict:
+        """getToolDisplayMeta(): every _toolDisplayMeta_part* map plus the gateway entries
+        the aggregator putAll()s itself."""
+        meta: dict = {}
+        for name in sorted(self.methods, key=lambda n: self.methods[n][0].start):
+            if name.startswith("_toolDisplayMeta_part"):
+                part = self.catalog.return_literal(self.methods[name][0])
+                if isinstance(part, dict):
+                    meta.update(part)
+        found = self.methods.get("getToolDisplayMeta")
+        if found:
+            for value in self.catalog.call_arguments(found[0], "putAll"):
+                if isinstance(value, dict):
+                    meta.update(value)
+        return {k: v for k, v in meta.items() if isinstance(v, dict)}
+
+
+def _leaf_annotations(name, meta, read_only, idempotent, open_world) -> dict:
+    """annotationsForLeaf()."""
+    ann = {}
+    title = meta.get(name, {}).get("title")
+    if isinstance(title, str) and title:
+        ann["title"] = title
+    ann["readOnlyHint"] = name in read_only
+    if name not in read_only:
+        ann["destructiveHint"] = True
+    ann["idempotentHint"] = name in idempotent
+    ann["openWorldHint"] = name in open_world
+    return ann
+
+
+def _gateway_annotations(name, visible, meta, read_only, idempotent, open_world) -> dict:
+    """The gateway entry's title + annotationsForGateway()."""
+    ann = {}
+    title = meta.get(name, {}).get("title")
+    if isinstance(title, str) and title:
+        ann["title"] = title
+    any_write = any(t not in read_only for t in visible)
+    ann["readOnlyHint"] = not any_write
+    if any_write:
+        ann["destructiveHint"] = True
+    ann["idempotentHint"] = all(t in idempotent for t in visible)
+    ann["openWorldHint"] = any(t in open_world for t in visible)
+    return ann
+
+
+def _response_guard(server_src: str) -> int:
+    cap = _CAP_RE.search(server_src)
+    margin = _GUARD_RE.search(server_src)
+    return ((int(cap.group(1)) if cap else HUB_RESPONSE_CAP_BYTES)
+            - (int(margin.group(1)) if margin else RESPONSE_GUARD_MARGIN_BYTES))
+
+
+def _envelope(server_src: str, tools: list) -> dict:
+    """handleToolsList() -> jsonRpcResult(): the frame around the tools array."""
+    version = _VERSION_RE.search(server_src)
+    version = version.group(1) if version else "0.0.0"
+    ttl = _TTL_RE.search(server_src)
+    return {"jsonrpc": "2.0", "id": ENVELOPE_ID, "result": {
+        "tools": tools,
+        "ttlMs": int(ttl.group(1)) if ttl else 0,
+        "cacheScope": "private",
+        "resultType": "complete",
+        # updateAvailable rides when the daily update check found a newer release.
+        "_meta": {"io.modelcontextprotocol/serverInfo": {
+            "name": "hubitat-mcp-rule-server", "version": version, "updateAvailable": version}},
+    }}
+
+
+def _library_of(corpus: sl.LintCorpus):
+    """offset in combined_text() -> the repo-relative file it came from."""
+    bounds = []
+    pos = 0
+    for path in [corpus.server_path, *corpus.library_paths]:
+        pos += len(corpus.text(path) or "") + 1
+        bounds.append((pos, corpus.rel(path).replace("\\", "/")))
+
+    def lookup(offset: int) -> str:
+        k = bisect.bisect_right([end for end, _ in bounds], offset)
+        return bounds[k][1] if k < len(bounds) else "?"
+    return lookup
+
+
+def _hidden_tools(catalog: sl.ToolCatalog, default_install: bool) -> set[str]:
+    """The getHiddenToolNames() set for the priced profile (see the module docstring):
+    empty for the largest catalog; for the default install, the Developer-Mode-only
+    names plus the custom engine's "readonly" list.
+
+    Raises ValueError when getHiddenToolNames() no longer spells that list as a literal."""
+    if not default_install:
+        return set()
+    hidden = set(catalog.name_sets["developer_mode_only"].names)
+    found = catalog.methods.get("getHiddenToolNames")
+    branch = found and _READONLY_ENGINE_RE.search(catalog.src, found[0].body_start, found[0].body_end)
+    engine = catalog.literal_at(branch.end(), found[0].body_end) if branch else None
+    if not isinstance(engine, list) or not all(isinstance(n, str) for n in engine):
+        raise ValueError('getHiddenToolNames(): the custom engine "readonly" list is unreadable')
+    return hidden | set(engine)
+
+
+def measure(corpus: sl.LintCorpus | None = None, *, default_install: bool = False,
+            publish_output_schemas: bool = False) -> CatalogSize:
+    """Size both tools/list modes for `corpus` (the repo by default); `default_install`
+    hides what a fresh install hides, otherwise every tool is visible.
+
+    Raises ValueError when the app or its tool catalog cannot be read."""
+    corpus = corpus or sl.LintCorpus()
+    catalog = corpus.tool_catalog()
+    if catalog is None:
+        raise ValueError("hubitat-mcp-server.groovy not found")
+    if catalog.errors:
+        raise ValueError("; ".join(f"{m}() return literal unreadable: {e}"
+                                   for m, e in catalog.errors.items()))
+    if not catalog.tools or not catalog.gateways:
+        raise ValueError("no tool definitions / gateway config found")
+    server_src = corpus.server_text
+    resolver = _Resolver(catalog)
+    library_of = _library_of(corpus)
+    meta = resolver.display_meta()
+    read_only = catalog.name_sets["read_only"].names
+    idempotent = read_only | catalog.name_sets["idempotent_write"].names
+    open_world = catalog.name_sets["open_world"].names
+    hidden = _hidden_tools(catalog, default_install)
+    proxied = catalog.proxied_names
+
+    costs: list[ToolCost] = []
+    flat_list, base_list = [], []
+    set_rule_flat = resolver.method_literal("_setRuleFlatTool")
+    for tool in catalog.tools:
+        cost = ToolCost(tool.name, library_of(tool.offset), tool.method,
+                        [g.name for g in catalog.gateways.values() if tool.name in g.tools])
+        costs.append(cost)
+        definition = resolver.plain(tool.definition, tool.name, tool.method)
+        if tool.name in hidden:
+            continue
+
+        if tool.name != "hub_search_tools":
+            flat = {k: v for k, v in definition.items() if k != "outputSchema"}
+            flat["description"] = _strip_flat_trim(flat.get("description"), True)
+            flat["inputSchema"] = _strip_schema_descriptions(flat.get("inputSchema"), True)
+            if tool.name == "hub_set_rule" and isinstance(set_rule_flat, dict):
+                thin = resolver.plain(set_rule_flat, tool.name)
+                flat["description"] = _strip_flat_trim(thin.get("description"), True)
+                flat["inputSchema"] = _strip_schema_descriptions(thin.get("inputSchema"), True)
+            flat["annotations"] = _leaf_annotations(tool.name, meta, read_only, idempotent, open_world)
+            flat_list.append(flat)
+            cost.flat_bytes = _json_bytes(flat) + 1
+
+        if tool.name not in proxied:
+            base = dict(definition)
+            base["description"] = _strip_flat_trim(base.get("description"), False)
+            base["inputSchema"] = _strip_schema_descriptions(base.get("inputSchema"), False)
+            if publish_output_schemas and base.get("outputSchema") is not None:
+                base["outputSchema"] = _wire_output_schema(base["outputSchema"])
+            else:
+                base.pop("outputSchema", None)
+            existing = base.get("annotations") if isinstance(base.get("annotations"), dict) else {}
+            base["annotations"] = {**existing, **_leaf_annotations(
+                tool.name, meta, read_only, idempotent, open_world)}
+            base_list.append(base)
+            cost.gateway_bytes = _json_bytes(base) + 1
+
+    flat_by_name = {c.name: c.flat_bytes or 0 for c in costs}
+    gateways, gateway_list = [], []
+    for gateway in catalog.gateways.values():
+        visible = [t for t in gateway.tools if t not in hidden]
+        entry_bytes = 0
+        if visible:
+            lines = "\n".join(f"- {t}: {gateway.summaries.get(t)}" for t in visible)
+            entry = {
+                "name": gateway.name,
+                "description": _strip_flat_trim(
+                    f"{gateway.description}{GATEWAY_CALL_HINT}{lines}", False),
+                "inputSchema": {"type": "object", "properties": {
+                    "tool": {"type": "string", "description": GATEWAY_TOOL_DESCRIPTION, "enum": visible},
+                    "args": {"type": "object", "description": GATEWAY_ARGS_DESCRIPTION},
+                }},
+                "annotations": _gateway_annotations(gateway.name, visible, meta, read_only,
+                                                    idempotent, open_world),
+            }
+            gateway_list.append(entry)
+            entry_bytes = _json_bytes(entry) + 1
+        gateways.append(GatewayCost(gateway.name, gateway.tools, entry_bytes,
+                                    sum(flat_by_name.get(t, 0) for t in visible)))
+
+    envelope_bytes = _json_bytes(_envelope(server_src, []))
+    return CatalogSize(
+        costs, gateways,
+        flat_wire=_json_bytes(_envelope(server_src, flat_list)),
+        gateway_wire=_json_bytes(_envelope(server_src, base_list + gateway_list)),
+        envelope_bytes=envelope_bytes,
+        guard=_response_guard(server_src),
+        unresolved=resolver.unresolved,
+    )
+
+
+def format_catalog_size(size: CatalogSize, budget: int, top: int = 10) -> str:
+    """The text report: mode totals vs the guard and budget, then per-library, per-gateway
+    and most-expensive-tool tables."""
+    rows = [f"{'mode':<10} {'tools':>5} {'bytes':>8} {'guard':>8} {'headroom':>9} {'budget':>8}"]
+    summary = size.as_dict()
+    for mode in ("flat", "gateway"):
+        m = summary[mode]
+        flag = "  <-- over budget" if m["bytes"] > budget else ""
+        rows.append(f"{mode:<10} {m['tools']:>5} {m['bytes']:>8} {size.guard:>8} "
+                    f"{m['headroom']:>9} {budget:>8}{flag}")
+    rows.append(f"(each response includes a {size.envelope_bytes}-byte JSON-RPC frame)")
+
+    rows += ["", f"{'library':<44} {'tools':>5} {'flat':>8} {'share':>6} {'gw base':>8}"]
+    flat_tools = max(size.flat_wire - size.envelope_bytes, 1)
+    for lib, n, flat, gw in size.libraries():
+        rows.append(f"{lib:<44} {n:>5} {flat:>8} {flat / flat_tools:>6.1%} {gw:>8}")
+
+    rows += ["", f"{'gateway':<36} {'tools':>5} {'entry':>8} {'flattened':>10}"]
+    for g in sorted(size.gateways, key=lambda g: (-g.flat_bytes, g.name)):
+        rows.append(f"{g.name:<36} {len(g.tools):>5} {g.entry_bytes:>8} {g.flat_bytes:>10}")
+
+    if top:
+        ranked = sorted((t for t in size.tools if t.flat_bytes),
+                        key=lambda t: (-t.flat_bytes, t.name))[:top]
+        rows += ["", f"{'tool':<36} {'flat':>8} {'library':<40}"]
+        for t in ranked:
+            rows.append(f"{t.name:<36} {t.flat_bytes:>8} {t.library:<40}")
+
+    if size.unresolved:
+        rows += ["", f"{len(size.unresolved)} value(s) sized from source text (not literals):"]
+        rows += [f"  {tool}: {text[:60]}" for tool, text in size.unresolved]
+    return "\n".join(rows)
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Static tools/list size profile.")
+    parser.add_argument("--budget", type=int, default=None,
+                        help="fail when a tools/list response exceeds this many bytes "
+                             "(default: the handleMcpRequest guard)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="list the N most expensive flat-mode tools (0 = none)")
+    parser.add_argument("--json", action="store_true", help="print the profile as JSON")
+    parser.add_argument("--default-install", action="store_true",
+                        help="price the default install (Developer Mode off, custom engine "
+                             "read-only)")
+    parser.add_argument("--publish-output-schemas", action="store_true",
+                        help="gateway mode emits base-tool outputSchema (publishOutputSchemas on)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    try:
+        size = measure(default_install=args.default_install,
+                       publish_output_schemas=args.publish_output_schemas)
+    except ValueError as exc:
+        print(f"catalog_size: {exc}", file=sys.stderr)
+        return 1
+    budget = size.guard if args.budget is None else args.budget
+    if args.json:
+        print(json.dumps({**size.as_dict(), "budget": budget}, indent=2))
+    else:
+        print(format_catalog_size(size, budget, args.top))
+    failed = 0
+    for mode, wire in (("flat", size.flat_wire), ("gateway", size.gateway_wire)):
+        if wire > budget:
+            print(f"ERROR: {mode}-mode tools/list response is {wire} bytes, "
+                  f"{wire - budget} over the {budget}-byte budget", file=sys.stderr)
+            failed = 1
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""Static hub round-trip cost model for every MCP tool.
+
+Each internal hub HTTP call (hubInternalGet*, hubInternalPost*, _radioGet* /
+_radioPost*, _hubRequest) is a serialized request against the hub's own web
+server, and a tool that makes one per device turns a 200-device hub into 200
+round trips. This analyzer prices that without a hub: it splits the app and
+every libraries/*.groovy into methods (the lint's tokenizer and method-header
+regex, so strings and comments never read as code), records each call site
+with the blocks around it, follows the call graph from each tool's dispatch
+case in executeTool() (the tool* implementation and the helpers its case calls)
+down to those primitives, and reports per tool:
+
+  min    hub calls every path makes -- call sites outside any branch, loop or
+         closure and not behind `?`, `&&`, `||`, `if` or `else` on their line.
+         Guard-clause returns and throws are not treated as paths, so this is
+         the floor of a call that gets past its argument checks.
+  max    hub calls with every branch taken, or "unbounded" when a call sits in a
+         loop (or a recursive cycle) -- its size is the data's, not the code's
+  loops  each loop that makes hub calls: where it is, whether it iterates devices
+         (the lint's PERF-005 naming heuristic), and the calls per iteration
+         ("unbounded" when the loop body itself loops)
+
+Each hub primitive counts as one call; what the primitives do internally (the
+_hubRequest auth-retry, a login for a fresh cookie) is not followed. Dynamic
+dispatch (`"${name}"()`, closures passed around as values) is invisible here.
+
+Usage:
+  python3 tools/hub_call_cost.py [--json] [--top N] [--tool NAME ...]
+
+  --json       print the model as JSON instead of a ranked table
+  --top N      rank only the N most expensive tools (default: all)
+  --tool NAME  report only the named tool(s)
+
+Ranking: tools with a device loop first, then other unbounded tools, then by
+max and min. Exit 0 = report printed, exit 1 = the app source is missing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import re
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# The tokenizer, method-header and loop-opener regexes live in the lint.
+sys.path.insert(0, str(REPO_ROOT / "tests"))
+
+import sandbox_lint as sl  # noqa: E402
+
+# The same primitive family PERF-005 flags inside device loops.
+HUB_CALL_RE = re.compile(r"hubInternalGet\w*|hubInternalPost\w*|_hubRequest|_radioGet\w*|_radioPost\w*")
+DISPATCH_METHOD = "executeTool"
+
+_CALL_RE = re.compile(r"(?<![\w.$])(?:this\s*\.\s*)?(\w+)\s*\(")
+_BRACE_RE = re.compile(r"[{}]")
+_CASE_RE = re.compile(r"^\s*case\s+[\"'](\w+)[\"']\s*:")
+_DEFAULT_RE = re.compile(r"^\s*default\s*:")
+_BRANCH_OPENER_RE = re.compile(r"\b(?:if|else|switch|catch)\b[^{}]*$")
+_PLAIN_OPENER_RE = re.compile(r"\b(?:try|finally|synchronized)\b[^{}]*$")
+# Text before a call on its own statement that makes the call conditional.
+_CONDITIONAL_PREFIX_RE = re.compile(r"\bif\s*\(|\belse\b|\?|&&|\|\|")
+_KEYWORDS = frozenset(("if", "for", "while", "switch", "catch", "return", "synchronized", "new"))
+
+# Block kinds: the method body and try/finally always run; a branch (if / else / switch /
+# catch) or a closure that is not an iterator may not; a loop runs per element.
+_BODY, _PLAIN, _BRANCH, _CLOSURE, _LOOP = "body", "plain", "branch", "closure", "loop"
+
+
+class Loop:
+    """A loop body in the source: `where` is "<file>:<line> <opener>"."""
+
+    def __init__(self, where: str, device: bool):
+        self.where = where
+        self.device = device
+
+
+class CallSite:
+    """One call in a method body, with the blocks around it (outermost first)."""
+
+    def __init__(self, name: str, line: int, frames: tuple, conditional: bool):
+        self.name = name
+        self.line = line
+        self.frames = frames  # ((kind, Loop | None), ...)
+        self.conditional = conditional
+
+
+class Method:
+    """One method (or one executeTool dispatch case): its call sites in source order."""
+
+    def __init__(self, name: str, path: str, line: int):
+        self.name = name
+        self.path = path
+        self.line = line
+        self.sites: list[CallSite] = []
+        self.cases: list[tuple[list[str], int, int]] = []  # (tool names, first line, frame depth)
+
+
+class Cost:
+    """Hub calls of one method or tool: min / max (None = unbounded), and per loop that
+    makes them, {where: (iterates devices, calls per iteration or None)}."""
+
+    def __init__(self, min_calls: int = 0, max_calls: int | None = 0):
+        self.min = min_calls
+        self.max = max_calls
+        self.loops: dict[str, tuple[bool, int | None]] = {}
+        self.recursive = False
+
+    @property
+    def device_fanout(self) -> bool:
+        return any(device for device, _ in self.loops.values())
+
+    def rank_key(self, name: str) -> tuple:
+        return (not self.device_fanout, self.max is not None,
+                -(self.max or 0), -self.min, name)
+
+
+_PRIMITIVE = Cost(1, 1)
+
+
+def _add(a: int | None, b: int | None) -> int | None:
+    return None if a is None or b is None else a + b
+
+
+def _opener_kind(line: str, brace: int, loops: dict[int, Loop]) -> tuple:
+    if brace in loops:
+        return (_LOOP, loops[brace])
+    before = re.split(r"[;{}]", line[:brace])[-1]
+    if _BRANCH_OPENER_RE.search(before):
+        return (_BRANCH, None)
+    if _PLAIN_OPENER_RE.search(before):
+        return (_PLAIN, None)
+    return (_CLOSURE, None)
+
+
+def _loops_opened(line: str, line_num: int, display_path: str) -> dict[int, Loop]:
+    """{brace offset: Loop} for every loop body a stripped line opens (the PERF rules' opener
+    regex and device-name heuristic)."""
+    loops: dict[int, Loop] = {}
+    for m in sl._LOOP_OPENER_RE.finditer(line):
+        if m.group("closure") is not None:
+            brace = m.start("closure")
+            receiver = re.split(r"[=;{}]", line[:m.start()])[-1]
+            params = sl._CLOSURE_PARAMS_RE.match(line, brace + 1)
+            device = bool(sl._DEVICE_NAME_RE.search(receiver) or (
+                params is not None and sl._DEVICE_NAME_RE.search(params.group(1))))
+            opener = "." + re.match(r"\??\.\s*(\w+)", m.group()).group(1)
+        elif m.group("for") is not None:
+            brace, opener = m.start("for"), "for"
+            device = bool(sl._DEVICE_NAME_RE.search(m.group("coll")))
+        else:
+            brace, opener, device = m.start("while"), "while", False
+        loops[brace] = Loop(f"{display_path}:{line_num} {opener}", device)
+    return loops
+
+
+def parse_methods(text: str, display_path: str) -> list[Method]:
+    """Every top-level method of one Groovy source, with its call sites. In the dispatch
+    method, each group of `case "<tool>":` labels of the outermost switch is recorded too,
+    with a boundary at every `default:`."""
+    methods: list[Method] = []
+    method: Method | None = None
+    frames: list[tuple] = []
+    case_depth = None
+    pending: list[str] = []
+    pending_line = 0
+    stripped = sl.strip_comments_and_strings(text)
+    for line_num, (raw, line) in enumerate(zip(text.split("\n"), stripped, strict=True), start=1):
+        start = 0
+        header = sl._METHOD_HEADER_RE.match(line) if not frames else None
+        if header:
+            method, case_depth, pending = Method(header.group(1), display_path, line_num), None, []
+            start = header.end()
+        if method is None:
+            continue
+
+        if method.name == DISPATCH_METHOD and frames:
+            case = _CASE_RE.match(raw)
+            if case and case_depth in (None, len(frames)):
+                case_depth = len(frames)
+                if not pending:
+                    pending_line = line_num
+                pending.append(case.group(1))
+                if not line[case.end():].strip():
+                    continue
+            elif case_depth == len(frames) and _DEFAULT_RE.match(line):
+                method.cases.append(([], line_num, case_depth))
+            if pending and line.strip():
+                method.cases.append((pending, pending_line, case_depth))
+                pending = []
+
+        loops = _loops_opened(line, line_num, display_path) if "{" in line else {}
+        events = sorted([(m.start(), m) for m in _CALL_RE.finditer(line, start)]
+                        + [(m.start(), m.group()) for m in _BRACE_RE.finditer(line, start)],
+                        key=lambda e: e[0])
+        for at, event in events:
+            if event == "{":
+                frames.append(_opener_kind(line, at, loops) if frames else (_BODY, None))
+            elif event == "}":
+                if frames:
+                    frames.pop()
+                if not frames:
+                    methods.append(method)
+                    method = None
+                    break
+            elif frames and event.group(1) not in _KEYWORDS:
+                statement = re.split(r"[;{}]", line[:at])[-1]
+                method.sites.append(CallSite(
+                    event.group(1), line_num, tuple(frames[1:]),
+                    bool(_CONDITIONAL_PREFIX_RE.search(statement)),
+                ))
+    return methods
+
+
+class CostModel:
+    """Hub-call costs over the app + libraries call graph (see the module docstring)."""
+
+    def __init__(self, methods: list[Method]):
+        self.methods: dict[str, list[Method]] = {}
+        for method in methods:
+            self.methods.setdefault(method.name, []).append(method)
+        self._costs: dict[str, Cost] = {}
+        # Stand-ins for the members of the cycle being priced (see _price_component).
+        self._provisional: dict[str, Cost] = {}
+
+    def cost(self, name: str) -> Cost:
+        """The merged cost of every overload of `name` (min of mins, max of maxes)."""
+        if HUB_CALL_RE.fullmatch(name):
+            return _PRIMITIVE
+        if name in self._provisional:
+            return self._provisional[name]
+        if name not in self._costs:
+            for component in self._components(name):
+                self._price_component(component)
+        return self._costs[name]
+
+    def _callees(self, name: str) -> list[str]:
+        return [site.name for method in self.methods.get(name, []) for site in method.sites
+                if site.name in self.methods and site.name not in self._costs]
+
+    def _components(self, root: str) -> list[list[str]]:
+        """The strongly connected components of the unpriced call graph reachable from
+        `root` (Tarjan, iterative), callees before callers -- so each component's outside
+        callees are priced by the time it is."""
+        index: dict[str, int] = {}
+        low: dict[str, int] = {}
+        stack: list[str] = []
+        on_stack: set[str] = set()
+        components: list[list[str]] = []
+        work = [(root, iter(self._callees(root)))]
+        index[root] = low[root] = 0
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            name, callees = work[-1]
+            callee = next(callees, None)
+            if callee is not None:
+                if callee not in index:
+                    index[callee] = low[callee] = len(index)
+                    stack.append(callee)
+                    on_stack.add(callee)
+                    work.append((callee, iter(self._callees(callee))))
+                elif callee in on_stack:
+                    low[name] = min(low[name], index[callee])
+                continue
+            work.pop()
+            if work:
+                caller = work[-1][0]
+                low[caller] = min(low[caller], low[name])
+            if low[name] == index[name]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == name:
+                        break
+                components.append(sorted(component))
+        return components
+
+    def _merged(self, name: str) -> Cost:
+        merged: Cost | None = None
+        for method in self.methods.get(name, []):
+            cost = self.sites_cost(method.sites)
+            if merged is None:
+                merged = cost
+            else:
+                merged.min = min(merged.min, cost.min)
+                merged.max = None if merged.max is None or cost.max is None else max(merged.max, cost.max)
+                merged.loops.update(cost.loops)
+                merged.recursive |= cost.recursive
+        return merged or Cost()
+
+    def _price_component(self, members: list[str]) -> None:
+        """Price one component as a unit, so the result does not depend on which member the
+        walk reached first. A cycle only matters when it makes hub calls: then it repeats
+        them unboundedly, for every member. Its mins are a fixed point over rounds that
+        price every member against the previous round's stand-ins for the others."""
+        if len(members) == 1 and members[0] not in self._callees(members[0]):
+            self._costs[members[0]] = self._merged(members[0])
+            return
+        priced = self._round(members, {name: Cost() for name in members})
+        calls = any(cost.max != 0 or cost.loops for cost in priced.values())
+        if calls:
+            standins = {name: Cost(0, None) for name in members}
+            # The mins only grow; a cycle that always recurses would grow them forever.
+            for _ in range(len(members) + 1):
+                priced = self._round(members, standins)
+                stable = all(priced[name].min == standins[name].min for name in members)
+                standins = {name: Cost(priced[name].min, None) for name in members}
+                if stable:
+                    break
+            # Each member's own loops, then the loops of every member it reaches.
+            priced = self._round(members, self._round(members, standins))
+        for name, cost in priced.items():
+            cost.recursive = calls
+            if calls:
+                cost.max = None
+            self._costs[name] = cost
+
+    def _round(self, members: list[str], standins: dict[str, Cost]) -> dict[str, Cost]:
+        """Every member priced with `standins` answering for calls into the cycle."""
+        for standin in standins.values():
+            standin.recursive = True
+            if standin.max != 0 or standin.loops:
+                standin.max = None
+        self._provisional = standins
+        try:
+            return {name: self._merged(name) for name in members}
+        finally:
+            self._provisional = {}
+
+    def sites_cost(self, sites: list[CallSite], skip_frames: int = 0) -> Cost:
+        total = Cost()
+        for site in sites:
+            if site.name not in self.methods and not HUB_CALL_RE.fullmatch(site.name):
+                continue
+            callee = self.cost(site.name)
+            total.recursive |= callee.recursive
+            if callee.max == 0 and not callee.loops:
+                continue
+            frames = site.frames[skip_frames:]
+            loops = [loop for kind, loop in frames if kind == _LOOP]
+            total.loops.update(callee.loops)
+            if not loops:
+                if not site.conditional and not any(kind in (_BRANCH, _CLOSURE) for kind, _ in frames):
+                    total.min += callee.min
+                total.max = _add(total.max, callee.max)
+                continue
+            # Per iteration of the innermost loop; an outer loop's body loops itself.
+            total.max = None
+            for loop in loops:
+                device, per_iteration = total.loops.get(loop.where, (loop.device, 0))
+                total.loops[loop.where] = (
+                    device, _add(per_iteration, callee.max) if loop is loops[-1] else None)
+        return total
+
+    def tools(self) -> dict[str, tuple[Cost, list[str]]]:
+        """{tool: (cost, tool* implementations its dispatch case calls)} from executeTool."""
+        result: dict[str, tuple[Cost, list[str]]] = {}
+        for dispatch in self.methods.get(DISPATCH_METHOD, []):
+            bounds = [*dispatch.cases, ([], 10 ** 9, 0)]
+            for (names, first, depth), (_, nxt, _) in itertools.pairwise(bounds):
+                if not names:
+                    continue
+                sites = [s for s in dispatch.sites
+                         if first <= s.line < nxt and len(s.frames) >= depth - 1]
+                # The dispatch case's own frames (switch and above) are not the tool's.
+                cost = self.sites_cost(sites, skip_frames=depth - 1)
+                impls = sorted({s.name for s in sites if re.match(r"tool[A-Z]", s.name)
+                                and s.name in self.methods})
+                for name in names:
+                    result.setdefault(name, (cost, impls))
+        return result
+
+
+def analyze(corpus: sl.LintCorpus | None = None) -> dict[str, tuple[Cost, list[str]]]:
+    """{tool: (cost, tool* implementations)} for every catalog tool with a dispatch case
+    (every dispatch case when the catalog cannot be read). Raises ValueError when the app
+    source is missing."""
+    corpus = corpus or sl.LintCorpus()
+    if corpus.server_text is None:
+        raise ValueError(f"{corpus.server_path} not found")
+    methods: list[Method] = []
+    for path in [corpus.server_path, *corpus.library_paths]:
+        methods += parse_methods(corpus.text(path) or "", corpus.rel(path).replace("\\", "/"))
+    tools = CostModel(methods).tools()
+    catalog = corpus.tool_catalog()
+    if catalog is not None and catalog.tools:
+        # Gateway cases re-enter executeTool for a sub-tool; their cost is the sub-tool's.
+        tools = {name: entry for name, entry in tools.items() if name in catalog.tool_names}
+    return dict(sorted(tools.items(), key=lambda kv: kv[1][0].rank_key(kv[0])))
+
+
+def _calls(n: int | None) -> str:
+    return "unbounded" if n is None else str(n)
+
+
+def as_json(tools: dict[str, tuple[Cost, list[str]]]) -> list[dict]:
+    return [{
+        "tool": name,
+        "implementations": impls,
+        "min": cost.min,
+        "max": cost.max,  # null = unbounded
+        "recursive": cost.recursive,
+        "loops": [{"where": where, "device": device, "calls_per_iteration": per_iteration}
+                  for where, (device, per_iteration) in cost.loops.items()],
+    } for name, (cost, impls) in tools.items()]
+
+
+def format_hub_call_cost(tools: dict[str, tuple[Cost, list[str]]]) -> str:
+    """The ranked table: one row per tool, its worst loop (a device loop if any) last."""
+    rows = [f"{'tool':<34} {'min':>4} {'max':>9} {'loops':>5} {'implementation':<28} worst loop"]
+    for name, (cost, impls) in tools.items():
+        worst = ""
+        if cost.loops:
+            where, (device, per_iteration) = min(
+                cost.loops.items(), key=lambda kv: (not kv[1][0], kv[1][1] is not None, -(kv[1][1] or 0)))
+            worst = f"{where} ({'per device, ' if device else ''}{_calls(per_iteration)}/iteration)"
+        rows.append(f"{name:<34} {cost.min:>4} {_calls(cost.max):>9} {len(cost.loops):>5} "
+                    f"{', '.join(impls)[:28]:<28} {worst}".rstrip())
+    return "\n".join(rows)
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Static hub round-trip cost per MCP tool.")
+    parser.add_argument("--json", action="store_true", help="print the model as JSON")
+    parser.add_argument("--top", type=int, default=None, help="rank only the N most expensive tools")
+    parser.add_argument("--tool", action="append", default=[], metavar="NAME",
+                        help="report only this tool (repeatable)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    try:
+        tools = analyze()
+    except ValueError as exc:
+        print(f"hub_call_cost: {exc}", file=sys.stderr)
+        return 1
+    if args.tool:
+        tools = {name: entry for name, entry in tools.items() if name in args.tool}
+    if args.top is not None:
+        tools = dict(list(tools.items())[:args.top])
+    if args.json:
+        print(json.dumps(as_json(tools), indent=2))
+    else:
+        print(format_hub_call_cost(tools))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())